@@ -0,0 +1,183 @@
+from collections import deque
+from contextlib import contextmanager
+import math
+import os
+import threading
+import time
+from typing import Deque, Dict, Iterator, Optional
+from dotenv import load_dotenv
+from backend.metrics import ADMISSION_IN_FLIGHT, ADMISSION_QUEUE_DEPTH, ADMISSION_REJECTIONS
+
+load_dotenv()
+
+# Admission control for the endpoints that hold a worker and a subprocess for a while
+# (traceroute, WiFi scan) and for the throughput test, which runs alone (another test at the
+# same time would skew both measurements). Per endpoint: at most N executions at once and, for traceroute,
+# a budget on the summed cost of what runs (max_hops * timeout, the seconds its subprocess
+# may take); requests over the limits queue FIFO, at most ..._QUEUE of them and for at most
+# ADMISSION_MAX_WAIT seconds, anything beyond is rejected right away with a 503. Each client
+# (IP) also gets a token bucket of ADMISSION_CLIENT_RATE requests per second, bursts of
+# ADMISSION_CLIENT_BURST, per endpoint; past it, 429.
+ADMISSION_MAX_WAIT = float(os.getenv('ADMISSION_MAX_WAIT', '5'))
+ADMISSION_CLIENT_RATE = float(os.getenv('ADMISSION_CLIENT_RATE', '0.5'))
+ADMISSION_CLIENT_BURST = float(os.getenv('ADMISSION_CLIENT_BURST', '5'))
+TRACEROUTE_CONCURRENCY = int(os.getenv('TRACEROUTE_CONCURRENCY', '4'))
+TRACEROUTE_QUEUE = int(os.getenv('TRACEROUTE_QUEUE', '8'))
+TRACEROUTE_COST_BUDGET = float(os.getenv('TRACEROUTE_COST_BUDGET', '160'))
+WIFI_SCAN_CONCURRENCY = int(os.getenv('WIFI_SCAN_CONCURRENCY', '1'))
+WIFI_SCAN_QUEUE = int(os.getenv('WIFI_SCAN_QUEUE', '4'))
+THROUGHPUT_QUEUE = int(os.getenv('THROUGHPUT_QUEUE', '0'))
+
+# Client buckets kept before the idle (full) ones are dropped
+MAX_TRACKED_CLIENTS = 4096
+
+class AdmissionRejected(Exception):
+    """A request turned away: `reason` is the error code, `status` the HTTP status to answer with"""
+    def __init__(self, endpoint: str, reason: str, status: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.endpoint = endpoint
+        self.reason = reason
+        self.status = status
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """`rate` tokens per second, up to `burst`; unlike a pacing limiter, never goes into debt."""
+
+    def __init__(self, rate: float, burst: float, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self) -> float:
+        """Takes a token; returns 0, or the seconds until one is available (nothing taken)."""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else float('inf')
+
+    @property
+    def full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.burst
+
+class AdmissionController:
+    def __init__(self, endpoint: str, max_concurrent: int, max_queue: int, max_wait: float = ADMISSION_MAX_WAIT,
+                 cost_budget: Optional[float] = None, client_rate: float = ADMISSION_CLIENT_RATE,
+                 client_burst: float = ADMISSION_CLIENT_BURST, clock=time.monotonic):
+        self.endpoint = endpoint
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.cost_budget = cost_budget
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.clock = clock
+        self.running = 0
+        self.running_cost = 0.0
+        self.rejections: Dict[str, int] = {}
+        self._queue: Deque[object] = deque()
+        self._clients: Dict[str, TokenBucket] = {}
+        self._cond = threading.Condition()
+
+    def _reject(self, reason: str, status: int, message: str, retry_after: Optional[float] = None) -> AdmissionRejected:
+        # The condition's lock is an RLock, this is also called with it held
+        with self._cond:
+            self.rejections[reason] = self.rejections.get(reason, 0) + 1
+        ADMISSION_REJECTIONS.inc(endpoint=self.endpoint, reason=reason)
+        return AdmissionRejected(self.endpoint, reason, status, message, retry_after)
+
+    def check_rate(self, client: str):
+        """Takes a token from `client`'s bucket, raises AdmissionRejected (429) if it's empty."""
+        if self.client_rate <= 0:
+            return
+        with self._cond:
+            bucket = self._clients.get(client)
+            if bucket is None:
+                if len(self._clients) >= MAX_TRACKED_CLIENTS:
+                    self._clients = {key: bucket for key, bucket in self._clients.items() if not bucket.full}
+                bucket = self._clients[client] = TokenBucket(self.client_rate, self.client_burst, self.clock)
+            retry_after = bucket.take()
+        if retry_after > 0:
+            raise self._reject('rate_limited', 429, f"Too many {self.endpoint} requests, retry in {retry_after:.1f}s", retry_after)
+
+    def check_cost(self, cost: float):
+        """Raises AdmissionRejected (400) if `cost` is over the whole budget, so could never run."""
+        if self.cost_budget is not None and cost > self.cost_budget:
+            raise self._reject('too_expensive', 400, f"This {self.endpoint} would cost {cost:g}, over the budget of {self.cost_budget:g}")
+
+    def _fits(self, cost: float) -> bool:
+        if self.running >= self.max_concurrent:
+            return False
+        return self.cost_budget is None or self.running_cost + cost <= self.cost_budget
+
+    @contextmanager
+    def slot(self, cost: float = 1, max_wait: Optional[float] = None, max_queue: Optional[float] = None) -> Iterator[None]:
+        """
+        Holds one of the endpoint's slots (and `cost` of its budget) for the
+        `with` block, waiting in line for it if needed. Raises AdmissionRejected:
+        400 if `cost` is over the whole budget, 503 if the queue is full or the
+        wait ran past `max_wait`. `max_wait` and `max_queue` override the
+        controller's (math.inf: wait as long as it takes, e.g. for a job).
+        """
+        max_wait = self.max_wait if max_wait is None else max_wait
+        max_queue = self.max_queue if max_queue is None else max_queue
+        self.check_cost(cost)
+        with self._cond:
+            if self._queue or not self._fits(cost):
+                if len(self._queue) >= max_queue:
+                    raise self._reject('queue_full', 503, f"Too many {self.endpoint} requests waiting, try again later", self.max_wait)
+                ticket = object()
+                self._queue.append(ticket)
+                ADMISSION_QUEUE_DEPTH.set(len(self._queue), endpoint=self.endpoint)
+                admitted = self._cond.wait_for(lambda: self._queue[0] is ticket and self._fits(cost), max_wait if math.isfinite(max_wait) else None)
+                self._queue.remove(ticket)
+                ADMISSION_QUEUE_DEPTH.set(len(self._queue), endpoint=self.endpoint)
+                # The next in line may fit now, or may have been waiting behind this one
+                self._cond.notify_all()
+                if not admitted:
+                    raise self._reject('queue_timeout', 503, f"Waited {max_wait:g}s for a {self.endpoint} slot, try again later", max_wait)
+            self.running += 1
+            self.running_cost += cost
+            ADMISSION_IN_FLIGHT.set(self.running, endpoint=self.endpoint)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.running -= 1
+                self.running_cost -= cost
+                ADMISSION_IN_FLIGHT.set(self.running, endpoint=self.endpoint)
+                self._cond.notify_all()
+
+    def stats(self) -> Dict[str, object]:
+        with self._cond:
+            return {
+                'endpoint': self.endpoint,
+                'running': self.running,
+                'running_cost': self.running_cost,
+                'queued': len(self._queue),
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'cost_budget': self.cost_budget,
+                'rejections': dict(self.rejections),
+            }
+
+    def reset(self):
+        """Forgets the client buckets and rejection counts (running slots are left alone)."""
+        with self._cond:
+            self._clients.clear()
+            self.rejections.clear()
+
+# Shared by the endpoints and the jobs running the same diagnostics (see jobs.py). For the
+# endpoints, only the execution a coalesced request started takes a slot, every request
+# takes a client token
+wifi_admission = AdmissionController('wifi_scan', WIFI_SCAN_CONCURRENCY, WIFI_SCAN_QUEUE)
+traceroute_admission = AdmissionController('traceroute', TRACEROUTE_CONCURRENCY, TRACEROUTE_QUEUE, cost_budget=TRACEROUTE_COST_BUDGET)
+throughput_admission = AdmissionController('throughput', 1, THROUGHPUT_QUEUE)
@@ -5,14 +5,30 @@ from flask import Flask
 from flask_cors import CORS
 from backend.routes import routes
 from backend.database import init_db
-from backend.utils import background_scan
+from backend.utils import background_scan, hostname_cache, vendor_cache
+from backend.snapshot import DEVICE_SNAPSHOT_INTERVAL, save_current_snapshot, start_periodic_save, warm_start
+from backend.wifi import WIFI_SCAN_REFRESH_INTERVAL, neighbor_scan_cache
+from backend.wifi_sampler import WIFI_SAMPLER_HZ, start_wifi_sampler
+from backend.monitor import MONITOR_INTERVAL, start_latency_monitor
+from backend.pathmonitor import PATH_MONITOR_INTERVAL, start_path_monitor
+from backend.discovery import DISCOVERY_LISTEN, start_discovery_listener
+from backend.dhcp import DHCP_WATCH, dhcp_monitor
+from backend.portscan import PORTSCAN_INTERVAL, start_port_scanner
+from backend.presence import PRESENCE_INTERVAL, start_presence_tracker
+from backend.throughput import THROUGHPUT_SERVER_PORT, start_throughput_server
+import atexit
 import logging
+import time
 from uuid import uuid4
 from werkzeug.exceptions import HTTPException
-from flask import jsonify, g
+from flask import jsonify, g, request
+from backend.metrics import HTTP_REQUEST_SECONDS
+from backend.profiling import begin_request, end_request
+from backend.serialization import compress_response, install_json_provider
 
 load_dotenv()
 app = Flask(__name__)
+install_json_provider(app)
 domain = os.getenv('DOMAIN')
 SQL_Alchemy_DB = f"sqlite:///{os.getenv('SQLALCHEMY_DATABASE_URI')}/"
 
@@ -21,6 +37,33 @@ CORS(app, origins = domain or "http://localhost:3000")
 @app.before_request
 def set_request_id():
     g.request_id = str(uuid4())
+    g.request_start = time.perf_counter()
+    g.request_profile = begin_request()
+
+@app.after_request
+def record_request_latency(response):
+    start = g.get("request_start")
+    if start is not None:
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            # The URL rule, not the raw path, so `/api/ping/<ip>` stays a single series
+            route=request.url_rule.rule if request.url_rule else "unmatched",
+            status=response.status_code,
+        )
+    profile = g.get("request_profile")
+    if profile is not None:
+        end_request(profile, g.request_id, request.method, request.path, response.status_code)
+    return response
+
+app.after_request(compress_response)
+
+@app.teardown_request
+def close_request_profile(_error):
+    # after_request is skipped when a response can't be built, don't leak an enabled profiler
+    profile = g.get("request_profile")
+    if profile is not None:
+        profile.close()
 
 @app.errorhandler(HTTPException)
 def handle_http_error(error):
@@ -47,10 +90,42 @@ def handle_unexpected_error(error):
     ), 500
 app.register_blueprint(routes)
 init_db()
+# Serve the last known devices right away, the first sweep below confirms them
+warm_start(hostname_cache, vendor_cache)
+atexit.register(save_current_snapshot, hostname_cache)
+if DEVICE_SNAPSHOT_INTERVAL > 0:
+    start_periodic_save(hostname_cache, DEVICE_SNAPSHOT_INTERVAL)
 
 scan_thread = threading.Thread(target=background_scan, daemon=True)
 scan_thread.start()
 
+if WIFI_SCAN_REFRESH_INTERVAL > 0:
+    neighbor_scan_cache.start_background_refresh(WIFI_SCAN_REFRESH_INTERVAL)
+
+if WIFI_SAMPLER_HZ > 0:
+    start_wifi_sampler(WIFI_SAMPLER_HZ)
+
+if MONITOR_INTERVAL > 0:
+    start_latency_monitor(MONITOR_INTERVAL)
+
+if PATH_MONITOR_INTERVAL > 0:
+    start_path_monitor(PATH_MONITOR_INTERVAL)
+
+if PORTSCAN_INTERVAL > 0:
+    start_port_scanner(PORTSCAN_INTERVAL)
+
+if PRESENCE_INTERVAL > 0:
+    start_presence_tracker(PRESENCE_INTERVAL)
+
+if DISCOVERY_LISTEN:
+    start_discovery_listener()
+
+if DHCP_WATCH:
+    dhcp_monitor.watch()
+
+if THROUGHPUT_SERVER_PORT > 0:
+    start_throughput_server(THROUGHPUT_SERVER_PORT)
+
 if __name__ == '__main__':
     app.run(
         debug=True, 
@@ -0,0 +1,54 @@
+"""
+Benchmark suite for the parsers, DB layer and request paths.
+
+    python -m backend.benchmarks                      # run everything, compare with baseline.json
+    python -m backend.benchmarks parsers database     # only some suites
+    python -m backend.benchmarks --sizes 1000,10000   # skip the 100k device runs
+    python -m backend.benchmarks --save               # record the results as the new baseline
+
+Exits with status 1 when any benchmark's median is slower than its baseline
+by more than --threshold (20% by default).
+"""
+import argparse
+import sys
+
+from backend.benchmarks.harness import DEFAULT_BASELINE_PATH, DEFAULT_THRESHOLD, find_regressions, load_baseline, save_baseline
+from backend.benchmarks.suite import DEFAULT_DEVICE_COUNTS, SUITES, run_suite
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m backend.benchmarks', description='Run the backend benchmark suite.')
+    parser.add_argument('suites', nargs='*', metavar='suite', help=f"any of: {', '.join(SUITES)} (default: all)")
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--sizes', default=','.join(str(n) for n in DEFAULT_DEVICE_COUNTS), help='device counts for the DB/request benchmarks')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_PATH)
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='allowed slowdown before flagging, 0.2 = 20%%')
+    parser.add_argument('--save', action='store_true', help='store these results as the baseline')
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.suites if name not in SUITES]
+    if unknown:
+        parser.error(f"unknown suite(s): {', '.join(unknown)}")
+
+    device_counts = tuple(int(size) for size in args.sizes.split(',') if size)
+    baseline = load_baseline(args.baseline)
+
+    results = []
+    print(f"{'benchmark':<45} {'median ms':>11} {'best ms':>11} {'baseline ms':>12} {'peak KiB':>10}")
+    for result in run_suite(args.suites or None, rounds=args.rounds, device_counts=device_counts):
+        results.append(result)
+        previous = baseline.get(result.name)
+        previous_ms = f"{previous['median_s'] * 1000:.3f}" if previous else '-'
+        peak = f"{result.peak_kib:.0f}" if result.peak_kib is not None else '-'
+        print(f"{result.name:<45} {result.median_s * 1000:>11.3f} {result.best_s * 1000:>11.3f} {previous_ms:>12} {peak:>10}")
+
+    if args.save:
+        save_baseline(results, args.baseline)
+        print(f"Saved {len(results)} results to {args.baseline}")
+        return 0
+
+    regressions = find_regressions(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression.name}: {regression.baseline_s * 1000:.3f}ms -> {regression.current_s * 1000:.3f}ms (+{regression.slowdown:.0%})")
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
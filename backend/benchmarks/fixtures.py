@@ -0,0 +1,130 @@
+import random
+from datetime import datetime, timedelta
+
+# Synthetic, seeded inputs for the benchmarks (and parser tests): the same seed always
+# produces byte-identical dumps and device lists, so runs are comparable across machines.
+
+SEED = 1234
+
+RADIO_TYPES = ['802.11n', '802.11ac', '802.11ax', '802.11be']
+AUTHENTICATIONS = ['WPA2-Personal', 'WPA3-Personal', 'WPA2-Enterprise', 'Open']
+CHANNELS_24 = list(range(1, 12))
+CHANNELS_5 = [36, 40, 44, 48, 52, 56, 60, 64, 100, 104, 108, 112, 149, 153, 157, 161, 165]
+
+def random_mac(rng: random.Random) -> str:
+    return ':'.join(f'{rng.randrange(256):02x}' for _ in range(6))
+
+def netsh_wlan_networks_dump(networks: int = 200, bssids_per_network: int = 3, seed: int = SEED) -> str:
+    """`netsh wlan show networks mode=bssid` output with `networks` SSIDs."""
+    rng = random.Random(seed)
+    lines = [
+        'Interface name : Wi-Fi',
+        f'There are {networks} networks currently visible.',
+        '',
+    ]
+    for n in range(1, networks + 1):
+        encryption = 'None' if n % 17 == 0 else 'CCMP'
+        lines += [
+            f'SSID {n} : {"" if n % 23 == 0 else f"Network-{n}"}',
+            '    Network type            : Infrastructure',
+            f'    Authentication          : {rng.choice(AUTHENTICATIONS)}',
+            f'    Encryption              : {encryption}',
+        ]
+        for b in range(1, rng.randint(1, bssids_per_network * 2 - 1) + 1):
+            band_5 = rng.random() < 0.5
+            channel = rng.choice(CHANNELS_5 if band_5 else CHANNELS_24)
+            lines += [
+                f'    BSSID {b}                 : {random_mac(rng)}',
+                f'         Signal             : {rng.randint(1, 100)}%',
+                f'         Radio type         : {rng.choice(RADIO_TYPES)}',
+                f'         Band               : {"5 GHz" if band_5 else "2.4 GHz"}',
+                f'         Channel            : {channel}',
+            ]
+            if rng.random() < 0.6:
+                utilization = rng.randint(0, 255)
+                lines += [
+                    '         Bss Load:',
+                    f'             Connected Stations:        {rng.randint(0, 40)}',
+                    f'             Channel Utilization:       {utilization} ({utilization * 100 // 255} %)',
+                    f'             Medium Available Capacity: {rng.randint(0, 31250)} (32 us/s)',
+                ]
+            lines += [
+                f'         QoS MSCS Supported : {rng.randint(0, 1)}',
+                f'         QoS Map Supported  : {rng.randint(0, 1)}',
+                '         Basic rates (Mbps) : 6 12 24',
+                '         Other rates (Mbps) : 9 18 36 48 54',
+            ]
+        lines.append('')
+    return '\n'.join(lines) + '\n'
+
+def iw_scan_dump(bss_count: int = 500, seed: int = SEED) -> str:
+    """`iw dev wlan0 scan dump` output with `bss_count` BSS blocks spread over ~bss_count/3 SSIDs."""
+    rng = random.Random(seed)
+    lines = []
+    for n in range(bss_count):
+        band_5 = rng.random() < 0.5
+        channel = rng.choice(CHANNELS_5 if band_5 else CHANNELS_24)
+        freq = 5000 + channel * 5 if band_5 else 2407 + channel * 5
+        lines += [
+            f'BSS {random_mac(rng)}(on wlan0)',
+            f'\tlast seen: {rng.randint(1, 99999)}.000s [boottime]',
+            f'\tfreq: {freq}',
+            '\tbeacon interval: 100 TUs',
+            '\tcapability: ESS Privacy ShortSlotTime (0x0411)',
+            f'\tsignal: {rng.uniform(-95, -30):.2f} dBm',
+            f'\tSSID: Network-{n // 3}',
+            '\tSupported rates: 6.0* 9.0 12.0* 18.0 24.0* 36.0 48.0 54.0 ',
+            f'\tDS Parameter set: channel {channel}',
+        ]
+        if rng.random() < 0.6:
+            lines += [
+                '\tBSS Load:',
+                f'\t\t * station count: {rng.randint(0, 40)}',
+                f'\t\t * channel utilisation: {rng.randint(0, 255)}/255',
+                f'\t\t * available admission capacity: {rng.randint(0, 31250)} [*32us]',
+            ]
+        lines += [
+            '\tHT capabilities:',
+            '\t\tCapabilities: 0x1ef',
+            '\tRSN:\t * Version: 1',
+            '\t\t * Group cipher: CCMP',
+            '\t\t * Pairwise ciphers: CCMP',
+            f'\t\t * Authentication suites: {rng.choice(["PSK", "SAE", "IEEE 802.1X"])}',
+        ]
+        if rng.random() < 0.5:
+            lines += ['\tHE capabilities:', '\t\tHE MAC Capabilities (0x000801185018):']
+    return '\n'.join(lines) + '\n'
+
+def traceroute_stdout(hops: int = 30, target_ip: str = '142.250.72.14', seed: int = SEED) -> str:
+    """`traceroute -n` output with a mix of answering, partially answering and silent hops."""
+    rng = random.Random(seed)
+    lines = [f'traceroute to {target_ip} ({target_ip}), {hops} hops max, 60 byte packets']
+    rtt = 0.5
+    for hop in range(1, hops + 1):
+        rtt += rng.uniform(0.2, 8.0)
+        if hop == hops:
+            probes = [f'{target_ip}  {rtt:.3f} ms', f'{rtt + 0.1:.3f} ms', f'{rtt + 0.2:.3f} ms']
+        elif rng.random() < 0.15:
+            probes = ['*', '*', '*']
+        else:
+            ip = f'10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}'
+            probes = [f'{ip}  {rtt:.3f} ms', '*' if rng.random() < 0.2 else f'{rtt + 0.3:.3f} ms', f'{rtt + 0.4:.3f} ms']
+        lines.append(f'{hop:2d}  ' + '  '.join(probes))
+    return '\n'.join(lines) + '\n'
+
+def devices(count: int, seed: int = SEED) -> list[dict]:
+    """`count` device dicts shaped like `update_scan_results` builds them."""
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 1, 12, 0, 0)
+    result = []
+    for i in range(count):
+        result.append({
+            'mac': ':'.join(f'{b:02X}' for b in (0x3C, 0x22, 0xFB, (i >> 16) & 0xFF, (i >> 8) & 0xFF, i & 0xFF)),
+            'ip': f'10.{(i >> 16) & 0xFF}.{(i >> 8) & 0xFF}.{i & 0xFF}',
+            'hostname': f'host-{i}' if rng.random() < 0.5 else 'Unknown',
+            'vendor': 'Apple' if rng.random() < 0.5 else 'Unknown',
+            'last_seen': (start + timedelta(seconds=i)).strftime('%Y-%m-%dT%H:%M:%S.%f'),
+            'status': 'online',
+            'random_mac': rng.random() < 0.2,
+        })
+    return result
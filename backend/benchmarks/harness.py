@@ -0,0 +1,94 @@
+import gc
+import json
+import os
+import statistics
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Callable, Optional
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+DEFAULT_THRESHOLD = 0.20
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    rounds: int
+    best_s: float
+    median_s: float
+    mean_s: float
+    # Peak traced allocation of one extra run, only for benchmarks that ask for it
+    peak_kib: Optional[float] = None
+
+@dataclass
+class Regression:
+    name: str
+    baseline_s: float
+    current_s: float
+
+    @property
+    def slowdown(self) -> float:
+        return self.current_s / self.baseline_s - 1
+
+def run_benchmark(name: str, func: Callable[[], object], setup: Optional[Callable[[], object]] = None, rounds: int = 5, warmup: int = 1, measure_memory: bool = False) -> BenchmarkResult:
+    """
+    Times `func` over `rounds` runs after `warmup` untimed ones. `setup` runs
+    before every call and is not timed. GC is disabled while timing so a
+    collection triggered by earlier garbage doesn't land on a random round.
+    `measure_memory` adds one untimed run under tracemalloc for `peak_kib`.
+    """
+    timings = []
+    for i in range(warmup + rounds):
+        if setup is not None:
+            setup()
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        if i >= warmup:
+            timings.append(elapsed)
+    peak_kib = None
+    if measure_memory:
+        if setup is not None:
+            setup()
+        tracemalloc.start()
+        try:
+            func()
+            peak_kib = tracemalloc.get_traced_memory()[1] / 1024
+        finally:
+            tracemalloc.stop()
+    return BenchmarkResult(
+        name=name,
+        rounds=rounds,
+        best_s=min(timings),
+        median_s=statistics.median(timings),
+        mean_s=statistics.fmean(timings),
+        peak_kib=peak_kib,
+    )
+
+def load_baseline(path: str = DEFAULT_BASELINE_PATH) -> dict[str, dict]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_baseline(results: list[BenchmarkResult], path: str = DEFAULT_BASELINE_PATH):
+    baseline = load_baseline(path)
+    baseline.update({result.name: asdict(result) for result in results})
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+
+def find_regressions(results: list[BenchmarkResult], baseline: dict[str, dict], threshold: float = DEFAULT_THRESHOLD) -> list[Regression]:
+    """Benchmarks whose median got slower than the stored baseline median by more than `threshold`."""
+    regressions = []
+    for result in results:
+        previous = baseline.get(result.name)
+        if not previous:
+            continue
+        if result.median_s > previous['median_s'] * (1 + threshold):
+            regressions.append(Regression(result.name, previous['median_s'], result.median_s))
+    return regressions
@@ -0,0 +1,205 @@
+from datetime import datetime
+import os
+import sqlite3
+import tempfile
+from typing import Callable, Iterator, Optional
+
+from flask import Flask
+
+from backend import database
+from backend.benchmarks import fixtures
+from backend.benchmarks.harness import BenchmarkResult, run_benchmark
+from backend.benchmarks.legacy import legacy_parse_netsh_wlan_networks
+from backend.serialization import response_cache
+from backend.traceroute import parse_traceroute_output
+from backend.transport import SimulatedNetwork, SimulatedTransport
+from backend.wifi import iter_netsh_wlan_networks, parse_netsh_wlan_networks
+from backend.wifi_linux import iter_iw_scan_records, parse_iw_scan
+
+DEFAULT_DEVICE_COUNTS = (1_000, 10_000, 100_000)
+
+class TemporaryDatabase:
+    """Points `backend.database` at a throwaway SQLite file for the duration of the `with` block."""
+
+    def __enter__(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self._previous_path = database.DB_PATH
+        database.DB_PATH = os.path.join(self._dir.name, 'benchmark.db')
+        database.init_db()
+        return self
+
+    def __exit__(self, *exc):
+        database.DB_PATH = self._previous_path
+        self._dir.cleanup()
+
+    def reset_devices(self):
+        with sqlite3.connect(database.DB_PATH) as conn:
+            conn.execute('DELETE FROM devices')
+            conn.commit()
+
+    def seed(self, devices: list[dict], label_every: int = 10):
+        self.reset_devices()
+        database.insert_or_replace_device_db(devices)
+        with sqlite3.connect(database.DB_PATH) as conn:
+            conn.execute('DELETE FROM device_labels')
+            conn.executemany(
+                'INSERT INTO device_labels (mac, label, updated_at) VALUES (?, ?, ?)',
+                ((device['mac'], f'label-{i}', device['last_seen']) for i, device in enumerate(devices) if i % label_every == 0),
+            )
+            conn.commit()
+
+def _drain(records):
+    for _ in records:
+        pass
+
+def parser_benchmarks(rounds: int, device_counts=DEFAULT_DEVICE_COUNTS) -> Iterator[BenchmarkResult]:
+    for networks in (50, 500):
+        dump = fixtures.netsh_wlan_networks_dump(networks=networks)
+        yield run_benchmark(f'parse_netsh_wlan_networks[{networks}]', lambda: parse_netsh_wlan_networks(dump), rounds=rounds, measure_memory=True)
+        yield run_benchmark(f'parse_netsh_wlan_networks[{networks},legacy]', lambda: legacy_parse_netsh_wlan_networks(dump), rounds=rounds, measure_memory=True)
+        # Consuming records as the pipe produces them: nothing is kept, the peak is one block
+        lines = dump.splitlines(keepends=True)
+        yield run_benchmark(
+            f'iter_netsh_wlan_networks[{networks},stream]',
+            lambda: _drain(iter_netsh_wlan_networks(iter(lines))),
+            rounds=rounds,
+            measure_memory=True,
+        )
+
+    for bss_count in (150, 1500):
+        dump = fixtures.iw_scan_dump(bss_count=bss_count)
+        yield run_benchmark(f'parse_iw_scan[{bss_count}]', lambda: parse_iw_scan(dump), rounds=rounds, measure_memory=True)
+        lines = dump.splitlines(keepends=True)
+        yield run_benchmark(
+            f'iter_iw_scan_records[{bss_count},stream]',
+            lambda: _drain(record.as_bssid() for record in iter_iw_scan_records(iter(lines))),
+            rounds=rounds,
+            measure_memory=True,
+        )
+
+    stdout = fixtures.traceroute_stdout(hops=30)
+    # A single traceroute is tiny, time a batch so the numbers are above timer noise
+    yield run_benchmark(
+        'parse_traceroute_output[30x1000]',
+        lambda: [parse_traceroute_output(stdout, '142.250.72.14') for _ in range(1000)],
+        rounds=rounds,
+    )
+
+def database_benchmarks(rounds: int, device_counts=DEFAULT_DEVICE_COUNTS) -> Iterator[BenchmarkResult]:
+    with TemporaryDatabase() as db:
+        for count in device_counts:
+            devices = fixtures.devices(count)
+            yield run_benchmark(
+                f'insert_or_replace_device_db[{count}]',
+                lambda: database.insert_or_replace_device_db(devices),
+                setup=db.reset_devices,
+                rounds=rounds,
+            )
+            # Same rows again: measures the ON CONFLICT(mac) update path
+            yield run_benchmark(
+                f'insert_or_replace_device_db[{count},update]',
+                lambda: database.insert_or_replace_device_db(devices),
+                rounds=rounds,
+            )
+            db.seed(devices)
+            yield run_benchmark(
+                f'get_devices_with_label_db[{count}]',
+                database.get_devices_with_label_db,
+                rounds=rounds,
+            )
+
+def request_benchmarks(rounds: int, device_counts=DEFAULT_DEVICE_COUNTS) -> Iterator[BenchmarkResult]:
+    from backend.routes import routes
+
+    app = Flask(__name__)
+    app.register_blueprint(routes)
+    client = app.test_client()
+
+    def get_devices(headers=None):
+        response = client.get('/api/devices', headers=headers)
+        assert response.status_code == 200, response.status_code
+
+    with TemporaryDatabase() as db:
+        for count in device_counts:
+            db.seed(fixtures.devices(count))
+            # Cold: the encoded-bytes cache is emptied before every request
+            yield run_benchmark(f'GET /api/devices[{count},cold]', get_devices, setup=response_cache.clear, rounds=rounds)
+            yield run_benchmark(f'GET /api/devices[{count}]', get_devices, rounds=rounds)
+            yield run_benchmark(f'GET /api/devices[{count},gzip]', lambda: get_devices({'Accept-Encoding': 'gzip'}), rounds=rounds)
+
+def scanner_benchmarks(rounds: int, device_counts=DEFAULT_DEVICE_COUNTS) -> Iterator[BenchmarkResult]:
+    from backend.utils import scan_network
+
+    for subnet in ('10.42.0.0/24', '10.42.0.0/16'):
+        transport = SimulatedTransport(SimulatedNetwork(subnets=[subnet], density=0.3, seed=fixtures.SEED))
+        yield run_benchmark(
+            f'scan_network[simulated {subnet}]',
+            lambda: scan_network(subnet=subnet, transport=transport),
+            rounds=rounds,
+        )
+
+def monitor_benchmarks(rounds: int, device_counts=DEFAULT_DEVICE_COUNTS) -> Iterator[BenchmarkResult]:
+    from backend.monitor import LatencyMonitor
+
+    # Processing cost of a round (stats + histograms), the simulated probes cost nothing
+    transport = SimulatedTransport(SimulatedNetwork(subnets=['10.42.0.0/23'], density=1.0, seed=fixtures.SEED))
+    for count in (100, 500):
+        targets = {host: None for host in list(transport.network.hosts)[:count]}
+        latency_monitor = LatencyMonitor(targets, probes=20, transport=transport)
+        yield run_benchmark(f'LatencyMonitor.probe_round[{count}x20]', latency_monitor.probe_round, rounds=rounds)
+
+def portscan_benchmarks(rounds: int, device_counts=DEFAULT_DEVICE_COUNTS) -> Iterator[BenchmarkResult]:
+    from backend.portscan import PortScanner, parse_profile
+
+    # Real connects against loopback addresses (all refused), i.e. the scanner's own cost
+    # per probe; 127.0.0.0/8 is all local on Linux
+    ports = parse_profile('extended')
+    for hosts in (16, 64):
+        targets = [f'127.0.0.{i}' for i in range(1, hosts + 1)]
+        yield run_benchmark(
+            f'PortScanner.scan[{hosts}x{len(ports)}]',
+            lambda: PortScanner(banners=False).scan(targets, ports),
+            rounds=rounds,
+        )
+
+def presence_benchmarks(rounds: int, device_counts=DEFAULT_DEVICE_COUNTS) -> Iterator[BenchmarkResult]:
+    from backend.presence import PresenceTracker
+
+    # A presence cycle over every known device: one simulated ARP exchange, the state
+    # machine and the bulk status UPDATE
+    transport = SimulatedTransport(SimulatedNetwork(subnets=['10.42.0.0/18'], density=0.35, seed=fixtures.SEED))
+    hosts = list(transport.network.hosts.values())
+    with TemporaryDatabase() as db:
+        for count in (1_000, 5_000):
+            db.seed([{'mac': host.mac, 'ip': host.ip, 'last_seen': datetime.now().strftime('%Y-%m-%dT%H:%M:%S.%f')} for host in hosts[:count]])
+            tracker = PresenceTracker(transport=transport)
+            yield run_benchmark(f'PresenceTracker.check[{count}]', tracker.check, rounds=rounds)
+
+def path_monitor_benchmarks(rounds: int, device_counts=DEFAULT_DEVICE_COUNTS) -> Iterator[BenchmarkResult]:
+    from backend.pathmonitor import PathMonitor
+
+    # Processing cost of a round over dozens of paths (per-hop stats, change detection),
+    # plus rendering every path's stats as an event stream would
+    transport = SimulatedTransport(SimulatedNetwork(seed=fixtures.SEED))
+    for count in (10, 50):
+        path_monitor = PathMonitor(transport=transport, max_paths=count)
+        for i in range(count):
+            path_monitor.add_path(f'198.51.100.{i + 1}')
+        path_monitor.probe_round()
+        yield run_benchmark(f'PathMonitor.probe_round[{count}]', path_monitor.probe_round, rounds=rounds)
+        yield run_benchmark(f'PathMonitor.snapshot[{count}]', lambda: [path_monitor.snapshot(target) for target in path_monitor.paths], rounds=rounds)
+
+SUITES: dict[str, Callable[..., Iterator[BenchmarkResult]]] = {
+    'parsers': parser_benchmarks,
+    'database': database_benchmarks,
+    'requests': request_benchmarks,
+    'scanner': scanner_benchmarks,
+    'monitor': monitor_benchmarks,
+    'portscan': portscan_benchmarks,
+    'presence': presence_benchmarks,
+    'paths': path_monitor_benchmarks,
+}
+
+def run_suite(names: Optional[list[str]] = None, rounds: int = 5, device_counts=DEFAULT_DEVICE_COUNTS) -> Iterator[BenchmarkResult]:
+    for name in names or SUITES:
+        yield from SUITES[name](rounds, device_counts)
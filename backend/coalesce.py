@@ -0,0 +1,95 @@
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional
+from dotenv import load_dotenv
+from backend.metrics import SINGLE_FLIGHT_REQUESTS, SINGLE_FLIGHT_TIMEOUTS
+
+load_dotenv()
+
+# Single-flight for the endpoints that shell out or probe the network (WiFi scan, DNS test,
+# traceroute): identical concurrent requests, same endpoint and normalized parameters,
+# share one execution instead of each starting their own. The result is also handed to
+# identical requests arriving up to COALESCE_REUSE_SECONDS after it finished. Every
+# caller waits with its own timeout (COALESCE_TIMEOUT by default); giving up doesn't
+# cancel the execution, later callers can still get its result.
+COALESCE_REUSE_SECONDS = float(os.getenv('COALESCE_REUSE_SECONDS', '2'))
+COALESCE_TIMEOUT = float(os.getenv('COALESCE_TIMEOUT', '30'))
+
+class CoalesceTimeout(Exception):
+    """Raised to a caller whose own timeout ran out before the shared execution finished"""
+    pass
+
+class _Flight:
+    __slots__ = ('future', 'finished_at')
+
+    def __init__(self):
+        self.future: Future = Future()
+        self.finished_at: Optional[float] = None
+
+class SingleFlight:
+    """
+    One execution per key at a time. Outcomes, counted per caller in
+    netdiag_single_flight_requests: 'executed' (started the execution),
+    'joined' (waited on one already running) and 'reused' (got a result that
+    finished less than `reuse_window` seconds ago). Failures are handed to
+    the callers waiting on them but never reused.
+    """
+    def __init__(self, name: str, reuse_window: float = COALESCE_REUSE_SECONDS, clock=time.monotonic):
+        self.name = name
+        self.reuse_window = reuse_window
+        self.clock = clock
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float):
+        expired = [key for key, flight in self._flights.items() if flight.finished_at is not None and now - flight.finished_at >= self.reuse_window]
+        for key in expired:
+            del self._flights[key]
+
+    def _execute(self, key: Hashable, flight: _Flight, fn: Callable[[], Any]):
+        try:
+            result = fn()
+        except BaseException as e:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.future.set_exception(e)
+            return
+        with self._lock:
+            flight.finished_at = self.clock()
+            if self.reuse_window <= 0 and self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.future.set_result(result)
+
+    def run(self, key: Hashable, fn: Callable[[], Any], timeout: Optional[float] = COALESCE_TIMEOUT) -> Any:
+        """
+        `fn()`'s result, from the execution in flight for `key` if there is one.
+        `fn` runs on its own thread, so it must not touch the request context.
+        Raises `CoalesceTimeout` after `timeout` seconds, or whatever `fn` raised.
+        """
+        with self._lock:
+            self._expire(self.clock())
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                outcome = 'executed'
+            else:
+                outcome = 'reused' if flight.finished_at is not None else 'joined'
+        SINGLE_FLIGHT_REQUESTS.inc(endpoint=self.name, outcome=outcome)
+        if outcome == 'executed':
+            threading.Thread(target=self._execute, args=(key, flight, fn), name=f'single-flight-{self.name}', daemon=True).start()
+        try:
+            return flight.future.result(timeout)
+        except FutureTimeoutError:
+            SINGLE_FLIGHT_TIMEOUTS.inc(endpoint=self.name)
+            raise CoalesceTimeout(f"{self.name} didn't finish within {timeout:g}s") from None
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return sum(1 for flight in self._flights.values() if flight.finished_at is None)
+
+    def clear(self):
+        with self._lock:
+            self._flights.clear()
@@ -1,7 +1,12 @@
 from datetime import datetime
+from itertools import islice
+import json
 import os
 import sqlite3;
-from typing import List, TypedDict
+import threading
+from typing import Dict, Iterable, Iterator, List, Tuple, TypedDict
+from backend.metrics import DB_WRITE_SECONDS
+from backend.profiling import tracked
 
 class Device(TypedDict):
     
@@ -20,6 +25,27 @@ class network_scans(TypedDict):
     timestamp: datetime
     results: str
 
+class DevicePort(TypedDict):
+    mac: str
+    ip: str
+    port: int
+    service: str | None
+    banner: str | None
+    first_seen: str
+    last_seen: str
+
+class DeviceService(TypedDict):
+    ip: str
+    mac: str | None
+    protocol: str
+    service_type: str
+    name: str
+    port: int | None
+    category: str | None
+    details: str
+    first_seen: str
+    changed_at: str
+
 class Mac_w_Label(TypedDict):
     id: int
     mac: str
@@ -27,11 +53,26 @@ class Mac_w_Label(TypedDict):
     updated_at: str | None
     
 DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'network_diagnostics.db')
+
+# Bumped by every write that changes what `get_devices_with_label_db` returns, so
+# responses built from it can be cached until the next change.
+_devices_version = 0
+_devices_version_lock = threading.Lock()
+
+def devices_version() -> int:
+    return _devices_version
+
+def _bump_devices_version():
+    global _devices_version
+    with _devices_version_lock:
+        _devices_version += 1
+
 def get_db():
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
     return conn
 
+@tracked('db')
 def init_db():
     with sqlite3.connect(DB_PATH) as conn:
         c = conn.cursor()
@@ -48,6 +89,10 @@ def init_db():
                     status TEXT
                 )
         ''')
+        # Presence checks only look at devices seen recently (see presence.py)
+        c.execute('CREATE INDEX IF NOT EXISTS idx_devices_last_seen ON devices (last_seen)')
+        # Warm starts used to load MACs in upper case, next to the lower case ones sweeps store
+        c.execute('DELETE FROM devices WHERE mac <> LOWER(mac) AND LOWER(mac) IN (SELECT mac FROM devices)')
 
         c.execute('''
             CREATE TABLE IF NOT EXISTS 
@@ -72,8 +117,85 @@ def init_db():
                 )
         ''')
 
+        # Open TCP ports per device (see portscan.py), and when/what each device was last
+        # scanned with, so only new devices or ones whose IP changed get rescanned
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS 
+                device_ports
+                (
+                    mac TEXT NOT NULL,
+                    port INTEGER NOT NULL,
+                    service TEXT,
+                    banner TEXT,
+                    first_seen TIMESTAMP,
+                    last_seen TIMESTAMP,
+                    PRIMARY KEY (mac, port)
+                )
+        ''')
+
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS 
+                port_scans
+                (
+                    mac TEXT PRIMARY KEY,
+                    ip TEXT NOT NULL,
+                    profile TEXT NOT NULL,
+                    scanned_at TIMESTAMP
+                )
+        ''')
+
+        # SSDP/mDNS services announced by each address (see discovery.py), keyed by IP
+        # since that's all a multicast announcement identifies
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS 
+                device_services
+                (
+                    ip TEXT NOT NULL,
+                    protocol TEXT NOT NULL,
+                    service_type TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    port INTEGER,
+                    category TEXT,
+                    details TEXT,
+                    first_seen TIMESTAMP,
+                    changed_at TIMESTAMP,
+                    PRIMARY KEY (ip, protocol, service_type, name)
+                )
+        ''')
+
+        # Last OS guess per device (see fingerprint.py), redone only when its IP changes
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS 
+                device_fingerprints
+                (
+                    mac TEXT PRIMARY KEY,
+                    ip TEXT NOT NULL,
+                    os_family TEXT,
+                    confidence REAL,
+                    evidence TEXT,
+                    has_tcp BOOLEAN,
+                    fingerprinted_at TIMESTAMP
+                )
+        ''')
+
+        # IPv6 addresses per device (see ipv6.py): a device has one IPv4 address, in
+        # `devices`, but any number of IPv6 ones (link-local, SLAAC, privacy addresses)
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS 
+                device_addresses
+                (
+                    mac TEXT NOT NULL,
+                    ip TEXT NOT NULL,
+                    source TEXT,
+                    first_seen TIMESTAMP,
+                    last_seen TIMESTAMP,
+                    PRIMARY KEY (mac, ip)
+                )
+        ''')
+
         conn.commit()
     
+@tracked('db')
 def insert_or_replace_device_db(devices:List[Device]):
     rows = []
     for device in devices:
@@ -85,7 +207,7 @@ def insert_or_replace_device_db(devices:List[Device]):
         last_seen = device.get('last_seen') or 'Unknown'
         
         rows.append((mac, random_mac, ip, hostname, 'online', vendor, last_seen))
-    with sqlite3.connect(DB_PATH) as conn:
+    with DB_WRITE_SECONDS.time(operation='insert_or_replace_device'), sqlite3.connect(DB_PATH) as conn:
         c = conn.cursor()
         c.executemany('''
             INSERT INTO 
@@ -96,12 +218,36 @@ def insert_or_replace_device_db(devices:List[Device]):
                 ip = excluded.ip,
                 hostname = excluded.hostname,
                 vendor = excluded.vendor,
-                last_seen = excluded.last_seen
+                last_seen = excluded.last_seen,
+                status = excluded.status
             ''', 
             rows
         )
         conn.commit()
+    _bump_devices_version()
     
+@tracked('db')
+def insert_missing_devices_db(devices: List[Device]):
+    """Inserts the devices whose MAC isn't in the table yet, leaves the others as they are."""
+    with DB_WRITE_SECONDS.time(operation='insert_missing_devices'), sqlite3.connect(DB_PATH) as conn:
+        inserted = conn.executemany('''
+            INSERT INTO 
+                devices (mac, random_mac, ip, hostname, status, vendor, last_seen)
+            VALUES 
+                (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(mac) DO NOTHING
+            ''',
+            [
+                (device['mac'], bool(device.get('random_mac')), device.get('ip') or 'Unknown', device.get('hostname') or 'Unknown',
+                 device.get('status') or 'online', device.get('vendor') or 'Unknown', device.get('last_seen') or 'Unknown')
+                for device in devices
+            ]
+        ).rowcount
+        conn.commit()
+    if inserted:
+        _bump_devices_version()
+
+@tracked('db')
 def get_devices_with_label_db() -> list[Device]:
     with sqlite3.connect(DB_PATH) as conn:
         conn.row_factory = sqlite3.Row
@@ -109,11 +255,15 @@ def get_devices_with_label_db() -> list[Device]:
         
         rows = c.execute('''
             SELECT 
-                d.ip, d.mac, d.random_mac, d.hostname, d.vendor, d.last_seen, d.status, l.label
+                d.ip, d.mac, d.random_mac, d.hostname, d.vendor, d.last_seen, d.status, l.label, f.os_family, a.ipv6
             FROM 
                 devices d
             LEFT JOIN 
                 device_labels l ON UPPER(d.mac) = l.mac
+            LEFT JOIN 
+                device_fingerprints f ON f.mac = d.mac
+            LEFT JOIN 
+                (SELECT mac, group_concat(ip, ' ') AS ipv6 FROM device_addresses GROUP BY mac) a ON a.mac = d.mac
             ORDER BY 
                 length(d.ip) ASC, d.ip 
             ASC
@@ -122,6 +272,7 @@ def get_devices_with_label_db() -> list[Device]:
     
         return rows_list
 
+@tracked('db')
 def update_devices_label_db(normalized_mac, label):
     with sqlite3.connect(DB_PATH) as conn:
         c = conn.cursor()
@@ -136,7 +287,69 @@ def update_devices_label_db(normalized_mac, label):
             (normalized_mac, label, datetime.now())
         )
         conn.commit()
+    _bump_devices_version()
       
+@tracked('db')
+def import_labels_db(labels: Iterable[Tuple[str, str]], batch_size: int = 500) -> int:
+    """
+    Upserts (normalized mac, label) pairs, `batch_size` per transaction.
+    `labels` can be a generator over a stream: each batch is read before its
+    transaction starts, so a slow upload never holds the write lock (sweeps
+    and hostname updates would fail with "database is locked" meanwhile).
+    Returns the number of rows written.
+    """
+    now = datetime.now()
+    labels = iter(labels)
+    imported = 0
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        while True:
+            batch = [(mac, label, now) for mac, label in islice(labels, batch_size)]
+            if not batch:
+                break
+            with DB_WRITE_SECONDS.time(operation='import_labels'), conn:
+                c = conn.cursor()
+                c.executemany('''
+                    INSERT INTO 
+                        device_labels (mac, label, updated_at)
+                    VALUES 
+                        (?, ?, ?)
+                    ON CONFLICT(mac) DO UPDATE SET 
+                        label=excluded.label, updated_at=excluded.updated_at
+                    ''',
+                    batch
+                )
+                imported += c.rowcount
+    finally:
+        conn.close()
+    if imported:
+        _bump_devices_version()
+    return imported
+
+def iter_labels_db(batch_size: int = 500) -> Iterator[Mac_w_Label]:
+    """Every label, ordered by MAC, fetched `batch_size` rows at a time."""
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        conn.row_factory = sqlite3.Row
+        c = conn.cursor()
+        c.execute('''
+            SELECT 
+                mac, label, updated_at
+            FROM 
+                device_labels
+            ORDER BY 
+                mac
+        ''')
+        while True:
+            rows = c.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        # Also runs when the consumer stops early (client disconnected mid-export)
+        conn.close()
+
+@tracked('db')
 def delete_label_db(normalized_mac, label):
     with sqlite3.connect(DB_PATH) as conn:
         c = conn.cursor()
@@ -149,17 +362,330 @@ def delete_label_db(normalized_mac, label):
         )
         deleted = c.rowcount > 0
         conn.commit()
-        
-        return deleted
+    if deleted:
+        _bump_devices_version()
+    return deleted
     
+@tracked('db')
 def update_device_hostname(ip, hostname):
-    """Update a single device's hostname in DB"""
-    with sqlite3.connect(DB_PATH) as conn:
+    """Update a single device's hostname in DB, returns whether it changed"""
+    with DB_WRITE_SECONDS.time(operation='update_device_hostname'), sqlite3.connect(DB_PATH) as conn:
         c = conn.cursor()
         c.execute('''
             UPDATE devices 
             SET hostname = ?
-            WHERE ip = ?
-        ''', (hostname, ip))
+            WHERE ip = ? AND hostname IS NOT ?
+        ''', (hostname, ip, hostname))
+        changed = c.rowcount > 0
+        conn.commit()
+    if changed:
+        _bump_devices_version()
+    return changed
+        
+@tracked('db')
+def get_devices_to_port_scan_db(profile: str, max_age_seconds: float) -> List[Tuple[str, str]]:
+    """
+    (mac, ip) of the online devices never scanned with `profile`, whose IP
+    changed since their last scan, or whose last scan is older than
+    `max_age_seconds`.
+    """
+    with sqlite3.connect(DB_PATH) as conn:
+        rows = conn.execute('''
+            SELECT 
+                d.mac, d.ip
+            FROM 
+                devices d
+            LEFT JOIN 
+                port_scans s ON s.mac = d.mac
+            WHERE 
+                d.status = 'online' AND d.ip IS NOT NULL AND d.ip != 'Unknown' AND d.ip NOT LIKE '%:%'
+                AND (
+                    s.mac IS NULL 
+                    OR s.ip != d.ip 
+                    OR s.profile != ? 
+                    OR s.scanned_at < ?
+                )
+            ''',
+            (profile, datetime.fromtimestamp(datetime.now().timestamp() - max_age_seconds))
+        ).fetchall()
+    return [(mac, ip) for mac, ip in rows]
+
+def get_device_ips_db(macs: Iterable[str]) -> List[Tuple[str, str]]:
+    """(mac, ip) of the devices with these MACs (any case) and a known IPv4 address."""
+    macs = [mac.upper() for mac in macs]
+    if not macs:
+        return []
+    with sqlite3.connect(DB_PATH) as conn:
+        rows = conn.execute(f'''
+            SELECT 
+                mac, ip
+            FROM 
+                devices
+            WHERE 
+                UPPER(mac) IN ({', '.join('?' * len(macs))})
+                AND ip IS NOT NULL AND ip != 'Unknown' AND ip NOT LIKE '%:%'
+            ''',
+            macs
+        ).fetchall()
+    return [(mac, ip) for mac, ip in rows]
+
+@tracked('db')
+def save_port_scan_db(results: Iterable[Tuple[str, str, List[Tuple[int, str | None, str | None]]]], profile: str):
+    """
+    Stores scan results, (mac, ip, [(port, service, banner)]) per device, in one
+    transaction. Ports no longer open are dropped, ports still open keep
+    their first_seen.
+    """
+    now = datetime.now()
+    with DB_WRITE_SECONDS.time(operation='save_port_scan'), sqlite3.connect(DB_PATH) as conn:
+        c = conn.cursor()
+        for mac, ip, ports in results:
+            open_ports = [port for port, _, _ in ports]
+            c.execute(
+                f'DELETE FROM device_ports WHERE mac = ? AND port NOT IN ({",".join("?" * len(open_ports))})',
+                (mac, *open_ports)
+            )
+            c.executemany('''
+                INSERT INTO 
+                    device_ports (mac, port, service, banner, first_seen, last_seen)
+                VALUES 
+                    (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(mac, port) DO UPDATE SET
+                    service = excluded.service,
+                    banner = COALESCE(excluded.banner, device_ports.banner),
+                    last_seen = excluded.last_seen
+                ''',
+                ((mac, port, service, banner, now, now) for port, service, banner in ports)
+            )
+            c.execute('''
+                INSERT INTO 
+                    port_scans (mac, ip, profile, scanned_at)
+                VALUES 
+                    (?, ?, ?, ?)
+                ON CONFLICT(mac) DO UPDATE SET
+                    ip = excluded.ip, profile = excluded.profile, scanned_at = excluded.scanned_at
+                ''',
+                (mac, ip, profile, now)
+            )
+        conn.commit()
+
+@tracked('db')
+def get_device_ports_db(mac: str | None = None) -> List[DevicePort]:
+    with sqlite3.connect(DB_PATH) as conn:
+        conn.row_factory = sqlite3.Row
+        query = '''
+            SELECT 
+                p.mac, s.ip, p.port, p.service, p.banner, p.first_seen, p.last_seen
+            FROM 
+                device_ports p
+            LEFT JOIN 
+                port_scans s ON s.mac = p.mac
+        '''
+        if mac is None:
+            rows = conn.execute(query + ' ORDER BY p.mac, p.port').fetchall()
+        else:
+            rows = conn.execute(query + ' WHERE UPPER(p.mac) = UPPER(?) ORDER BY p.port', (mac,)).fetchall()
+    return rows
+
+@tracked('db')
+def upsert_device_services_db(services: Iterable[Tuple[str, str, str, str, int | None, str | None, str]]):
+    """(ip, protocol, service_type, name, port, category, details JSON) rows, in one transaction."""
+    now = datetime.now()
+    with DB_WRITE_SECONDS.time(operation='upsert_device_services'), sqlite3.connect(DB_PATH) as conn:
+        conn.executemany('''
+            INSERT INTO 
+                device_services (ip, protocol, service_type, name, port, category, details, first_seen, changed_at)
+            VALUES 
+                (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(ip, protocol, service_type, name) DO UPDATE SET
+                port = excluded.port,
+                category = excluded.category,
+                details = excluded.details,
+                changed_at = excluded.changed_at
+            ''',
+            ((*service, now, now) for service in services)
+        )
+        conn.commit()
+
+@tracked('db')
+def get_device_services_db(ip: str | None = None) -> List[DeviceService]:
+    with sqlite3.connect(DB_PATH) as conn:
+        conn.row_factory = sqlite3.Row
+        query = '''
+            SELECT 
+                s.ip, d.mac, s.protocol, s.service_type, s.name, s.port, s.category, s.details, s.first_seen, s.changed_at
+            FROM 
+                device_services s
+            LEFT JOIN 
+                devices d ON d.ip = s.ip
+        '''
+        if ip is None:
+            return conn.execute(query + ' ORDER BY length(s.ip), s.ip, s.protocol, s.service_type').fetchall()
+        return conn.execute(query + ' WHERE s.ip = ? ORDER BY s.protocol, s.service_type', (ip,)).fetchall()
+
+@tracked('db')
+def get_devices_to_fingerprint_db(retry_seconds: float) -> List[Tuple[str, str, int | None]]:
+    """
+    (mac, ip, open port or None) of the online devices never fingerprinted,
+    whose IP changed since, that gave no answer more than `retry_seconds` ago,
+    or that were guessed without TCP and have a known open port now.
+    """
+    with sqlite3.connect(DB_PATH) as conn:
+        rows = conn.execute('''
+            SELECT 
+                d.mac, d.ip, p.port
+            FROM 
+                devices d
+            LEFT JOIN 
+                device_fingerprints f ON f.mac = d.mac
+            LEFT JOIN 
+                (SELECT mac, MIN(port) AS port FROM device_ports GROUP BY mac) p ON p.mac = d.mac
+            WHERE 
+                d.status = 'online' AND d.ip IS NOT NULL AND d.ip != 'Unknown' AND d.ip NOT LIKE '%:%'
+                AND (
+                    f.mac IS NULL 
+                    OR f.ip != d.ip 
+                    OR (f.os_family IS NULL AND f.fingerprinted_at < ?)
+                    OR (p.port IS NOT NULL AND NOT f.has_tcp)
+                )
+            ''',
+            (datetime.fromtimestamp(datetime.now().timestamp() - retry_seconds),)
+        ).fetchall()
+    return [(mac, ip, port) for mac, ip, port in rows]
+
+@tracked('db')
+def save_fingerprints_db(fingerprints: Iterable[Tuple[str, str, str | None, float, str, bool]]):
+    """(mac, ip, os_family, confidence, evidence JSON, has_tcp) rows, in one transaction."""
+    now = datetime.now()
+    with DB_WRITE_SECONDS.time(operation='save_fingerprints'), sqlite3.connect(DB_PATH) as conn:
+        c = conn.cursor()
+        c.executemany('''
+            INSERT INTO 
+                device_fingerprints (mac, ip, os_family, confidence, evidence, has_tcp, fingerprinted_at)
+            VALUES 
+                (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(mac) DO UPDATE SET
+                ip = excluded.ip,
+                os_family = excluded.os_family,
+                confidence = excluded.confidence,
+                evidence = excluded.evidence,
+                has_tcp = excluded.has_tcp,
+                fingerprinted_at = excluded.fingerprinted_at
+            ''',
+            ((*fingerprint, now) for fingerprint in fingerprints)
+        )
+        saved = c.rowcount
+        conn.commit()
+    if saved:
+        _bump_devices_version()
+    return saved
+
+@tracked('db')
+def get_device_fingerprints_db() -> List[sqlite3.Row]:
+    with sqlite3.connect(DB_PATH) as conn:
+        conn.row_factory = sqlite3.Row
+        return conn.execute('''
+            SELECT 
+                mac, ip, os_family, confidence, evidence, has_tcp, fingerprinted_at
+            FROM 
+                device_fingerprints
+            ORDER BY 
+                length(ip), ip
+        ''').fetchall()
+
+@tracked('db')
+def get_presence_targets_db(seen_since: str) -> List[Tuple[str, str, str | None]]:
+    """(mac, ip, status) of the devices seen since `seen_since`, least recently seen first."""
+    with sqlite3.connect(DB_PATH) as conn:
+        rows = conn.execute('''
+            SELECT 
+                mac, ip, status
+            FROM 
+                devices
+            WHERE 
+                last_seen >= ? AND ip IS NOT NULL AND ip != 'Unknown' AND ip NOT LIKE '%:%' AND mac != 'Unknown'
+            ORDER BY 
+                last_seen
+            ''',
+            (seen_since,)
+        ).fetchall()
+    return rows
+
+@tracked('db')
+def update_presence_db(statuses: Dict[str, str], seen_at: str) -> int:
+    """
+    Sets the status of every {mac: status} in a single UPDATE, `last_seen`
+    too for the devices that are 'online'. Returns the number of rows changed.
+    """
+    if not statuses:
+        return 0
+    with DB_WRITE_SECONDS.time(operation='update_presence'), sqlite3.connect(DB_PATH) as conn:
+        c = conn.cursor()
+        c.execute('''
+            UPDATE 
+                devices
+            SET 
+                status = s.value,
+                last_seen = CASE WHEN s.value = 'online' THEN ? ELSE devices.last_seen END
+            FROM 
+                json_each(?) s
+            WHERE 
+                devices.mac = s.key
+            ''',
+            (seen_at, json.dumps(statuses))
+        )
+        changed = c.rowcount
+        conn.commit()
+    if changed:
+        _bump_devices_version()
+    return changed
+
+@tracked('db')
+def get_known_macs_db() -> List[str]:
+    with sqlite3.connect(DB_PATH) as conn:
+        return [mac for mac, in conn.execute("SELECT mac FROM devices WHERE mac != 'Unknown'")]
+
+@tracked('db')
+def save_ipv6_neighbors_db(addresses: Iterable[Tuple[str, str, str]], devices: List[Device], forget_before: str) -> int:
+    """
+    (mac, ip, source) IPv6 addresses and the devices only seen over IPv6, in
+    one transaction. Those devices get an IPv6 address as their `ip`, unless
+    they already have an IPv4 one (not answering ARP this time doesn't take
+    it away). Addresses last seen before `forget_before` (rotated privacy
+    addresses) are dropped. Returns the number of addresses saved.
+    """
+    now = datetime.now().strftime('%Y-%m-%dT%H:%M:%S.%f')
+    rows = [(mac, ip, source, now, now) for mac, ip, source in addresses]
+    with DB_WRITE_SECONDS.time(operation='save_ipv6_neighbors'), sqlite3.connect(DB_PATH) as conn:
+        c = conn.cursor()
+        c.executemany('''
+            INSERT INTO 
+                device_addresses (mac, ip, source, first_seen, last_seen)
+            VALUES 
+                (?, ?, ?, ?, ?)
+            ON CONFLICT(mac, ip) DO UPDATE SET
+                source = excluded.source,
+                last_seen = excluded.last_seen
+            ''',
+            rows
+        )
+        c.executemany('''
+            INSERT INTO 
+                devices (mac, random_mac, ip, hostname, status, vendor, last_seen)
+            VALUES 
+                (?, ?, ?, ?, 'online', ?, ?)
+            ON CONFLICT(mac) DO UPDATE SET
+                ip = CASE WHEN devices.ip IS NULL OR devices.ip = 'Unknown' OR devices.ip LIKE '%:%' THEN excluded.ip ELSE devices.ip END,
+                last_seen = excluded.last_seen,
+                status = excluded.status
+            ''',
+            [
+                (device['mac'], bool(device.get('random_mac')), device['ip'], device.get('hostname') or 'Unknown', device.get('vendor') or 'Unknown', device.get('last_seen') or now)
+                for device in devices
+            ]
+        )
+        c.execute('DELETE FROM device_addresses WHERE last_seen < ?', (forget_before,))
         conn.commit()
-        
\ No newline at end of file
+    if rows or devices:
+        _bump_devices_version()
+    return len(rows)
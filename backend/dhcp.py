@@ -0,0 +1,312 @@
+from concurrent.futures import ThreadPoolExecutor
+import ctypes
+from dataclasses import asdict, dataclass, field
+import os
+import random
+import select
+import socket
+import struct
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from venv import logger
+from dotenv import load_dotenv
+import scapy.all as scapy
+from scapy.layers.dhcp import BOOTP, DHCP
+from scapy.layers.inet import IP, UDP
+from scapy.layers.l2 import Ether
+
+load_dotenv()
+
+# Rogue DHCP detection. Actively, a DHCPDISCOVER goes out on every interface at once and
+# every server answering within the time budget is reported; passively, a watcher keeps
+# listening for OFFER/ACK/NAK from any server. Either way the sockets carry a kernel BPF
+# filter (server port 67 -> client port 68), so Python never sees unrelated traffic.
+#
+# DHCP_TRUSTED_SERVERS: comma separated server IPs/MACs that are legitimate. When empty
+# the default gateway is the one trusted server, as on most home networks.
+DHCP_WATCH = os.getenv('DHCP_WATCH', '0').lower() in ('1', 'true', 'yes')
+DHCP_PROBE_TIMEOUT = float(os.getenv('DHCP_PROBE_TIMEOUT', '3'))
+DHCP_INTERFACES = os.getenv('DHCP_INTERFACES', '')
+DHCP_TRUSTED_SERVERS = os.getenv('DHCP_TRUSTED_SERVERS', '')
+MAX_PROBE_TIMEOUT = 10
+
+BOOTP_SERVER_PORT = 67
+BOOTP_CLIENT_PORT = 68
+MESSAGE_TYPES = {2: 'offer', 5: 'ack', 6: 'nak'}
+# Same as tcpdump's "udp src port 67 and udp dst port 68", for pcap replay and non-Linux
+DHCP_BPF_FILTER = f'udp and src port {BOOTP_SERVER_PORT} and dst port {BOOTP_CLIENT_PORT}'
+
+# Classic BPF (what `tcpdump -dd` prints for DHCP_BPF_FILTER on Ethernet): IPv4, UDP,
+# first fragment, source port 67, destination port 68. (code, jt, jf, k)
+SO_ATTACH_FILTER = 26
+ETH_P_ALL = 0x0003
+DHCP_BPF_PROGRAM = (
+    (0x28, 0, 0, 12),            # ldh [12]               ethertype
+    (0x15, 0, 10, 0x0800),       # jeq #IPv4
+    (0x30, 0, 0, 23),            # ldb [23]               IP protocol
+    (0x15, 0, 8, 17),            # jeq #UDP
+    (0x28, 0, 0, 20),            # ldh [20]               fragment offset
+    (0x45, 6, 0, 0x1FFF),        # jset #0x1fff -> drop
+    (0xB1, 0, 0, 14),            # ldxb 4*([14]&0xf)      IP header length
+    (0x48, 0, 0, 14),            # ldh [x + 14]           UDP source port
+    (0x15, 0, 3, BOOTP_SERVER_PORT),
+    (0x48, 0, 0, 16),            # ldh [x + 16]           UDP destination port
+    (0x15, 0, 1, BOOTP_CLIENT_PORT),
+    (0x06, 0, 0, 0x40000),       # accept
+    (0x06, 0, 0, 0),             # drop
+)
+_BPF_INSTRUCTION = struct.Struct('HBBI')
+
+@dataclass
+class DhcpOffer:
+    """One OFFER/ACK/NAK, with the lease parameters it carried."""
+    message_type: str
+    server_id: Optional[str]
+    server_mac: str
+    iface: Optional[str]
+    xid: int
+    client_mac: str
+    offered_ip: Optional[str] = None
+    subnet_mask: Optional[str] = None
+    router: Optional[str] = None
+    dns: List[str] = field(default_factory=list)
+    domain: Optional[str] = None
+    lease_time: Optional[int] = None
+    renewal_time: Optional[int] = None
+    rebinding_time: Optional[int] = None
+    seen_at: float = field(default_factory=time.time)
+
+@dataclass
+class DhcpServer:
+    server_id: Optional[str]
+    server_mac: str
+    rogue: bool
+    first_seen: float
+    last_seen: float
+    ifaces: Set[str] = field(default_factory=set)
+    counts: Dict[str, int] = field(default_factory=dict)
+    last: Optional[DhcpOffer] = None
+
+    def to_json(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data['ifaces'] = sorted(self.ifaces)
+        return data
+
+def _option_values(options: Iterable) -> Dict[str, Any]:
+    values = {}
+    for option in options:
+        if isinstance(option, tuple) and len(option) >= 2:
+            values[option[0]] = option[1] if len(option) == 2 else list(option[1:])
+    return values
+
+def _decode(value) -> Optional[str]:
+    if value is None:
+        return None
+    return value.decode(errors='replace').rstrip('\0') if isinstance(value, bytes) else str(value)
+
+def parse_dhcp_reply(packet, iface: Optional[str] = None) -> Optional[DhcpOffer]:
+    """DhcpOffer for a server's OFFER/ACK/NAK frame (scapy packet), None for anything else."""
+    if BOOTP not in packet or DHCP not in packet or packet[BOOTP].op != 2:
+        return None
+    options = _option_values(packet[DHCP].options)
+    message_type = options.get('message-type')
+    # Decoded frames carry the number, packets built with scapy the name
+    message_type = MESSAGE_TYPES.get(message_type, message_type if message_type in MESSAGE_TYPES.values() else None)
+    if message_type is None:
+        return None
+    bootp = packet[BOOTP]
+    dns = options.get('name_server', [])
+    router = options.get('router')
+    return DhcpOffer(
+        message_type=message_type,
+        server_id=options.get('server_id') or (packet[IP].src if IP in packet else None),
+        server_mac=packet[Ether].src.lower() if Ether in packet else '',
+        iface=iface,
+        xid=bootp.xid,
+        client_mac=':'.join(f'{b:02x}' for b in bytes(bootp.chaddr)[:6]),
+        offered_ip=bootp.yiaddr if bootp.yiaddr != '0.0.0.0' else None,
+        subnet_mask=options.get('subnet_mask'),
+        router=router[0] if isinstance(router, list) else router,
+        dns=dns if isinstance(dns, list) else [dns],
+        domain=_decode(options.get('domain')),
+        lease_time=options.get('lease_time'),
+        renewal_time=options.get('renewal_time'),
+        rebinding_time=options.get('rebinding_time'),
+    )
+
+def discover_packet(mac: str, xid: int):
+    """Broadcast DHCPDISCOVER from `mac`, asking for the lease parameters we report."""
+    return (
+        Ether(src=mac, dst='ff:ff:ff:ff:ff:ff')
+        / IP(src='0.0.0.0', dst='255.255.255.255')
+        / UDP(sport=BOOTP_CLIENT_PORT, dport=BOOTP_SERVER_PORT)
+        # Broadcast flag: the offer must come back broadcast, we have no address yet
+        / BOOTP(chaddr=bytes.fromhex(mac.replace(':', '')), xid=xid, flags=0x8000)
+        / DHCP(options=[('message-type', 'discover'), ('param_req_list', [1, 3, 6, 15, 51, 54, 58, 59]), 'end'])
+    )
+
+def open_dhcp_socket(iface: str) -> socket.socket:
+    """
+    AF_PACKET socket on `iface` that only receives DHCP server replies. The filter
+    is attached before binding, so not a single unrelated frame is queued.
+    """
+    sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+    try:
+        program = b''.join(_BPF_INSTRUCTION.pack(*instruction) for instruction in DHCP_BPF_PROGRAM)
+        buffer = ctypes.create_string_buffer(program)
+        sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, struct.pack('HL', len(DHCP_BPF_PROGRAM), ctypes.addressof(buffer)))
+        sock.bind((iface, ETH_P_ALL))
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
+def default_interfaces() -> List[Tuple[str, str]]:
+    """(name, MAC) of the interfaces to probe: DHCP_INTERFACES, or every non-loopback one with an IPv4 address."""
+    wanted = {name.strip() for name in DHCP_INTERFACES.split(',') if name.strip()}
+    interfaces = []
+    for iface in scapy.conf.ifaces.values():
+        mac = (iface.mac or '').lower()
+        if wanted:
+            if iface.name in wanted and mac:
+                interfaces.append((iface.name, mac))
+        elif mac and mac != '00:00:00:00:00:00' and iface.ip:
+            interfaces.append((iface.name, mac))
+    return interfaces
+
+def _probe_interface(iface: str, mac: str, deadline: float) -> List[DhcpOffer]:
+    xid = random.getrandbits(32)
+    offers = []
+    if hasattr(socket, 'AF_PACKET'):
+        with open_dhcp_socket(iface) as sock:
+            sock.send(bytes(discover_packet(mac, xid)))
+            while (remaining := deadline - time.monotonic()) > 0:
+                readable, _, _ = select.select([sock], [], [], remaining)
+                if not readable:
+                    break
+                offer = parse_dhcp_reply(Ether(sock.recv(65535)), iface)
+                if offer is not None and offer.xid == xid:
+                    offers.append(offer)
+        return offers
+    # No AF_PACKET (Windows/macOS): libpcap/Npcap applies the same filter in the kernel
+    sniffer = scapy.AsyncSniffer(iface=iface, filter=DHCP_BPF_FILTER, store=True)
+    sniffer.start()
+    try:
+        scapy.sendp(discover_packet(mac, xid), iface=iface, verbose=0)
+        time.sleep(max(deadline - time.monotonic(), 0))
+    finally:
+        packets = sniffer.stop() or []
+    for packet in packets:
+        offer = parse_dhcp_reply(packet, iface)
+        if offer is not None and offer.xid == xid:
+            offers.append(offer)
+    return offers
+
+class DhcpMonitor:
+    """Every DHCP server seen, by active probes or the passive watcher."""
+
+    def __init__(self, trusted: Iterable[str] = ()):
+        self.trusted = {value.strip().lower() for value in trusted if value.strip()}
+        self.servers: Dict[Tuple[Optional[str], str], DhcpServer] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def is_trusted(self, offer: DhcpOffer) -> bool:
+        trusted = self.trusted
+        if not trusted:
+            from backend.utils import net_config
+            gateway = net_config.gateway_ip[2] if isinstance(net_config.gateway_ip, tuple) else net_config.gateway_ip
+            trusted = {gateway} if gateway else set()
+        return (offer.server_id or '').lower() in trusted or offer.server_mac in trusted
+
+    def observe(self, offer: DhcpOffer) -> DhcpServer:
+        rogue = not self.is_trusted(offer)
+        with self._lock:
+            key = (offer.server_id, offer.server_mac)
+            server = self.servers.get(key)
+            if server is None:
+                server = self.servers[key] = DhcpServer(offer.server_id, offer.server_mac, rogue, offer.seen_at, offer.seen_at)
+                if rogue:
+                    logger.warning(f"Rogue DHCP server {offer.server_id} ({offer.server_mac}) on {offer.iface}")
+            server.last_seen = offer.seen_at
+            server.rogue = rogue
+            if offer.iface:
+                server.ifaces.add(offer.iface)
+            server.counts[offer.message_type] = server.counts.get(offer.message_type, 0) + 1
+            server.last = offer
+        return server
+
+    def probe(self, interfaces: Optional[List[Tuple[str, str]]] = None, timeout: float = DHCP_PROBE_TIMEOUT) -> List[DhcpOffer]:
+        """DHCPDISCOVER on all `interfaces` at once; returns within `timeout` seconds."""
+        interfaces = default_interfaces() if interfaces is None else interfaces
+        if not interfaces:
+            return []
+        deadline = time.monotonic() + timeout
+        offers: List[DhcpOffer] = []
+        with ThreadPoolExecutor(max_workers=len(interfaces), thread_name_prefix='dhcp-probe') as executor:
+            futures = {executor.submit(_probe_interface, iface, mac, deadline): iface for iface, mac in interfaces}
+            for future, iface in futures.items():
+                try:
+                    offers.extend(future.result())
+                except OSError as e:
+                    logger.warning(f"DHCP probe on {iface} failed: {e}")
+        for offer in offers:
+            self.observe(offer)
+        return offers
+
+    def feed(self, frame: bytes, iface: Optional[str] = None) -> Optional[DhcpOffer]:
+        offer = parse_dhcp_reply(Ether(frame), iface)
+        if offer is not None:
+            self.observe(offer)
+        return offer
+
+    def replay(self, path: str) -> int:
+        """Feeds a pcap file through the same path as live traffic, returns the replies found."""
+        found = 0
+        with scapy.PcapReader(path) as reader:
+            for packet in reader:
+                if UDP in packet and packet[UDP].sport == BOOTP_SERVER_PORT and packet[UDP].dport == BOOTP_CLIENT_PORT:
+                    found += self.feed(bytes(packet)) is not None
+        return found
+
+    def watch(self, interfaces: Optional[List[str]] = None) -> List[threading.Thread]:
+        """Passive watcher threads, one per interface (Linux, AF_PACKET)."""
+        if not hasattr(socket, 'AF_PACKET'):
+            logger.warning("The passive DHCP watcher needs AF_PACKET (Linux), only active probes are available")
+            return []
+        names = [name for name, _ in default_interfaces()] if interfaces is None else interfaces
+
+        def watch_interface(iface):
+            try:
+                with open_dhcp_socket(iface) as sock:
+                    while not self._stop.is_set():
+                        readable, _, _ = select.select([sock], [], [], 1)
+                        if readable:
+                            self.feed(sock.recv(65535), iface)
+            except OSError as e:
+                logger.error(f"DHCP watcher on {iface} stopped: {e}")
+
+        self._stop.clear()
+        for iface in names:
+            thread = threading.Thread(target=watch_interface, args=(iface,), name=f'dhcp-watch-{iface}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self._threads
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    @property
+    def watching(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    def snapshot(self) -> List[DhcpServer]:
+        with self._lock:
+            return sorted(self.servers.values(), key=lambda server: server.first_seen)
+
+dhcp_monitor = DhcpMonitor(DHCP_TRUSTED_SERVERS.split(','))
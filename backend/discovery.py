@@ -0,0 +1,334 @@
+import json
+import os
+import select
+import socket
+import struct
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from venv import logger
+from dotenv import load_dotenv
+from backend import database
+
+load_dotenv()
+
+# Passive service inventory: one background thread listens on the SSDP and mDNS multicast
+# groups, sending a single M-SEARCH and a single mDNS query every DISCOVERY_QUERY_INTERVAL
+# seconds (the answers, and every spontaneous announcement, arrive on the same sockets).
+# Announcements repeat constantly, so they're deduplicated in memory and only a new
+# service or changed details are written to `device_services`.
+DISCOVERY_LISTEN = os.getenv('DISCOVERY_LISTEN', '0').lower() in ('1', 'true', 'yes')
+DISCOVERY_QUERY_INTERVAL = float(os.getenv('DISCOVERY_QUERY_INTERVAL', '300'))
+
+SSDP_GROUP = ('239.255.255.250', 1900)
+MDNS_GROUP = ('224.0.0.251', 5353)
+
+# mDNS service types asked for directly, on top of the DNS-SD enumeration
+MDNS_SERVICE_TYPES = (
+    '_services._dns-sd._udp.local',
+    '_googlecast._tcp.local',
+    '_airplay._tcp.local',
+    '_raop._tcp.local',
+    '_hap._tcp.local',
+    '_ipp._tcp.local',
+    '_printer._tcp.local',
+    '_pdl-datastream._tcp.local',
+    '_spotify-connect._tcp.local',
+    '_smb._tcp.local',
+)
+
+CATEGORIES = (
+    ('_googlecast.', 'chromecast'),
+    ('_airplay.', 'airplay'),
+    ('_raop.', 'airplay'),
+    ('_hap.', 'homekit'),
+    ('_ipp.', 'printer'),
+    ('_ipps.', 'printer'),
+    ('_printer.', 'printer'),
+    ('_pdl-datastream.', 'printer'),
+    ('_scanner.', 'scanner'),
+    ('_spotify-connect.', 'speaker'),
+    ('_smb.', 'file_share'),
+    ('_sonos', 'speaker'),
+    ('device:mediarenderer', 'media_renderer'),
+    ('device:mediaserver', 'media_server'),
+    ('device:internetgatewaydevice', 'router'),
+    ('dial-multiscreen', 'chromecast'),
+    ('device:printer', 'printer'),
+)
+
+M_SEARCH = (
+    'M-SEARCH * HTTP/1.1\r\n'
+    f'HOST: {SSDP_GROUP[0]}:{SSDP_GROUP[1]}\r\n'
+    'MAN: "ssdp:discover"\r\n'
+    'MX: 2\r\n'
+    'ST: ssdp:all\r\n'
+    '\r\n'
+).encode()
+
+DNS_HEADER = struct.Struct('!HHHHHH')
+DNS_RR = struct.Struct('!HHIH')
+TYPE_A, TYPE_PTR, TYPE_TXT, TYPE_SRV = 1, 12, 16, 33
+
+class DnsFormatError(Exception):
+    """Raised for a truncated or malformed mDNS packet"""
+    pass
+
+@dataclass
+class ServiceRecord:
+    ip: str
+    protocol: str                 # 'ssdp' or 'mdns'
+    service_type: str
+    name: str
+    port: Optional[int] = None
+    details: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def key(self) -> Tuple[str, str, str, str]:
+        return (self.ip, self.protocol, self.service_type, self.name)
+
+    @property
+    def category(self) -> Optional[str]:
+        service_type = self.service_type.lower()
+        return next((category for marker, category in CATEGORIES if marker in service_type), None)
+
+def parse_ssdp(data: bytes, ip: str) -> Optional[ServiceRecord]:
+    """A NOTIFY or M-SEARCH response as a ServiceRecord; None for requests and byebyes."""
+    lines = data.decode('utf-8', errors='replace').split('\r\n')
+    start = lines[0].upper()
+    if not (start.startswith('NOTIFY') or start.startswith('HTTP/1.1 200')):
+        return None
+    headers = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(':')
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    if headers.get('nts') == 'ssdp:byebye':
+        return None
+    service_type = headers.get('nt') or headers.get('st')
+    if not service_type:
+        return None
+    usn = headers.get('usn', '')
+    details = {key: headers[key] for key in ('location', 'server') if headers.get(key)}
+    # USN is "uuid:<device>::<type>", the uuid part identifies the device
+    return ServiceRecord(ip, 'ssdp', service_type, usn.split('::')[0] or service_type, details=details)
+
+def _read_name(data: bytes, offset: int) -> Tuple[str, int]:
+    """DNS name at `offset` (with compression pointers); returns it and the offset after it."""
+    labels = []
+    end = None
+    jumps = 0
+    while True:
+        if offset >= len(data):
+            raise DnsFormatError("Name runs past the packet")
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            if offset + 1 >= len(data) or jumps > 16:
+                raise DnsFormatError("Bad compression pointer")
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | data[offset + 1]
+            jumps += 1
+            continue
+        offset += 1
+        if length == 0:
+            break
+        labels.append(data[offset:offset + length].decode('utf-8', errors='replace'))
+        offset += length
+    return '.'.join(labels), end if end is not None else offset
+
+def _txt(rdata: bytes) -> Dict[str, str]:
+    values = {}
+    offset = 0
+    while offset < len(rdata):
+        length = rdata[offset]
+        entry = rdata[offset + 1:offset + 1 + length].decode('utf-8', errors='replace')
+        offset += 1 + length
+        key, _, value = entry.partition('=')
+        if key:
+            values[key.lower()] = value
+    return values
+
+def parse_mdns(data: bytes, ip: str) -> List[ServiceRecord]:
+    """
+    Service instances announced in an mDNS response: PTR records give the
+    instances, SRV/TXT records (usually in the same packet) their port and
+    metadata (model, friendly name...). Queries yield nothing.
+    """
+    if len(data) < DNS_HEADER.size:
+        raise DnsFormatError("Truncated header")
+    _, flags, questions, answers, authorities, additionals = DNS_HEADER.unpack_from(data)
+    if not flags & 0x8000:
+        return []
+    offset = DNS_HEADER.size
+    for _ in range(questions):
+        _, offset = _read_name(data, offset)
+        offset += 4
+    instances: Dict[str, str] = {}
+    ports: Dict[str, int] = {}
+    hosts: Dict[str, str] = {}
+    txts: Dict[str, Dict[str, str]] = {}
+    for _ in range(answers + authorities + additionals):
+        name, offset = _read_name(data, offset)
+        if offset + DNS_RR.size > len(data):
+            raise DnsFormatError("Truncated record")
+        rtype, _, _, length = DNS_RR.unpack_from(data, offset)
+        offset += DNS_RR.size
+        rdata_offset, offset = offset, offset + length
+        if offset > len(data):
+            raise DnsFormatError("Truncated record data")
+        if rtype == TYPE_PTR:
+            target, _ = _read_name(data, rdata_offset)
+            # The DNS-SD enumeration answers with service types, not instances
+            if name != '_services._dns-sd._udp.local':
+                instances[target] = name
+        elif rtype == TYPE_SRV and length >= 6:
+            (ports[name],) = struct.unpack_from('!H', data, rdata_offset + 4)
+            hosts[name], _ = _read_name(data, rdata_offset + 6)
+        elif rtype == TYPE_TXT:
+            txts[name] = _txt(data[rdata_offset:offset])
+    records = []
+    for instance, service_type in instances.items():
+        details: Dict[str, Any] = {}
+        if instance in hosts:
+            details['host'] = hosts[instance]
+        txt = txts.get(instance, {})
+        # Identity fields only, TXT records also carry volatile status flags
+        for key in ('md', 'model', 'ty', 'fn', 'am', 'manufacturer', 'product'):
+            if txt.get(key):
+                details[key] = txt[key]
+        name = instance[:-len(service_type) - 1] if instance.endswith('.' + service_type) else instance
+        records.append(ServiceRecord(ip, 'mdns', service_type, name, ports.get(instance), details))
+    return records
+
+def mdns_query(service_types=MDNS_SERVICE_TYPES) -> bytes:
+    """One mDNS query packet asking PTR for every service type at once."""
+    parts = [DNS_HEADER.pack(0, 0, len(service_types), 0, 0, 0)]
+    for service_type in service_types:
+        for label in service_type.split('.'):
+            encoded = label.encode()
+            parts.append(bytes([len(encoded)]) + encoded)
+        parts.append(b'\0' + struct.pack('!HH', TYPE_PTR, 1))
+    return b''.join(parts)
+
+def _multicast_socket(group: Tuple[str, int]) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, 'SO_REUSEPORT'):
+        # Share the port with avahi/mDNSResponder and other listeners
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(('', group[1]))
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, struct.pack('4s4s', socket.inet_aton(group[0]), socket.inet_aton('0.0.0.0')))
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+    sock.setblocking(False)
+    return sock
+
+class ServiceInventory:
+    """Deduplicates announcements in memory, writes new services and changed details only."""
+
+    def __init__(self):
+        self._seen: Dict[Tuple[str, str, str, str], Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+        self.announcements = 0
+        self.writes = 0
+
+    def observe(self, records: List[ServiceRecord]) -> int:
+        """Records the announcement; returns how many rows it changed in the DB."""
+        now = time.time()
+        changed = []
+        with self._lock:
+            for record in records:
+                self.announcements += 1
+                fingerprint = json.dumps([record.port, record.details], sort_keys=True)
+                previous = self._seen.get(record.key)
+                self._seen[record.key] = (fingerprint, now)
+                if previous is None or previous[0] != fingerprint:
+                    changed.append(record)
+        if changed:
+            database.upsert_device_services_db(
+                (record.ip, record.protocol, record.service_type, record.name, record.port, record.category, json.dumps(record.details, sort_keys=True))
+                for record in changed
+            )
+            self.writes += len(changed)
+        return len(changed)
+
+    def last_seen(self, key: Tuple[str, str, str, str]) -> Optional[float]:
+        entry = self._seen.get(key)
+        return entry[1] if entry else None
+
+    def feed(self, protocol: str, data: bytes, ip: str) -> int:
+        try:
+            records = parse_mdns(data, ip) if protocol == 'mdns' else [record for record in [parse_ssdp(data, ip)] if record]
+        except DnsFormatError:
+            return 0
+        return self.observe(records) if records else 0
+
+class DiscoveryListener:
+    def __init__(self, inventory: ServiceInventory, query_interval: float = DISCOVERY_QUERY_INTERVAL):
+        self.inventory = inventory
+        self.query_interval = query_interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def query(self, sockets: Dict[socket.socket, str]):
+        for sock, protocol in sockets.items():
+            try:
+                if protocol == 'ssdp':
+                    sock.sendto(M_SEARCH, SSDP_GROUP)
+                else:
+                    sock.sendto(mdns_query(), MDNS_GROUP)
+            except OSError as e:
+                logger.warning(f"{protocol} query failed: {e}")
+
+    def run(self):
+        sockets: Dict[socket.socket, str] = {}
+        for protocol, group in (('ssdp', SSDP_GROUP), ('mdns', MDNS_GROUP)):
+            try:
+                sockets[_multicast_socket(group)] = protocol
+            except OSError as e:
+                logger.error(f"Can't listen for {protocol} on {group[0]}:{group[1]}: {e}")
+        if not sockets:
+            return
+        next_query = 0.0
+        try:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                if now >= next_query:
+                    self.query(sockets)
+                    next_query = now + self.query_interval
+                readable, _, _ = select.select(list(sockets), [], [], min(1.0, max(next_query - now, 0)))
+                for sock in readable:
+                    while True:
+                        try:
+                            data, (ip, _) = sock.recvfrom(9000)
+                        except (BlockingIOError, InterruptedError):
+                            break
+                        self.inventory.feed(sockets[sock], data, ip)
+        finally:
+            for sock in sockets:
+                sock.close()
+
+    def start(self) -> threading.Thread:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name='service-discovery', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+service_inventory = ServiceInventory()
+discovery_listener: Optional[DiscoveryListener] = None
+
+def start_discovery_listener(query_interval: float = DISCOVERY_QUERY_INTERVAL) -> DiscoveryListener:
+    global discovery_listener
+    discovery_listener = DiscoveryListener(service_inventory, query_interval)
+    discovery_listener.start()
+    return discovery_listener
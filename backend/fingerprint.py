@@ -0,0 +1,125 @@
+from dataclasses import dataclass, field
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from backend import database
+from backend.transport import get_transport
+
+load_dotenv()
+
+# OS guesses for the devices a sweep found, from one batch of probes per sweep (a single
+# transport.fingerprint_many exchange) instead of one ICMP round trip per device. Each
+# device is answered by the TTL its replies left with, the window and option layout of the
+# SYN-ACK from a port the port scanner found open, and whether its echo reply keeps the
+# ICMP code of the request. Guesses are stored per MAC and only redone when the device
+# changes IP, gets an open port after a TTL-only guess, or didn't answer at all more than
+# OS_FINGERPRINT_RETRY seconds ago.
+OS_FINGERPRINT = os.getenv('OS_FINGERPRINT', '1').lower() in ('1', 'true', 'yes')
+OS_FINGERPRINT_TIMEOUT = float(os.getenv('OS_FINGERPRINT_TIMEOUT', '2'))
+OS_FINGERPRINT_RETRY = float(os.getenv('OS_FINGERPRINT_RETRY', '600'))
+
+INITIAL_TTLS = (32, 64, 128, 255)
+
+# What each family's stack answers with; None when it's no evidence either way
+SIGNATURES: Dict[str, Dict[str, Any]] = {
+    'Linux/Android/Unix-like': {
+        'ttl': 64,
+        'windows': {5840, 14600, 28960, 29200, 43440, 65160},
+        'options': {'MSTNW', 'MNNSNW', 'MSNW'},
+        'icmp_code_echoed': True,
+    },
+    'macOS/iOS': {
+        'ttl': 64,
+        'windows': {65535},
+        'options': {'MNWNNTSE', 'MNWNNTS'},
+        'icmp_code_echoed': True,
+    },
+    'Windows': {
+        'ttl': 128,
+        'windows': {8192, 64240, 65535},
+        'options': {'MNWNNS', 'MNWSNNT', 'MNWNNTS'},
+        'icmp_code_echoed': False,
+    },
+    'Network device (router/switch)': {
+        'ttl': 255,
+        'windows': {4128, 4096, 16384},
+        'options': {'M', ''},
+        'icmp_code_echoed': None,
+    },
+}
+
+# TTL tells the families apart best; the SYN-ACK only adds to it when a port is open
+WEIGHTS = {'ttl': 3, 'options': 2, 'window': 1, 'icmp_code': 1}
+
+def initial_ttl(ttl: int) -> int:
+    """The TTL a reply most likely left with: the next common initial value at or above what arrived."""
+    return next((initial for initial in INITIAL_TTLS if ttl <= initial), INITIAL_TTLS[-1])
+
+@dataclass
+class Fingerprint:
+    family: Optional[str]
+    confidence: float = 0.0
+    features: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def has_tcp(self) -> bool:
+        return 'tcp_window' in self.features
+
+def score_fingerprint(features: Dict[str, Any]) -> Fingerprint:
+    """
+    Scores every family against what a device answered (see
+    `fingerprint_many`): each matching feature adds its weight. The best
+    family wins, the first one listed on a tie; confidence is its score over
+    the weight of the observed features its signature has an opinion on.
+    """
+    ttl = features.get('icmp_ttl') or features.get('tcp_ttl')
+    if ttl is None:
+        return Fingerprint(None, 0.0, features)
+    observed = [
+        ('ttl', initial_ttl(ttl)),
+        ('window', features.get('tcp_window')),
+        ('options', features.get('tcp_options')),
+        ('icmp_code', features.get('icmp_code_echoed')),
+    ]
+    observed = [(name, value) for name, value in observed if value is not None]
+    best, best_score, best_possible = None, 0, 0
+    for family, signature in SIGNATURES.items():
+        score = 0
+        possible = sum(WEIGHTS[name] for name, _ in observed if name != 'icmp_code' or signature['icmp_code_echoed'] is not None)
+        for name, value in observed:
+            if name == 'ttl' and value == signature['ttl']:
+                score += WEIGHTS[name]
+            elif name == 'window' and value in signature['windows']:
+                score += WEIGHTS[name]
+            elif name == 'options' and value in signature['options']:
+                score += WEIGHTS[name]
+            elif name == 'icmp_code' and value == signature['icmp_code_echoed']:
+                score += WEIGHTS[name]
+        if score > best_score:
+            best, best_score, best_possible = family, score, possible
+    return Fingerprint(best, round(best_score / best_possible, 2) if best else 0.0, features)
+
+def fingerprint_hosts(targets: Dict[str, Optional[int]], transport=None, timeout: float = OS_FINGERPRINT_TIMEOUT) -> Dict[str, Fingerprint]:
+    """Fingerprints {ip: open port or None} in a single probe exchange."""
+    if not targets:
+        return {}
+    transport = transport or get_transport()
+    answers = transport.fingerprint_many(targets, timeout=timeout)
+    return {ip: score_fingerprint(answers.get(ip, {})) for ip in targets}
+
+def fingerprint_devices(devices: List[Tuple[str, str, Optional[int]]], transport=None, timeout: float = OS_FINGERPRINT_TIMEOUT) -> Dict[str, Fingerprint]:
+    """Fingerprints (mac, ip, open port) devices and stores the guesses, returns them by MAC."""
+    by_ip = fingerprint_hosts({ip: port for _, ip, port in devices}, transport, timeout)
+    database.save_fingerprints_db(
+        (mac, ip, by_ip[ip].family, by_ip[ip].confidence, json.dumps(by_ip[ip].features), by_ip[ip].has_tcp)
+        for mac, ip, _ in devices
+    )
+    return {mac: by_ip[ip] for mac, ip, _ in devices}
+
+def fingerprint_stale_devices(transport=None, retry: float = OS_FINGERPRINT_RETRY, timeout: float = OS_FINGERPRINT_TIMEOUT) -> Dict[str, Fingerprint]:
+    """The sweep's fingerprinting stage: only devices without a current guess are probed."""
+    devices = database.get_devices_to_fingerprint_db(retry)
+    if not devices:
+        return {}
+    return fingerprint_devices(devices, transport, timeout)
@@ -0,0 +1,69 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+import ipaddress
+import os
+from typing import Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+from backend.mac_utils import eui64_address
+from backend.transport import get_transport
+
+load_dotenv()
+
+# IPv6 discovery, run alongside every ARP sweep: one ICMPv6 echo to all-nodes (ff02::1),
+# which every IPv6 host on the link answers, plus neighbor solicitations for the addresses
+# devices are likely to have in each of the interface's /64s - sweeping a /64 isn't
+# possible, so that's the EUI-64 address of every MAC known from earlier sweeps and a few
+# low, statically assigned ones - and the kernel's IPv6 neighbor cache. Addresses not seen
+# for IPV6_FORGET_AFTER seconds (rotated privacy addresses) are dropped.
+IPV6_DISCOVERY = os.getenv('IPV6_DISCOVERY', '1').lower() in ('1', 'true', 'yes')
+IPV6_DISCOVERY_TIMEOUT = float(os.getenv('IPV6_DISCOVERY_TIMEOUT', '2'))
+IPV6_FORGET_AFTER = float(os.getenv('IPV6_FORGET_AFTER', '604800'))
+
+# Sources that mean the device answered just now. The kernel keeps STALE, DELAY and PROBE
+# entries ('stale_neighbor') long after a device left: they're listed, but don't make it online.
+LIVE_SOURCES = ('ndp', 'neighbor_cache')
+
+# Interface IDs tried in every prefix on top of the EUI-64 ones: routers and static hosts
+STATIC_INTERFACE_IDS = (1, 2, 3)
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ipv6-discovery')
+
+def candidate_addresses(prefixes: Iterable[str], macs: Iterable[str]) -> List[str]:
+    """The addresses to solicit: per /64, the low static ones and the EUI-64 one of each MAC."""
+    macs = list(macs)
+    candidates = []
+    for prefix in prefixes:
+        network = ipaddress.ip_network(prefix, strict=False)
+        if network.prefixlen != 64:
+            continue
+        candidates.extend(str(network.network_address + interface_id) for interface_id in STATIC_INTERFACE_IDS)
+        for mac in macs:
+            try:
+                candidates.append(eui64_address(network, mac))
+            except ValueError:
+                continue  # 'Unknown' and other non-MACs
+    return candidates
+
+def preferred_address(addresses: Iterable[str]) -> str:
+    """A global address if there is one, for the `ip` of IPv6-only devices."""
+    return min(addresses, key=lambda address: (ipaddress.ip_address(address).is_link_local, address))
+
+def discover_ipv6(known_macs: Iterable[str], transport=None, timeout: float = IPV6_DISCOVERY_TIMEOUT,
+                  iface: Optional[str] = None) -> List[Tuple[str, str, str]]:
+    """
+    (mac, ip, source) of every IPv6 address found: `source` is 'ndp' for the
+    echo and solicitation replies, 'neighbor_cache' for the kernel's REACHABLE
+    entries and 'stale_neighbor' for its other ones.
+    """
+    transport = transport or get_transport()
+    targets = candidate_addresses(transport.ipv6_prefixes(iface), known_macs)
+    found = {}
+    for ip, mac, state in transport.ipv6_neighbors():
+        found[ip] = (mac.lower(), ip, 'neighbor_cache' if state == 'REACHABLE' else 'stale_neighbor')
+    for ip, mac in transport.ndp_sweep(targets, timeout=timeout, iface=iface):
+        found[ip] = (mac.lower(), ip, 'ndp')
+    # Multicast and unspecified addresses have nothing to do in a device's list
+    return [entry for ip, entry in found.items() if not (ipaddress.ip_address(ip).is_multicast or ipaddress.ip_address(ip).is_unspecified)]
+
+def start_ipv6_discovery(known_macs: Iterable[str], transport=None, iface: Optional[str] = None) -> Future:
+    """`discover_ipv6` on its own thread, so it runs while the ARP sweep does."""
+    return _executor.submit(discover_ipv6, list(known_macs), transport, IPV6_DISCOVERY_TIMEOUT, iface)
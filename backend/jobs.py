@@ -0,0 +1,326 @@
+from dataclasses import dataclass
+import ipaddress
+import itertools
+import json
+import math
+import os
+import queue
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+from venv import logger
+from dotenv import load_dotenv
+from backend.admission import AdmissionController, AdmissionRejected, traceroute_admission, wifi_admission
+from backend.traceroute import MAX_HOPS, MAX_TIMEOUT, traceroute_host
+from backend.utils import scan_network
+from backend.wifi import get_neighbor_nets
+
+load_dotenv()
+
+# Long-running diagnostics as jobs: POST /api/jobs queues one and answers right away with
+# its ID, JOB_WORKERS threads run the queue by priority (lower first, then oldest), and
+# clients poll the job or subscribe to its events for progress and partial results (e.g.
+# each traceroute hop as it comes in). At most JOB_QUEUE_SIZE jobs wait; finished jobs are
+# kept JOB_RESULT_TTL seconds, at most JOB_MAX_FINISHED of them, and a job whose partial
+# results and result add up to over JOB_MAX_RESULT_BYTES (as JSON) fails with
+# result_too_large. Traceroute and WiFi jobs go through the same admission control as
+# their endpoints: a client token to be queued, a slot (and budget) of their own to run,
+# which they wait for as long as it takes (a job is there to wait its turn; JOB_WORKERS
+# bounds the threads waiting).
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+JOB_QUEUE_SIZE = int(os.getenv('JOB_QUEUE_SIZE', '64'))
+JOB_RESULT_TTL = float(os.getenv('JOB_RESULT_TTL', '600'))
+JOB_MAX_FINISHED = int(os.getenv('JOB_MAX_FINISHED', '256'))
+JOB_MAX_RESULT_BYTES = int(os.getenv('JOB_MAX_RESULT_BYTES', str(1024 * 1024)))
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+class JobError(Exception):
+    """Raised for a job that can't be created: `code` is the API error code"""
+    def __init__(self, code: str, message: str):
+        super().__init__(message)
+        self.code = code
+
+class JobCancelled(Exception):
+    """Raised by `Job.report` once the job was cancelled, to stop the runner early"""
+    pass
+
+class JobResultTooLarge(Exception):
+    """Raised by `Job.report` when the partial results would go over the job's size limit"""
+    pass
+
+class Job:
+    def __init__(self, job_type: str, params: Dict[str, Any], priority: int, max_result_bytes: int = JOB_MAX_RESULT_BYTES):
+        self.id = uuid.uuid4().hex
+        self.type = job_type
+        self.params = params
+        self.priority = priority
+        self.status = QUEUED
+        self.progress: Optional[Dict[str, Any]] = None
+        self.partial: List[Any] = []
+        self.partial_bytes = 0
+        self.max_result_bytes = max_result_bytes
+        self.result: Any = None
+        self.error: Optional[Dict[str, str]] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        # Bumped on every change, subscribers wait for it to move
+        self.version = 0
+        self._changed = threading.Condition()
+
+    def _update(self, **changes):
+        with self._changed:
+            for name, value in changes.items():
+                setattr(self, name, value)
+            self.version += 1
+            self._changed.notify_all()
+
+    def finish(self, status: str, **changes):
+        """Final status and result/error, unless the job was cancelled meanwhile."""
+        with self._changed:
+            if self.status == CANCELLED:
+                return
+            self._update(status=status, finished_at=time.time(), **changes)
+
+    def report(self, progress: Optional[Dict[str, Any]] = None, partial: Any = None):
+        """For runners: new progress and/or one more partial result."""
+        if self.status == CANCELLED:
+            raise JobCancelled()
+        with self._changed:
+            if progress is not None:
+                self.progress = progress
+            if partial is not None:
+                size = len(json.dumps(partial, default=str))
+                if self.partial_bytes + size > self.max_result_bytes:
+                    raise JobResultTooLarge(f"The partial results are over the {self.max_result_bytes} bytes kept.")
+                self.partial.append(partial)
+                self.partial_bytes += size
+            self.version += 1
+            self._changed.notify_all()
+
+    def wait_for_change(self, version: int, timeout: float) -> int:
+        """Blocks until the job moved past `version` (or `timeout`), returns the current version."""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def to_json(self, partial_since: int = 0) -> Dict[str, Any]:
+        with self._changed:
+            return {
+                'id': self.id,
+                'type': self.type,
+                'params': self.params,
+                'priority': self.priority,
+                'status': self.status,
+                'progress': self.progress,
+                # `partial_since` skips the ones a poller already has
+                'partial': self.partial[partial_since:],
+                'partial_count': len(self.partial),
+                'result': self.result,
+                'error': self.error,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+            }
+
+@dataclass(frozen=True)
+class JobType:
+    # Validates/normalizes the request's params, raising JobError
+    parse: Callable[[Dict[str, Any]], Dict[str, Any]]
+    # run(job, **params) -> result
+    run: Callable[..., Any]
+    priority: int
+    # The endpoint's admission control, and what a run costs against its budget (cost(**params))
+    admission: Optional[AdmissionController] = None
+    cost: Callable[..., float] = lambda **params: 1
+
+class JobManager:
+    def __init__(self, types: Dict[str, JobType], workers: int = JOB_WORKERS, queue_size: int = JOB_QUEUE_SIZE,
+                 ttl: float = JOB_RESULT_TTL, max_finished: int = JOB_MAX_FINISHED, max_result_bytes: int = JOB_MAX_RESULT_BYTES):
+        self.types = types
+        self.workers = workers
+        self.queue_size = queue_size
+        self.ttl = ttl
+        self.max_finished = max_finished
+        self.max_result_bytes = max_result_bytes
+        self._jobs: Dict[str, Job] = {}
+        self._queue: queue.PriorityQueue = queue.PriorityQueue()
+        self._queued = 0
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def _start_workers(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name=f'job-worker-{len(self._threads)}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _expire(self, now: float):
+        finished = sorted((job for job in self._jobs.values() if job.finished), key=lambda job: job.finished_at)
+        excess = len(finished) - self.max_finished
+        for i, job in enumerate(finished):
+            if i < excess or now - job.finished_at >= self.ttl:
+                del self._jobs[job.id]
+
+    def submit(self, job_type: str, params: Optional[Dict[str, Any]] = None, priority: Optional[int] = None, client: str = '') -> Job:
+        """
+        Queues a job, raises JobError for an unknown type, invalid params or a
+        full queue, AdmissionRejected when `client` is over its rate or the job
+        over the whole cost budget.
+        """
+        definition = self.types.get(job_type)
+        if definition is None:
+            raise JobError('invalid_job_type', f"type must be one of {', '.join(self.types)}.")
+        if priority is not None and (isinstance(priority, bool) or not isinstance(priority, int) or not 0 <= priority <= 9):
+            raise JobError('invalid_priority', "priority must be an integer from 0 (first) to 9.")
+        params = definition.parse(params or {})
+        if definition.admission is not None:
+            definition.admission.check_cost(definition.cost(**params))
+            definition.admission.check_rate(client)
+        job = Job(job_type, params, definition.priority if priority is None else priority, self.max_result_bytes)
+        with self._lock:
+            self._expire(time.time())
+            if self._queued >= self.queue_size:
+                raise JobError('queue_full', f"{self._queued} jobs are already waiting, try again later.")
+            self._jobs[job.id] = job
+            self._queued += 1
+            self._start_workers()
+        self._queue.put((job.priority, next(self._sequence), job))
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            self._expire(time.time())
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> List[Job]:
+        with self._lock:
+            self._expire(time.time())
+            return sorted(self._jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        A queued job never runs; a running one stops at its next report (the
+        step in progress, e.g. a subprocess, still finishes).
+        """
+        job = self.get(job_id)
+        if job is None:
+            return None
+        with self._lock:
+            if not job.finished:
+                if job.status == QUEUED:
+                    self._queued -= 1
+                job._update(status=CANCELLED, finished_at=time.time())
+        return job
+
+    def _run(self, job: Job):
+        definition = self.types[job.type]
+        if definition.admission is None:
+            return definition.run(job, **job.params)
+        with definition.admission.slot(definition.cost(**job.params), max_wait=math.inf, max_queue=math.inf):
+            return definition.run(job, **job.params)
+
+    def _work(self):
+        while True:
+            _, _, job = self._queue.get()
+            with self._lock:
+                if job.status != QUEUED:
+                    continue  # cancelled while waiting
+                self._queued -= 1
+                job._update(status=RUNNING, started_at=time.time())
+            try:
+                result = self._run(job)
+            except JobCancelled:
+                continue
+            except JobResultTooLarge as e:
+                job.finish(FAILED, error={'code': 'result_too_large', 'message': str(e)})
+                continue
+            except AdmissionRejected as e:
+                job.finish(FAILED, error={'code': e.reason, 'message': str(e)})
+                continue
+            except ValueError as e:
+                job.finish(FAILED, error={'code': 'invalid_parameters', 'message': str(e)})
+                continue
+            except Exception as e:
+                logger.error(f"Job {job.id} ({job.type}) failed: {e}")
+                job.finish(FAILED, error={'code': 'job_failed', 'message': str(e)})
+                continue
+            size = len(json.dumps(result, default=str))
+            if job.partial_bytes + size > self.max_result_bytes:
+                job.finish(FAILED, error={
+                    'code': 'result_too_large',
+                    'message': f"The result is {size} bytes ({job.partial_bytes} more of partial results), over the {self.max_result_bytes} bytes kept.",
+                })
+            else:
+                job.finish(SUCCEEDED, result=result)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counts = {status: 0 for status in (QUEUED, RUNNING, *FINISHED)}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            return counts
+
+def _parse_traceroute(params: Dict[str, Any]) -> Dict[str, Any]:
+    target = params.get('target')
+    max_hops = params.get('max_hops', 20)
+    timeout = params.get('timeout', 1)
+    if not isinstance(target, str) or not target.strip():
+        raise JobError('invalid_parameters', "target is required.")
+    # bool is an int too, but `true` isn't a hop count
+    if any(isinstance(value, bool) or not isinstance(value, int) for value in (max_hops, timeout)) \
+            or not 1 <= max_hops <= MAX_HOPS or not 1 <= timeout <= MAX_TIMEOUT:
+        raise JobError('invalid_parameters', f"max_hops must be 1-{MAX_HOPS} and timeout 1-{MAX_TIMEOUT} seconds.")
+    return {'target': target.strip(), 'max_hops': max_hops, 'timeout': timeout}
+
+def _run_traceroute(job: Job, target: str, max_hops: int, timeout: int):
+    job.report(progress={'hop': 0, 'max_hops': max_hops})
+    return traceroute_host(
+        target, max_hops=max_hops, timeout=timeout,
+        on_hop=lambda hop: job.report(progress={'hop': hop['hop'], 'max_hops': max_hops}, partial=hop),
+    )
+
+def _parse_wifi_neighbors(params: Dict[str, Any]) -> Dict[str, Any]:
+    return {'reset_adapter': bool(params.get('reset_adapter', False))}
+
+def _run_wifi_neighbors(job: Job, reset_adapter: bool):
+    job.report(progress={'stage': 'resetting_adapter' if reset_adapter else 'scanning'})
+    return get_neighbor_nets(reset_adapter)
+
+def _parse_scan(params: Dict[str, Any]) -> Dict[str, Any]:
+    subnet = params.get('subnet')
+    if subnet is None:
+        return {'subnet': None}
+    try:
+        network = ipaddress.ip_network(str(subnet), strict=False)
+    except ValueError as e:
+        raise JobError('invalid_parameters', str(e)) from e
+    if network.version != 4 or network.prefixlen < 16:
+        raise JobError('invalid_parameters', "subnet must be an IPv4 network of at most a /16.")
+    return {'subnet': str(network)}
+
+def _run_scan(job: Job, subnet: Optional[str]):
+    job.report(progress={'stage': 'sweeping', 'subnet': subnet})
+    devices = scan_network(subnet)
+    return [{'ip': ip, 'mac': mac} for ip, mac in devices]
+
+JOB_TYPES = {
+    'traceroute': JobType(_parse_traceroute, _run_traceroute, priority=5, admission=traceroute_admission,
+                          cost=lambda max_hops, timeout, **params: max_hops * timeout),
+    'wifi_neighbors': JobType(_parse_wifi_neighbors, _run_wifi_neighbors, priority=5, admission=wifi_admission),
+    'scan': JobType(_parse_scan, _run_scan, priority=7),
+}
+
+job_manager = JobManager(JOB_TYPES)
@@ -0,0 +1,100 @@
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, IO, Iterable, Iterator, List, Optional, Tuple
+from backend.database import Mac_w_Label
+from backend.mac_utils import normalize_mac
+
+# Bulk label import/export. Imports are read from the request stream one line at a time
+# and fed straight into `import_labels_db`'s executemany, exports are written one row at a
+# time: neither holds the whole label set in memory.
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+CSV_MIMETYPE = 'text/csv'
+FORMATS = {'ndjson': NDJSON_MIMETYPE, 'csv': CSV_MIMETYPE}
+MAX_LABEL_LENGTH = 256
+# Per-row errors reported back, the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+
+class UnsupportedFormat(Exception):
+    """Raised for an import whose content type is neither NDJSON nor CSV"""
+    pass
+
+@dataclass
+class LabelImport:
+    """Validates rows while they're imported, keeping the errors for the response."""
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+    error_count: int = 0
+    rows: int = 0
+
+    def error(self, line: int, code: str, message: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'code': code, 'message': message})
+
+    def validate(self, records: Iterable[Tuple[int, Optional[Dict[str, Any]]]]) -> Iterator[Tuple[str, str]]:
+        """(mac, label) pairs of the valid records, errors recorded for the rest."""
+        for line, record in records:
+            self.rows += 1
+            if record is None:
+                self.error(line, 'invalid_row', 'Row could not be parsed.')
+                continue
+            mac = normalize_mac(record.get('mac'))
+            if mac is None:
+                self.error(line, 'invalid_mac', f"Not a MAC address: {record.get('mac')!r}.")
+                continue
+            label = record.get('label')
+            label = label.strip() if isinstance(label, str) else ''
+            if not label:
+                self.error(line, 'missing_label', f'No label for {mac}.')
+                continue
+            if len(label) > MAX_LABEL_LENGTH:
+                self.error(line, 'label_too_long', f'Label for {mac} is longer than {MAX_LABEL_LENGTH} characters.')
+                continue
+            yield mac, label
+
+def iter_ndjson_records(text: IO[str]) -> Iterator[Tuple[int, Optional[Dict[str, Any]]]]:
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield line_number, record if isinstance(record, dict) else None
+
+def iter_csv_records(text: IO[str]) -> Iterator[Tuple[int, Optional[Dict[str, Any]]]]:
+    """CSV with a `mac,label` header (any extra columns are ignored)."""
+    reader = csv.DictReader(text)
+    for record in reader:
+        yield reader.line_num, record
+
+def iter_import_records(stream: IO[bytes], content_type: str) -> Iterator[Tuple[int, Optional[Dict[str, Any]]]]:
+    mimetype = (content_type or '').split(';')[0].strip().lower()
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if mimetype in (NDJSON_MIMETYPE, 'application/jsonl', 'application/json-lines'):
+        return iter_ndjson_records(text)
+    if mimetype == CSV_MIMETYPE:
+        return iter_csv_records(text)
+    raise UnsupportedFormat(f"Expected {NDJSON_MIMETYPE} or {CSV_MIMETYPE}, got {mimetype or 'no content type'}.")
+
+def _json_default(value):
+    return str(value)
+
+def iter_export(labels: Iterable[Mac_w_Label], fmt: str) -> Iterator[str]:
+    """Serializes labels one row at a time as NDJSON or CSV (with header)."""
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(('mac', 'label', 'updated_at'))
+        for row in labels:
+            writer.writerow((row['mac'], row['label'], row['updated_at']))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+        return
+    for row in labels:
+        yield json.dumps({'mac': row['mac'], 'label': row['label'], 'updated_at': row['updated_at']}, default=_json_default) + '\n'
@@ -1,5 +1,24 @@
+import ipaddress
+import re
 import scapy.all as scapy
 
+mac_separators_re = re.compile(r'[:\-.\s]')
+mac_hex_re = re.compile(r'^[0-9A-Fa-f]{12}$')
+
+def normalize_mac(mac):
+    """
+    Normalizes a MAC address written as aa:bb:cc:dd:ee:ff, AA-BB-CC-DD-EE-FF,
+    aabb.ccdd.eeff (Cisco) or aabbccddeeff to the AA:BB:CC:DD:EE:FF form the
+    labels table is keyed by. Returns None when it isn't a MAC address.
+    """
+    if not isinstance(mac, str):
+        return None
+    digits = mac_separators_re.sub('', mac.strip())
+    if not mac_hex_re.match(digits):
+        return None
+    digits = digits.upper()
+    return ':'.join(digits[i:i + 2] for i in range(0, 12, 2))
+
 def is_locally_administered_mac(mac):
     """
     Checks the U/L bit in a MAC address. If set, this MAC was randomly
@@ -10,6 +29,17 @@ def is_locally_administered_mac(mac):
     first_octet = int(mac.split(':')[0], 16)
     return bool(first_octet & 0b00000010)
 
+def eui64_address(prefix, mac):
+    """
+    The SLAAC address a device with `mac` picks in the /64 `prefix` when it
+    doesn't use privacy addresses: the MAC split around ff:fe, U/L bit flipped.
+    """
+    octets = bytearray(bytes.fromhex(mac.replace(':', '').replace('-', '')))
+    octets[0] ^= 0b00000010
+    interface_id = int.from_bytes(octets[:3] + b'\xff\xfe' + octets[3:], 'big')
+    network = ipaddress.ip_network(prefix, strict=False)
+    return str(network.network_address + interface_id)
+
 def get_net_mask2():
     iface = scapy.conf.iface
     return {
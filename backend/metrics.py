@@ -0,0 +1,213 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Prometheus-style metrics, rendered in the text exposition format by `render_metrics()`.
+# Kept dependency-free on purpose (no prometheus_client): every observation is a dict
+# lookup plus a bisect under a per-metric lock, cheap enough to leave on in production.
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+
+def _label_key(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {labelnames}, got {tuple(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = list(zip(labelnames, key))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        f'{name}="' + value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"') + '"'
+        for name, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        # A list of their own keeps metrics (e.g. the tests') out of /metrics
+        (_registry if registry is None else registry).append(self)
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for suffix, key, extra, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return '\n'.join(lines)
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [('_total', key, None, value) for key, value in items]
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [('', key, None, value) for key, value in items]
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [per-bucket counts..., +Inf count], sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time spent inside the `with` block, in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        state = self._values.get(_label_key(self.labelnames, labels))
+        return sum(state[0]) if state else 0
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        samples = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                samples.append(('_bucket', key, ('le', _format_value(float(bound))), cumulative))
+            samples.append(('_sum', key, None, total))
+            samples.append(('_count', key, None, cumulative))
+        return samples
+
+def render_metrics() -> str:
+    """Render every registered metric in the Prometheus text exposition format (v0.0.4)."""
+    return '\n'.join(metric.render() for metric in _registry) + '\n'
+
+SCAN_DURATION_SECONDS = Histogram(
+    'netdiag_scan_duration_seconds',
+    'Wall time of one ARP sweep in scan_network.',
+)
+SCAN_HOSTS_FOUND = Gauge(
+    'netdiag_scan_hosts_found',
+    'Hosts that answered the most recent ARP sweep.',
+)
+SCANS = Counter(
+    'netdiag_scans',
+    'ARP sweeps completed.',
+)
+REVERSE_LOOKUP_SECONDS = Histogram(
+    'netdiag_reverse_lookup_duration_seconds',
+    'Reverse hostname lookup latency.',
+    ('outcome',),
+)
+REVERSE_LOOKUP_QUEUE_DEPTH = Gauge(
+    'netdiag_reverse_lookup_queue_depth',
+    'Reverse lookups submitted to the executor and not finished yet.',
+)
+DB_WRITE_SECONDS = Histogram(
+    'netdiag_db_write_duration_seconds',
+    'SQLite write time.',
+    ('operation',),
+)
+TRACEROUTE_PHASE_SECONDS = Histogram(
+    'netdiag_traceroute_phase_duration_seconds',
+    'Traceroute timing broken down by phase.',
+    ('phase',),
+)
+WIFI_SUBPROCESS_SECONDS = Histogram(
+    'netdiag_wifi_subprocess_duration_seconds',
+    'Duration of the WiFi tool subprocesses (netsh).',
+    ('command',),
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    'netdiag_http_request_duration_seconds',
+    'HTTP request latency per route.',
+    ('method', 'route', 'status'),
+)
+SINGLE_FLIGHT_REQUESTS = Counter(
+    'netdiag_single_flight_requests',
+    'Requests to coalesced endpoints: executed, joined (waited on a running execution) or reused (recent result).',
+    ('endpoint', 'outcome'),
+)
+SINGLE_FLIGHT_TIMEOUTS = Counter(
+    'netdiag_single_flight_timeouts',
+    'Coalesced requests that gave up waiting on the shared execution.',
+    ('endpoint',),
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    'netdiag_admission_in_flight',
+    'Executions holding a slot of an admission-controlled endpoint.',
+    ('endpoint',),
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    'netdiag_admission_queue_depth',
+    'Requests waiting for a slot of an admission-controlled endpoint.',
+    ('endpoint',),
+)
+ADMISSION_REJECTIONS = Counter(
+    'netdiag_admission_rejections',
+    'Requests turned away by admission control: rate_limited, too_expensive, queue_full or queue_timeout.',
+    ('endpoint', 'reason'),
+)
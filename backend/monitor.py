@@ -0,0 +1,230 @@
+from array import array
+from dataclasses import dataclass, field
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+from venv import logger
+from dotenv import load_dotenv
+from backend.ringbuffer import RingBuffer
+from backend.transport import get_transport
+
+load_dotenv()
+
+# Smokeping-style latency monitor: every MONITOR_INTERVAL seconds (0 disables it) each
+# target gets MONITOR_PROBES echo requests, all targets probed together in one round over
+# one socket (`ping_many`). Per target we keep a fixed-size log histogram of every RTT
+# seen and a fixed-size ring of per-round stats (percentiles, jitter, loss).
+MONITOR_INTERVAL = float(os.getenv('MONITOR_INTERVAL', '0'))
+MONITOR_PROBES = int(os.getenv('MONITOR_PROBES', '20'))
+MONITOR_TIMEOUT = float(os.getenv('MONITOR_TIMEOUT', '1'))
+# Comma separated IPs, plus "gateway" (default route) and "dns" (the system resolvers)
+MONITOR_TARGETS = os.getenv('MONITOR_TARGETS', 'gateway,dns')
+# Rounds kept per target (1440 rounds of 60 s = one day)
+MONITOR_HISTORY = int(os.getenv('MONITOR_HISTORY', '1440'))
+
+# Histogram buckets: 8 per doubling (~9% wide) from 50 µs to ~13 s
+HISTOGRAM_MIN_MS = 0.05
+HISTOGRAM_BUCKETS_PER_DOUBLING = 8
+HISTOGRAM_BUCKETS = 18 * HISTOGRAM_BUCKETS_PER_DOUBLING
+
+ROUND_FIELDS = ('sent', 'lost', 'loss', 'min_ms', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms', 'mean_ms', 'jitter_ms')
+
+class LogHistogram:
+    """
+    RTT counts in logarithmic buckets, a fixed array no matter how many samples:
+    percentiles are accurate to a bucket width (~9%).
+    """
+    def __init__(self, buckets: int = HISTOGRAM_BUCKETS, min_ms: float = HISTOGRAM_MIN_MS, per_doubling: int = HISTOGRAM_BUCKETS_PER_DOUBLING):
+        self.min_ms = min_ms
+        self.per_doubling = per_doubling
+        self.counts = array('Q', bytes(8 * buckets))
+        self.total = 0
+
+    def bucket(self, rtt_ms: float) -> int:
+        if rtt_ms <= self.min_ms:
+            return 0
+        return min(int(math.log2(rtt_ms / self.min_ms) * self.per_doubling), len(self.counts) - 1)
+
+    def upper_bound(self, bucket: int) -> float:
+        return self.min_ms * 2 ** ((bucket + 1) / self.per_doubling)
+
+    def observe(self, rtt_ms: float):
+        self.counts[self.bucket(rtt_ms)] += 1
+        self.total += 1
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Upper bound of the bucket holding the `p`th percentile (0-100)."""
+        if not self.total:
+            return None
+        rank = max(math.ceil(self.total * p / 100), 1)
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.upper_bound(bucket)
+        return self.upper_bound(len(self.counts) - 1)
+
+    def buckets(self) -> List[Dict[str, float]]:
+        """Non-empty buckets as {le, count}, like a Prometheus histogram without the cumulation."""
+        return [
+            {'le': round(self.upper_bound(bucket), 4), 'count': count}
+            for bucket, count in enumerate(self.counts) if count
+        ]
+
+def round_stats(rtts: List[Optional[float]]) -> Dict[str, float]:
+    """
+    Stats of one round of probes. Percentiles are exact here (a round is only
+    a few dozen samples); jitter is the mean difference between consecutive
+    answered probes (RFC 3550 style, without the smoothing).
+    """
+    answered = sorted(rtt for rtt in rtts if rtt is not None)
+    sent, lost = len(rtts), len(rtts) - len(answered)
+    stats = {'sent': sent, 'lost': lost, 'loss': lost / sent if sent else math.nan}
+    if not answered:
+        return stats | {name: math.nan for name in ('min_ms', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms', 'mean_ms', 'jitter_ms')}
+
+    def percentile(p):
+        return answered[min(max(math.ceil(len(answered) * p / 100) - 1, 0), len(answered) - 1)]
+
+    in_order = [rtt for rtt in rtts if rtt is not None]
+    jitter = sum(abs(b - a) for a, b in zip(in_order, in_order[1:])) / (len(in_order) - 1) if len(in_order) > 1 else 0.0
+    return stats | {
+        'min_ms': answered[0],
+        'p50_ms': percentile(50),
+        'p90_ms': percentile(90),
+        'p99_ms': percentile(99),
+        'max_ms': answered[-1],
+        'mean_ms': sum(answered) / len(answered),
+        'jitter_ms': jitter,
+    }
+
+@dataclass
+class TargetSeries:
+    target: str
+    name: Optional[str] = None
+    history: int = MONITOR_HISTORY
+    histogram: LogHistogram = field(default_factory=LogHistogram)
+    rounds: RingBuffer = field(init=False)
+    latest: Optional[Dict[str, float]] = None
+
+    def __post_init__(self):
+        self.rounds = RingBuffer(self.history, ROUND_FIELDS)
+
+    def record(self, timestamp: float, rtts: List[Optional[float]]):
+        for rtt in rtts:
+            if rtt is not None:
+                self.histogram.observe(rtt)
+        stats = round_stats(rtts)
+        self.rounds.append((timestamp, *(stats[name] for name in ROUND_FIELDS)))
+        self.latest = stats | {'timestamp': timestamp}
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'target': self.target,
+            'name': self.name,
+            'latest': _json_safe(self.latest) if self.latest else None,
+            'samples': self.histogram.total,
+            'p50_ms': self.histogram.percentile(50),
+            'p99_ms': self.histogram.percentile(99),
+        }
+
+def _json_safe(values: Dict[str, float]) -> Dict[str, Optional[float]]:
+    return {key: None if isinstance(value, float) and value != value else value for key, value in values.items()}
+
+def system_resolvers(path: str = '/etc/resolv.conf') -> List[str]:
+    try:
+        with open(path) as f:
+            return [line.split()[1] for line in f if line.startswith('nameserver') and len(line.split()) > 1 and ':' not in line.split()[1]]
+    except OSError:
+        return []
+
+def resolve_targets(spec: str) -> Dict[str, str]:
+    """`MONITOR_TARGETS` to {ip: name}; "gateway" and "dns" expand to the current ones."""
+    targets: Dict[str, str] = {}
+    for token in (token.strip() for token in spec.split(',')):
+        if not token:
+            continue
+        if token == 'gateway':
+            from backend.utils import net_config
+            gateway = net_config.gateway_ip[2] if isinstance(net_config.gateway_ip, tuple) else net_config.gateway_ip
+            if gateway and gateway != '0.0.0.0':
+                targets.setdefault(gateway, 'gateway')
+        elif token == 'dns':
+            for resolver in system_resolvers():
+                targets.setdefault(resolver, 'dns')
+        else:
+            targets.setdefault(token, None)
+    return targets
+
+class LatencyMonitor:
+    """Probes `targets` every `interval` seconds in one `ping_many` round."""
+
+    def __init__(self, targets: Optional[Dict[str, Optional[str]]] = None, interval: float = 60, probes: int = MONITOR_PROBES, timeout: float = MONITOR_TIMEOUT, history: int = MONITOR_HISTORY, transport=None):
+        self.interval = interval
+        self.probes = probes
+        self.timeout = timeout
+        self.history = history
+        self.transport = transport
+        self.series: Dict[str, TargetSeries] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        for target, name in (targets or {}).items():
+            self.add_target(target, name)
+
+    def add_target(self, target: str, name: Optional[str] = None) -> TargetSeries:
+        with self._lock:
+            series = self.series.get(target)
+            if series is None:
+                series = self.series[target] = TargetSeries(target, name, self.history)
+            return series
+
+    def remove_target(self, target: str) -> bool:
+        with self._lock:
+            return self.series.pop(target, None) is not None
+
+    def probe_round(self):
+        with self._lock:
+            targets = list(self.series)
+        if not targets:
+            return
+        transport = self.transport or get_transport()
+        # Spread the probes over at most half the interval, smokeping sends them back to back
+        spacing = min(0.05, self.interval / 2 / max(self.probes, 1))
+        results = transport.ping_many(targets, count=self.probes, spacing=spacing, timeout=self.timeout)
+        now = time.time()
+        with self._lock:
+            for target, rtts in results.items():
+                series = self.series.get(target)
+                if series is not None:
+                    series.record(now, rtts)
+
+    def start(self) -> threading.Thread:
+        def probe_forever():
+            while not self._stop.is_set():
+                started = time.monotonic()
+                try:
+                    self.probe_round()
+                except Exception as e:
+                    logger.error(f"Latency monitor round failed: {e}")
+                self._stop.wait(max(self.interval - (time.monotonic() - started), 0))
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=probe_forever, name='latency-monitor', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+latency_monitor: Optional[LatencyMonitor] = None
+
+def start_latency_monitor(interval: float = MONITOR_INTERVAL, targets: str = MONITOR_TARGETS) -> LatencyMonitor:
+    global latency_monitor
+    latency_monitor = LatencyMonitor(resolve_targets(targets), interval=interval)
+    latency_monitor.start()
+    return latency_monitor
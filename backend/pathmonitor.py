@@ -0,0 +1,314 @@
+from collections import deque
+import math
+import os
+import socket
+import threading
+import time
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from venv import logger
+from dotenv import load_dotenv
+from backend.monitor import LogHistogram
+from backend.transport import get_transport
+
+load_dotenv()
+
+# mtr-style path monitor: every PATH_MONITOR_INTERVAL seconds (0, the default, disables it)
+# each monitored path gets one probe per TTL, every path probed together in one round over
+# one socket (`ttl_probe_many`). Per hop we keep running sent/received counts, RTT stats and a log
+# histogram, plus whether the last PATH_MONITOR_WINDOW probes were answered - all fixed
+# size, so a path costs the same memory after a week as after a minute. A hop whose loss
+# doesn't carry on to the hops after it is a router rate limiting its ICMP, not real loss.
+PATH_MONITOR_INTERVAL = float(os.getenv('PATH_MONITOR_INTERVAL', '0'))
+# Comma separated hosts monitored from startup
+PATH_MONITOR_TARGETS = os.getenv('PATH_MONITOR_TARGETS', '')
+PATH_MONITOR_MAX_HOPS = int(os.getenv('PATH_MONITOR_MAX_HOPS', '30'))
+PATH_MONITOR_TIMEOUT = float(os.getenv('PATH_MONITOR_TIMEOUT', '1'))
+PATH_MONITOR_MAX_PATHS = int(os.getenv('PATH_MONITOR_MAX_PATHS', '64'))
+PATH_MONITOR_WINDOW = int(os.getenv('PATH_MONITOR_WINDOW', '100'))
+
+# Path changes kept per path
+MAX_CHANGES = 20
+# Other addresses remembered per hop (ECMP routers answering in turn)
+MAX_OTHER_RESPONDERS = 4
+# Loss over the loss of the hops after it that makes a hop "rate limited"
+RATE_LIMIT_MARGIN = 0.1
+
+class HopStats:
+    """Running stats of one TTL of a path, updated in O(1) per probe."""
+
+    __slots__ = ('ttl', 'ip', 'sent', 'received', 'last_ms', 'best_ms', 'worst_ms', '_mean', '_m2',
+                 '_jitter_total', 'histogram', '_recent', '_recent_next', '_recent_sent', '_recent_lost', 'others')
+
+    def __init__(self, ttl: int, window: int = PATH_MONITOR_WINDOW):
+        self.ttl = ttl
+        self._recent = bytearray(window)
+        self.others: Dict[str, int] = {}
+        self.reset(None)
+
+    def reset(self, ip: Optional[str]):
+        """Starts over for a new router at this TTL."""
+        self.ip = ip
+        self.sent = self.received = 0
+        self.last_ms = self.best_ms = self.worst_ms = None
+        self._mean = self._m2 = self._jitter_total = 0.0
+        self.histogram = LogHistogram()
+        self._recent[:] = bytes(len(self._recent))
+        self._recent_next = self._recent_sent = self._recent_lost = 0
+        self.others.clear()
+
+    def observe(self, rtt_ms: Optional[float]):
+        """One probe of this TTL, None if it went unanswered."""
+        self.sent += 1
+        lost = rtt_ms is None
+        # Ring of lost flags over the last `window` probes, with the number lost kept alongside
+        if self._recent_sent == len(self._recent):
+            self._recent_lost -= self._recent[self._recent_next]
+        else:
+            self._recent_sent += 1
+        self._recent[self._recent_next] = lost
+        self._recent_lost += lost
+        self._recent_next = (self._recent_next + 1) % len(self._recent)
+        if lost:
+            return
+        self.received += 1
+        if self.last_ms is not None:
+            self._jitter_total += abs(rtt_ms - self.last_ms)
+        self.last_ms = rtt_ms
+        self.best_ms = rtt_ms if self.best_ms is None else min(self.best_ms, rtt_ms)
+        self.worst_ms = rtt_ms if self.worst_ms is None else max(self.worst_ms, rtt_ms)
+        # Welford's, for the mean and standard deviation without keeping the samples
+        delta = rtt_ms - self._mean
+        self._mean += delta / self.received
+        self._m2 += delta * (rtt_ms - self._mean)
+        self.histogram.observe(rtt_ms)
+
+    def note_other(self, ip: str):
+        if ip in self.others or len(self.others) < MAX_OTHER_RESPONDERS:
+            self.others[ip] = self.others.get(ip, 0) + 1
+
+    @property
+    def loss(self) -> Optional[float]:
+        return 1 - self.received / self.sent if self.sent else None
+
+    @property
+    def avg_ms(self) -> Optional[float]:
+        return self._mean if self.received else None
+
+    @property
+    def recent_loss(self) -> Optional[float]:
+        return self._recent_lost / self._recent_sent if self._recent_sent else None
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            'hop': self.ttl,
+            'ip': self.ip,
+            'sent': self.sent,
+            'received': self.received,
+            'loss': self.loss,
+            'recent_loss': self.recent_loss,
+            'last_ms': self.last_ms,
+            'best_ms': self.best_ms,
+            'avg_ms': self.avg_ms,
+            'worst_ms': self.worst_ms,
+            'stdev_ms': math.sqrt(self._m2 / (self.received - 1)) if self.received > 1 else None,
+            'jitter_ms': self._jitter_total / (self.received - 1) if self.received > 1 else None,
+            'p50_ms': self.histogram.percentile(50),
+            'p90_ms': self.histogram.percentile(90),
+            'other_ips': dict(self.others),
+        }
+
+class MonitoredPath:
+    def __init__(self, target: str, target_ip: str, max_hops: int = PATH_MONITOR_MAX_HOPS, window: int = PATH_MONITOR_WINDOW):
+        self.target = target
+        self.target_ip = target_ip
+        self.max_hops = max_hops
+        self.rounds = 0
+        self.hops = [HopStats(ttl, window) for ttl in range(1, max_hops + 1)]
+        # TTL the target answers at, None until it did
+        self.length: Optional[int] = None
+        self.changes: Deque[Dict[str, Any]] = deque(maxlen=MAX_CHANGES)
+        self.updated_at: Optional[float] = None
+
+    @property
+    def probes(self) -> int:
+        """TTLs to probe next round: up to the target once its distance is known."""
+        return self.length or self.max_hops
+
+    def _change(self, timestamp: float, ttl: int, before: Optional[str], after: Optional[str]):
+        self.changes.append({'timestamp': timestamp, 'hop': ttl, 'from': before, 'to': after})
+
+    def record(self, timestamp: float, answers: List[Optional[Tuple[str, float]]]):
+        """One round: (responder, RTT) or None per TTL from 1."""
+        self.rounds += 1
+        self.updated_at = timestamp
+        reached = next((ttl for ttl, answer in enumerate(answers, 1) if answer and answer[0] == self.target_ip), None)
+        if reached is not None and reached != self.length:
+            # Past the target, the TTLs are the target again: nothing to keep
+            for hop in self.hops[reached:]:
+                if hop.sent:
+                    hop.reset(None)
+            self.length = reached
+        elif reached is None and self.length is not None and len(answers) >= self.length and answers[self.length - 1] is not None:
+            # Something else answers where the target used to: the path got longer, probe every TTL again
+            self.length = None
+        for hop, answer in zip(self.hops, answers[:self.probes]):
+            if answer is None:
+                hop.observe(None)
+                continue
+            ip, rtt = answer
+            if hop.ip is None:
+                hop.ip = ip
+            elif ip != hop.ip:
+                if ip in hop.others:
+                    # A responder seen at this TTL before: load balancing, not a new route
+                    hop.note_other(ip)
+                else:
+                    # A new router at this TTL (or the target moving): the stats start over
+                    self._change(timestamp, hop.ttl, hop.ip, ip)
+                    previous = hop.ip
+                    hop.reset(ip)
+                    hop.note_other(previous)
+            hop.observe(rtt)
+
+    def hop_stats(self) -> List[Dict[str, Any]]:
+        """
+        Per hop stats up to the target (or the last hop that ever answered),
+        with `forwarded_loss`, the recent loss that carries on to every later
+        hop, i.e. the loss of the path itself; a hop well above it only drops
+        the probes addressed to it.
+        """
+        last = self.length or max((hop.ttl for hop in self.hops if hop.received), default=0)
+        hops = [hop.to_json() for hop in self.hops[:last]]
+        forwarded = None
+        for hop in reversed(hops):
+            loss = hop['recent_loss']
+            if loss is not None and hop['received']:
+                forwarded = loss if forwarded is None else min(forwarded, loss)
+            hop['forwarded_loss'] = forwarded
+            hop['rate_limited'] = loss is not None and forwarded is not None and loss - forwarded > RATE_LIMIT_MARGIN
+        return hops
+
+    def summary(self) -> Dict[str, Any]:
+        destination = self.hops[self.length - 1] if self.length else None
+        return {
+            'target': self.target,
+            'target_ip': self.target_ip,
+            'rounds': self.rounds,
+            'reached': self.length is not None,
+            'hop_count': self.length,
+            'loss': destination.recent_loss if destination else None,
+            'avg_ms': destination.avg_ms if destination else None,
+            'path_changes': len(self.changes),
+            'updated_at': self.updated_at,
+        }
+
+    def to_json(self) -> Dict[str, Any]:
+        return self.summary() | {'hops': self.hop_stats(), 'changes': list(self.changes)}
+
+class PathMonitor:
+    """Probes every path each `interval` seconds in one `ttl_probe_many` round."""
+
+    def __init__(self, interval: float = 1, timeout: float = PATH_MONITOR_TIMEOUT,
+                 max_paths: int = PATH_MONITOR_MAX_PATHS, window: int = PATH_MONITOR_WINDOW, transport=None):
+        self.interval = interval
+        self.timeout = timeout
+        self.max_paths = max_paths
+        self.window = window
+        self.transport = transport
+        self.paths: Dict[str, MonitoredPath] = {}
+        # Bumped after every round, the event streams wait on it
+        self.version = 0
+        self._changed = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add_path(self, target: str, max_hops: int = PATH_MONITOR_MAX_HOPS) -> MonitoredPath:
+        """
+        Starts monitoring `target` (a host name or IPv4 address). Raises
+        ValueError if it doesn't resolve or `max_paths` are already monitored.
+        """
+        with self._changed:
+            path = self.paths.get(target)
+            if path is not None:
+                return path
+            if len(self.paths) >= self.max_paths:
+                raise ValueError(f"At most {self.max_paths} paths can be monitored at once.")
+        try:
+            target_ip = socket.gethostbyname(target)
+        except socket.gaierror as e:
+            raise ValueError(f"Could not resolve host '{target}': {e}")
+        with self._changed:
+            return self.paths.setdefault(target, MonitoredPath(target, target_ip, max_hops, self.window))
+
+    def remove_path(self, target: str) -> bool:
+        with self._changed:
+            return self.paths.pop(target, None) is not None
+
+    def probe_round(self):
+        with self._changed:
+            paths = list(self.paths.values())
+        if not paths:
+            return
+        transport = self.transport or get_transport()
+        probes: Dict[str, int] = {}
+        for path in paths:
+            # Two names of one address share its probes
+            probes[path.target_ip] = max(probes.get(path.target_ip, 0), path.probes)
+        spacing = min(0.02, self.interval / 2 / max(probes.values()))
+        results = transport.ttl_probe_many(probes, timeout=self.timeout, spacing=spacing)
+        now = time.time()
+        with self._changed:
+            for path in paths:
+                if self.paths.get(path.target) is path:
+                    path.record(now, results.get(path.target_ip, []))
+            self.version += 1
+            self._changed.notify_all()
+
+    def wait_for_round(self, version: int, timeout: float) -> int:
+        """Blocks until a round after `version` finished (or `timeout`), returns the current version."""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    def snapshot(self, target: str) -> Optional[Dict[str, Any]]:
+        with self._changed:
+            path = self.paths.get(target)
+            return path.to_json() if path is not None else None
+
+    def summaries(self) -> List[Dict[str, Any]]:
+        with self._changed:
+            return [path.summary() for path in self.paths.values()]
+
+    def start(self) -> threading.Thread:
+        def probe_forever():
+            while not self._stop.is_set():
+                started = time.monotonic()
+                try:
+                    self.probe_round()
+                except Exception as e:
+                    logger.error(f"Path monitor round failed: {e}")
+                self._stop.wait(max(self.interval - (time.monotonic() - started), 0))
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=probe_forever, name='path-monitor', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+path_monitor: Optional[PathMonitor] = None
+
+def start_path_monitor(interval: float = PATH_MONITOR_INTERVAL, targets: str = PATH_MONITOR_TARGETS) -> PathMonitor:
+    global path_monitor
+    path_monitor = PathMonitor(interval=interval)
+    for target in (target.strip() for target in targets.split(',')):
+        if target:
+            try:
+                path_monitor.add_path(target)
+            except ValueError as e:
+                logger.error(f"Not monitoring the path to {target}: {e}")
+    path_monitor.start()
+    return path_monitor
@@ -0,0 +1,297 @@
+import asyncio
+from dataclasses import dataclass
+import errno
+import itertools
+import os
+import socket
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from venv import logger
+from dotenv import load_dotenv
+from backend import database
+from backend.transport import get_transport
+
+load_dotenv()
+
+# Port and service discovery for the devices the sweep found: asyncio TCP connects (or SYN
+# probes through the transport, PORTSCAN_MODE=syn, needs raw sockets), at most
+# PORTSCAN_CONCURRENCY connections in flight overall and PORTSCAN_HOST_RATE new ones per
+# second per device. Open ports of services that talk first (SSH, SMTP...) or answer a
+# HEAD (HTTP) get their banner. Every PORTSCAN_INTERVAL seconds (0 = off) only the devices
+# that are new, changed IP or haven't been scanned for PORTSCAN_MAX_AGE seconds are scanned.
+PORTSCAN_INTERVAL = float(os.getenv('PORTSCAN_INTERVAL', '0'))
+PORTSCAN_PROFILE = os.getenv('PORTSCAN_PROFILE', 'common')
+PORTSCAN_MODE = os.getenv('PORTSCAN_MODE', 'connect')
+PORTSCAN_CONCURRENCY = int(os.getenv('PORTSCAN_CONCURRENCY', '1024'))
+PORTSCAN_HOST_RATE = float(os.getenv('PORTSCAN_HOST_RATE', '500'))
+PORTSCAN_TIMEOUT = float(os.getenv('PORTSCAN_TIMEOUT', '1'))
+PORTSCAN_MAX_AGE = float(os.getenv('PORTSCAN_MAX_AGE', '86400'))
+
+# connect_ex() on a non-blocking socket: still connecting (WSAEWOULDBLOCK is Windows')
+CONNECT_IN_PROGRESS = {errno.EINPROGRESS, errno.EWOULDBLOCK, getattr(errno, 'WSAEWOULDBLOCK', 10035)}
+
+BANNER_TIMEOUT = 1.0
+BANNER_BYTES = 256
+
+SERVICES = {
+    20: 'ftp-data', 21: 'ftp', 22: 'ssh', 23: 'telnet', 25: 'smtp', 53: 'dns', 80: 'http',
+    110: 'pop3', 111: 'rpcbind', 135: 'msrpc', 139: 'netbios-ssn', 143: 'imap', 161: 'snmp',
+    389: 'ldap', 443: 'https', 445: 'smb', 465: 'smtps', 515: 'printer', 548: 'afp',
+    554: 'rtsp', 587: 'submission', 631: 'ipp', 636: 'ldaps', 873: 'rsync', 993: 'imaps',
+    995: 'pop3s', 1080: 'socks', 1194: 'openvpn', 1433: 'mssql', 1723: 'pptp', 1883: 'mqtt',
+    1900: 'upnp', 2049: 'nfs', 3000: 'http-alt', 3306: 'mysql', 3389: 'rdp', 5000: 'upnp',
+    5353: 'mdns', 5432: 'postgresql', 5900: 'vnc', 6379: 'redis', 7000: 'airplay',
+    8000: 'http-alt', 8008: 'http-alt', 8080: 'http-proxy', 8443: 'https-alt', 8883: 'mqtts',
+    8888: 'http-alt', 9000: 'http-alt', 9100: 'jetdirect', 9200: 'elasticsearch',
+    11211: 'memcached', 27017: 'mongodb', 32400: 'plex', 49152: 'upnp', 62078: 'iphone-sync',
+}
+# Services that send a greeting as soon as the connection is up
+GREETING_PORTS = {21, 22, 23, 25, 110, 143, 587, 3306, 5900}
+# Plain HTTP: a HEAD gets the status line and Server header
+HTTP_PORTS = {80, 3000, 5000, 7000, 8000, 8008, 8080, 8888, 9000, 32400}
+
+PROFILES = {
+    # The services a home/office LAN device typically exposes
+    'common': sorted(SERVICES),
+    # Every well-known port plus the common higher ones, ~1,070 ports
+    'extended': sorted(set(range(1, 1025)) | set(SERVICES)),
+}
+
+class PortScanError(Exception):
+    """Raised for a port profile that's neither a known name nor a list of ports/ranges"""
+    pass
+
+def parse_profile(profile: str) -> List[int]:
+    """A PROFILES name, or ports and ranges such as "22,80,8000-8100"."""
+    if profile in PROFILES:
+        return PROFILES[profile]
+    ports = set()
+    try:
+        for token in (token.strip() for token in profile.split(',')):
+            if not token:
+                continue
+            start, _, end = token.partition('-')
+            first, last = int(start), int(end or start)
+            if not 1 <= first <= last <= 65535:
+                raise ValueError
+            ports.update(range(first, last + 1))
+    except ValueError as e:
+        raise PortScanError(f"Invalid port profile {profile!r}") from e
+    if not ports:
+        raise PortScanError(f"Invalid port profile {profile!r}")
+    return sorted(ports)
+
+def max_concurrency(requested: int = PORTSCAN_CONCURRENCY) -> int:
+    """`requested`, capped below the file descriptor limit where there is one."""
+    try:
+        import resource
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    except (ImportError, ValueError, OSError):
+        return requested
+    if soft == resource.RLIM_INFINITY:
+        return requested
+    # Leave room for the DB, the Flask server and the other workers
+    return min(requested, max(soft - 128, 16))
+
+class RateLimiter:
+    """Token bucket: `rate` acquisitions per second, bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate / 10, 1)
+        self.clock = clock
+        self.tokens = self.burst
+        self.updated = clock()
+
+    def delay(self) -> float:
+        """Takes a token; returns how long to wait before using it (0 if one was available)."""
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    async def acquire(self):
+        wait = self.delay()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+@dataclass
+class OpenPort:
+    port: int
+    service: Optional[str]
+    banner: Optional[str] = None
+
+def _clean_banner(data: bytes) -> Optional[str]:
+    text = data.decode('utf-8', errors='replace').strip()
+    if not text:
+        return None
+    lines = text.splitlines()
+    if lines[0].startswith('HTTP/'):
+        server = next((line for line in lines if line.lower().startswith('server:')), None)
+        return f"{lines[0]} | {server}" if server else lines[0]
+    return lines[0][:BANNER_BYTES]
+
+def _resolve(future: asyncio.Future, result=None):
+    if not future.done():
+        future.set_result(result)
+
+def _can_watch_sockets(loop: asyncio.AbstractEventLoop) -> bool:
+    """Whether the loop has add_writer: Windows' default (proactor) loop doesn't."""
+    return isinstance(loop, asyncio.SelectorEventLoop)
+
+def _interleave(targets: Dict[str, List[int]]) -> Iterator[Tuple[str, int]]:
+    """(ip, port) round-robin over the hosts, so consecutive probes hit different devices."""
+    per_host = [zip(itertools.repeat(ip), ports) for ip, ports in targets.items()]
+    for probes in itertools.zip_longest(*per_host):
+        for probe in probes:
+            if probe is not None:
+                yield probe
+
+class PortScanner:
+    """
+    Runs `concurrency` worker coroutines over one interleaved (ip, port) queue,
+    the number of workers being the in-flight limit. Probes are bare
+    non-blocking sockets (no stream objects) so the event loop, not Python
+    bookkeeping, is what a scan costs.
+    """
+    def __init__(self, concurrency: int = PORTSCAN_CONCURRENCY, host_rate: float = PORTSCAN_HOST_RATE,
+                 timeout: float = PORTSCAN_TIMEOUT, banners: bool = True, mode: str = PORTSCAN_MODE, transport=None):
+        self.concurrency = max_concurrency(concurrency)
+        self.host_rate = host_rate
+        self.timeout = timeout
+        self.banners = banners
+        self.mode = mode
+        self.transport = transport
+        self.probes = 0
+
+    async def _connect(self, ip: str, port: int) -> Optional[socket.socket]:
+        """
+        Connected socket, None if refused or timed out. Waits on writability
+        directly rather than through sock_connect + wait_for, which cost a task
+        and several callbacks per probe, on the loops that can (not proactor).
+        """
+        loop = asyncio.get_running_loop()
+        sock = socket.socket(socket.AF_INET6 if ':' in ip else socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        if not _can_watch_sockets(loop):
+            try:
+                await asyncio.wait_for(loop.sock_connect(sock, (ip, port)), self.timeout)
+            except (OSError, asyncio.TimeoutError):
+                sock.close()
+                return None
+            return sock
+        error = sock.connect_ex((ip, port))
+        if error in CONNECT_IN_PROGRESS:
+            done = loop.create_future()
+            fd = sock.fileno()
+            loop.add_writer(fd, _resolve, done)
+            timer = loop.call_later(self.timeout, _resolve, done, 'timeout')
+            try:
+                await done
+            finally:
+                loop.remove_writer(fd)
+                timer.cancel()
+            error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) if done.result() is None else errno.ETIMEDOUT
+        if error:
+            sock.close()
+            return None
+        return sock
+
+    async def _banner(self, sock: socket.socket, port: int) -> Optional[str]:
+        loop = asyncio.get_running_loop()
+        try:
+            if port in HTTP_PORTS:
+                await loop.sock_sendall(sock, b'HEAD / HTTP/1.0\r\nUser-Agent: network-diagnostics\r\n\r\n')
+            elif port not in GREETING_PORTS:
+                return None
+            return _clean_banner(await asyncio.wait_for(loop.sock_recv(sock, BANNER_BYTES), BANNER_TIMEOUT))
+        except (OSError, asyncio.TimeoutError):
+            return None
+
+    async def _probe(self, ip: str, port: int) -> Optional[OpenPort]:
+        self.probes += 1
+        sock = await self._connect(ip, port)
+        if sock is None:
+            return None
+        with sock:
+            banner = await self._banner(sock, port) if self.banners else None
+        return OpenPort(port, SERVICES.get(port), banner)
+
+    async def _connect_scan(self, targets: Dict[str, List[int]]) -> Dict[str, List[OpenPort]]:
+        limiters = {ip: RateLimiter(self.host_rate) for ip in targets}
+        found: Dict[str, List[OpenPort]] = {ip: [] for ip in targets}
+        queue = _interleave(targets)
+
+        async def worker():
+            for ip, port in queue:
+                await limiters[ip].acquire()
+                result = await self._probe(ip, port)
+                if result is not None:
+                    found[ip].append(result)
+
+        total = sum(len(ports) for ports in targets.values())
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, total))))
+        for results in found.values():
+            results.sort(key=lambda result: result.port)
+        return found
+
+    async def _syn_scan(self, hosts: List[str], ports: List[int]) -> Dict[str, List[OpenPort]]:
+        transport = self.transport or get_transport()
+        # One sr() per host in the default thread pool, which bounds them too
+        open_ports = await asyncio.gather(*(asyncio.to_thread(transport.syn_scan, ip, ports, self.timeout) for ip in hosts))
+        self.probes += len(hosts) * len(ports)
+        targets = dict(zip(hosts, open_ports))
+        if not self.banners:
+            return {ip: [OpenPort(port, SERVICES.get(port)) for port in ports] for ip, ports in targets.items()}
+        # Only the open ports get a full connection, for their banner; a port that
+        # answered the SYN but refused the connect since is still reported
+        connected = await self._connect_scan(targets)
+        results = {}
+        for ip, ports in targets.items():
+            by_port = {result.port: result for result in connected[ip]}
+            results[ip] = [by_port.get(port) or OpenPort(port, SERVICES.get(port)) for port in ports]
+        return results
+
+    async def scan_async(self, hosts: Iterable[str], ports: List[int]) -> Dict[str, List[OpenPort]]:
+        hosts = list(dict.fromkeys(hosts))
+        if self.mode == 'syn':
+            return await self._syn_scan(hosts, ports)
+        return await self._connect_scan({ip: ports for ip in hosts})
+
+    def scan(self, hosts: Iterable[str], ports: List[int]) -> Dict[str, List[OpenPort]]:
+        return asyncio.run(self.scan_async(hosts, ports))
+
+def scan_devices(devices: List[Tuple[str, str]], profile: str = PORTSCAN_PROFILE, scanner: Optional[PortScanner] = None) -> Dict[str, List[OpenPort]]:
+    """Scans (mac, ip) devices with `profile` and stores the results, returns them by MAC."""
+    ports = parse_profile(profile)
+    if not devices:
+        return {}
+    scanner = scanner or PortScanner()
+    by_ip = scanner.scan([ip for _, ip in devices], ports)
+    database.save_port_scan_db(
+        ((mac, ip, [(result.port, result.service, result.banner) for result in by_ip[ip]]) for mac, ip in devices),
+        profile,
+    )
+    return {mac: by_ip[ip] for mac, ip in devices}
+
+def scan_stale_devices(profile: str = PORTSCAN_PROFILE, max_age: Optional[float] = None, scanner: Optional[PortScanner] = None) -> Dict[str, List[OpenPort]]:
+    """Incremental scan: only devices that are new, changed IP or were scanned over `max_age` (PORTSCAN_MAX_AGE) ago."""
+    max_age = PORTSCAN_MAX_AGE if max_age is None else max_age
+    return scan_devices(database.get_devices_to_port_scan_db(profile, max_age), profile, scanner)
+
+def start_port_scanner(interval: float = PORTSCAN_INTERVAL, profile: str = PORTSCAN_PROFILE) -> threading.Thread:
+    def scan_forever():
+        while True:
+            try:
+                scanned = scan_stale_devices(profile)
+                if scanned:
+                    logger.info(f"Port scanned {len(scanned)} devices")
+            except Exception as e:
+                logger.error(f"Port scan failed: {e}")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=scan_forever, name='port-scanner', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,104 @@
+from datetime import datetime
+import os
+import threading
+import time
+from typing import Dict, Optional
+from venv import logger
+from dotenv import load_dotenv
+from backend import database
+from backend.transport import get_transport
+
+load_dotenv()
+
+# Device presence: every PRESENCE_INTERVAL seconds (0 = off) each device seen in the last
+# PRESENCE_FORGET_AFTER seconds gets a unicast ARP who-has to its last known MAC, all of
+# them in one exchange (transport.arp_probe_many), so a cycle lasts about one round trip
+# however many devices there are. A device that misses PRESENCE_UNRESPONSIVE_MISSES
+# cycles in a row is 'unresponsive', PRESENCE_OFFLINE_MISSES 'offline'; one answer makes
+# it 'online' again. Status changes are written with a single UPDATE per cycle.
+PRESENCE_INTERVAL = float(os.getenv('PRESENCE_INTERVAL', '30'))
+PRESENCE_TIMEOUT = float(os.getenv('PRESENCE_TIMEOUT', '1'))
+PRESENCE_UNRESPONSIVE_MISSES = int(os.getenv('PRESENCE_UNRESPONSIVE_MISSES', '2'))
+PRESENCE_OFFLINE_MISSES = int(os.getenv('PRESENCE_OFFLINE_MISSES', '5'))
+PRESENCE_FORGET_AFTER = float(os.getenv('PRESENCE_FORGET_AFTER', '604800'))
+
+ONLINE = 'online'
+UNRESPONSIVE = 'unresponsive'
+OFFLINE = 'offline'
+
+class PresenceTracker:
+    """Consecutive missed checks per MAC, and the status they put each device in."""
+
+    def __init__(self, transport=None, timeout: float = PRESENCE_TIMEOUT,
+                 unresponsive_misses: int = PRESENCE_UNRESPONSIVE_MISSES, offline_misses: int = PRESENCE_OFFLINE_MISSES,
+                 forget_after: float = PRESENCE_FORGET_AFTER):
+        if not 0 < unresponsive_misses <= offline_misses:
+            raise ValueError("Need 0 < unresponsive misses <= offline misses")
+        self.transport = transport
+        self.timeout = timeout
+        self.unresponsive_misses = unresponsive_misses
+        self.offline_misses = offline_misses
+        self.forget_after = forget_after
+        self.misses: Dict[str, int] = {}
+
+    def status(self, misses: int) -> str:
+        if misses >= self.offline_misses:
+            return OFFLINE
+        return UNRESPONSIVE if misses >= self.unresponsive_misses else ONLINE
+
+    def _known_misses(self, mac: str, status: Optional[str]) -> int:
+        misses = self.misses.get(mac)
+        # First check since a restart: carry on from the stored status
+        if misses is None:
+            return {OFFLINE: self.offline_misses, UNRESPONSIVE: self.unresponsive_misses}.get(status, 0)
+        # The sweep saw it since we counted it as gone
+        if status == ONLINE and misses >= self.unresponsive_misses:
+            return 0
+        return misses
+
+    def check(self) -> Dict[str, str]:
+        """
+        One presence cycle. Returns the {mac: status} written: every device that
+        answered (its last_seen moves) plus the ones whose status changed.
+        """
+        now = datetime.now()
+        seen_since = datetime.fromtimestamp(now.timestamp() - self.forget_after).strftime('%Y-%m-%dT%H:%M:%S.%f')
+        devices = database.get_presence_targets_db(seen_since)
+        if not devices:
+            return {}
+        # Least recently seen first: when two MACs last had the same IP the newest one is probed
+        targets = {ip: mac.lower() for mac, ip, _ in devices}
+        replies = (self.transport or get_transport()).arp_probe_many(targets, timeout=self.timeout)
+        updates = {}
+        for mac, ip, status in devices:
+            if replies.get(ip) == mac.lower():
+                misses = 0
+            else:
+                misses = self._known_misses(mac, status) + 1
+            self.misses[mac] = min(misses, self.offline_misses)
+            new_status = self.status(misses)
+            if misses == 0 or new_status != status:
+                updates[mac] = new_status
+        database.update_presence_db(updates, now.strftime('%Y-%m-%dT%H:%M:%S.%f'))
+        return updates
+
+presence_tracker: Optional[PresenceTracker] = None
+
+def start_presence_tracker(interval: float = PRESENCE_INTERVAL) -> threading.Thread:
+    global presence_tracker
+    presence_tracker = PresenceTracker()
+
+    def check_forever():
+        while True:
+            try:
+                changed = presence_tracker.check()
+                offline = sum(1 for status in changed.values() if status == OFFLINE)
+                if offline:
+                    logger.info(f"Presence: {offline} devices went offline")
+            except Exception as e:
+                logger.error(f"Presence check failed: {e}")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=check_forever, name='presence', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,153 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import wraps
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+SLOW_REQUEST_MS = float(os.getenv('SLOW_REQUEST_MS', '1000'))
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0.05'))
+SLOW_REQUEST_BUFFER = int(os.getenv('SLOW_REQUEST_BUFFER', '20'))
+PROFILE_TOP_FUNCTIONS = 40
+
+# Time spent in DB calls / subprocesses for the request currently being handled. `None`
+# outside a request (background scan thread, executors), so `track()` is a no-op there.
+_request_timings: ContextVar[dict | None] = ContextVar('request_timings', default=None)
+
+# Only one cProfile can be active at a time (since 3.12 it hooks sys.monitoring, which is
+# process wide), so concurrent sampled requests skip profiling instead of failing.
+_profiler_lock = threading.Lock()
+
+slow_requests: deque = deque(maxlen=SLOW_REQUEST_BUFFER)
+
+@dataclass
+class SlowRequest:
+    request_id: str
+    method: str
+    path: str
+    status: int
+    duration_ms: float
+    db_ms: float
+    subprocess_ms: float
+    timestamp: str
+    profile: str | None = None
+
+    def summary(self) -> dict:
+        return {
+            'request_id': self.request_id,
+            'method': self.method,
+            'path': self.path,
+            'status': self.status,
+            'duration_ms': self.duration_ms,
+            'db_ms': self.db_ms,
+            'subprocess_ms': self.subprocess_ms,
+            'timestamp': self.timestamp,
+            'profiled': self.profile is not None,
+        }
+
+@dataclass
+class RequestProfile:
+    start: float = field(default_factory=time.perf_counter)
+    timings: dict = field(default_factory=lambda: {'db': 0.0, 'subprocess': 0.0})
+    profiler: cProfile.Profile | None = None
+    token: object = None
+
+    def close(self) -> cProfile.Profile | None:
+        """Stops the profiler and detaches the timings; safe to call more than once."""
+        profiler, self.profiler = self.profiler, None
+        if profiler is not None:
+            profiler.disable()
+            _profiler_lock.release()
+        if self.token is not None:
+            _request_timings.reset(self.token)
+            self.token = None
+        return profiler
+
+@contextmanager
+def track(kind: str):
+    """Add the time spent in the `with` block to the current request's `kind` bucket."""
+    timings = _request_timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[kind] = timings.get(kind, 0.0) + (time.perf_counter() - start)
+
+def tracked(kind: str):
+    """Decorator form of `track`"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with track(kind):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def begin_request() -> RequestProfile:
+    profile = RequestProfile()
+    profile.token = _request_timings.set(profile.timings)
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE and _profiler_lock.acquire(blocking=False):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            profile.profiler = profiler
+        except ValueError:
+            # Another profiling tool (a debugger, a manual cProfile run) already owns the hook
+            _profiler_lock.release()
+    return profile
+
+def end_request(profile: RequestProfile, request_id: str, method: str, path: str, status: int) -> float:
+    """
+    Stops timing/profiling for a request, logs its breakdown and keeps it in the
+    slow-request ring buffer when it went over `SLOW_REQUEST_MS`. Returns the duration in ms.
+    """
+    duration_ms = (time.perf_counter() - profile.start) * 1000
+    profiler = profile.close()
+
+    db_ms = round(profile.timings.get('db', 0.0) * 1000, 1)
+    subprocess_ms = round(profile.timings.get('subprocess', 0.0) * 1000, 1)
+    logger.info(
+        f"request {request_id} {method} {path} -> {status} in {duration_ms:.1f}ms "
+        f"(db {db_ms}ms, subprocess {subprocess_ms}ms)"
+    )
+
+    if duration_ms >= SLOW_REQUEST_MS:
+        slow_requests.append(SlowRequest(
+            request_id=request_id,
+            method=method,
+            path=path,
+            status=status,
+            duration_ms=round(duration_ms, 1),
+            db_ms=db_ms,
+            subprocess_ms=subprocess_ms,
+            timestamp=datetime.now().isoformat(),
+            profile=format_profile(profiler) if profiler is not None else None,
+        ))
+    return duration_ms
+
+def format_profile(profiler: cProfile.Profile) -> str:
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_TOP_FUNCTIONS)
+    return out.getvalue()
+
+def get_slow_request(request_id: str) -> SlowRequest | None:
+    for slow_request in slow_requests:
+        if slow_request.request_id == request_id:
+            return slow_request
+    return None
@@ -0,0 +1,89 @@
+from array import array
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+class RingBuffer:
+    """
+    Fixed-capacity columnar ring of doubles. Column 0 is the timestamp and must be
+    appended in non-decreasing order, which lets `window` binary-search it.
+    """
+    def __init__(self, capacity: int, fields: Iterable[str]):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.fields = ('timestamp', *fields)
+        self._columns = [array('d', bytes(8 * capacity)) for _ in self.fields]
+        self._start = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, values: Iterable[float]):
+        """Appends one row (timestamp first), overwriting the oldest row when full."""
+        with self._lock:
+            if self._count < self.capacity:
+                index = (self._start + self._count) % self.capacity
+                self._count += 1
+            else:
+                index = self._start
+                self._start = (self._start + 1) % self.capacity
+            for column, value in zip(self._columns, values):
+                column[index] = value
+
+    def _bisect(self, timestamp: float) -> int:
+        """Logical index of the first row with a timestamp >= `timestamp`."""
+        timestamps = self._columns[0]
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if timestamps[(self._start + mid) % self.capacity] < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _segments(self, first: int, last: int) -> List[Tuple[int, int]]:
+        """Physical [start, stop) ranges covering logical rows [first, last) - at most two."""
+        if first >= last:
+            return []
+        begin = (self._start + first) % self.capacity
+        end = begin + (last - first)
+        if end <= self.capacity:
+            return [(begin, end)]
+        return [(begin, self.capacity), (0, end - self.capacity)]
+
+    def window(self, start: Optional[float] = None, end: Optional[float] = None) -> Dict[str, array]:
+        """
+        Rows with start <= timestamp < end, one array per field. Only the window is
+        copied (as at most two memoryview slices per column), never the whole ring.
+        """
+        with self._lock:
+            first = self._bisect(start) if start is not None else 0
+            last = self._bisect(end) if end is not None else self._count
+            segments = self._segments(first, last)
+            result = {}
+            for name, column in zip(self.fields, self._columns):
+                view = memoryview(column)
+                values = array('d')
+                for begin, stop in segments:
+                    values.frombytes(view[begin:stop].cast('B'))
+                result[name] = values
+            return result
+
+    def iter_rows(self, start: Optional[float] = None, end: Optional[float] = None) -> Iterator[Tuple[float, ...]]:
+        """Rows of `window(start, end)` as tuples."""
+        window = self.window(start, end)
+        return zip(*(window[name] for name in self.fields))
+
+    def latest(self) -> Optional[Tuple[float, ...]]:
+        with self._lock:
+            if not self._count:
+                return None
+            index = (self._start + self._count - 1) % self.capacity
+            return tuple(column[index] for column in self._columns)
+
+def window_to_json(window: Dict[str, array]) -> Dict[str, List[Optional[float]]]:
+    """Column arrays to JSON-safe lists (NaN -> None)."""
+    return {name: [None if value != value else value for value in values] for name, values in window.items()}
@@ -1,14 +1,33 @@
+from dataclasses import asdict
 from ipaddress import ip_address
+import json
 import logging
 import time
 from dotenv import load_dotenv
 from datetime import datetime
-from backend.mac_utils import get_net_mask
-from backend.traceroute import traceroute_host
+from backend.mac_utils import get_net_mask, normalize_mac
+from backend.metrics import render_metrics
+from backend.profiling import get_slow_request, slow_requests
+from backend.serialization import encoded_response
+from backend.snapshot import warm_state
+from backend.traceroute import MAX_HOPS, MAX_TIMEOUT, traceroute_host
 from backend.utils import get_hostname, net_config, ping_host
-from backend.database import Device, delete_label_db, get_db, get_devices_with_label_db, update_devices_label_db
-from backend.wifi import get_neighbor_nets, get_wifi_signal_quality
-from flask import request, jsonify, abort, Blueprint, request, current_app
+from backend import database
+from backend.database import Device, delete_label_db, get_device_fingerprints_db, get_device_ips_db, get_device_ports_db, get_device_services_db, devices_version, get_db, get_devices_with_label_db, import_labels_db, iter_labels_db, update_devices_label_db
+from backend.labels import FORMATS, LabelImport, UnsupportedFormat, iter_export, iter_import_records
+from backend.wifi import AdapterResetRateLimited, get_neighbor_snapshot, get_wifi_signal_quality, neighbor_scan_cache
+from backend import monitor, pathmonitor, wifi_sampler
+from backend import discovery
+from backend.admission import AdmissionController, AdmissionRejected, throughput_admission, traceroute_admission, wifi_admission
+from backend.coalesce import COALESCE_TIMEOUT, CoalesceTimeout, SingleFlight
+from backend.dhcp import MAX_PROBE_TIMEOUT, dhcp_monitor
+from backend.fingerprint import fingerprint_stale_devices
+from backend.jobs import FINISHED as JOB_FINISHED, JobError, job_manager
+from backend.portscan import PORTSCAN_PROFILE, PortScanError, parse_profile, scan_devices, scan_stale_devices
+from backend.services import get_service_checker, result_to_json
+from backend.throughput import DEFAULT_PORT, MAX_DURATION, MAX_RATE_MBPS, MAX_STREAMS, ThroughputError, run_tcp_test, run_udp_test
+from backend.ringbuffer import window_to_json
+from flask import request, jsonify, abort, Blueprint, request, current_app, Response
 import socket
 
 load_dotenv()
@@ -16,16 +35,47 @@ load_dotenv()
 routes = Blueprint("routes", __name__)
 
 health_route = '/api/health'
+metrics_route = '/metrics'
+debug_slow_requests_route = '/api/debug/slow-requests'
+debug_slow_request_route = '/api/debug/slow-requests/<request_id>'
+debug_admission_route = '/api/debug/admission'
 network_info_route = '/api/network/info'
 ping_route = '/api/ping/<ip>'
 dns_route = '/api/dns/'
 wifi_route = '/api/wifi/scan'
 wifi_neighbor_route = '/api/wifi/scan/neighbor'
+wifi_samples_route = '/api/wifi/samples'
 traceroute_route = '/api/traceroute'
 devices_route = '/api/devices'
 devices_update_route = '/api/devices/update/<mac>/label'
 devices_delete_route = '/api/devices/delete/<mac>/label'
 devices_leasetime_route = '/api/devices/lease_time'
+monitor_route = '/api/monitor'
+monitor_target_route = '/api/monitor/<target>'
+monitor_targets_route = '/api/monitor/targets'
+monitor_delete_target_route = '/api/monitor/targets/<target>'
+labels_import_route = '/api/devices/labels/import'
+labels_export_route = '/api/devices/labels/export'
+throughput_route = '/api/throughput'
+services_route = '/api/services'
+dhcp_servers_route = '/api/dhcp/servers'
+dhcp_probe_route = '/api/dhcp/probe'
+devices_ports_route = '/api/devices/ports'
+device_ports_route = '/api/devices/<mac>/ports'
+devices_ports_scan_route = '/api/devices/ports/scan'
+discovery_services_route = '/api/discovery/services'
+devices_fingerprints_route = '/api/devices/fingerprints'
+jobs_route = '/api/jobs'
+job_route = '/api/jobs/<job_id>'
+job_events_route = '/api/jobs/<job_id>/events'
+paths_route = '/api/paths'
+path_route = '/api/paths/<target>'
+path_events_route = '/api/paths/<target>/events'
+
+# Identical concurrent requests to these share one execution (see coalesce.py)
+dns_flight = SingleFlight('dns')
+wifi_flight = SingleFlight('wifi_scan')
+traceroute_flight = SingleFlight('traceroute')
 
 @routes.route(health_route)
 def health():
@@ -34,6 +84,31 @@ def health():
         'timestamp': datetime.now().isoformat()
     })
 
+@routes.route(metrics_route)
+def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@routes.route(debug_slow_requests_route)
+def list_slow_requests():
+    """Most recent slow requests, newest first (profiles are served per request ID)"""
+    return jsonify([slow_request.summary() for slow_request in reversed(slow_requests)])
+
+@routes.route(debug_slow_request_route)
+def slow_request_profile(request_id):
+    slow_request = get_slow_request(request_id)
+    if slow_request is None:
+        return jsonify(error={
+            "code": "not_found",
+            "message": f"No slow request recorded with id {request_id}.",
+        }), 404
+    return jsonify(slow_request.summary() | {'profile': slow_request.profile})
+
+@routes.route(debug_admission_route)
+def admission_stats():
+    """Slots in use, queue depth and rejections per admission-controlled endpoint"""
+    return jsonify([controller.stats() for controller in (wifi_admission, traceroute_admission, throughput_admission)])
+
 @routes.route(network_info_route)
 def network_info():
     local_ip = net_config.local_ip
@@ -55,9 +130,7 @@ def ping(ip):
             "message": "ip must be a valid IP address.",
         }), 400
 
-@routes.route(dns_route)
-def dns_test():
-    """Test DNS resolution"""
+def _test_dns():
     results = []
     
     test_domains = ['google.com', 'cloudflare.com', 'github.com']
@@ -82,29 +155,116 @@ def dns_test():
                     "message": "The domain could not be resolved."
                 },
             })
-    
-    return jsonify(results)
+    return results
+
+def _wait_timeout(default: float) -> float:
+    """How long this caller waits on a coalesced execution: `?wait=` seconds, at most `default`"""
+    wait = request.args.get('wait', type=float)
+    return default if wait is None or wait <= 0 else min(wait, default)
+
+def _coalesce_timeout_response(e: CoalesceTimeout):
+    return jsonify(error={
+        "code": "timeout",
+        "message": str(e),
+    }), 504
+
+def _admission_rejected_response(e: AdmissionRejected):
+    response = jsonify(error={
+        "code": e.reason,
+        "message": str(e),
+    })
+    if e.retry_after is not None:
+        response.headers['Retry-After'] = str(int(e.retry_after) + 1)
+    return response, e.status
+
+def _run_admitted(controller: AdmissionController, cost: float, fn, *args, **kwargs):
+    with controller.slot(cost):
+        return fn(*args, **kwargs)
+
+@routes.route(dns_route)
+def dns_test():
+    """Test DNS resolution"""
+    try:
+        return jsonify(dns_flight.run('dns', _test_dns, timeout=_wait_timeout(COALESCE_TIMEOUT)))
+    except CoalesceTimeout as e:
+        return _coalesce_timeout_response(e)
 
 @routes.route(wifi_neighbor_route)
 def wifi_neighbor_networks():
-    """Scan for nearby WiFi neighbor networks via native Windows Python"""
+    """
+    Nearby WiFi neighbor networks, from the cached scan. `?reset_adapter=1`
+    power-cycles the adapter first to force a rescan (rate-limited, drops the
+    connection for a few seconds).
+    """
+    reset_adapter = request.args.get('reset_adapter', default=False, type=lambda v: v.lower() in ('1', 'true', 'yes'))
     try:
-        wifi_neighbor = get_neighbor_nets() 
-        return jsonify(wifi_neighbor)
+        snapshot = get_neighbor_snapshot(reset_adapter=reset_adapter)
+    except AdapterResetRateLimited as e:
+        response = jsonify(error={
+            "code": "adapter_reset_rate_limited",
+            "message": str(e),
+        })
+        response.headers['Retry-After'] = str(int(e.retry_after) + 1)
+        return response, 429
     except Exception as e:
         print(f"WiFi scan error: {e}")
         return jsonify({'error': 'Error getting wifi neighbors'}), 500
 
+    response = encoded_response(lambda: snapshot.networks or None, cache_key=('wifi_neighbor', snapshot.version, snapshot.taken_at))
+    response.headers['Age'] = str(int(snapshot.age))
+    response.headers['X-Scan-Stale'] = 'true' if snapshot.age >= neighbor_scan_cache.max_age else 'false'
+    return response
+
 @routes.route(wifi_route)
 def wifi_scan():
     """Scan for nearby WiFi networks via native Windows Python"""
     try:
-        wifi_quality = get_wifi_signal_quality()
+        wifi_admission.check_rate(request.remote_addr)
+        wifi_quality = wifi_flight.run(
+            'wifi_scan',
+            lambda: _run_admitted(wifi_admission, 1, get_wifi_signal_quality),
+            timeout=_wait_timeout(COALESCE_TIMEOUT),
+        )
         return jsonify(wifi_quality)
+    except AdmissionRejected as e:
+        return _admission_rejected_response(e)
+    except CoalesceTimeout as e:
+        return _coalesce_timeout_response(e)
     except Exception as e:
         print(f"WiFi scan error: {e}")
         return jsonify({'error': 'WiFi scanning requires a native Windows Python with pywifi installed'}), 500
 
+@routes.route(wifi_samples_route)
+def wifi_samples():
+    """
+    Link samples from the background sampler as columns (`timestamp`, `signal_dbm`, ...).
+    `?resolution=` raw (default), 1s, 1m or 1h; `?seconds=` how far back (default 60).
+    Rollups have `<metric>_min`/`_max`/`_mean` columns.
+    """
+    sampler = wifi_sampler.wifi_sampler
+    if sampler is None:
+        return jsonify(error={
+            "code": "sampler_disabled",
+            "message": "The WiFi sampler isn't running (set WIFI_SAMPLER_HZ).",
+        }), 503
+
+    resolution = request.args.get('resolution', 'raw')
+    seconds = request.args.get('seconds', default=60, type=float)
+    if resolution != 'raw' and resolution not in sampler.rollups:
+        return jsonify(error={
+            "code": "invalid_resolution",
+            "message": f"resolution must be one of raw, {', '.join(sampler.rollups)}.",
+        }), 400
+
+    end = time.time()
+    window = sampler.window(resolution, start=end - seconds)
+    return jsonify({
+        'resolution': resolution,
+        'hz': sampler.hz,
+        'errors': sampler.errors,
+        'samples': window_to_json(window),
+    })
+
 @routes.route(traceroute_route)
 def traceroute():
     """Traceroute to a given host/URL, reporting where the path fails, if anywhere"""
@@ -114,10 +274,27 @@ def traceroute():
 
     max_hops = request.args.get('max_hops', default=20, type=int)
     timeout = request.args.get('timeout', default=1, type=int)
+    if not 1 <= max_hops <= MAX_HOPS or not 1 <= timeout <= MAX_TIMEOUT:
+        return jsonify(error={
+            "code": "invalid_parameters",
+            "message": f"max_hops must be 1-{MAX_HOPS} and timeout 1-{MAX_TIMEOUT} seconds.",
+        }), 400
 
+    # The traceroute subprocess alone may take max_hops * timeout (+10s) before it's killed,
+    # which is also what it costs against the endpoint's budget
+    wait = _wait_timeout(max(COALESCE_TIMEOUT, max_hops * timeout + 20))
     try:
-        result = traceroute_host(target, max_hops=max_hops, timeout=timeout)
+        traceroute_admission.check_rate(request.remote_addr)
+        result = traceroute_flight.run(
+            (target.strip().lower(), max_hops, timeout),
+            lambda: _run_admitted(traceroute_admission, max_hops * timeout, traceroute_host, target, max_hops=max_hops, timeout=timeout),
+            timeout=wait,
+        )
         return jsonify(result)
+    except AdmissionRejected as e:
+        return _admission_rejected_response(e)
+    except CoalesceTimeout as e:
+        return _coalesce_timeout_response(e)
     except ValueError as e:
         abort(400, description=str(e))
     except Exception as e:
@@ -126,28 +303,36 @@ def traceroute():
         
 @routes.route(devices_route)
 def get_devices():
-    # lease_time = get_lease_time()
-    rows:list[Device] = get_devices_with_label_db()
-    devices = []
-    for row in rows:
-        # ip = row['ip']
-        # Try to get the hostname (might be None if still processing)
-        # hostname = get_hostname(ip)
-        hostname = get_hostname(row['ip'])
-        if hostname is not None:
-            device = dict(row) | {
-                'hostname': hostname
-            }
-        else:
-            device = dict(row)
-        devices.append(device)
-    
-    logging.info(devices)
-    
-    return jsonify({
-        'devices': devices,
-        # 'lease_time': lease_time
-    })
+    def build():
+        # lease_time = get_lease_time()
+        rows:list[Device] = get_devices_with_label_db()
+        devices = []
+        for row in rows:
+            # Try to get the hostname (might be None if still processing)
+            hostname = get_hostname(row['ip'])
+            if hostname is not None:
+                device = dict(row) | {
+                    'hostname': hostname
+                }
+            else:
+                device = dict(row)
+            # Every IPv6 address the device was seen with, `ip` being its IPv4 one when it has one
+            device['ipv6'] = device['ipv6'].split(' ') if device.get('ipv6') else []
+            devices.append(device)
+
+        logging.info(devices)
+
+        return {
+            'devices': devices,
+            # True while these are still the warm-start snapshot, until the first sweep
+            'stale': warm_state.stale,
+            # 'lease_time': lease_time
+        }
+
+    # Every write to devices/labels (and every finished hostname lookup) bumps the version
+    response = encoded_response(build, cache_key=('devices', database.DB_PATH, devices_version(), warm_state.stale))
+    response.headers['X-Data-Stale'] = 'true' if warm_state.stale else 'false'
+    return response
 
 @routes.route(devices_update_route, methods=['PUT'])
 def set_device_label(mac):
@@ -180,3 +365,477 @@ def delete_device_label(mac):
         return jsonify({'error': f'No label found for mac {normalized_mac}'}), 404
 
     return jsonify({'mac': normalized_mac, 'deleted': True})
+
+@routes.route(labels_import_route, methods=['POST'])
+def import_labels():
+    """
+    Bulk label import, streamed: NDJSON (`{"mac": ..., "label": ...}` per line,
+    application/x-ndjson) or CSV with a `mac,label` header (text/csv). Valid rows
+    are written 500 per transaction, invalid ones are reported per line.
+    """
+    try:
+        records = iter_import_records(request.stream, request.content_type)
+    except UnsupportedFormat as e:
+        return jsonify(error={
+            "code": "invalid_content_type",
+            "message": str(e),
+        }), 415
+
+    result = LabelImport()
+    imported = import_labels_db(result.validate(records))
+    return jsonify({
+        'rows': result.rows,
+        'imported': imported,
+        'error_count': result.error_count,
+        'errors': result.errors,
+    })
+
+@routes.route(labels_export_route)
+def export_labels():
+    """Every label as NDJSON (default) or `?format=csv`, streamed row by row."""
+    fmt = request.args.get('format', 'ndjson').lower()
+    if fmt not in FORMATS:
+        return jsonify(error={
+            "code": "invalid_format",
+            "message": f"format must be one of {', '.join(FORMATS)}.",
+        }), 400
+    response = Response(iter_export(iter_labels_db(), fmt), mimetype=FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename=labels.{fmt}'
+    return response
+
+def _monitor_disabled():
+    return jsonify(error={
+        "code": "monitor_disabled",
+        "message": "The latency monitor isn't running (set MONITOR_INTERVAL).",
+    }), 503
+
+@routes.route(monitor_route)
+def monitor_targets():
+    """Latest round and overall p50/p99 of every monitored target"""
+    latency_monitor = monitor.latency_monitor
+    if latency_monitor is None:
+        return _monitor_disabled()
+    return jsonify({
+        'interval': latency_monitor.interval,
+        'probes': latency_monitor.probes,
+        'targets': [series.summary() for series in list(latency_monitor.series.values())],
+    })
+
+@routes.route(monitor_target_route)
+def monitor_target(target):
+    """
+    Per-round series (loss, percentiles, jitter) of one target over the last
+    `?seconds=` (default 3600), plus its RTT histogram since startup.
+    """
+    latency_monitor = monitor.latency_monitor
+    if latency_monitor is None:
+        return _monitor_disabled()
+    series = latency_monitor.series.get(target)
+    if series is None:
+        return jsonify(error={
+            "code": "not_found",
+            "message": f"{target} isn't monitored.",
+        }), 404
+    seconds = request.args.get('seconds', default=3600, type=float)
+    return jsonify(series.summary() | {
+        'rounds': window_to_json(series.rounds.window(start=time.time() - seconds)),
+        'histogram': series.histogram.buckets(),
+    })
+
+@routes.route(monitor_targets_route, methods=['POST'])
+def add_monitor_target():
+    latency_monitor = monitor.latency_monitor
+    if latency_monitor is None:
+        return _monitor_disabled()
+    data = request.get_json(silent=True) or {}
+    target = str(data.get('target', '')).strip()
+    try:
+        ip_address(target)
+    except ValueError:
+        return jsonify(error={
+            "code": "invalid_target",
+            "message": "target must be an IP address.",
+        }), 400
+    series = latency_monitor.add_target(target, data.get('name'))
+    return jsonify(series.summary()), 201
+
+@routes.route(monitor_delete_target_route, methods=['DELETE'])
+def remove_monitor_target(target):
+    latency_monitor = monitor.latency_monitor
+    if latency_monitor is None:
+        return _monitor_disabled()
+    if not latency_monitor.remove_target(target):
+        return jsonify(error={
+            "code": "not_found",
+            "message": f"{target} isn't monitored.",
+        }), 404
+    return jsonify({'target': target, 'deleted': True})
+
+@routes.route(throughput_route, methods=['POST'])
+def throughput_test():
+    """
+    Runs a throughput test against another instance's test server
+    (THROUGHPUT_SERVER_PORT). Blocks for the test's duration; one test runs
+    at a time.
+    """
+    data = request.get_json(silent=True) or {}
+    target = str(data.get('target', '')).strip()
+    protocol = data.get('protocol', 'tcp')
+    direction = data.get('direction', 'upload')
+    try:
+        ip_address(target)
+        port = int(data.get('port', DEFAULT_PORT))
+        duration = float(data.get('duration', 5))
+        streams = int(data.get('streams', 1))
+        rate_mbps = float(data.get('rate_mbps', 100))
+        if (
+            protocol not in ('tcp', 'udp')
+            or direction not in ('upload', 'download')
+            or (protocol == 'udp' and direction != 'upload')
+            or not 0 < port < 65536
+            or not 0 < duration <= MAX_DURATION
+            or not 0 < streams <= MAX_STREAMS
+            or not 0 < rate_mbps <= MAX_RATE_MBPS
+        ):
+            raise ValueError
+    except (TypeError, ValueError):
+        return jsonify(error={
+            "code": "invalid_parameters",
+            "message": f"Expected an IP target, protocol tcp|udp, direction upload|download (tcp only), duration up to {MAX_DURATION}s, 1-{MAX_STREAMS} streams and a rate_mbps up to {MAX_RATE_MBPS}.",
+        }), 400
+    try:
+        throughput_admission.check_rate(request.remote_addr)
+        with throughput_admission.slot():
+            if protocol == 'tcp':
+                result = run_tcp_test(target, port, duration, streams, direction)
+            else:
+                result = run_udp_test(target, port, duration, rate_mbps, streams)
+    except AdmissionRejected as e:
+        return _admission_rejected_response(e)
+    except ThroughputError as e:
+        return jsonify(error={
+            "code": "throughput_failed",
+            "message": str(e),
+        }), 502
+    return jsonify(result | {'target': target, 'port': port})
+
+@routes.route(services_route)
+def service_status():
+    """
+    Reachability of the SERVICE_CHECKS services. Results are cached for
+    SERVICE_CHECK_TTL seconds, `?refresh=1` re-checks now (open circuit
+    breakers still skip their service).
+    """
+    checker = get_service_checker()
+    if checker is None:
+        return jsonify(error={
+            "code": "invalid_configuration",
+            "message": "SERVICE_CHECKS couldn't be parsed, see the server log.",
+        }), 500
+    refresh = request.args.get('refresh', '').lower() in ('1', 'true', 'yes')
+    results, cached = checker.results(max_age=0 if refresh else None)
+    return jsonify({
+        'cached': cached,
+        'up': sum(result.up for result in results),
+        'down': sum(not result.up for result in results),
+        'services': [result_to_json(result) for result in results],
+    })
+
+@routes.route(dhcp_servers_route)
+def dhcp_servers():
+    """Every DHCP server seen so far (probes and the DHCP_WATCH watcher), rogue ones flagged"""
+    servers = dhcp_monitor.snapshot()
+    return jsonify({
+        'watching': dhcp_monitor.watching,
+        'rogue': sum(server.rogue for server in servers),
+        'servers': [server.to_json() for server in servers],
+    })
+
+@routes.route(dhcp_probe_route, methods=['POST'])
+def dhcp_probe():
+    """Sends a DHCPDISCOVER on every interface and reports the servers that offered a lease"""
+    data = request.get_json(silent=True) or {}
+    try:
+        timeout = float(data.get('timeout', 3))
+        if not 0 < timeout <= MAX_PROBE_TIMEOUT:
+            raise ValueError
+    except (TypeError, ValueError):
+        return jsonify(error={
+            "code": "invalid_timeout",
+            "message": f"timeout must be between 0 and {MAX_PROBE_TIMEOUT} seconds.",
+        }), 400
+    offers = dhcp_monitor.probe(timeout=timeout)
+    servers = {(offer.server_id, offer.server_mac): dhcp_monitor.servers[(offer.server_id, offer.server_mac)] for offer in offers}
+    return jsonify({
+        'offers': [asdict(offer) for offer in offers],
+        'rogue': [server.to_json() for server in servers.values() if server.rogue],
+    })
+
+def _ports_to_json(rows):
+    devices = {}
+    for row in rows:
+        device = devices.setdefault(row['mac'], {'mac': row['mac'], 'ip': row['ip'], 'ports': []})
+        device['ports'].append({key: row[key] for key in ('port', 'service', 'banner', 'first_seen', 'last_seen')})
+    return list(devices.values())
+
+@routes.route(devices_ports_route)
+def devices_ports():
+    """Open ports of every scanned device"""
+    return jsonify({'devices': _ports_to_json(get_device_ports_db())})
+
+@routes.route(device_ports_route)
+def device_ports(mac):
+    devices = _ports_to_json(get_device_ports_db(mac))
+    return jsonify(devices[0] if devices else {'mac': mac, 'ip': None, 'ports': []})
+
+@routes.route(devices_ports_scan_route, methods=['POST'])
+def scan_devices_ports():
+    """
+    Port scan now: the given `devices` (MACs of devices the sweep found, at
+    their last known IP) or, by default, only the new/changed ones (`full:
+    true` rescans every online device). Never anything the sweep didn't find.
+    """
+    data = request.get_json(silent=True) or {}
+    profile = str(data.get('profile') or PORTSCAN_PROFILE)
+    try:
+        parse_profile(profile)
+    except PortScanError as e:
+        return jsonify(error={
+            "code": "invalid_profile",
+            "message": str(e),
+        }), 400
+    devices = data.get('devices')
+    if devices is not None:
+        macs = [normalize_mac(mac) for mac in devices] if isinstance(devices, list) else [None]
+        if None in macs:
+            return jsonify(error={
+                "code": "invalid_devices",
+                "message": "devices must be a list of MAC addresses.",
+            }), 400
+        targets = get_device_ips_db(macs)
+        unknown = set(macs) - {mac.upper() for mac, _ in targets}
+        if unknown:
+            return jsonify(error={
+                "code": "not_found",
+                "message": f"No device with an IPv4 address for {', '.join(sorted(unknown))}.",
+            }), 404
+        results = scan_devices(targets, profile)
+    else:
+        results = scan_stale_devices(profile, max_age=0 if data.get('full') else None)
+    return jsonify({
+        'profile': profile,
+        'scanned': len(results),
+        'devices': [{'mac': mac, 'ports': [asdict(port) for port in ports]} for mac, ports in results.items()],
+    })
+
+@routes.route(discovery_services_route)
+def discovery_services():
+    """SSDP/mDNS service inventory, grouped by device (`?ip=` for a single one)"""
+    ip = request.args.get('ip')
+    devices = {}
+    for row in get_device_services_db(ip):
+        device = devices.setdefault(row['ip'], {'ip': row['ip'], 'mac': row['mac'], 'categories': [], 'services': []})
+        key = (row['ip'], row['protocol'], row['service_type'], row['name'])
+        if row['category'] and row['category'] not in device['categories']:
+            device['categories'].append(row['category'])
+        device['services'].append({
+            'protocol': row['protocol'],
+            'service_type': row['service_type'],
+            'name': row['name'],
+            'port': row['port'],
+            'category': row['category'],
+            'details': json.loads(row['details'] or '{}'),
+            'first_seen': row['first_seen'],
+            'changed_at': row['changed_at'],
+            'last_seen': discovery.service_inventory.last_seen(key),
+        })
+    listener = discovery.discovery_listener
+    return jsonify({
+        'listening': listener is not None and listener.running,
+        'devices': list(devices.values()),
+    })
+
+@routes.route(devices_fingerprints_route, methods=['GET', 'POST'])
+def devices_fingerprints():
+    """OS guess per device with its confidence and evidence; POST fingerprints the new/changed devices first"""
+    if request.method == 'POST':
+        fingerprint_stale_devices()
+    return jsonify({'devices': [
+        dict(row) | {'has_tcp': bool(row['has_tcp']), 'evidence': json.loads(row['evidence'] or '{}')}
+        for row in get_device_fingerprints_db()
+    ]})
+
+# Seconds between keep-alive comments on an idle job event stream
+JOB_EVENTS_HEARTBEAT = 15
+
+def _job_not_found(job_id):
+    return jsonify(error={
+        "code": "not_found",
+        "message": f"No job with id {job_id} (finished jobs expire).",
+    }), 404
+
+@routes.route(jobs_route, methods=['POST'])
+def create_job():
+    """
+    Queues a `type` (traceroute, wifi_neighbors or scan) job with its `params`
+    and optional `priority` (0 first ... 9), answers 202 with the job right away
+    """
+    data = request.get_json(silent=True) or {}
+    params = data.get('params') or {}
+    if not isinstance(params, dict):
+        return jsonify(error={
+            "code": "invalid_parameters",
+            "message": "params must be an object.",
+        }), 400
+    try:
+        job = job_manager.submit(str(data.get('type')), params, data.get('priority'), client=request.remote_addr)
+    except AdmissionRejected as e:
+        return _admission_rejected_response(e)
+    except JobError as e:
+        return jsonify(error={
+            "code": e.code,
+            "message": str(e),
+        }), 503 if e.code == 'queue_full' else 400
+    response = jsonify(job.to_json())
+    response.headers['Location'] = f'{jobs_route}/{job.id}'
+    return response, 202
+
+@routes.route(jobs_route)
+def list_jobs():
+    """Every job still kept, newest first, without their partial results"""
+    return jsonify({
+        'counts': job_manager.stats(),
+        'jobs': [job.to_json() | {'partial': []} for job in job_manager.jobs()],
+    })
+
+@routes.route(job_route)
+def get_job(job_id):
+    """The job; `?partial_since=N` leaves out the partial results a poller already has"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return _job_not_found(job_id)
+    return jsonify(job.to_json(max(request.args.get('partial_since', default=0, type=int), 0)))
+
+@routes.route(job_route, methods=['DELETE'])
+def cancel_job(job_id):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return _job_not_found(job_id)
+    return jsonify(job.to_json())
+
+@routes.route(job_events_route)
+def job_events(job_id):
+    """
+    Server-sent events: `partial` for each partial result, `progress` on every
+    change, then `done` with the whole job once it finished.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        return _job_not_found(job_id)
+
+    def event(name, data):
+        return f"event: {name}\ndata: {json.dumps(data, default=str)}\n\n"
+
+    def stream():
+        version, sent = None, 0
+        while True:
+            current = job.wait_for_change(version, JOB_EVENTS_HEARTBEAT) if version is not None else job.version
+            if current == version:
+                yield ': keep-alive\n\n'
+                continue
+            version = current
+            snapshot = job.to_json(sent)
+            for partial in snapshot['partial']:
+                yield event('partial', partial)
+            sent = snapshot['partial_count']
+            if snapshot['status'] in JOB_FINISHED:
+                yield event('done', snapshot | {'partial': []})
+                return
+            yield event('progress', {'status': snapshot['status'], 'progress': snapshot['progress']})
+
+    return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def _path_monitor_disabled():
+    return jsonify(error={
+        "code": "path_monitor_disabled",
+        "message": "The path monitor isn't running (set PATH_MONITOR_INTERVAL).",
+    }), 503
+
+def _path_not_found(target):
+    return jsonify(error={
+        "code": "not_found",
+        "message": f"The path to {target} isn't monitored.",
+    }), 404
+
+@routes.route(paths_route)
+def monitored_paths():
+    """Destination loss/RTT and path changes of every monitored path"""
+    path_monitor = pathmonitor.path_monitor
+    if path_monitor is None:
+        return _path_monitor_disabled()
+    return jsonify({'interval': path_monitor.interval, 'paths': path_monitor.summaries()})
+
+@routes.route(paths_route, methods=['POST'])
+def add_monitored_path():
+    path_monitor = pathmonitor.path_monitor
+    if path_monitor is None:
+        return _path_monitor_disabled()
+    data = request.get_json(silent=True) or {}
+    target = str(data.get('target', '')).strip().lower()
+    max_hops = data.get('max_hops', pathmonitor.PATH_MONITOR_MAX_HOPS)
+    if not target or not isinstance(max_hops, int) or not 1 <= max_hops <= MAX_HOPS:
+        return jsonify(error={
+            "code": "invalid_parameters",
+            "message": f"target is required and max_hops must be 1-{MAX_HOPS}.",
+        }), 400
+    try:
+        path = path_monitor.add_path(target, max_hops)
+    except ValueError as e:
+        return jsonify(error={"code": "invalid_target", "message": str(e)}), 400
+    return jsonify(path.summary()), 201
+
+@routes.route(path_route)
+def monitored_path(target):
+    """Per-hop sent/received, loss (own and forwarded), RTT stats and the path changes seen"""
+    path_monitor = pathmonitor.path_monitor
+    if path_monitor is None:
+        return _path_monitor_disabled()
+    snapshot = path_monitor.snapshot(target)
+    if snapshot is None:
+        return _path_not_found(target)
+    return jsonify(snapshot)
+
+@routes.route(path_route, methods=['DELETE'])
+def remove_monitored_path(target):
+    path_monitor = pathmonitor.path_monitor
+    if path_monitor is None:
+        return _path_monitor_disabled()
+    if not path_monitor.remove_path(target):
+        return _path_not_found(target)
+    return jsonify({'target': target, 'deleted': True})
+
+@routes.route(path_events_route)
+def monitored_path_events(target):
+    """Server-sent events: `round` with the path's per-hop stats after every probe round."""
+    path_monitor = pathmonitor.path_monitor
+    if path_monitor is None:
+        return _path_monitor_disabled()
+    if path_monitor.snapshot(target) is None:
+        return _path_not_found(target)
+    version = path_monitor.version
+
+    def stream():
+        nonlocal version
+        while True:
+            current = path_monitor.wait_for_round(version, JOB_EVENTS_HEARTBEAT)
+            if current == version:
+                yield ': keep-alive\n\n'
+                continue
+            version = current
+            snapshot = path_monitor.snapshot(target)
+            if snapshot is None:
+                # No longer monitored
+                return
+            yield f"event: round\ndata: {json.dumps(snapshot)}\n\n"
+
+    return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
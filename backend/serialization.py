@@ -0,0 +1,181 @@
+from collections import OrderedDict
+import gzip
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from dotenv import load_dotenv
+from flask import Response, request
+from flask.json.provider import DefaultJSONProvider
+
+# Optional accelerators, none of them is required: without orjson the stdlib encoder is
+# used, without msgpack clients get JSON, without brotli they get gzip.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+load_dotenv()
+
+# Bodies smaller than this aren't worth the compression CPU
+RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv('RESPONSE_COMPRESS_MIN_BYTES', '1024'))
+# Distinct payloads (e.g. devices + wifi neighbors) whose encoded bytes are kept
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '32'))
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+COMPRESSIBLE_MIMETYPES = (JSON_MIMETYPE, 'text/plain', 'text/html', 'text/csv', MSGPACK_MIMETYPES[0])
+
+def _default(obj: Any) -> Any:
+    return DefaultJSONProvider.default(obj)
+
+def dumps_json(obj: Any, sort_keys: bool = True, indent: bool = False) -> bytes:
+    """JSON bytes, with orjson when it's installed. Same output types as Flask's encoder."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_default, option=option)
+    if indent:
+        return json.dumps(obj, default=_default, sort_keys=sort_keys, indent=2).encode()
+    return json.dumps(obj, default=_default, sort_keys=sort_keys, separators=(',', ':')).encode()
+
+class FastJSONProvider(DefaultJSONProvider):
+    """`app.json` provider that encodes with orjson (see `dumps_json`)."""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if kwargs.keys() - {'indent', 'separators'}:
+            # Options orjson doesn't have (e.g. ensure_ascii), keep the stdlib behavior
+            return super().dumps(obj, **kwargs)
+        return dumps_json(obj, sort_keys=self.sort_keys, indent='indent' in kwargs).decode()
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(dumps_json(obj, self.sort_keys, indent) + b'\n', mimetype=self.mimetype)
+
+def install_json_provider(app):
+    if orjson is not None:
+        app.json = FastJSONProvider(app)
+
+def negotiate(accept: str, accept_encoding: str) -> Tuple[str, Optional[str]]:
+    """(mimetype, content encoding) to answer with, from the request headers."""
+    accept, accept_encoding = accept.lower(), accept_encoding.lower()
+    mimetype = JSON_MIMETYPE
+    if msgpack is not None and any(candidate in accept for candidate in MSGPACK_MIMETYPES):
+        mimetype = MSGPACK_MIMETYPES[0]
+    encodings = {token.split(';')[0].strip() for token in accept_encoding.split(',')}
+    if brotli is not None and 'br' in encodings:
+        return mimetype, 'br'
+    if 'gzip' in encodings:
+        return mimetype, 'gzip'
+    return mimetype, None
+
+def encode(payload: Any, mimetype: str) -> bytes:
+    if mimetype == JSON_MIMETYPE:
+        return dumps_json(payload) + b'\n'
+    return msgpack.packb(payload, default=_default, use_bin_type=True)
+
+def compress(body: bytes, encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    """Compresses `body` when it's large enough, returns the bytes and the encoding actually used."""
+    if encoding is None or len(body) < RESPONSE_COMPRESS_MIN_BYTES:
+        return body, None
+    if encoding == 'br':
+        return brotli.compress(body, quality=5), 'br'
+    # mtime=0: identical payloads give identical bytes
+    return gzip.compress(body, compresslevel=6, mtime=0), 'gzip'
+
+class ResponseCache:
+    """
+    LRU of encoded bodies. Each entry is keyed by a caller-provided key that must
+    change whenever the payload does (e.g. a snapshot version), and holds the
+    payload plus one body per (mimetype, encoding) variant.
+    """
+    def __init__(self, size: int = RESPONSE_CACHE_SIZE):
+        self.size = size
+        self._entries: OrderedDict[Hashable, Dict[str, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _entry(self, key: Hashable, build: Callable[[], Any]) -> Dict[str, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+        # Built outside the lock, two concurrent misses just build twice
+        entry = {'payload': build(), 'bodies': {}}
+        with self._lock:
+            self._entries[key] = entry
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return entry
+
+    def body(self, key: Hashable, build: Callable[[], Any], mimetype: str, encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+        entry = self._entry(key, build)
+        variant = (mimetype, encoding)
+        cached = entry['bodies'].get(variant)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        cached = entry['bodies'][variant] = compress(encode(entry['payload'], mimetype), encoding)
+        return cached
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+response_cache = ResponseCache()
+
+def encoded_response(build: Callable[[], Any], cache_key: Optional[Hashable] = None, status: int = 200) -> Response:
+    """
+    Response for the payload `build()` returns, as JSON or MessagePack (Accept)
+    and compressed (Accept-Encoding). With a `cache_key` the payload and its
+    encoded bytes are reused until the key changes, `build` isn't even called.
+    """
+    mimetype, encoding = negotiate(request.headers.get('Accept', ''), request.headers.get('Accept-Encoding', ''))
+    if cache_key is None:
+        body, used_encoding = compress(encode(build(), mimetype), encoding)
+    else:
+        body, used_encoding = response_cache.body(cache_key, build, mimetype, encoding)
+    response = Response(body, status=status, mimetype=mimetype)
+    if used_encoding:
+        response.headers['Content-Encoding'] = used_encoding
+    response.vary.update(('Accept', 'Accept-Encoding'))
+    return response
+
+def compress_response(response: Response) -> Response:
+    """after_request hook: compresses any other large, buffered text/JSON response."""
+    if (
+        response.direct_passthrough
+        or response.is_streamed
+        or response.status_code < 200
+        or response.status_code in (204, 304)
+        or 'Content-Encoding' in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+    _, encoding = negotiate('', request.headers.get('Accept-Encoding', ''))
+    body, used_encoding = compress(response.get_data(), encoding)
+    response.vary.add('Accept-Encoding')
+    if used_encoding:
+        response.set_data(body)
+        response.headers['Content-Encoding'] = used_encoding
+    return response
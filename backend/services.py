@@ -0,0 +1,294 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+import http.client
+import os
+import socket
+import ssl
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+from venv import logger
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "Is Netflix down?": every configured service is probed concurrently. HTTP(S) checks keep
+# their connection alive and reuse it on the next run, new connections are timed phase by
+# phase (DNS, connect, TLS, time to first byte). A service failing SERVICE_BREAKER_THRESHOLD
+# times in a row isn't probed again for SERVICE_BREAKER_COOLDOWN seconds, and results are
+# cached SERVICE_CHECK_TTL seconds so dashboards polling the endpoint don't add traffic.
+#
+# SERVICE_CHECKS: comma separated name=url, url being http(s)://host[:port][/path] or
+# tcp://host:port (connect only).
+SERVICE_CHECKS = os.getenv('SERVICE_CHECKS', 'google=https://www.google.com/generate_204,netflix=https://www.netflix.com,disneyplus=https://www.disneyplus.com,cloudflare-dns=tcp://1.1.1.1:53')
+SERVICE_CHECK_TTL = float(os.getenv('SERVICE_CHECK_TTL', '30'))
+SERVICE_CHECK_TIMEOUT = float(os.getenv('SERVICE_CHECK_TIMEOUT', '5'))
+SERVICE_BREAKER_THRESHOLD = int(os.getenv('SERVICE_BREAKER_THRESHOLD', '3'))
+SERVICE_BREAKER_COOLDOWN = float(os.getenv('SERVICE_BREAKER_COOLDOWN', '60'))
+MAX_CONCURRENT_CHECKS = 16
+
+USER_AGENT = 'network-diagnostics-service-check/1'
+
+class ServiceConfigError(Exception):
+    """Raised for a SERVICE_CHECKS entry that isn't name=http(s)://... or name=tcp://host:port"""
+    pass
+
+@dataclass(frozen=True)
+class Service:
+    name: str
+    scheme: str
+    host: str
+    port: int
+    path: str = '/'
+
+def parse_services(spec: str) -> List[Service]:
+    services = []
+    for entry in (entry.strip() for entry in spec.split(',')):
+        if not entry:
+            continue
+        name, sep, url = entry.partition('=')
+        parts = urlsplit(url.strip())
+        if not sep or not name.strip() or parts.scheme not in ('http', 'https', 'tcp') or not parts.hostname:
+            raise ServiceConfigError(f"Invalid service check {entry!r}")
+        try:
+            port = parts.port or {'http': 80, 'https': 443}.get(parts.scheme)
+        except ValueError as e:
+            raise ServiceConfigError(f"Invalid service check {entry!r}") from e
+        if port is None:
+            raise ServiceConfigError(f"tcp service check {entry!r} needs a port")
+        path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        services.append(Service(name.strip(), parts.scheme, parts.hostname, port, path))
+    return services
+
+@dataclass
+class CheckResult:
+    name: str
+    url: str
+    up: bool
+    status: Optional[int] = None
+    error: Optional[str] = None
+    # Phases in ms; None when skipped, e.g. DNS/connect/TLS on a reused connection
+    dns_ms: Optional[float] = None
+    connect_ms: Optional[float] = None
+    tls_ms: Optional[float] = None
+    ttfb_ms: Optional[float] = None
+    total_ms: Optional[float] = None
+    reused_connection: bool = False
+    breaker: str = 'closed'
+    checked_at: float = field(default_factory=time.time)
+
+class CircuitBreaker:
+    """
+    closed -> open after `threshold` consecutive failures; open -> half_open
+    once `cooldown` seconds passed, letting one probe through; that probe
+    closes the breaker or opens it again.
+    """
+    def __init__(self, threshold: int = SERVICE_BREAKER_THRESHOLD, cooldown: float = SERVICE_BREAKER_COOLDOWN, clock=time.monotonic):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if self.clock() - self.opened_at >= self.cooldown else 'open'
+
+    def allow(self) -> bool:
+        return self.state != 'open'
+
+    def record(self, success: bool):
+        if success:
+            self.failures = 0
+            self.opened_at = None
+            return
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.threshold:
+            self.opened_at = self.clock()
+
+class ConnectionPool:
+    """One idle keep-alive connection per (scheme, host, port)."""
+
+    def __init__(self):
+        self._idle: Dict[Tuple[str, str, int], http.client.HTTPConnection] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: Tuple[str, str, int]) -> Optional[http.client.HTTPConnection]:
+        with self._lock:
+            return self._idle.pop(key, None)
+
+    def put(self, key: Tuple[str, str, int], conn: http.client.HTTPConnection):
+        with self._lock:
+            previous = self._idle.pop(key, None)
+            self._idle[key] = conn
+        if previous is not None:
+            previous.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = list(self._idle.values()), {}
+        for conn in idle:
+            conn.close()
+
+def _ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+def _resolve(host: str, port: int) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    return infos[0], _ms(start)
+
+def _connect(info, timeout: float) -> Tuple[socket.socket, float]:
+    family, socktype, proto, _, address = info
+    sock = socket.socket(family, socktype, proto)
+    sock.settimeout(timeout)
+    start = time.perf_counter()
+    try:
+        sock.connect(address)
+    except BaseException:
+        sock.close()
+        raise
+    return sock, _ms(start)
+
+class ServiceChecker:
+    def __init__(self, services: List[Service], timeout: float = SERVICE_CHECK_TIMEOUT, ttl: float = SERVICE_CHECK_TTL,
+                 breaker_threshold: int = SERVICE_BREAKER_THRESHOLD, breaker_cooldown: float = SERVICE_BREAKER_COOLDOWN,
+                 ssl_context: Optional[ssl.SSLContext] = None):
+        self.services = services
+        self.timeout = timeout
+        self.ttl = ttl
+        self.ssl_context = ssl_context or ssl.create_default_context()
+        self.pool = ConnectionPool()
+        self.breakers = {service.name: CircuitBreaker(breaker_threshold, breaker_cooldown) for service in services}
+        self._last: Dict[str, CheckResult] = {}
+        self._checked_at: Optional[float] = None
+        self._refresh_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=min(max(len(services), 1), MAX_CONCURRENT_CHECKS), thread_name_prefix='service-check')
+
+    @staticmethod
+    def url(service: Service) -> str:
+        if service.scheme == 'tcp':
+            return f'tcp://{service.host}:{service.port}'
+        return f'{service.scheme}://{service.host}:{service.port}{service.path}'
+
+    def _check_tcp(self, service: Service, result: CheckResult):
+        info, result.dns_ms = _resolve(service.host, service.port)
+        sock, result.connect_ms = _connect(info, self.timeout)
+        sock.close()
+        result.up = True
+
+    def _new_connection(self, service: Service, result: CheckResult) -> http.client.HTTPConnection:
+        info, result.dns_ms = _resolve(service.host, service.port)
+        sock, result.connect_ms = _connect(info, self.timeout)
+        try:
+            if service.scheme == 'https':
+                start = time.perf_counter()
+                sock = self.ssl_context.wrap_socket(sock, server_hostname=service.host)
+                result.tls_ms = _ms(start)
+        except BaseException:
+            sock.close()
+            raise
+        # http.client connects lazily, handing it our socket skips its own connect
+        conn_class = http.client.HTTPSConnection if service.scheme == 'https' else http.client.HTTPConnection
+        conn = conn_class(service.host, service.port, timeout=self.timeout)
+        conn.sock = sock
+        return conn
+
+    def _request(self, conn: http.client.HTTPConnection, service: Service, result: CheckResult):
+        start = time.perf_counter()
+        conn.request('HEAD', service.path, headers={'User-Agent': USER_AGENT, 'Connection': 'keep-alive'})
+        response = conn.getresponse()
+        result.ttfb_ms = _ms(start)
+        response.read()
+        result.status = response.status
+        # Any answer, even a 4xx, means the service is reachable; 5xx means it's struggling
+        result.up = response.status < 500
+        if not response.will_close:
+            self.pool.put((service.scheme, service.host, service.port), conn)
+        else:
+            conn.close()
+
+    def _check_http(self, service: Service, result: CheckResult):
+        conn = self.pool.take((service.scheme, service.host, service.port))
+        if conn is not None:
+            try:
+                result.reused_connection = True
+                self._request(conn, service, result)
+                return
+            except (OSError, http.client.HTTPException):
+                # The server closed the idle connection, start over on a new one
+                conn.close()
+                result.reused_connection = False
+        conn = self._new_connection(service, result)
+        try:
+            self._request(conn, service, result)
+        except BaseException:
+            conn.close()
+            raise
+
+    def check(self, service: Service) -> CheckResult:
+        breaker = self.breakers[service.name]
+        if not breaker.allow():
+            last = self._last.get(service.name)
+            return CheckResult(
+                service.name, self.url(service), up=False, breaker='open',
+                error=last.error if last and last.error else 'Circuit open after repeated failures',
+                status=last.status if last else None,
+                checked_at=last.checked_at if last else time.time(),
+            )
+        result = CheckResult(service.name, self.url(service), up=False)
+        start = time.perf_counter()
+        try:
+            if service.scheme == 'tcp':
+                self._check_tcp(service, result)
+            else:
+                self._check_http(service, result)
+        except (OSError, http.client.HTTPException, ssl.SSLError) as e:
+            result.error = str(e) or e.__class__.__name__
+        result.total_ms = _ms(start)
+        breaker.record(result.up)
+        result.breaker = breaker.state
+        return result
+
+    def check_all(self) -> List[CheckResult]:
+        results = list(self._executor.map(self.check, self.services))
+        self._last = {result.name: result for result in results}
+        self._checked_at = time.monotonic()
+        return results
+
+    def results(self, max_age: Optional[float] = None) -> Tuple[List[CheckResult], bool]:
+        """
+        The last results if younger than `max_age` (default: the TTL), otherwise
+        new ones. Concurrent callers wait for a single refresh. Returns
+        (results, from_cache).
+        """
+        max_age = self.ttl if max_age is None else max_age
+        with self._refresh_lock:
+            if self._checked_at is not None and time.monotonic() - self._checked_at < max_age:
+                return [self._last[service.name] for service in self.services], True
+            return self.check_all(), False
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.pool.close()
+
+def result_to_json(result: CheckResult) -> Dict[str, Any]:
+    return asdict(result)
+
+service_checker: Optional[ServiceChecker] = None
+_checker_lock = threading.Lock()
+
+def get_service_checker() -> Optional[ServiceChecker]:
+    """The checker for SERVICE_CHECKS, created on first use; None if it can't be parsed."""
+    global service_checker
+    with _checker_lock:
+        if service_checker is None:
+            try:
+                service_checker = ServiceChecker(parse_services(SERVICE_CHECKS))
+            except ServiceConfigError as e:
+                logger.error(f"SERVICE_CHECKS: {e}")
+                return None
+        return service_checker
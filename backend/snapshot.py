@@ -0,0 +1,240 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+from venv import logger
+from dotenv import load_dotenv
+from backend import database
+from backend.database import Device
+
+load_dotenv()
+
+# Warm start: the last known devices (with their resolved hostnames and vendors) are written
+# to a compact binary file at exit and every DEVICE_SNAPSHOT_INTERVAL seconds (0 = only at
+# exit). On startup the file is memory-mapped and loaded before the first sweep, and the
+# devices are served flagged as stale until that sweep confirms them. The devices table
+# persists on its own: the snapshot only adds the devices missing from it (a new database)
+# and fills the hostname and vendor caches.
+DEVICE_SNAPSHOT_PATH = os.getenv('DEVICE_SNAPSHOT_PATH') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'device_snapshot.bin')
+DEVICE_SNAPSHOT_INTERVAL = float(os.getenv('DEVICE_SNAPSHOT_INTERVAL', '300'))
+
+# File layout (little endian):
+#   header   magic, format version, saved_at (epoch), string count, record count
+#   strings  per string: u16 length + UTF-8 bytes (IPs, hostnames and vendors, deduplicated)
+#   records  per device: MAC (6 bytes), last_seen (epoch, NaN if unknown), IP / hostname /
+#            vendor string indexes (NO_STRING if missing) and flags (random MAC, status)
+MAGIC = b'NDSNAP'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<6sHdII')
+STRING_LENGTH = struct.Struct('<H')
+RECORD = struct.Struct('<6sdIIIB')
+NO_STRING = 0xFFFFFFFF
+FLAG_RANDOM_MAC = 0x01
+# Status bits, neither set is 'online' (all files written before these existed)
+FLAG_UNRESPONSIVE = 0x02
+FLAG_OFFLINE = 0x04
+STATUS_FLAGS = {'unresponsive': FLAG_UNRESPONSIVE, 'offline': FLAG_OFFLINE}
+
+LAST_SEEN_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file is truncated, corrupt or from another format version"""
+    pass
+
+@dataclass
+class Snapshot:
+    saved_at: float
+    devices: List[Device]
+
+class _StringTable:
+    def __init__(self):
+        self.strings: List[bytes] = []
+        self._index: Dict[str, int] = {}
+
+    def add(self, value: Optional[str]) -> int:
+        if not value or value == 'Unknown':
+            return NO_STRING
+        index = self._index.get(value)
+        if index is None:
+            encoded = value.encode()[:0xFFFF]
+            index = self._index[value] = len(self.strings)
+            self.strings.append(encoded)
+        return index
+
+def _epoch(last_seen: Optional[str]) -> float:
+    try:
+        return datetime.strptime(last_seen, LAST_SEEN_FORMAT).timestamp()
+    except (TypeError, ValueError):
+        return math.nan
+
+def _mac_bytes(mac: Optional[str]) -> Optional[bytes]:
+    try:
+        raw = bytes.fromhex((mac or '').replace(':', '').replace('-', ''))
+    except ValueError:
+        return None
+    return raw if len(raw) == 6 else None
+
+def encode_snapshot(devices: Iterable[Device], saved_at: Optional[float] = None) -> bytes:
+    strings = _StringTable()
+    records = []
+    for device in devices:
+        mac = _mac_bytes(device.get('mac'))
+        if mac is None:
+            continue
+        records.append(RECORD.pack(
+            mac,
+            _epoch(device.get('last_seen')),
+            strings.add(device.get('ip')),
+            strings.add(device.get('hostname')),
+            strings.add(device.get('vendor')),
+            (FLAG_RANDOM_MAC if device.get('random_mac') else 0) | STATUS_FLAGS.get(device.get('status'), 0),
+        ))
+    parts = [HEADER.pack(MAGIC, FORMAT_VERSION, saved_at if saved_at is not None else time.time(), len(strings.strings), len(records))]
+    for value in strings.strings:
+        parts.append(STRING_LENGTH.pack(len(value)))
+        parts.append(value)
+    parts.extend(records)
+    return b''.join(parts)
+
+def decode_snapshot(buffer) -> Snapshot:
+    """Decodes a snapshot from any buffer (bytes or an mmap), reading it in place."""
+    view = memoryview(buffer)
+    try:
+        magic, version, saved_at, string_count, record_count = HEADER.unpack_from(view, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise SnapshotError(f"Not a version {FORMAT_VERSION} device snapshot")
+        offset = HEADER.size
+        strings = []
+        for _ in range(string_count):
+            (length,) = STRING_LENGTH.unpack_from(view, offset)
+            offset += STRING_LENGTH.size
+            strings.append(str(view[offset:offset + length], 'utf-8'))
+            offset += length
+        end = offset + record_count * RECORD.size
+        if end > len(view):
+            raise SnapshotError("Truncated device snapshot")
+
+        def string(index):
+            return strings[index] if index != NO_STRING else None
+
+        devices: List[Device] = []
+        for mac, last_seen, ip, hostname, vendor, flags in RECORD.iter_unpack(view[offset:end]):
+            devices.append({
+                # Lower case, like the MACs sweeps store, or the first sweep adds every device a second time
+                'mac': ':'.join(f'{b:02x}' for b in mac),
+                'ip': string(ip),
+                'hostname': string(hostname),
+                'vendor': string(vendor),
+                'last_seen': datetime.fromtimestamp(last_seen).strftime(LAST_SEEN_FORMAT) if last_seen == last_seen else None,
+                'status': next((status for status, flag in STATUS_FLAGS.items() if flags & flag), 'online'),
+                'random_mac': bool(flags & FLAG_RANDOM_MAC),
+            })
+        return Snapshot(saved_at=saved_at, devices=devices)
+    except (struct.error, UnicodeDecodeError, IndexError) as e:
+        raise SnapshotError(f"Corrupt device snapshot: {e}") from e
+    finally:
+        view.release()
+
+def write_snapshot(devices: Iterable[Device], path: str = DEVICE_SNAPSHOT_PATH):
+    """Writes atomically: a crash mid-write leaves the previous snapshot in place."""
+    data = encode_snapshot(devices)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.device_snapshot.', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def read_snapshot(path: str = DEVICE_SNAPSHOT_PATH) -> Optional[Snapshot]:
+    """The snapshot at `path`, memory-mapped rather than read; None if there is none."""
+    try:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return decode_snapshot(mapped)
+    except FileNotFoundError:
+        return None
+
+@dataclass
+class WarmStartState:
+    """Whether the devices being served still come from the snapshot rather than a live sweep."""
+    stale: bool = False
+    snapshot_saved_at: Optional[float] = None
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def loaded(self, saved_at: float):
+        with self._lock:
+            self.stale = True
+            self.snapshot_saved_at = saved_at
+
+    def confirmed(self):
+        """Called after each live sweep, clears the stale flag."""
+        if self.stale:
+            with self._lock:
+                self.stale = False
+                # Served devices changed meaning, cached responses must be rebuilt
+                database._bump_devices_version()
+
+warm_state = WarmStartState()
+
+def warm_start(hostname_cache: Dict[str, str], vendor_cache: Dict[str, str], path: str = DEVICE_SNAPSHOT_PATH) -> Optional[Snapshot]:
+    """
+    Loads the snapshot into the hostname/vendor caches and the devices table
+    (only the devices it doesn't have: its rows, and their status, are more
+    recent), and marks the data stale until the first sweep. A missing or
+    unreadable snapshot just means a cold start.
+    """
+    try:
+        snapshot = read_snapshot(path)
+    except (OSError, SnapshotError) as e:
+        logger.warning(f"Ignoring device snapshot {path}: {e}")
+        return None
+    if snapshot is None:
+        return None
+    for device in snapshot.devices:
+        if device['ip'] and device['hostname']:
+            hostname_cache.setdefault(device['ip'], device['hostname'])
+        if device['vendor']:
+            vendor_cache.setdefault(device['mac'].upper(), device['vendor'])
+    database.insert_missing_devices_db(snapshot.devices)
+    warm_state.loaded(snapshot.saved_at)
+    return snapshot
+
+def current_devices(hostname_cache: Dict[str, str]) -> List[Device]:
+    """The devices table, with hostnames resolved since the last sweep filled in."""
+    devices = []
+    for row in database.get_devices_with_label_db():
+        device = dict(row)
+        hostname = hostname_cache.get(device.get('ip'))
+        if hostname:
+            device['hostname'] = hostname
+        devices.append(device)
+    return devices
+
+def save_current_snapshot(hostname_cache: Dict[str, str], path: str = DEVICE_SNAPSHOT_PATH):
+    try:
+        write_snapshot(current_devices(hostname_cache), path)
+    except Exception as e:
+        logger.error(f"Could not write the device snapshot {path}: {e}")
+
+def start_periodic_save(hostname_cache: Dict[str, str], interval: float = DEVICE_SNAPSHOT_INTERVAL, path: str = DEVICE_SNAPSHOT_PATH) -> threading.Thread:
+    def save_forever():
+        while True:
+            time.sleep(interval)
+            save_current_snapshot(hostname_cache, path)
+
+    thread = threading.Thread(target=save_forever, name='device-snapshot', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,170 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from flask import Flask
+
+from backend import routes as routes_module
+from backend.admission import AdmissionController, AdmissionRejected, TokenBucket
+from backend.metrics import ADMISSION_REJECTIONS
+from backend.routes import routes
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TokenBucketTestCase(unittest.TestCase):
+    def test_burst_then_rate(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, burst=3, clock=clock)
+
+        self.assertEqual([bucket.take() for _ in range(3)], [0, 0, 0])
+        self.assertEqual(bucket.take(), 0.5)
+        # A refused take doesn't put the bucket into debt
+        self.assertEqual(bucket.take(), 0.5)
+        clock.now = 0.5
+        self.assertEqual(bucket.take(), 0)
+
+
+class AdmissionControllerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.controller = AdmissionController('test', max_concurrent=2, max_queue=1, max_wait=0.2, cost_budget=10)
+
+    def hold(self, cost, entered, release):
+        with self.controller.slot(cost):
+            entered.set()
+            release.wait(5)
+
+    def test_queue_then_fast_rejection(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            for _ in range(2):
+                entered = threading.Event()
+                executor.submit(self.hold, 1, entered, release)
+                entered.wait(1)
+            queued = executor.submit(self.hold, 1, threading.Event(), release)
+            while self.controller.stats()['queued'] == 0:
+                time.sleep(0.01)
+
+            start = time.perf_counter()
+            with self.assertRaises(AdmissionRejected) as rejected:
+                with self.controller.slot(1):
+                    pass
+            self.assertLess(time.perf_counter() - start, 0.1)
+            self.assertEqual((rejected.exception.reason, rejected.exception.status), ('queue_full', 503))
+
+            # The queued one times out waiting
+            with self.assertRaises(AdmissionRejected) as timed_out:
+                queued.result()
+            self.assertEqual(timed_out.exception.reason, 'queue_timeout')
+            release.set()
+
+        self.assertEqual(self.controller.stats()['rejections'], {'queue_full': 1, 'queue_timeout': 1})
+        self.assertEqual(self.controller.stats()['running'], 0)
+
+    def test_cost_budget(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        with self.assertRaises(AdmissionRejected) as too_expensive:
+            with self.controller.slot(11):
+                pass
+        self.assertEqual((too_expensive.exception.reason, too_expensive.exception.status), ('too_expensive', 400))
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            entered = threading.Event()
+            executor.submit(self.hold, 8, entered, release)
+            entered.wait(1)
+            # A slot is free but the budget isn't: waits until the expensive one is done
+            second = threading.Event()
+            executor.submit(self.hold, 5, second, release)
+            self.assertFalse(second.wait(0.05))
+            release.set()
+            self.assertTrue(second.wait(1))
+
+    def test_queue_is_fifo(self):
+        controller = AdmissionController('fifo', max_concurrent=1, max_queue=5, max_wait=5)
+        order = []
+        release = threading.Event()
+
+        def run(name, started=None):
+            with controller.slot():
+                order.append(name)
+                if started is not None:
+                    started.set()
+                    release.wait(5)
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            started = threading.Event()
+            executor.submit(run, 'first', started)
+            started.wait(1)
+            for name in ('a', 'b', 'c'):
+                executor.submit(run, name)
+                while controller.stats()['queued'] < 'abc'.index(name) + 1:
+                    time.sleep(0.01)
+            release.set()
+
+        self.assertEqual(order, ['first', 'a', 'b', 'c'])
+
+    def test_client_rate(self):
+        controller = AdmissionController('rate', max_concurrent=1, max_queue=0, client_rate=1, client_burst=2, clock=FakeClock())
+        before = ADMISSION_REJECTIONS.value(endpoint='rate', reason='rate_limited')
+
+        controller.check_rate('10.0.0.1')
+        controller.check_rate('10.0.0.1')
+        controller.check_rate('10.0.0.2')
+        with self.assertRaises(AdmissionRejected) as limited:
+            controller.check_rate('10.0.0.1')
+
+        self.assertEqual((limited.exception.status, limited.exception.retry_after), (429, 1.0))
+        self.assertEqual(ADMISSION_REJECTIONS.value(endpoint='rate', reason='rate_limited'), before + 1)
+
+
+class TracerouteAdmissionTestCase(unittest.TestCase):
+    def setUp(self):
+        app = Flask(__name__)
+        app.register_blueprint(routes)
+        self.client = app.test_client()
+        for reset in (routes_module.traceroute_admission.reset, routes_module.traceroute_flight.clear):
+            reset()
+            self.addCleanup(reset)
+
+    def test_parameters_are_bounded(self):
+        for query in ('max_hops=0', 'max_hops=65', 'timeout=0', 'timeout=11'):
+            response = self.client.get(f'/api/traceroute?target=example.com&{query}')
+
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json['error']['code'], 'invalid_parameters')
+
+    def test_over_the_cost_budget(self):
+        with patch('backend.routes.traceroute_host') as traceroute:
+            response = self.client.get('/api/traceroute?target=example.com&max_hops=64&timeout=10')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['error']['code'], 'too_expensive')
+        traceroute.assert_not_called()
+
+    def test_client_rate_limit(self):
+        with patch('backend.routes.traceroute_host', return_value={'hops': []}):
+            statuses = [self.client.get(f'/api/traceroute?target=host{i}.example').status_code for i in range(7)]
+        limited = self.client.get('/api/traceroute?target=example.com')
+
+        self.assertEqual(statuses, [200] * 5 + [429] * 2)
+        self.assertIn('Retry-After', limited.headers)
+
+    def test_stats(self):
+        response = self.client.get('/api/debug/admission')
+
+        self.assertEqual([stats['endpoint'] for stats in response.json], ['wifi_scan', 'traceroute', 'throughput'])
+        self.assertEqual(response.json[1]['queued'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from flask import Flask
+
+from backend import routes as routes_module
+from backend.coalesce import CoalesceTimeout, SingleFlight
+from backend.metrics import SINGLE_FLIGHT_REQUESTS, SINGLE_FLIGHT_TIMEOUTS
+from backend.routes import routes
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class SingleFlightTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.flight = SingleFlight('test', reuse_window=2, clock=self.clock)
+        self.release = threading.Event()
+        self.calls = 0
+
+    def slow(self):
+        self.calls += 1
+        self.release.wait(5)
+        return self.calls
+
+    def test_concurrent_callers_share_one_execution(self):
+        joined_before = SINGLE_FLIGHT_REQUESTS.value(endpoint='test', outcome='joined')
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = [executor.submit(self.flight.run, 'key', self.slow, 5) for _ in range(8)]
+            while SINGLE_FLIGHT_REQUESTS.value(endpoint='test', outcome='joined') - joined_before < 7:
+                time.sleep(0.01)
+            self.release.set()
+            results = [future.result() for future in futures]
+
+        self.assertEqual(results, [1] * 8)
+        self.assertEqual(self.calls, 1)
+
+    def test_result_reused_within_the_window_only(self):
+        self.release.set()
+        first = self.flight.run('key', self.slow)
+        self.clock.now = 1.9
+        reused = self.flight.run('key', self.slow)
+        self.clock.now = 2.0
+        fresh = self.flight.run('key', self.slow)
+
+        self.assertEqual((first, reused, fresh), (1, 1, 2))
+
+    def test_keys_are_independent(self):
+        self.release.set()
+
+        self.assertEqual(self.flight.run('a', self.slow), 1)
+        self.assertEqual(self.flight.run('b', self.slow), 2)
+
+    def test_each_caller_has_its_own_timeout(self):
+        timeouts_before = SINGLE_FLIGHT_TIMEOUTS.value(endpoint='test')
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            patient = executor.submit(self.flight.run, 'key', self.slow, 5)
+            while self.flight.in_flight() == 0:
+                time.sleep(0.01)
+            with self.assertRaises(CoalesceTimeout):
+                self.flight.run('key', self.slow, 0.05)
+            self.release.set()
+
+            self.assertEqual(patient.result(), 1)
+        self.assertEqual(SINGLE_FLIGHT_TIMEOUTS.value(endpoint='test'), timeouts_before + 1)
+        # The execution wasn't cancelled: its result is still there to reuse
+        self.assertEqual(self.flight.run('key', self.slow), 1)
+
+    def test_failures_are_not_reused(self):
+        def failing():
+            self.calls += 1
+            raise ValueError('boom')
+
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                self.flight.run('key', failing)
+
+        self.assertEqual(self.calls, 2)
+
+
+class CoalescedRoutesTestCase(unittest.TestCase):
+    def setUp(self):
+        app = Flask(__name__)
+        app.register_blueprint(routes)
+        self.app = app
+        for flight in (routes_module.dns_flight, routes_module.traceroute_flight):
+            flight.clear()
+            self.addCleanup(flight.clear)
+        routes_module.traceroute_admission.reset()
+        self.addCleanup(routes_module.traceroute_admission.reset)
+
+    def test_concurrent_dns_tests_resolve_once(self):
+        calls = []
+
+        def lookup(domain):
+            calls.append(domain)
+            time.sleep(0.2)
+            return '1.1.1.1'
+
+        with patch('backend.routes.socket.gethostbyname', side_effect=lookup), ThreadPoolExecutor(max_workers=5) as executor:
+            responses = list(executor.map(lambda _: self.app.test_client().get('/api/dns/'), range(5)))
+
+        self.assertEqual([response.status_code for response in responses], [200] * 5)
+        self.assertEqual(sorted(calls), ['cloudflare.com', 'github.com', 'google.com'])
+
+    def test_traceroute_key_is_normalized(self):
+        with patch('backend.routes.traceroute_host', return_value={'hops': []}) as traceroute:
+            client = self.app.test_client()
+            client.get('/api/traceroute?target=Example.com')
+            client.get('/api/traceroute?target=example.com%20')
+            client.get('/api/traceroute?target=example.com&max_hops=5')
+
+        self.assertEqual(traceroute.call_count, 2)
+
+    def test_wait_timeout_returns_504(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        with patch('backend.routes.traceroute_host', side_effect=lambda *args, **kwargs: release.wait(5)):
+            response = self.app.test_client().get('/api/traceroute?target=example.com&wait=0.05')
+
+        self.assertEqual(response.status_code, 504)
+        self.assertEqual(response.json['error']['code'], 'timeout')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+import os
+import select
+import socket
+import subprocess
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from flask import Flask
+import scapy.all as scapy
+from scapy.layers.dhcp import BOOTP, DHCP
+from scapy.layers.inet import IP, UDP
+from scapy.layers.l2 import Ether
+
+from backend import dhcp
+from backend.dhcp import DhcpMonitor, open_dhcp_socket, parse_dhcp_reply
+from backend.routes import routes
+
+SERVER_MAC = '02:00:00:00:00:01'
+ROGUE_MAC = '02:00:00:00:00:66'
+CLIENT_MAC = '02:00:00:00:00:aa'
+
+
+def reply(server_ip, server_mac, xid=1234, message_type='offer', client_mac=CLIENT_MAC, yiaddr='192.168.1.50'):
+    return (
+        Ether(src=server_mac, dst='ff:ff:ff:ff:ff:ff')
+        / IP(src=server_ip, dst='255.255.255.255')
+        / UDP(sport=67, dport=68)
+        / BOOTP(op=2, xid=xid, yiaddr=yiaddr, chaddr=bytes.fromhex(client_mac.replace(':', '')))
+        / DHCP(options=[
+            ('message-type', message_type), ('server_id', server_ip), ('lease_time', 3600),
+            ('subnet_mask', '255.255.255.0'), ('router', server_ip), ('name_server', '1.1.1.1', '8.8.8.8'),
+            ('domain', b'lan'), 'end',
+        ])
+    )
+
+
+class ParseTestCase(unittest.TestCase):
+    def test_offer_lease_parameters(self):
+        offer = parse_dhcp_reply(Ether(bytes(reply('192.168.1.1', SERVER_MAC))), 'eth0')
+
+        self.assertEqual(offer.message_type, 'offer')
+        self.assertEqual(offer.server_id, '192.168.1.1')
+        self.assertEqual(offer.server_mac, SERVER_MAC)
+        self.assertEqual(offer.client_mac, CLIENT_MAC)
+        self.assertEqual(offer.offered_ip, '192.168.1.50')
+        self.assertEqual(offer.lease_time, 3600)
+        self.assertEqual(offer.router, '192.168.1.1')
+        self.assertEqual(offer.dns, ['1.1.1.1', '8.8.8.8'])
+        self.assertEqual(offer.domain, 'lan')
+
+    def test_ignores_client_messages(self):
+        discover = dhcp.discover_packet(CLIENT_MAC, 1)
+        self.assertIsNone(parse_dhcp_reply(Ether(bytes(discover))))
+
+
+class MonitorTestCase(unittest.TestCase):
+    def test_pcap_replay_flags_rogue(self):
+        frames = [
+            reply('192.168.1.1', SERVER_MAC),
+            Ether() / IP(dst='192.168.1.9') / UDP(sport=5353, dport=5353),
+            reply('192.168.1.66', ROGUE_MAC),
+            reply('192.168.1.1', SERVER_MAC, message_type='ack'),
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'dhcp.pcap')
+            scapy.wrpcap(path, frames)
+            monitor = DhcpMonitor(trusted=['192.168.1.1'])
+            found = monitor.replay(path)
+
+        servers = {server.server_id: server for server in monitor.snapshot()}
+        self.assertEqual(found, 3)
+        self.assertFalse(servers['192.168.1.1'].rogue)
+        self.assertEqual(servers['192.168.1.1'].counts, {'offer': 1, 'ack': 1})
+        self.assertTrue(servers['192.168.1.66'].rogue)
+
+    def test_trusts_gateway_by_default(self):
+        monitor = DhcpMonitor()
+        with patch('backend.utils.net_config.gateway_ip', ('0.0.0.0', 'eth0', '192.168.1.1')):
+            trusted = monitor.observe(parse_dhcp_reply(reply('192.168.1.1', SERVER_MAC)))
+            rogue = monitor.observe(parse_dhcp_reply(reply('10.0.0.1', ROGUE_MAC)))
+
+        self.assertFalse(trusted.rogue)
+        self.assertTrue(rogue.rogue)
+
+
+def _veth_pair():
+    if not hasattr(socket, 'AF_PACKET') or os.geteuid() != 0:
+        return None
+    names = (f'ndv{os.getpid() % 10000}a', f'ndv{os.getpid() % 10000}b')
+    try:
+        subprocess.run(['ip', 'link', 'add', names[0], 'type', 'veth', 'peer', 'name', names[1]], check=True, capture_output=True)
+        for name in names:
+            subprocess.run(['ip', 'link', 'set', name, 'up'], check=True, capture_output=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return names
+
+
+class VethTestCase(unittest.TestCase):
+    """A simulated DHCP responder (plus a rogue one) on the far end of a veth pair."""
+
+    def setUp(self):
+        self.veth = _veth_pair()
+        if self.veth is None:
+            self.skipTest('Needs root and veth support')
+        self.addCleanup(subprocess.run, ['ip', 'link', 'del', self.veth[0]], capture_output=True)
+        self.responder = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(0x0003))
+        self.responder.bind((self.veth[1], 0))
+        self.addCleanup(self.responder.close)
+        self.stop = threading.Event()
+        self.addCleanup(self.stop.set)
+        threading.Thread(target=self.respond, daemon=True).start()
+
+    def respond(self):
+        while not self.stop.is_set():
+            readable, _, _ = select.select([self.responder], [], [], 0.1)
+            if not readable:
+                continue
+            try:
+                packet = Ether(self.responder.recv(65535))
+            except OSError:
+                return
+            if DHCP in packet and packet[BOOTP].op == 1:
+                client_mac = packet[Ether].src
+                for server_ip, server_mac in (('192.168.77.1', SERVER_MAC), ('192.168.77.66', ROGUE_MAC)):
+                    self.responder.send(bytes(reply(server_ip, server_mac, xid=packet[BOOTP].xid, client_mac=client_mac)))
+
+    def test_probe_reports_every_server(self):
+        monitor = DhcpMonitor(trusted=['192.168.77.1'])
+        mac = open(f'/sys/class/net/{self.veth[0]}/address').read().strip()
+
+        offers = monitor.probe([(self.veth[0], mac)], timeout=0.5)
+
+        self.assertEqual(sorted(offer.server_id for offer in offers), ['192.168.77.1', '192.168.77.66'])
+        self.assertEqual({offer.client_mac for offer in offers}, {mac})
+        self.assertEqual([server.server_id for server in monitor.snapshot() if server.rogue], ['192.168.77.66'])
+
+    def test_kernel_filter_drops_unrelated_traffic(self):
+        with open_dhcp_socket(self.veth[0]) as sock:
+            self.responder.send(bytes(Ether(dst='ff:ff:ff:ff:ff:ff') / IP(dst='192.168.77.255') / UDP(sport=5353, dport=5353)))
+            self.responder.send(bytes(reply('192.168.77.1', SERVER_MAC)))
+            readable, _, _ = select.select([sock], [], [], 1)
+            self.assertTrue(readable)
+            frame = Ether(sock.recv(65535))
+            self.assertIn(DHCP, frame)
+            readable, _, _ = select.select([sock], [], [], 0.1)
+            self.assertFalse(readable)
+
+
+class DhcpRoutesTestCase(unittest.TestCase):
+    def setUp(self):
+        app = Flask(__name__)
+        app.register_blueprint(routes)
+        self.client = app.test_client()
+        monitor = DhcpMonitor(trusted=['192.168.1.1'])
+        patcher = patch('backend.routes.dhcp_monitor', monitor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.monitor = monitor
+
+    def test_servers(self):
+        self.monitor.observe(parse_dhcp_reply(reply('192.168.1.66', ROGUE_MAC), 'eth0'))
+
+        response = self.client.get('/api/dhcp/servers')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['rogue'], 1)
+        self.assertEqual(response.json['servers'][0]['ifaces'], ['eth0'])
+        self.assertEqual(response.json['servers'][0]['last']['lease_time'], 3600)
+
+    def test_probe(self):
+        offer = parse_dhcp_reply(reply('192.168.1.66', ROGUE_MAC), 'eth0')
+        with patch('backend.dhcp._probe_interface', return_value=[offer]):
+            response = self.client.post('/api/dhcp/probe', json={'timeout': 0.1})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json['offers']), 1)
+        self.assertEqual(response.json['rogue'][0]['server_id'], '192.168.1.66')
+
+    def test_probe_invalid_timeout(self):
+        response = self.client.post('/api/dhcp/probe', json={'timeout': 60})
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
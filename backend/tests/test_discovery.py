@@ -0,0 +1,144 @@
+import json
+import socket
+import time
+import unittest
+from unittest.mock import patch
+
+from flask import Flask
+from scapy.layers.dns import DNS, DNSQR, DNSRR, DNSRRSRV
+
+from backend import database, discovery
+from backend.benchmarks.suite import TemporaryDatabase
+from backend.discovery import DiscoveryListener, ServiceInventory, mdns_query, parse_mdns, parse_ssdp
+from backend.routes import routes
+
+CAST = 'Living Room._googlecast._tcp.local'
+
+
+def mdns_response(model='Chromecast', status='0', compress=False):
+    packet = DNS(
+        id=0, qr=1, aa=1,
+        an=[DNSRR(rrname='_googlecast._tcp.local', type='PTR', rdata=CAST)],
+        ar=[
+            DNSRRSRV(rrname=CAST, port=8009, target='cc-1.local'),
+            DNSRR(rrname=CAST, type='TXT', rdata=[f'md={model}'.encode(), b'fn=Living Room', f'st={status}'.encode()]),
+            DNSRR(rrname='cc-1.local', type='A', rdata='10.0.0.5'),
+        ],
+    )
+    return bytes(packet.compress() if compress else packet)
+
+
+NOTIFY = (
+    'NOTIFY * HTTP/1.1\r\n'
+    'HOST: 239.255.255.250:1900\r\n'
+    'NT: urn:schemas-upnp-org:device:MediaRenderer:1\r\n'
+    'NTS: ssdp:alive\r\n'
+    'LOCATION: http://10.0.0.7:49152/description.xml\r\n'
+    'SERVER: Linux/4.9 UPnP/1.0 Sonos/70.3\r\n'
+    'USN: uuid:RINCON_1234::urn:schemas-upnp-org:device:MediaRenderer:1\r\n'
+    '\r\n'
+).encode()
+
+
+class ParseTestCase(unittest.TestCase):
+    def test_mdns_instance_with_srv_and_txt(self):
+        for compress in (False, True):
+            (record,) = parse_mdns(mdns_response(compress=compress), '10.0.0.5')
+
+            self.assertEqual(record.service_type, '_googlecast._tcp.local')
+            self.assertEqual(record.name, 'Living Room')
+            self.assertEqual(record.port, 8009)
+            self.assertEqual(record.category, 'chromecast')
+            # The volatile status flag isn't part of the identity
+            self.assertEqual(record.details, {'host': 'cc-1.local', 'md': 'Chromecast', 'fn': 'Living Room'})
+
+    def test_mdns_queries_and_garbage(self):
+        self.assertEqual(parse_mdns(bytes(DNS(qd=[DNSQR(qname='_hap._tcp.local', qtype='PTR')])), '10.0.0.5'), [])
+        self.assertEqual(parse_mdns(mdns_query(), '10.0.0.5'), [])
+        with self.assertRaises(discovery.DnsFormatError):
+            parse_mdns(mdns_response()[:40], '10.0.0.5')
+
+    def test_ssdp(self):
+        record = parse_ssdp(NOTIFY, '10.0.0.7')
+
+        self.assertEqual(record.name, 'uuid:RINCON_1234')
+        self.assertEqual(record.category, 'media_renderer')
+        self.assertEqual(record.details['server'], 'Linux/4.9 UPnP/1.0 Sonos/70.3')
+        self.assertIsNone(parse_ssdp(NOTIFY.replace(b'ssdp:alive', b'ssdp:byebye'), '10.0.0.7'))
+        self.assertIsNone(parse_ssdp(discovery.M_SEARCH, '10.0.0.7'))
+
+
+class InventoryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.db = TemporaryDatabase().__enter__()
+        self.addCleanup(self.db.__exit__, None, None, None)
+
+    def test_only_changes_are_written(self):
+        inventory = ServiceInventory()
+
+        with patch('backend.database.upsert_device_services_db', wraps=database.upsert_device_services_db) as upsert:
+            writes = [inventory.feed('mdns', mdns_response(status=str(i)), '10.0.0.5') for i in range(50)]
+            writes.append(inventory.feed('mdns', mdns_response(model='Chromecast Ultra'), '10.0.0.5'))
+            writes.append(inventory.feed('ssdp', NOTIFY, '10.0.0.7'))
+            writes.append(inventory.feed('ssdp', NOTIFY, '10.0.0.7'))
+
+        self.assertEqual(writes, [1] + [0] * 49 + [1, 1, 0])
+        self.assertEqual(upsert.call_count, 3)
+        self.assertEqual(inventory.announcements, 53)
+        rows = database.get_device_services_db('10.0.0.5')
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(json.loads(rows[0]['details'])['md'], 'Chromecast Ultra')
+
+    def test_route_groups_by_device(self):
+        database.insert_or_replace_device_db([{'mac': 'AA:BB:CC:DD:EE:05', 'ip': '10.0.0.5', 'last_seen': '2026-01-01T00:00:00.000000'}])
+        with patch.object(discovery, 'service_inventory', ServiceInventory()) as inventory:
+            inventory.feed('mdns', mdns_response(), '10.0.0.5')
+            inventory.feed('ssdp', NOTIFY, '10.0.0.7')
+            app = Flask(__name__)
+            app.register_blueprint(routes)
+            response = app.test_client().get('/api/discovery/services')
+
+        devices = {device['ip']: device for device in response.json['devices']}
+        self.assertEqual(devices['10.0.0.5']['mac'], 'AA:BB:CC:DD:EE:05')
+        self.assertEqual(devices['10.0.0.5']['categories'], ['chromecast'])
+        self.assertEqual(devices['10.0.0.5']['services'][0]['details']['md'], 'Chromecast')
+        self.assertIsNotNone(devices['10.0.0.5']['services'][0]['last_seen'])
+        self.assertEqual(devices['10.0.0.7']['categories'], ['media_renderer'])
+
+
+class ListenerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.db = TemporaryDatabase().__enter__()
+        self.addCleanup(self.db.__exit__, None, None, None)
+
+    def test_listener_loop(self):
+        sockets = {}
+
+        def loopback_socket(group):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind(('127.0.0.1', 0))
+            sock.setblocking(False)
+            sockets[group] = sock.getsockname()
+            return sock
+
+        inventory = ServiceInventory()
+        listener = DiscoveryListener(inventory, query_interval=60)
+        with patch('backend.discovery._multicast_socket', loopback_socket), patch.object(listener, 'query') as query:
+            listener.start()
+            self.addCleanup(listener.stop)
+            deadline = time.monotonic() + 2
+            while len(sockets) < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sender:
+                sender.sendto(NOTIFY, sockets[discovery.SSDP_GROUP])
+                sender.sendto(mdns_response(), sockets[discovery.MDNS_GROUP])
+            while inventory.writes < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+        self.assertEqual(inventory.writes, 2)
+        # One query round when the listener starts, not one per host
+        self.assertEqual(query.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
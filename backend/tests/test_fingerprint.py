@@ -0,0 +1,120 @@
+import unittest
+from unittest.mock import patch
+
+from flask import Flask
+
+from backend import database
+from backend.benchmarks.suite import TemporaryDatabase
+from backend.fingerprint import fingerprint_hosts, fingerprint_stale_devices, initial_ttl, score_fingerprint
+from backend.routes import routes
+from backend.transport import SimulatedNetwork, SimulatedTransport, tcp_option_layout
+
+
+class ScoringTestCase(unittest.TestCase):
+    def test_initial_ttl(self):
+        self.assertEqual(initial_ttl(57), 64)
+        self.assertEqual(initial_ttl(64), 64)
+        self.assertEqual(initial_ttl(113), 128)
+        self.assertEqual(initial_ttl(250), 255)
+
+    def test_ttl_only(self):
+        guess = score_fingerprint({'icmp_ttl': 120})
+
+        self.assertEqual(guess.family, 'Windows')
+        self.assertEqual(guess.confidence, 1.0)
+        self.assertFalse(guess.has_tcp)
+
+    def test_syn_ack_tells_apart_families_sharing_a_ttl(self):
+        linux = score_fingerprint({'icmp_ttl': 63, 'icmp_code_echoed': True, 'tcp_ttl': 63, 'tcp_window': 65160, 'tcp_options': 'MSTNW'})
+        mac = score_fingerprint({'icmp_ttl': 63, 'icmp_code_echoed': True, 'tcp_ttl': 63, 'tcp_window': 65535, 'tcp_options': 'MNWNNTSE'})
+
+        self.assertEqual(linux.family, 'Linux/Android/Unix-like')
+        self.assertEqual(mac.family, 'macOS/iOS')
+        self.assertTrue(mac.has_tcp)
+
+    def test_conflicting_evidence_lowers_confidence(self):
+        guess = score_fingerprint({'icmp_ttl': 128, 'icmp_code_echoed': True, 'tcp_window': 65160, 'tcp_options': 'MSTNW'})
+
+        self.assertEqual(guess.family, 'Linux/Android/Unix-like')
+        self.assertLess(guess.confidence, 0.6)
+
+    def test_no_answer(self):
+        self.assertIsNone(score_fingerprint({}).family)
+
+    def test_option_layout(self):
+        options = [('MSS', 1460), ('SAckOK', b''), ('Timestamp', (1, 0)), ('NOP', None), ('WScale', 7)]
+
+        self.assertEqual(tcp_option_layout(options), 'MSTNW')
+
+
+class BatchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.network = SimulatedNetwork(subnets=['10.8.0.0/26'], density=1.0, loss=0.0, seed=5)
+        self.transport = SimulatedTransport(self.network)
+
+    def test_one_exchange_for_every_host(self):
+        targets = {ip: (host.open_ports[0] if host.open_ports else None) for ip, host in self.network.hosts.items()}
+
+        with patch.object(self.transport, 'fingerprint_many', wraps=self.transport.fingerprint_many) as exchange:
+            guesses = fingerprint_hosts(targets, self.transport)
+
+        exchange.assert_called_once()
+        expected = {64: 'Linux/Android/Unix-like', 128: 'Windows', 255: 'Network device (router/switch)'}
+        for ip, host in self.network.hosts.items():
+            self.assertEqual(guesses[ip].family, expected[host.ttl])
+            self.assertEqual(guesses[ip].has_tcp, bool(host.open_ports))
+            self.assertEqual(guesses[ip].confidence, 1.0)
+
+
+class StaleDevicesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.db = TemporaryDatabase().__enter__()
+        self.addCleanup(self.db.__exit__, None, None, None)
+        self.network = SimulatedNetwork(subnets=['10.8.1.0/28'], density=1.0, loss=0.0, seed=2)
+        self.transport = SimulatedTransport(self.network)
+        self.hosts = list(self.network.hosts.values())[:3]
+        database.insert_or_replace_device_db([
+            {'mac': host.mac, 'ip': host.ip, 'last_seen': '2026-01-01T00:00:00.000000'} for host in self.hosts
+        ])
+
+    def test_only_new_or_changed_devices_are_fingerprinted(self):
+        first = fingerprint_stale_devices(self.transport)
+        second = fingerprint_stale_devices(self.transport)
+        moved = self.hosts[0]
+        database.insert_or_replace_device_db([
+            {'mac': moved.mac, 'ip': self.hosts[1].ip, 'last_seen': '2026-01-01T00:00:10.000000'},
+        ])
+        third = fingerprint_stale_devices(self.transport)
+
+        self.assertEqual(set(first), {host.mac for host in self.hosts})
+        self.assertEqual(second, {})
+        self.assertEqual(list(third), [moved.mac])
+        families = {row['mac']: row['os_family'] for row in database.get_devices_with_label_db()}
+        self.assertEqual(families[self.hosts[2].mac], first[self.hosts[2].mac].family)
+
+    def test_open_port_found_later_triggers_a_tcp_fingerprint(self):
+        host = next(host for host in self.network.hosts.values() if host.open_ports)
+        database.insert_or_replace_device_db([{'mac': host.mac, 'ip': host.ip, 'last_seen': '2026-01-01T00:00:00.000000'}])
+        fingerprint_stale_devices(self.transport)
+        database.save_port_scan_db([(host.mac, host.ip, [(host.open_ports[0], None, None)])], 'common')
+
+        again = fingerprint_stale_devices(self.transport)
+
+        self.assertEqual(list(again), [host.mac])
+        self.assertTrue(again[host.mac].has_tcp)
+
+    def test_route(self):
+        app = Flask(__name__)
+        app.register_blueprint(routes)
+        client = app.test_client()
+
+        with patch('backend.fingerprint.get_transport', return_value=self.transport):
+            response = client.post('/api/devices/fingerprints')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json['devices']), 3)
+        self.assertIn('icmp_ttl', response.json['devices'][0]['evidence'])
+
+
+if __name__ == '__main__':
+    unittest.main()
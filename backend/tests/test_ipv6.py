@@ -0,0 +1,194 @@
+import sqlite3
+import subprocess
+import time
+import unittest
+from unittest.mock import patch
+
+from backend import database
+from backend.benchmarks.suite import TemporaryDatabase
+from backend.ipv6 import candidate_addresses, discover_ipv6, preferred_address
+from backend.mac_utils import eui64_address
+from backend.transport import ScapyTransport, SimulatedNetwork, SimulatedTransport, parse_ip_neigh, set_transport
+from backend.utils import save_ipv6_neighbors, update_scan_results
+
+
+def _addresses():
+    with sqlite3.connect(database.DB_PATH) as conn:
+        return conn.execute('SELECT mac, ip, source FROM device_addresses ORDER BY mac, ip').fetchall()
+
+
+class AddressingTestCase(unittest.TestCase):
+    def test_eui64_address(self):
+        self.assertEqual(eui64_address('fe80::/64', '00:1a:2b:3c:4d:5e'), 'fe80::21a:2bff:fe3c:4d5e')
+        self.assertEqual(eui64_address('2001:db8:1:2::/64', '02:00:00:00:00:01'), '2001:db8:1:2:0:ff:fe00:1')
+
+    def test_candidates(self):
+        candidates = candidate_addresses(['fd00::/64', '2001:db8::/48'], ['00:1a:2b:3c:4d:5e', 'Unknown'])
+
+        # Not a /64, no SLAAC addresses to guess in there
+        self.assertEqual(candidates, ['fd00::1', 'fd00::2', 'fd00::3', 'fd00::21a:2bff:fe3c:4d5e'])
+
+    def test_parse_ip_neigh(self):
+        output = (
+            'fe80::1 dev eth0 lladdr 00:1A:2B:3C:4D:5E router REACHABLE\n'
+            'fd00::5 dev eth0 lladdr 02:00:00:00:00:05 STALE\n'
+            'fd00::6 dev eth0  FAILED\n'
+            'fd00::7 dev eth0 lladdr 02:00:00:00:00:07 INCOMPLETE\n'
+        )
+
+        self.assertEqual(parse_ip_neigh(output), [
+            ('fe80::1', '00:1a:2b:3c:4d:5e', 'REACHABLE'),
+            ('fd00::5', '02:00:00:00:00:05', 'STALE'),
+        ])
+
+    def test_preferred_address(self):
+        self.assertEqual(preferred_address(['fe80::1', 'fd00::5']), 'fd00::5')
+        self.assertEqual(preferred_address(['fe80::1']), 'fe80::1')
+
+
+class DiscoveryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.network = SimulatedNetwork(density=0.5, loss=0.0, ipv6_ratio=0.6, ipv6_only=2, seed=5)
+        self.transport = SimulatedTransport(self.network)
+        self.dual_stack = [host for host in self.network.hosts.values() if host.ipv6]
+
+    def test_all_nodes_echo_and_solicitations(self):
+        known = [host.mac for host in self.network.hosts.values()]
+
+        found = {(mac, ip) for mac, ip, _ in discover_ipv6(known, self.transport)}
+
+        hosts = {id(host): host for host in self.network.ipv6_hosts.values()}.values()
+        # Every IPv6 host answers the all-nodes echo with its link-local address
+        self.assertTrue({(host.mac, host.ipv6[0]) for host in hosts} <= found)
+        # Global addresses only show up when they're the EUI-64 of a known MAC
+        for host in self.dual_stack:
+            eui64 = host.ipv6[1] == eui64_address(self.network.ipv6_prefix, host.mac)
+            self.assertEqual((host.mac, host.ipv6[1]) in found, eui64)
+
+    def test_neighbor_cache_entries(self):
+        privacy = next(host for host in self.dual_stack if host.ipv6[1] != eui64_address(self.network.ipv6_prefix, host.mac))
+        self.transport.neighbor_cache = {privacy.ipv6[1]: privacy.mac.upper(), 'ff02::1': '33:33:00:00:00:01', 'fd00::dead': '02:00:00:00:de:ad'}
+        self.transport.neighbor_states = {'fd00::dead': 'STALE'}
+
+        found = discover_ipv6([], self.transport)
+
+        self.assertIn((privacy.mac, privacy.ipv6[1], 'neighbor_cache'), found)
+        self.assertIn(('02:00:00:00:de:ad', 'fd00::dead', 'stale_neighbor'), found)
+        self.assertNotIn('ff02::1', [ip for _, ip, _ in found])
+
+
+class MergeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.db = TemporaryDatabase().__enter__()
+        self.addCleanup(self.db.__exit__, None, None, None)
+        self.now = time.strftime('%Y-%m-%dT%H:%M:%S.000000')
+        database.insert_or_replace_device_db([{'mac': '02:00:00:00:00:01', 'ip': '10.0.0.1', 'last_seen': self.now}])
+
+    def test_dual_stack_and_ipv6_only_devices(self):
+        save_ipv6_neighbors([
+            ('02:00:00:00:00:01', 'fe80::1', 'ndp'),
+            ('02:00:00:00:00:01', 'fd00::1', 'ndp'),
+            ('02:00:00:00:00:02', 'fe80::2', 'ndp'),
+            ('02:00:00:00:00:02', 'fd00::2', 'neighbor_cache'),
+        ], ipv4_macs=set())
+        devices = {row['mac']: row for row in database.get_devices_with_label_db()}
+
+        # Missing from the ARP sweep doesn't cost a device its IPv4 address
+        self.assertEqual(devices['02:00:00:00:00:01']['ip'], '10.0.0.1')
+        self.assertEqual(sorted(devices['02:00:00:00:00:01']['ipv6'].split(' ')), ['fd00::1', 'fe80::1'])
+        self.assertEqual(devices['02:00:00:00:00:02']['ip'], 'fd00::2')
+        self.assertEqual(devices['02:00:00:00:00:02']['status'], 'online')
+        # IPv4-only probes leave the IPv6-only device alone
+        self.assertEqual([mac for mac, _, _ in database.get_presence_targets_db('2000-01-01')], ['02:00:00:00:00:01'])
+
+    def test_stale_neighbor_entries_are_not_proof_of_life(self):
+        with sqlite3.connect(database.DB_PATH) as conn:
+            conn.execute("UPDATE devices SET status = 'offline', last_seen = '2026-01-01T12:00:00.000000'")
+
+        save_ipv6_neighbors([
+            ('02:00:00:00:00:01', 'fd00::1', 'stale_neighbor'),
+            ('02:00:00:00:00:03', 'fd00::3', 'stale_neighbor'),
+        ], ipv4_macs=set())
+        devices = {row['mac']: row for row in database.get_devices_with_label_db()}
+
+        self.assertEqual((devices['02:00:00:00:00:01']['status'], devices['02:00:00:00:00:01']['last_seen']), ('offline', '2026-01-01T12:00:00.000000'))
+        self.assertEqual(devices['02:00:00:00:00:01']['ipv6'], 'fd00::1')
+        self.assertNotIn('02:00:00:00:00:03', devices)
+
+    def test_ipv4_address_replaces_an_ipv6_one(self):
+        save_ipv6_neighbors([('02:00:00:00:00:02', 'fd00::2', 'ndp')], ipv4_macs=set())
+        database.insert_or_replace_device_db([{'mac': '02:00:00:00:00:02', 'ip': '10.0.0.2', 'last_seen': self.now}])
+        save_ipv6_neighbors([('02:00:00:00:00:02', 'fd00::2', 'ndp')], ipv4_macs=set())
+
+        devices = {row['mac']: row for row in database.get_devices_with_label_db()}
+        self.assertEqual(devices['02:00:00:00:00:02']['ip'], '10.0.0.2')
+
+    def test_old_addresses_are_forgotten(self):
+        save_ipv6_neighbors([('02:00:00:00:00:01', 'fd00::dead', 'ndp')], ipv4_macs={'02:00:00:00:00:01'})
+        with patch('backend.utils.IPV6_FORGET_AFTER', -60):
+            save_ipv6_neighbors([('02:00:00:00:00:01', 'fd00::1', 'ndp')], ipv4_macs={'02:00:00:00:00:01'})
+
+        self.assertEqual(_addresses(), [])
+
+    def test_runs_with_the_arp_sweep(self):
+        network = SimulatedNetwork(density=0.5, loss=0.0, ipv6_ratio=1.0, ipv6_only=1, seed=2)
+        previous = set_transport(SimulatedTransport(network))
+        self.addCleanup(set_transport, previous)
+
+        with patch('backend.utils.queue_reverse_lookup'), patch('backend.utils.OS_FINGERPRINT', False):
+            update_scan_results()
+
+        devices = {row['mac']: row for row in database.get_devices_with_label_db()}
+        for host in network.hosts.values():
+            self.assertEqual(devices[host.mac]['ip'], host.ip)
+            self.assertIn(host.ipv6[0], devices[host.mac]['ipv6'])
+        ipv6_only = next(host for host in network.ipv6_hosts.values() if host.ip not in network.hosts)
+        self.assertEqual(devices[ipv6_only.mac]['ip'], ipv6_only.ipv6[0])
+
+
+class NdpSweepTestCase(unittest.TestCase):
+    """All-nodes echo and neighbor solicitation on a veth pair whose far end lives in its own namespace."""
+
+    def setUp(self):
+        self.netns, self.iface = 'ipv6-test', 'ip6t0'
+        commands = [
+            ['ip', 'netns', 'add', self.netns],
+            ['ip', 'link', 'add', self.iface, 'type', 'veth', 'peer', 'name', 'ip6t1'],
+            ['ip', 'link', 'set', 'ip6t1', 'netns', self.netns],
+            ['sysctl', '-qw', f'net.ipv6.conf.{self.iface}.accept_dad=0'],
+            ['ip', 'netns', 'exec', self.netns, 'sysctl', '-qw', 'net.ipv6.conf.ip6t1.accept_dad=0'],
+            ['ip', 'link', 'set', self.iface, 'up'],
+            ['ip', '-n', self.netns, 'link', 'set', 'ip6t1', 'up'],
+        ]
+        self.addCleanup(subprocess.run, ['ip', 'netns', 'del', self.netns], capture_output=True)
+        self.addCleanup(subprocess.run, ['ip', 'link', 'del', self.iface], capture_output=True)
+        try:
+            for command in commands:
+                subprocess.run(command, check=True, capture_output=True)
+            self.peer_mac = subprocess.run(
+                ['ip', 'netns', 'exec', self.netns, 'cat', '/sys/class/net/ip6t1/address'],
+                check=True, capture_output=True, text=True,
+            ).stdout.strip()
+            self.peer_global = eui64_address('fd00:81::/64', self.peer_mac)
+            subprocess.run(['ip', '-n', self.netns, 'addr', 'add', f'{self.peer_global}/64', 'dev', 'ip6t1'], check=True, capture_output=True)
+        except (OSError, subprocess.CalledProcessError):
+            self.skipTest('Needs root, veth and network namespace support')
+        # The link-local addresses appear once the links are up
+        deadline = time.monotonic() + 5
+        while not any(prefix.startswith('fe80:') for prefix in ScapyTransport().ipv6_prefixes(self.iface)):
+            if time.monotonic() > deadline:
+                self.skipTest('No IPv6 link-local address on the veth')
+            time.sleep(0.1)
+
+    def test_finds_link_local_and_solicited_addresses(self):
+        targets = [self.peer_global, 'fd00:81::dead']
+
+        found = dict(ScapyTransport().ndp_sweep(targets, timeout=1, iface=self.iface))
+
+        self.assertEqual(found.get(eui64_address('fe80::/64', self.peer_mac)), self.peer_mac)
+        self.assertEqual(found.get(self.peer_global), self.peer_mac)
+        self.assertNotIn('fd00:81::dead', found)
+
+
+if __name__ == '__main__':
+    unittest.main()
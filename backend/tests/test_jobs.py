@@ -0,0 +1,233 @@
+import json
+import os
+import stat
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from flask import Flask
+
+from backend import jobs
+from backend.admission import AdmissionController, AdmissionRejected, traceroute_admission
+from backend.jobs import JobError, JobManager, JobType
+from backend.routes import routes
+from backend.traceroute import traceroute_host
+
+
+def _echo(params):
+    return params
+
+def _wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError('Timed out')
+        time.sleep(0.01)
+
+
+class JobManagerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        self.order = []
+
+        def blocking(job):
+            self.release.wait(5)
+            return 'unblocked'
+
+        def record(job, name):
+            self.order.append(name)
+            job.report(partial=name)
+            return name
+
+        self.types = {
+            'blocking': JobType(_echo, blocking, priority=5),
+            'record': JobType(_echo, record, priority=5),
+            'big': JobType(_echo, lambda job: 'x' * 100, priority=5),
+            'fails': JobType(_echo, lambda job: 1 / 0, priority=5),
+            'chatty': JobType(_echo, lambda job: [job.report(partial='x' * 20) for _ in range(10)], priority=5),
+        }
+
+    def test_priorities_then_fifo(self):
+        manager = JobManager(self.types, workers=1)
+        blocker = manager.submit('blocking')
+        _wait_until(lambda: blocker.status == 'running')
+        queued = [
+            manager.submit('record', {'name': 'low'}, priority=9),
+            manager.submit('record', {'name': 'first'}, priority=1),
+            manager.submit('record', {'name': 'second'}, priority=1),
+        ]
+        self.release.set()
+        _wait_until(lambda: all(job.finished for job in queued))
+
+        self.assertEqual(self.order, ['first', 'second', 'low'])
+        self.assertEqual(queued[0].partial, ['low'])
+        self.assertEqual(blocker.result, 'unblocked')
+
+    def test_bounded_queue(self):
+        manager = JobManager(self.types, workers=1, queue_size=1)
+        blocker = manager.submit('blocking')
+        _wait_until(lambda: blocker.status == 'running')
+        manager.submit('record', {'name': 'waits'})
+
+        with self.assertRaises(JobError) as full:
+            manager.submit('record', {'name': 'rejected'})
+
+        self.assertEqual(full.exception.code, 'queue_full')
+
+    def test_cancel_queued_job(self):
+        manager = JobManager(self.types, workers=1, queue_size=1)
+        blocker = manager.submit('blocking')
+        _wait_until(lambda: blocker.status == 'running')
+        queued = manager.submit('record', {'name': 'never'})
+
+        manager.cancel(queued.id)
+        # Its queue spot is free again
+        manager.submit('record', {'name': 'runs'})
+        self.release.set()
+        _wait_until(lambda: self.order == ['runs'])
+
+        self.assertEqual(queued.status, 'cancelled')
+
+    def test_cancel_running_job_keeps_it_cancelled(self):
+        manager = JobManager(self.types, workers=1)
+        blocker = manager.submit('blocking')
+        _wait_until(lambda: blocker.status == 'running')
+
+        manager.cancel(blocker.id)
+        self.release.set()
+        time.sleep(0.05)
+
+        self.assertEqual((blocker.status, blocker.result), ('cancelled', None))
+
+    def test_failures_and_result_size_cap(self):
+        manager = JobManager(self.types, workers=2, max_result_bytes=50)
+        failing, big = manager.submit('fails'), manager.submit('big')
+        _wait_until(lambda: failing.finished and big.finished)
+
+        self.assertEqual(failing.error['code'], 'job_failed')
+        self.assertEqual(big.error['code'], 'result_too_large')
+        self.assertIsNone(big.result)
+
+    def test_partial_results_count_against_the_size_cap(self):
+        manager = JobManager(self.types, workers=1, max_result_bytes=50)
+        chatty = manager.submit('chatty')
+        _wait_until(lambda: chatty.finished)
+
+        self.assertEqual(chatty.error['code'], 'result_too_large')
+        self.assertEqual(len(chatty.partial), 2)
+
+    def test_admission_control(self):
+        controller = AdmissionController('test', max_concurrent=1, max_queue=0, max_wait=0.1, cost_budget=10, client_rate=0.001, client_burst=2)
+        manager = JobManager({'limited': JobType(_echo, lambda job, cost: self.release.wait(5), priority=5, admission=controller,
+                                                 cost=lambda cost: cost)}, workers=2)
+
+        with self.assertRaises(AdmissionRejected) as expensive:
+            manager.submit('limited', {'cost': 20}, client='10.0.0.2')
+        running = manager.submit('limited', {'cost': 5}, client='10.0.0.2')
+        _wait_until(lambda: controller.running == 1)
+        # Doesn't fit next to the first one: waits, past max_wait and though the endpoint's queue is 0 long
+        waiting = manager.submit('limited', {'cost': 5}, client='10.0.0.2')
+        _wait_until(lambda: controller.stats()['queued'] == 1)
+        time.sleep(0.2)
+        with self.assertRaises(AdmissionRejected) as rate_limited:
+            manager.submit('limited', {'cost': 5}, client='10.0.0.2')
+        self.assertEqual((waiting.status, controller.running), ('running', 1))
+        self.release.set()
+        _wait_until(lambda: running.finished and waiting.finished)
+
+        self.assertEqual(expensive.exception.reason, 'too_expensive')
+        self.assertEqual(rate_limited.exception.status, 429)
+        self.assertEqual((running.status, waiting.status, controller.running), ('succeeded', 'succeeded', 0))
+
+    def test_finished_jobs_expire(self):
+        manager = JobManager(self.types, workers=1, ttl=60, max_finished=2)
+        done = [manager.submit('record', {'name': str(i)}) for i in range(3)]
+        _wait_until(lambda: all(job.finished for job in done))
+
+        self.assertIsNone(manager.get(done[0].id))
+        self.assertEqual({job.id for job in manager.jobs()}, {done[1].id, done[2].id})
+        with patch('backend.jobs.time.time', return_value=time.time() + 61):
+            self.assertEqual(manager.jobs(), [])
+
+    def test_invalid_submissions(self):
+        manager = JobManager(jobs.JOB_TYPES, workers=1)
+        for job_type, params, priority in [
+            ('nope', {}, None),
+            ('traceroute', {}, None),
+            ('traceroute', {'target': 'example.com', 'max_hops': 100}, None),
+            ('traceroute', {'target': 'example.com', 'max_hops': True}, None),
+            ('scan', {'subnet': '10.0.0.0/8'}, None),
+            ('scan', {}, 12),
+            ('scan', {}, True),
+        ]:
+            with self.assertRaises(JobError):
+                manager.submit(job_type, params, priority)
+
+
+def _fake_traceroute(directory):
+    """A `traceroute` on PATH that prints its hops 50ms apart."""
+    path = os.path.join(directory, 'traceroute')
+    with open(path, 'w') as script:
+        script.write(
+            '#!/bin/sh\n'
+            'echo "traceroute to 127.0.0.1 (127.0.0.1), 3 hops max, 60 byte packets"\n'
+            'echo " 1  10.0.0.1  1.000 ms  1.100 ms  1.200 ms"; sleep 0.05\n'
+            'echo " 2  * * *"; sleep 0.05\n'
+            'echo " 3  127.0.0.1  3.000 ms  3.100 ms  3.200 ms"\n'
+        )
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+
+
+class TracerouteStreamingTestCase(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        _fake_traceroute(directory.name)
+        self.path = patch.dict(os.environ, {'PATH': directory.name + os.pathsep + os.environ['PATH']})
+        self.path.start()
+        self.addCleanup(self.path.stop)
+
+    def test_hops_are_reported_as_they_come(self):
+        seen = []
+
+        result = traceroute_host('127.0.0.1', max_hops=3, timeout=1, on_hop=lambda hop: seen.append((hop['hop'], hop['status'], time.monotonic())))
+
+        self.assertEqual([(hop, status) for hop, status, _ in seen], [(1, 'ok'), (2, 'timeout'), (3, 'reached')])
+        self.assertGreater(seen[-1][2] - seen[0][2], 0.05)
+        self.assertTrue(result['reached'])
+        self.assertEqual(result['total_hops'], 3)
+
+    def test_job_api(self):
+        traceroute_admission.reset()
+        self.addCleanup(traceroute_admission.reset)
+        app = Flask(__name__)
+        app.register_blueprint(routes)
+        client = app.test_client()
+
+        created = client.post('/api/jobs', json={'type': 'traceroute', 'params': {'target': '127.0.0.1', 'max_hops': 3}})
+        events = client.get(f"/api/jobs/{created.json['id']}/events").get_data(as_text=True)
+        job = client.get(f"/api/jobs/{created.json['id']}?partial_since=1").json
+        invalid = client.post('/api/jobs', json={'type': 'traceroute', 'params': {}})
+        expensive = client.post('/api/jobs', json={'type': 'traceroute', 'params': {'target': '127.0.0.1', 'max_hops': 64, 'timeout': 10}})
+        missing = client.get('/api/jobs/nope')
+
+        self.assertEqual(created.status_code, 202)
+        self.assertEqual(created.headers['Location'], f"/api/jobs/{created.json['id']}")
+        names = [line.split(': ', 1)[1] for line in events.splitlines() if line.startswith('event: ')]
+        self.assertEqual(names.count('partial'), 3)
+        self.assertEqual(names[-1], 'done')
+        done = json.loads(events.strip().splitlines()[-1].split(': ', 1)[1])
+        self.assertEqual(done['status'], 'succeeded')
+        self.assertTrue(done['result']['reached'])
+        self.assertEqual([hop['hop'] for hop in job['partial']], [2, 3])
+        self.assertEqual(job['partial_count'], 3)
+        self.assertEqual(invalid.status_code, 400)
+        self.assertEqual((expensive.status_code, expensive.json['error']['code']), (400, 'too_expensive'))
+        self.assertEqual(missing.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import json
+import sqlite3
+import unittest
+
+from flask import Flask
+
+from backend import database
+from backend.benchmarks.suite import TemporaryDatabase
+from backend.mac_utils import normalize_mac
+from backend.routes import routes
+
+
+class NormalizeMacTestCase(unittest.TestCase):
+    def test_accepted_notations(self):
+        for mac in ('aa:bb:cc:dd:ee:ff', 'AA-BB-CC-DD-EE-FF', 'aabb.ccdd.eeff', 'aabbccddeeff', ' aa:bb:cc:dd:ee:ff '):
+            self.assertEqual(normalize_mac(mac), 'AA:BB:CC:DD:EE:FF')
+
+    def test_rejects_non_macs(self):
+        for mac in ('aa:bb:cc:dd:ee', 'gg:bb:cc:dd:ee:ff', '', None, 42):
+            self.assertIsNone(normalize_mac(mac))
+
+
+class LabelImportExportTestCase(unittest.TestCase):
+    def setUp(self):
+        self.db = TemporaryDatabase().__enter__()
+        self.addCleanup(self.db.__exit__, None, None, None)
+        app = Flask(__name__)
+        app.register_blueprint(routes)
+        self.client = app.test_client()
+
+    def labels(self):
+        return {row['mac']: row['label'] for row in database.iter_labels_db()}
+
+    def test_ndjson_import_reports_per_line_errors(self):
+        body = '\n'.join([
+            json.dumps({'mac': 'aa-bb-cc-dd-ee-01', 'label': 'Printer'}),
+            json.dumps({'mac': 'not-a-mac', 'label': 'x'}),
+            '{broken',
+            '',
+            json.dumps({'mac': 'aabb.ccdd.ee02', 'label': '  '}),
+            json.dumps({'mac': 'AA:BB:CC:DD:EE:03', 'label': 'NAS'}),
+        ])
+
+        response = self.client.post('/api/devices/labels/import', data=body, content_type='application/x-ndjson')
+
+        result = response.get_json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(result['imported'], 2)
+        self.assertEqual(result['rows'], 5)
+        self.assertEqual([(error['line'], error['code']) for error in result['errors']],
+                         [(2, 'invalid_mac'), (3, 'invalid_row'), (5, 'missing_label')])
+        self.assertEqual(self.labels(), {'AA:BB:CC:DD:EE:01': 'Printer', 'AA:BB:CC:DD:EE:03': 'NAS'})
+
+    def test_csv_import_upserts_in_one_go(self):
+        database.update_devices_label_db('AA:BB:CC:DD:EE:01', 'Old')
+        rows = ['mac,label'] + [f'aa:bb:cc:00:{i // 256:02x}:{i % 256:02x},device {i}' for i in range(2000)]
+        rows.append('aa:bb:cc:dd:ee:01,"Printer, 2nd floor"')
+
+        response = self.client.post('/api/devices/labels/import', data='\n'.join(rows), content_type='text/csv')
+
+        self.assertEqual(response.get_json()['imported'], 2001)
+        labels = self.labels()
+        self.assertEqual(len(labels), 2001)
+        self.assertEqual(labels['AA:BB:CC:DD:EE:01'], 'Printer, 2nd floor')
+
+    def test_slow_upload_doesnt_hold_the_write_lock(self):
+        def slow_upload():
+            for i in range(5):
+                # Whatever the server writes while the next rows are on their way, without waiting for the lock
+                with sqlite3.connect(database.DB_PATH, timeout=0) as conn:
+                    conn.execute("INSERT INTO devices (mac, ip, status) VALUES (?, '10.0.0.1', 'online')", (f'02:00:00:00:00:{i:02x}',))
+                yield f'AA:BB:CC:DD:EE:{i:02X}', 'Printer'
+
+        imported = database.import_labels_db(slow_upload(), batch_size=2)
+
+        self.assertEqual(imported, 5)
+        self.assertEqual(len(self.labels()), 5)
+
+    def test_unsupported_content_type(self):
+        response = self.client.post('/api/devices/labels/import', json=[{'mac': 'aa:bb:cc:dd:ee:01', 'label': 'x'}])
+
+        self.assertEqual(response.status_code, 415)
+        self.assertEqual(response.get_json()['error']['code'], 'invalid_content_type')
+
+    def test_export_streams_ndjson_and_csv(self):
+        database.import_labels_db([('AA:BB:CC:DD:EE:02', 'TV'), ('AA:BB:CC:DD:EE:01', 'Printer, 2nd floor')])
+
+        ndjson = self.client.get('/api/devices/labels/export')
+        csv_response = self.client.get('/api/devices/labels/export?format=csv')
+
+        self.assertTrue(ndjson.is_streamed)
+        rows = [json.loads(line) for line in ndjson.get_data(as_text=True).splitlines()]
+        self.assertEqual([row['mac'] for row in rows], ['AA:BB:CC:DD:EE:01', 'AA:BB:CC:DD:EE:02'])
+        lines = csv_response.get_data(as_text=True).splitlines()
+        self.assertEqual(lines[0], 'mac,label,updated_at')
+        self.assertTrue(lines[1].startswith('AA:BB:CC:DD:EE:01,"Printer, 2nd floor",'))
+        self.assertEqual(self.client.get('/api/devices/labels/export?format=xml').status_code, 400)
+
+    def test_export_round_trips_through_import(self):
+        database.import_labels_db([('AA:BB:CC:DD:EE:01', 'Printer')])
+        exported = self.client.get('/api/devices/labels/export').get_data()
+        self.db.__exit__(None, None, None)
+        self.db = TemporaryDatabase().__enter__()
+
+        response = self.client.post('/api/devices/labels/import', data=exported, content_type='application/x-ndjson')
+
+        self.assertEqual(response.get_json()['imported'], 1)
+        self.assertEqual(self.labels(), {'AA:BB:CC:DD:EE:01': 'Printer'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+
+from flask import Flask
+
+from backend.metrics import Counter, Gauge, Histogram, render_metrics
+from backend.routes import routes
+
+
+class MetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        # Not the global registry, or these would show up in /metrics
+        self.registry = []
+
+    def test_histogram_renders_cumulative_buckets(self):
+        histogram = Histogram('test_latency_seconds', 'Test latency.', ('route',), buckets=(0.1, 1.0), registry=self.registry)
+        histogram.observe(0.05, route='/a')
+        histogram.observe(0.5, route='/a')
+        histogram.observe(5, route='/a')
+
+        text = histogram.render()
+
+        self.assertIn('# TYPE test_latency_seconds histogram', text)
+        self.assertIn('test_latency_seconds_bucket{route="/a",le="0.1"} 1', text)
+        self.assertIn('test_latency_seconds_bucket{route="/a",le="1.0"} 2', text)
+        self.assertIn('test_latency_seconds_bucket{route="/a",le="+Inf"} 3', text)
+        self.assertIn('test_latency_seconds_count{route="/a"} 3', text)
+        self.assertEqual(histogram.count(route='/a'), 3)
+
+    def test_counter_and_gauge_track_values(self):
+        counter = Counter('test_events', 'Test events.', registry=self.registry)
+        gauge = Gauge('test_depth', 'Test depth.', registry=self.registry)
+        counter.inc()
+        counter.inc(2)
+        gauge.inc()
+        gauge.inc()
+        gauge.dec()
+
+        self.assertEqual(counter.value(), 3)
+        self.assertEqual(self.registry, [counter, gauge])
+        self.assertNotIn('test_events', render_metrics())
+        self.assertEqual(gauge.value(), 1)
+        self.assertIn('test_events_total 3', counter.render())
+
+    def test_wrong_labels_raise(self):
+        counter = Counter('test_labelled', 'Test labelled.', ('kind',), registry=self.registry)
+
+        with self.assertRaises(ValueError):
+            counter.inc(other='x')
+
+    def test_metrics_route_serves_exposition_format(self):
+        app = Flask(__name__)
+        app.register_blueprint(routes)
+        response = app.test_client().get('/metrics')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        self.assertIn('netdiag_scan_duration_seconds', response.get_data(as_text=True))
+        self.assertEqual(response.get_data(as_text=True), render_metrics())
+
+
+if __name__ == '__main__':
+    unittest.main()
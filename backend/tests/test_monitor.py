@@ -0,0 +1,140 @@
+import math
+import unittest
+from unittest.mock import patch
+
+from flask import Flask
+
+from backend import monitor
+from backend.monitor import LatencyMonitor, LogHistogram, resolve_targets, round_stats
+from backend.routes import routes
+from backend.transport import ScapyTransport, SimulatedNetwork, SimulatedTransport
+
+
+class LogHistogramTestCase(unittest.TestCase):
+    def test_percentiles_within_a_bucket(self):
+        histogram = LogHistogram()
+        for rtt in range(1, 101):
+            histogram.observe(float(rtt))
+
+        for p in (50, 90, 99):
+            estimate = histogram.percentile(p)
+            self.assertGreaterEqual(estimate, p)
+            self.assertLess(estimate, p * 1.1)
+        self.assertEqual(histogram.total, 100)
+
+    def test_fixed_size_and_clamped(self):
+        histogram = LogHistogram()
+        size = len(histogram.counts)
+        for rtt in (0.001, 1e9, 5.0):
+            histogram.observe(rtt)
+
+        self.assertEqual(len(histogram.counts), size)
+        self.assertEqual(histogram.counts[0], 1)
+        self.assertEqual(histogram.counts[-1], 1)
+        self.assertIsNone(LogHistogram().percentile(50))
+
+
+class RoundStatsTestCase(unittest.TestCase):
+    def test_loss_percentiles_and_jitter(self):
+        stats = round_stats([10.0, None, 12.0, 11.0, None])
+
+        self.assertEqual(stats['sent'], 5)
+        self.assertEqual(stats['lost'], 2)
+        self.assertAlmostEqual(stats['loss'], 0.4)
+        self.assertEqual(stats['min_ms'], 10.0)
+        self.assertEqual(stats['p50_ms'], 11.0)
+        self.assertEqual(stats['max_ms'], 12.0)
+        self.assertAlmostEqual(stats['jitter_ms'], 1.5)
+
+    def test_all_lost(self):
+        stats = round_stats([None, None])
+
+        self.assertEqual(stats['loss'], 1.0)
+        self.assertTrue(math.isnan(stats['p50_ms']))
+
+
+class LatencyMonitorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.transport = SimulatedTransport(SimulatedNetwork(subnets=['10.42.0.0/24'], density=1.0, loss=0.1, seed=7))
+        self.targets = {f'10.42.0.{i}': None for i in range(1, 201)}
+
+    def test_rounds_are_recorded_per_target(self):
+        latency_monitor = LatencyMonitor(self.targets, interval=60, probes=20, history=5, transport=self.transport)
+
+        for _ in range(8):
+            latency_monitor.probe_round()
+
+        series = latency_monitor.series['10.42.0.1']
+        self.assertEqual(len(series.rounds), 5)
+        window = series.rounds.window()
+        self.assertTrue(all(sent == 20 for sent in window['sent']))
+        self.assertTrue(0 < sum(window['lost']) < 100)
+        # The histogram covers all 8 rounds, the ring only the last 5
+        self.assertGreater(series.histogram.total, 100)
+        self.assertLess(series.histogram.total, 160)
+        self.assertIsNotNone(series.summary()['p50_ms'])
+
+    def test_unknown_target_is_all_loss(self):
+        latency_monitor = LatencyMonitor({'192.0.2.1': 'nowhere'}, probes=5, transport=self.transport)
+
+        latency_monitor.probe_round()
+
+        self.assertEqual(latency_monitor.series['192.0.2.1'].latest['loss'], 1.0)
+
+    @patch('backend.monitor.system_resolvers', return_value=['1.1.1.1', '10.0.0.1'])
+    def test_resolve_targets(self, mock_resolvers):
+        with patch('backend.utils.net_config.gateway_ip', ('eth0', '10.0.0.2', '10.0.0.1')):
+            targets = resolve_targets('gateway, dns, 8.8.8.8')
+
+        self.assertEqual(targets, {'10.0.0.1': 'gateway', '1.1.1.1': 'dns', '8.8.8.8': None})
+
+
+class PingManyTestCase(unittest.TestCase):
+    def test_loopback(self):
+        try:
+            results = ScapyTransport().ping_many(['127.0.0.1'], count=3, spacing=0.01, timeout=1)
+        except PermissionError:
+            self.skipTest('ICMP sockets not permitted')
+
+        self.assertEqual(len(results['127.0.0.1']), 3)
+        self.assertTrue(all(rtt is not None and rtt < 1000 for rtt in results['127.0.0.1']))
+
+
+class MonitorRoutesTestCase(unittest.TestCase):
+    def setUp(self):
+        app = Flask(__name__)
+        app.register_blueprint(routes)
+        self.client = app.test_client()
+        transport = SimulatedTransport(SimulatedNetwork(subnets=['10.42.0.0/24'], density=1.0, seed=7))
+        self.monitor = LatencyMonitor({'10.42.0.1': 'gateway'}, probes=10, transport=transport)
+        self.monitor.probe_round()
+        patcher = patch('backend.monitor.latency_monitor', self.monitor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_list_and_detail(self):
+        listing = self.client.get('/api/monitor').get_json()
+        detail = self.client.get('/api/monitor/10.42.0.1').get_json()
+
+        self.assertEqual(listing['targets'][0]['name'], 'gateway')
+        self.assertEqual(detail['rounds']['sent'], [10])
+        self.assertEqual(sum(bucket['count'] for bucket in detail['histogram']), detail['samples'])
+        self.assertEqual(self.client.get('/api/monitor/10.9.9.9').status_code, 404)
+
+    def test_add_and_remove_targets(self):
+        added = self.client.post('/api/monitor/targets', json={'target': '10.42.0.7', 'name': 'nas'})
+        invalid = self.client.post('/api/monitor/targets', json={'target': 'nas.lan'})
+        removed = self.client.delete('/api/monitor/targets/10.42.0.7')
+
+        self.assertEqual(added.status_code, 201)
+        self.assertEqual(invalid.status_code, 400)
+        self.assertEqual(removed.get_json()['deleted'], True)
+        self.assertNotIn('10.42.0.7', self.monitor.series)
+
+    def test_disabled(self):
+        with patch('backend.monitor.latency_monitor', None):
+            self.assertEqual(self.client.get('/api/monitor').status_code, 503)
+
+
+if __name__ == '__main__':
+    unittest.main()
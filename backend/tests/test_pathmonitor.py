@@ -0,0 +1,255 @@
+import json
+import statistics
+import subprocess
+import threading
+import unittest
+from unittest.mock import patch
+
+from flask import Flask
+
+from backend import pathmonitor
+from backend.pathmonitor import HopStats, MonitoredPath, PathMonitor
+from backend.routes import routes
+from backend.transport import ScapyTransport, SimulatedHop, SimulatedNetwork, SimulatedTransport
+
+TARGET = '198.51.100.7'
+
+
+def _round(path, answers, times=1):
+    for _ in range(times):
+        path.record(0, answers)
+
+
+class HopStatsTestCase(unittest.TestCase):
+    def test_running_stats(self):
+        hop = HopStats(1, window=4)
+        rtts = [10.0, None, 12.0, 11.0, None, 30.0]
+        for rtt in rtts:
+            hop.observe(rtt)
+        stats = hop.to_json()
+        answered = [rtt for rtt in rtts if rtt is not None]
+
+        self.assertEqual((stats['sent'], stats['received']), (6, 4))
+        self.assertAlmostEqual(stats['loss'], 2 / 6)
+        # Only the last 4 probes: 12, 11, lost, 30
+        self.assertAlmostEqual(stats['recent_loss'], 1 / 4)
+        self.assertEqual((stats['best_ms'], stats['worst_ms'], stats['last_ms']), (10.0, 30.0, 30.0))
+        self.assertAlmostEqual(stats['avg_ms'], statistics.mean(answered))
+        self.assertAlmostEqual(stats['stdev_ms'], statistics.stdev(answered))
+        self.assertAlmostEqual(stats['jitter_ms'], (2 + 1 + 19) / 3)
+
+
+class MonitoredPathTestCase(unittest.TestCase):
+    def setUp(self):
+        self.path = MonitoredPath(TARGET, TARGET, max_hops=8, window=10)
+
+    def test_trims_the_ttls_past_the_target(self):
+        _round(self.path, [('10.0.0.1', 1.0), ('100.64.0.1', 5.0), (TARGET, 9.0), (TARGET, 9.0)] + [None] * 4)
+
+        self.assertEqual(self.path.length, 3)
+        self.assertEqual(self.path.probes, 3)
+        self.assertEqual([hop['ip'] for hop in self.path.hop_stats()], ['10.0.0.1', '100.64.0.1', TARGET])
+
+    def test_rate_limiting_is_not_loss(self):
+        answered = [('10.0.0.1', 1.0), ('100.64.0.1', 5.0), (TARGET, 9.0)]
+        rate_limited = [('10.0.0.1', 1.0), None, (TARGET, 9.0)]
+        for _ in range(5):
+            _round(self.path, answered)
+            _round(self.path, rate_limited)
+        hops = self.path.hop_stats()
+
+        self.assertEqual(hops[1]['recent_loss'], 0.5)
+        self.assertEqual(hops[1]['forwarded_loss'], 0.0)
+        self.assertTrue(hops[1]['rate_limited'])
+        self.assertFalse(hops[2]['rate_limited'])
+
+    def test_loss_carried_on_to_the_target_is_real(self):
+        answered = [('10.0.0.1', 1.0), ('100.64.0.1', 5.0), (TARGET, 9.0)]
+        lossy = [('10.0.0.1', 1.0), None, None]
+        for _ in range(5):
+            _round(self.path, answered)
+            _round(self.path, lossy)
+        hops = self.path.hop_stats()
+
+        self.assertEqual([hop['forwarded_loss'] for hop in hops], [0.0, 0.5, 0.5])
+        self.assertFalse(any(hop['rate_limited'] for hop in hops))
+        self.assertEqual(self.path.summary()['loss'], 0.5)
+
+    def test_new_router_is_a_path_change(self):
+        _round(self.path, [('10.0.0.1', 1.0), ('100.64.0.1', 5.0), (TARGET, 9.0)], times=3)
+        _round(self.path, [('10.0.0.1', 1.0), ('100.64.0.2', 7.0), (TARGET, 9.0)])
+
+        hop = self.path.hop_stats()[1]
+        self.assertEqual([(change['hop'], change['from'], change['to']) for change in self.path.changes], [(2, '100.64.0.1', '100.64.0.2')])
+        self.assertEqual((hop['ip'], hop['sent'], hop['avg_ms']), ('100.64.0.2', 1, 7.0))
+        self.assertEqual(hop['other_ips'], {'100.64.0.1': 1})
+
+    def test_load_balanced_routers_are_not_changes(self):
+        first, second = [('10.0.0.1', 1.0), ('100.64.0.1', 5.0), (TARGET, 9.0)], [('10.0.0.1', 1.0), ('100.64.0.2', 5.0), (TARGET, 9.0)]
+        for _ in range(3):
+            _round(self.path, first)
+            _round(self.path, second)
+
+        self.assertEqual(len(self.path.changes), 1)
+        self.assertEqual(self.path.hop_stats()[1]['received'], 5)
+
+    def test_longer_path_is_probed_to_the_end_again(self):
+        _round(self.path, [('10.0.0.1', 1.0), (TARGET, 9.0)])
+        _round(self.path, [('10.0.0.1', 1.0), ('100.64.0.1', 5.0)])
+
+        self.assertIsNone(self.path.length)
+        self.assertEqual(self.path.probes, 8)
+
+        _round(self.path, [('10.0.0.1', 1.0), ('100.64.0.1', 5.0), (TARGET, 9.0)] + [(TARGET, 9.0)] * 5)
+        self.assertEqual(self.path.length, 3)
+
+    def test_memory_is_fixed(self):
+        for i in range(500):
+            _round(self.path, [('10.0.0.1', 1.0 + i % 7), None if i % 3 else ('100.64.0.1', 5.0), (TARGET, 9.0)])
+
+        self.assertEqual(len(self.path.hops), 8)
+        self.assertEqual(len(self.path.hops[0]._recent), 10)
+        self.assertEqual(self.path.hops[0].sent, 500)
+
+
+class PathMonitorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.transport = SimulatedTransport(SimulatedNetwork(loss=0.0, seed=3))
+        self.monitor = PathMonitor(interval=1, timeout=1, max_paths=3, transport=self.transport)
+
+    def test_one_exchange_per_round_for_every_path(self):
+        for target in ('198.51.100.1', '198.51.100.2', '198.51.100.3'):
+            self.monitor.add_path(target)
+
+        with patch.object(self.transport, 'ttl_probe_many', wraps=self.transport.ttl_probe_many) as exchange:
+            self.monitor.probe_round()
+            self.monitor.probe_round()
+
+        self.assertEqual(exchange.call_count, 2)
+        # The first round goes all the way to max_hops, the next only to each target
+        first, second = (call.args[0] for call in exchange.call_args_list)
+        self.assertEqual(set(first.values()), {30})
+        self.assertEqual(second, {target: len(self.transport.path(target)) for target in first})
+        for summary in self.monitor.summaries():
+            self.assertTrue(summary['reached'])
+
+    def test_max_paths_and_unresolvable_targets(self):
+        for target in ('198.51.100.1', '198.51.100.2', '198.51.100.3'):
+            self.monitor.add_path(target)
+
+        with self.assertRaises(ValueError):
+            self.monitor.add_path('198.51.100.4')
+        self.monitor.remove_path('198.51.100.1')
+        with self.assertRaises(ValueError):
+            self.monitor.add_path('no-such-host.invalid')
+
+    def test_simulated_route_change_is_detected(self):
+        self.monitor.add_path(TARGET)
+        for _ in range(3):
+            self.monitor.probe_round()
+        path = self.transport.path(TARGET)
+        path[1] = SimulatedHop('100.127.0.1', path[1].latency_ms)
+        self.monitor.probe_round()
+
+        changes = self.monitor.snapshot(TARGET)['changes']
+        self.assertEqual([(change['hop'], change['to']) for change in changes], [(2, '100.127.0.1')])
+
+
+class PathRoutesTestCase(unittest.TestCase):
+    def setUp(self):
+        app = Flask(__name__)
+        app.register_blueprint(routes)
+        self.client = app.test_client()
+        self.monitor = PathMonitor(transport=SimulatedTransport(SimulatedNetwork(loss=0.0, seed=3)))
+        patcher = patch.object(pathmonitor, 'path_monitor', self.monitor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_add_get_and_remove(self):
+        created = self.client.post('/api/paths', json={'target': TARGET, 'max_hops': 20})
+        self.monitor.probe_round()
+        listed = self.client.get('/api/paths')
+        detail = self.client.get(f'/api/paths/{TARGET}')
+        invalid = self.client.post('/api/paths', json={'target': TARGET, 'max_hops': 100})
+        deleted = self.client.delete(f'/api/paths/{TARGET}')
+        missing = self.client.get(f'/api/paths/{TARGET}')
+
+        self.assertEqual(created.status_code, 201)
+        self.assertEqual(listed.json['paths'][0]['target'], TARGET)
+        self.assertEqual(detail.json['hops'][-1]['ip'], TARGET)
+        self.assertEqual(invalid.status_code, 400)
+        self.assertEqual(deleted.status_code, 200)
+        self.assertEqual(missing.status_code, 404)
+
+    def test_events_stream_each_round(self):
+        self.monitor.add_path(TARGET)
+        timer = threading.Timer(0.2, self.monitor.probe_round)
+        timer.start()
+        self.addCleanup(timer.cancel)
+        response = self.client.get(f'/api/paths/{TARGET}/events', buffered=False)
+
+        chunk = next(iter(response.response))
+        response.close()
+
+        event, data = chunk.decode().strip().split('\n')
+        self.assertEqual(event, 'event: round')
+        self.assertEqual(json.loads(data[len('data: '):])['rounds'], 1)
+
+    def test_disabled(self):
+        with patch.object(pathmonitor, 'path_monitor', None):
+            self.assertEqual(self.client.get('/api/paths').status_code, 503)
+
+
+class TtlProbeManyTestCase(unittest.TestCase):
+    """A real two hop path: this namespace, a router namespace forwarding to a target namespace."""
+
+    def setUp(self):
+        commands = [
+            ['ip', 'netns', 'add', 'pm-router'],
+            ['ip', 'netns', 'add', 'pm-target'],
+            ['ip', 'link', 'add', 'pm0', 'type', 'veth', 'peer', 'name', 'pm1'],
+            ['ip', 'link', 'add', 'pm2', 'type', 'veth', 'peer', 'name', 'pm3'],
+            ['ip', 'link', 'set', 'pm1', 'netns', 'pm-router'],
+            ['ip', 'link', 'set', 'pm2', 'netns', 'pm-router'],
+            ['ip', 'link', 'set', 'pm3', 'netns', 'pm-target'],
+            ['ip', 'addr', 'add', '10.81.0.1/24', 'dev', 'pm0'],
+            ['ip', 'link', 'set', 'pm0', 'up'],
+            ['ip', '-n', 'pm-router', 'addr', 'add', '10.81.0.2/24', 'dev', 'pm1'],
+            ['ip', '-n', 'pm-router', 'addr', 'add', '10.81.1.1/24', 'dev', 'pm2'],
+            ['ip', '-n', 'pm-router', 'link', 'set', 'pm1', 'up'],
+            ['ip', '-n', 'pm-router', 'link', 'set', 'pm2', 'up'],
+            ['ip', '-n', 'pm-target', 'addr', 'add', '10.81.1.2/24', 'dev', 'pm3'],
+            ['ip', '-n', 'pm-target', 'link', 'set', 'pm3', 'up'],
+            ['ip', '-n', 'pm-target', 'route', 'add', 'default', 'via', '10.81.1.1'],
+            ['ip', 'route', 'add', '10.81.1.0/24', 'via', '10.81.0.2'],
+            ['ip', 'netns', 'exec', 'pm-router', 'sysctl', '-qw', 'net.ipv4.ip_forward=1'],
+        ]
+        for namespace in ('pm-router', 'pm-target'):
+            self.addCleanup(subprocess.run, ['ip', 'netns', 'del', namespace], capture_output=True)
+        self.addCleanup(subprocess.run, ['ip', 'link', 'del', 'pm0'], capture_output=True)
+        try:
+            for command in commands:
+                subprocess.run(command, check=True, capture_output=True)
+        except (OSError, subprocess.CalledProcessError):
+            self.skipTest('Needs root, veth and network namespace support')
+
+    def test_time_exceeded_and_echo_replies(self):
+        results = ScapyTransport().ttl_probe_many({'10.81.1.2': 4, '10.81.0.2': 1}, timeout=1)
+
+        self.assertEqual([answer[0] for answer in results['10.81.1.2']], ['10.81.0.2'] + ['10.81.1.2'] * 3)
+        self.assertEqual(results['10.81.0.2'][0][0], '10.81.0.2')
+
+    def test_path_monitor_over_the_wire(self):
+        monitor = PathMonitor(timeout=1, transport=ScapyTransport())
+        monitor.add_path('10.81.1.2', max_hops=5)
+
+        monitor.probe_round()
+        monitor.probe_round()
+
+        snapshot = monitor.snapshot('10.81.1.2')
+        self.assertEqual(snapshot['hop_count'], 2)
+        self.assertEqual([(hop['ip'], hop['received']) for hop in snapshot['hops']], [('10.81.0.2', 2), ('10.81.1.2', 2)])
+
+
+if __name__ == '__main__':
+    unittest.main()
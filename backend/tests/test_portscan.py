@@ -0,0 +1,204 @@
+import errno
+import socket
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from flask import Flask
+
+from backend import database, portscan
+from backend.benchmarks.suite import TemporaryDatabase
+from backend.portscan import PortScanError, PortScanner, RateLimiter, parse_profile, scan_stale_devices
+from backend.routes import routes
+from backend.transport import SimulatedNetwork, SimulatedTransport
+
+
+class Listeners:
+    """Loopback listeners: `greeting` ones send a banner, the others stay silent."""
+
+    def __init__(self, count=3, greeting=b'SSH-2.0-OpenSSH_9.6\r\n'):
+        self.servers = [socket.create_server(('127.0.0.1', 0)) for _ in range(count)]
+        self.ports = [server.getsockname()[1] for server in self.servers]
+        self.greeting = greeting
+        for server in self.servers:
+            threading.Thread(target=self.serve, args=(server,), daemon=True).start()
+
+    def serve(self, server):
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            with conn:
+                try:
+                    conn.sendall(self.greeting)
+                except OSError:
+                    pass
+
+    def close(self):
+        for server in self.servers:
+            server.close()
+
+
+def closed_ports(count):
+    sockets = [socket.socket() for _ in range(count)]
+    for sock in sockets:
+        sock.bind(('127.0.0.1', 0))
+    ports = [sock.getsockname()[1] for sock in sockets]
+    for sock in sockets:
+        sock.close()
+    return ports
+
+
+class ProfileTestCase(unittest.TestCase):
+    def test_profiles_and_ranges(self):
+        self.assertIn(22, parse_profile('common'))
+        self.assertGreater(len(parse_profile('extended')), 1000)
+        self.assertEqual(parse_profile('22, 80,8000-8002'), [22, 80, 8000, 8001, 8002])
+
+    def test_invalid(self):
+        for profile in ('', 'abc', '0', '70000', '90-80'):
+            with self.assertRaises(PortScanError):
+                parse_profile(profile)
+
+
+class RateLimiterTestCase(unittest.TestCase):
+    def test_token_bucket(self):
+        now = [0.0]
+        limiter = RateLimiter(rate=10, burst=2, clock=lambda: now[0])
+
+        self.assertEqual([limiter.delay() for _ in range(4)], [0.0, 0.0, 0.1, 0.2])
+        now[0] = 1.0
+        self.assertEqual(limiter.delay(), 0.0)
+
+
+class ConnectScanTestCase(unittest.TestCase):
+    def setUp(self):
+        self.listeners = Listeners()
+        self.addCleanup(self.listeners.close)
+
+    def test_open_ports_and_banners(self):
+        ports = sorted(self.listeners.ports + closed_ports(20))
+        with patch.object(portscan, 'GREETING_PORTS', {self.listeners.ports[0]}):
+            results = PortScanner(concurrency=8, host_rate=10_000, timeout=1).scan(['127.0.0.1'], ports)
+
+        found = {result.port: result for result in results['127.0.0.1']}
+        self.assertEqual(sorted(found), sorted(self.listeners.ports))
+        self.assertEqual(found[self.listeners.ports[0]].banner, 'SSH-2.0-OpenSSH_9.6')
+        self.assertIsNone(found[self.listeners.ports[1]].banner)
+
+    def test_per_host_rate_limit(self):
+        ports = closed_ports(30)
+        start = time.perf_counter()
+        PortScanner(host_rate=100, timeout=1, banners=False).scan(['127.0.0.1'], ports)
+        elapsed = time.perf_counter() - start
+
+        # 30 connections at 100/s with a burst of 10: at least ~0.2 s
+        self.assertGreaterEqual(elapsed, 0.18)
+
+    def test_in_flight_limit(self):
+        scanner = PortScanner(concurrency=4, host_rate=10_000, timeout=1, banners=False)
+        in_flight = peak = 0
+        original = PortScanner._connect
+
+        async def counting_connect(self, ip, port):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            try:
+                await portscan.asyncio.sleep(0.01)
+                return await original(self, ip, port)
+            finally:
+                in_flight -= 1
+
+        with patch.object(PortScanner, '_connect', counting_connect):
+            scanner.scan(['127.0.0.1', '127.0.0.2'], closed_ports(40))
+
+        self.assertEqual(peak, 4)
+        self.assertEqual(scanner.probes, 80)
+
+    def test_windows_connects(self):
+        class WindowsSocket(socket.socket):
+            def connect_ex(self, address):
+                error = super().connect_ex(address)
+                return 10035 if error == errno.EINPROGRESS else error  # WSAEWOULDBLOCK
+
+        ports = sorted(self.listeners.ports + closed_ports(5))
+        scanner = PortScanner(host_rate=10_000, timeout=1, banners=False)
+        with patch.object(portscan.socket, 'socket', WindowsSocket):
+            selector = scanner.scan(['127.0.0.1'], ports)
+        # The proactor loop: no add_writer, sock_connect instead
+        with patch.object(portscan, '_can_watch_sockets', return_value=False):
+            proactor = scanner.scan(['127.0.0.1'], ports)
+
+        for results in (selector, proactor):
+            self.assertEqual([result.port for result in results['127.0.0.1']], sorted(self.listeners.ports))
+
+
+class SynScanTestCase(unittest.TestCase):
+    def test_syn_mode_through_the_transport(self):
+        network = SimulatedNetwork(subnets=['10.9.0.0/28'], density=1.0, loss=0.0, seed=3)
+        host = next(host for host in network.hosts.values() if host.open_ports)
+        scanner = PortScanner(mode='syn', banners=False, timeout=0.05, transport=SimulatedTransport(network))
+
+        results = scanner.scan([host.ip], parse_profile('common'))
+
+        self.assertEqual([result.port for result in results[host.ip]], list(host.open_ports))
+
+
+class IncrementalScanTestCase(unittest.TestCase):
+    def setUp(self):
+        self.db = TemporaryDatabase().__enter__()
+        self.addCleanup(self.db.__exit__, None, None, None)
+        self.listeners = Listeners(count=2)
+        self.addCleanup(self.listeners.close)
+        self.profile = ','.join(map(str, self.listeners.ports))
+        database.insert_or_replace_device_db([
+            {'mac': 'AA:BB:CC:DD:EE:01', 'ip': '127.0.0.1', 'last_seen': '2026-01-01T00:00:00.000000'},
+        ])
+
+    def test_only_new_or_changed_devices_are_rescanned(self):
+        scanner = PortScanner(host_rate=10_000, timeout=1, banners=False)
+
+        first = scan_stale_devices(self.profile, scanner=scanner)
+        second = scan_stale_devices(self.profile, scanner=scanner)
+        database.insert_or_replace_device_db([
+            {'mac': 'AA:BB:CC:DD:EE:01', 'ip': '127.0.0.2', 'last_seen': '2026-01-01T00:00:10.000000'},
+        ])
+        third = scan_stale_devices(self.profile, scanner=scanner)
+
+        self.assertEqual([port.port for port in first['AA:BB:CC:DD:EE:01']], sorted(self.listeners.ports))
+        self.assertEqual(second, {})
+        # Nothing listens on 127.0.0.2: the stored ports follow the device
+        self.assertEqual(third, {'AA:BB:CC:DD:EE:01': []})
+        self.assertEqual(database.get_device_ports_db('aa:bb:cc:dd:ee:01'), [])
+
+    def test_routes(self):
+        app = Flask(__name__)
+        app.register_blueprint(routes)
+        client = app.test_client()
+
+        scanned = client.post('/api/devices/ports/scan', json={'profile': self.profile})
+        listed = client.get('/api/devices/ports')
+        device = client.get('/api/devices/AA:BB:CC:DD:EE:01/ports')
+        invalid = client.post('/api/devices/ports/scan', json={'profile': 'nope'})
+        by_mac = client.post('/api/devices/ports/scan', json={'profile': self.profile, 'devices': ['aa-bb-cc-dd-ee-01']})
+        unknown = client.post('/api/devices/ports/scan', json={'profile': self.profile, 'devices': ['AA:BB:CC:DD:EE:02']})
+        by_ip = client.post('/api/devices/ports/scan', json={'profile': self.profile, 'devices': [{'mac': 'AA:BB:CC:DD:EE:02', 'ip': '192.0.2.1'}]})
+
+        self.assertEqual(scanned.status_code, 200)
+        self.assertEqual(scanned.json['scanned'], 1)
+        self.assertEqual(len(listed.json['devices']), 1)
+        self.assertEqual([port['port'] for port in device.json['ports']], sorted(self.listeners.ports))
+        self.assertEqual(device.json['ip'], '127.0.0.1')
+        self.assertEqual(invalid.status_code, 400)
+        self.assertEqual(by_mac.json['devices'][0]['mac'], 'AA:BB:CC:DD:EE:01')
+        self.assertEqual(len(by_mac.json['devices'][0]['ports']), 2)
+        # Only devices the sweep found, never an IP the client picks
+        self.assertEqual(unknown.status_code, 404)
+        self.assertEqual(by_ip.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
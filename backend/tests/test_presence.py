@@ -0,0 +1,135 @@
+import sqlite3
+import subprocess
+import time
+import unittest
+from unittest.mock import patch
+
+from backend import database
+from backend.benchmarks.suite import TemporaryDatabase
+from backend.presence import PresenceTracker
+from backend.transport import ScapyTransport, SimulatedNetwork, SimulatedTransport
+
+
+def _statuses():
+    with sqlite3.connect(database.DB_PATH) as conn:
+        return dict(conn.execute('SELECT mac, status FROM devices').fetchall())
+
+
+class PresenceTrackerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.db = TemporaryDatabase().__enter__()
+        self.addCleanup(self.db.__exit__, None, None, None)
+        self.network = SimulatedNetwork(subnets=['10.7.0.0/27'], density=1.0, loss=0.0, seed=4)
+        self.transport = SimulatedTransport(self.network)
+        self.hosts = list(self.network.hosts.values())[:4]
+        self.now = time.strftime('%Y-%m-%dT%H:%M:%S.000000')
+        database.insert_or_replace_device_db([{'mac': host.mac, 'ip': host.ip, 'last_seen': self.now} for host in self.hosts])
+        self.tracker = PresenceTracker(self.transport, timeout=0.1, unresponsive_misses=2, offline_misses=3)
+
+    def test_online_unresponsive_offline_and_back(self):
+        gone = self.hosts[0]
+        del self.network.hosts[gone.ip]
+
+        history = [self.tracker.check().get(gone.mac) for _ in range(4)]
+        self.network.hosts[gone.ip] = gone
+        back = self.tracker.check()
+
+        # Still online after one miss (nothing to write), then unresponsive, offline, and no rewrite once offline
+        self.assertEqual(history, [None, 'unresponsive', 'offline', None])
+        self.assertEqual(back[gone.mac], 'online')
+        self.assertEqual(set(_statuses().values()), {'online'})
+
+    def test_one_exchange_and_one_update_per_cycle(self):
+        with patch.object(self.transport, 'arp_probe_many', wraps=self.transport.arp_probe_many) as exchange, \
+                patch('backend.presence.database.update_presence_db', wraps=database.update_presence_db) as update:
+            written = self.tracker.check()
+
+        exchange.assert_called_once()
+        update.assert_called_once()
+        self.assertEqual(written, {host.mac: 'online' for host in self.hosts})
+
+    def test_ip_taken_over_by_another_device(self):
+        moved = self.hosts[0]
+        earlier = time.strftime('%Y-%m-%dT%H:%M:%S.000000', time.localtime(time.time() - 60))
+        database.insert_or_replace_device_db([{'mac': '02:00:00:00:00:01', 'ip': moved.ip, 'last_seen': earlier}])
+        tracker = PresenceTracker(self.transport, timeout=0.1, unresponsive_misses=1, offline_misses=1)
+
+        written = tracker.check()
+
+        self.assertEqual(written['02:00:00:00:00:01'], 'offline')
+        self.assertEqual(written[moved.mac], 'online')
+
+    def test_restart_carries_on_from_the_stored_status(self):
+        gone = self.hosts[0]
+        del self.network.hosts[gone.ip]
+        for _ in range(3):
+            self.tracker.check()
+
+        restarted = PresenceTracker(self.transport, timeout=0.1, unresponsive_misses=2, offline_misses=3)
+
+        self.assertEqual(restarted.check(), {host.mac: 'online' for host in self.hosts[1:]})
+
+    def test_sweep_marks_a_device_online_again(self):
+        gone = self.hosts[0]
+        del self.network.hosts[gone.ip]
+        for _ in range(3):
+            self.tracker.check()
+        database.insert_or_replace_device_db([{'mac': gone.mac, 'ip': gone.ip, 'last_seen': self.now}])
+
+        self.assertEqual(_statuses()[gone.mac], 'online')
+        # One more miss after that is a single miss again, not straight back to offline
+        self.assertNotIn(gone.mac, self.tracker.check())
+
+    def test_invalid_thresholds(self):
+        with self.assertRaises(ValueError):
+            PresenceTracker(self.transport, unresponsive_misses=3, offline_misses=2)
+
+
+class ArpProbeManyTestCase(unittest.TestCase):
+    """Unicast ARP on a veth pair whose far end lives in its own network namespace."""
+
+    def setUp(self):
+        self.netns, self.iface = 'presence-test', 'prs0'
+        commands = [
+            ['ip', 'netns', 'add', self.netns],
+            ['ip', 'link', 'add', self.iface, 'type', 'veth', 'peer', 'name', 'prs1'],
+            ['ip', 'link', 'set', 'prs1', 'netns', self.netns],
+            ['ip', 'addr', 'add', '10.78.0.1/24', 'dev', self.iface],
+            ['ip', '-n', self.netns, 'addr', 'add', '10.78.0.2/24', 'dev', 'prs1'],
+            ['ip', 'link', 'set', self.iface, 'up'],
+            ['ip', '-n', self.netns, 'link', 'set', 'prs1', 'up'],
+        ]
+        self.addCleanup(subprocess.run, ['ip', 'netns', 'del', self.netns], capture_output=True)
+        self.addCleanup(subprocess.run, ['ip', 'link', 'del', self.iface], capture_output=True)
+        try:
+            for command in commands:
+                subprocess.run(command, check=True, capture_output=True)
+            self.peer_mac = subprocess.run(
+                ['ip', 'netns', 'exec', self.netns, 'cat', '/sys/class/net/prs1/address'],
+                check=True, capture_output=True, text=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            self.skipTest('Needs root, veth and network namespace support')
+
+    def test_answers_and_misses(self):
+        targets = {'10.78.0.2': self.peer_mac, '10.78.0.3': '02:00:00:00:00:03'}
+
+        replies = ScapyTransport().arp_probe_many(targets, timeout=0.3, iface=self.iface)
+
+        self.assertEqual(replies, {'10.78.0.2': self.peer_mac})
+
+    def test_returns_once_everyone_answered(self):
+        start = time.perf_counter()
+        replies = ScapyTransport().arp_probe_many({'10.78.0.2': self.peer_mac}, timeout=5, iface=self.iface)
+
+        self.assertEqual(replies, {'10.78.0.2': self.peer_mac})
+        self.assertLess(time.perf_counter() - start, 1)
+
+    def test_wrong_mac_does_not_answer(self):
+        replies = ScapyTransport().arp_probe_many({'10.78.0.2': '02:00:00:00:00:02'}, timeout=0.3, iface=self.iface)
+
+        self.assertEqual(replies, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+from unittest.mock import patch
+
+from flask import Flask
+
+from backend import profiling
+from backend.routes import routes
+
+
+class ProfilingTestCase(unittest.TestCase):
+    def setUp(self):
+        profiling.slow_requests.clear()
+
+    def test_track_is_noop_outside_requests(self):
+        with profiling.track('db'):
+            pass
+
+        self.assertIsNone(profiling._request_timings.get())
+
+    @patch('backend.profiling.PROFILE_SAMPLE_RATE', 0)
+    def test_track_accumulates_per_request(self):
+        profile = profiling.begin_request()
+        with profiling.track('db'):
+            pass
+        with profiling.track('subprocess'):
+            pass
+        profile.close()
+
+        self.assertGreater(profile.timings['db'], 0)
+        self.assertGreater(profile.timings['subprocess'], 0)
+        self.assertIsNone(profiling._request_timings.get())
+
+    @patch('backend.profiling.SLOW_REQUEST_MS', 0)
+    @patch('backend.profiling.PROFILE_SAMPLE_RATE', 1)
+    def test_slow_request_is_captured_with_profile(self):
+        profile = profiling.begin_request()
+        sum(range(1000))
+        profiling.end_request(profile, 'req-1', 'GET', '/api/devices', 200)
+
+        slow_request = profiling.get_slow_request('req-1')
+        self.assertIsNotNone(slow_request)
+        self.assertIn('function calls', slow_request.profile)
+        # The profiler lock must be free again for the next sampled request
+        self.assertTrue(profiling._profiler_lock.acquire(blocking=False))
+        profiling._profiler_lock.release()
+
+    @patch('backend.profiling.SLOW_REQUEST_MS', 10_000)
+    @patch('backend.profiling.PROFILE_SAMPLE_RATE', 0)
+    def test_fast_request_is_not_captured(self):
+        profile = profiling.begin_request()
+        profiling.end_request(profile, 'req-2', 'GET', '/api/health', 200)
+
+        self.assertEqual(len(profiling.slow_requests), 0)
+
+    def test_debug_endpoint_serves_profiles(self):
+        profiling.slow_requests.append(profiling.SlowRequest(
+            request_id='req-3', method='GET', path='/api/devices', status=200,
+            duration_ms=1500.0, db_ms=20.0, subprocess_ms=0.0,
+            timestamp='2026-01-01T12:00:00', profile='profile text',
+        ))
+        app = Flask(__name__)
+        app.register_blueprint(routes)
+        client = app.test_client()
+
+        listing = client.get('/api/debug/slow-requests').get_json()
+        self.assertEqual(listing[0]['request_id'], 'req-3')
+        self.assertTrue(listing[0]['profiled'])
+
+        detail = client.get('/api/debug/slow-requests/req-3').get_json()
+        self.assertEqual(detail['profile'], 'profile text')
+
+        self.assertEqual(client.get('/api/debug/slow-requests/missing').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import gzip
+import json
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+from flask import Flask, jsonify
+
+from backend import database, serialization
+from backend.benchmarks.suite import TemporaryDatabase
+from backend.routes import routes
+from backend.serialization import compress_response, dumps_json, encoded_response, install_json_provider, negotiate
+
+
+class EncodingTestCase(unittest.TestCase):
+    def test_dumps_json_matches_the_flask_encoder(self):
+        app = Flask(__name__)
+        payload = {'b': [1, 2.5, None], 'a': 'é', 'when': datetime(2026, 1, 1, 12, 0, 0)}
+
+        with app.app_context():
+            expected = json.loads(app.json.dumps(payload))
+
+        self.assertEqual(json.loads(dumps_json(payload)), expected)
+
+    def test_negotiate(self):
+        self.assertEqual(negotiate('*/*', 'gzip, deflate'), ('application/json', 'gzip'))
+        self.assertEqual(negotiate('application/json', ''), ('application/json', None))
+        with patch('backend.serialization.msgpack', None):
+            self.assertEqual(negotiate('application/msgpack', ''), ('application/json', None))
+
+    @unittest.skipIf(serialization.orjson is None, 'orjson not installed')
+    def test_fast_provider_is_used_for_jsonify(self):
+        app = Flask(__name__)
+        install_json_provider(app)
+
+        with app.test_request_context():
+            response = jsonify({'b': 1, 'a': 2})
+
+        self.assertIsInstance(app.json, serialization.FastJSONProvider)
+        self.assertEqual(response.get_data(), b'{"a":2,"b":1}\n')
+
+
+class EncodedResponseTestCase(unittest.TestCase):
+    def setUp(self):
+        serialization.response_cache.clear()
+        self.app = Flask(__name__)
+        self.builds = []
+
+        def build():
+            self.builds.append(1)
+            return {'rows': [{'mac': f'AA:BB:CC:00:00:{i:02X}', 'ip': f'10.0.0.{i}'} for i in range(200)]}
+
+        self.version = 1
+
+        @self.app.route('/rows')
+        def rows():
+            return encoded_response(build, cache_key=('rows', self.version))
+
+        @self.app.route('/plain')
+        def plain():
+            return jsonify({'text': 'x' * 5000})
+
+        self.app.after_request(compress_response)
+        self.client = self.app.test_client()
+
+    def test_large_payload_is_gzipped(self):
+        response = self.client.get('/rows', headers={'Accept-Encoding': 'gzip'})
+
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(len(json.loads(gzip.decompress(response.get_data()))['rows']), 200)
+
+    def test_uncompressed_without_accept_encoding(self):
+        response = self.client.get('/rows')
+
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(len(response.get_json()['rows']), 200)
+
+    def test_bytes_are_cached_per_version(self):
+        first = self.client.get('/rows', headers={'Accept-Encoding': 'gzip'}).get_data()
+        second = self.client.get('/rows', headers={'Accept-Encoding': 'gzip'}).get_data()
+        self.client.get('/rows')
+        self.version = 2
+        self.client.get('/rows')
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.builds), 2)
+        self.assertEqual(serialization.response_cache.hits, 1)
+
+    def test_other_responses_are_compressed_by_the_hook(self):
+        response = self.client.get('/plain', headers={'Accept-Encoding': 'gzip'})
+
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.get_data())), {'text': 'x' * 5000})
+
+    @unittest.skipIf(serialization.msgpack is None, 'msgpack not installed')
+    def test_msgpack_by_content_negotiation(self):
+        response = self.client.get('/rows', headers={'Accept': 'application/msgpack'})
+
+        self.assertEqual(response.mimetype, 'application/msgpack')
+        self.assertEqual(len(serialization.msgpack.unpackb(response.get_data())['rows']), 200)
+
+
+class DevicesVersionTestCase(unittest.TestCase):
+    def test_hostname_update_bumps_the_version_only_on_change(self):
+        with TemporaryDatabase():
+            database.insert_or_replace_device_db([{'mac': 'AA:BB:CC:DD:EE:FF', 'ip': '10.0.0.2', 'hostname': 'Unknown'}])
+            version = database.devices_version()
+
+            self.assertTrue(database.update_device_hostname('10.0.0.2', 'printer'))
+            self.assertEqual(database.devices_version(), version + 1)
+            self.assertFalse(database.update_device_hostname('10.0.0.2', 'printer'))
+            self.assertEqual(database.devices_version(), version + 1)
+
+    def test_devices_route_serves_cached_bytes_until_a_write(self):
+        serialization.response_cache.clear()
+        app = Flask(__name__)
+        app.register_blueprint(routes)
+        client = app.test_client()
+        with TemporaryDatabase(), patch('backend.routes.get_hostname', return_value=None):
+            database.insert_or_replace_device_db([{'mac': 'AA:BB:CC:DD:EE:FF', 'ip': '10.0.0.2'}])
+            with patch('backend.routes.get_devices_with_label_db', wraps=database.get_devices_with_label_db) as mock_rows:
+                client.get('/api/devices')
+                client.get('/api/devices')
+                database.update_devices_label_db('AA:BB:CC:DD:EE:FF', 'Printer')
+                body = client.get('/api/devices').get_json()
+
+        self.assertEqual(mock_rows.call_count, 2)
+        self.assertEqual(body['devices'][0]['label'], 'Printer')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import socket
+import threading
+import unittest
+from unittest.mock import patch
+
+from flask import Flask
+
+from backend import services
+from backend.routes import routes
+from backend.services import CircuitBreaker, Service, ServiceChecker, ServiceConfigError, parse_services
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    connections = set()
+
+    def do_HEAD(self):
+        StandInHandler.connections.add(self.client_address)
+        self.send_response(503 if self.path == '/down' else 204)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def _closed_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class ServiceCheckerTestCase(unittest.TestCase):
+    def setUp(self):
+        StandInHandler.connections = set()
+        self.http = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        threading.Thread(target=self.http.serve_forever, daemon=True).start()
+        self.port = self.http.server_address[1]
+
+    def tearDown(self):
+        self.http.shutdown()
+        self.http.server_close()
+
+    def checker(self, services, **kwargs):
+        checker = ServiceChecker(services, timeout=1, **kwargs)
+        self.addCleanup(checker.close)
+        return checker
+
+    def test_phases_and_connection_reuse(self):
+        checker = self.checker([Service('local', 'http', '127.0.0.1', self.port, '/')])
+
+        first = checker.check_all()[0]
+        second = checker.check_all()[0]
+
+        self.assertTrue(first.up)
+        self.assertEqual(first.status, 204)
+        self.assertFalse(first.reused_connection)
+        for phase in (first.dns_ms, first.connect_ms, first.ttfb_ms):
+            self.assertIsNotNone(phase)
+        self.assertIsNone(first.tls_ms)
+        self.assertTrue(second.reused_connection)
+        self.assertIsNone(second.connect_ms)
+        self.assertEqual(len(StandInHandler.connections), 1)
+
+    def test_concurrent_mixed_services(self):
+        listener = socket.create_server(('127.0.0.1', 0))
+        self.addCleanup(listener.close)
+        checker = self.checker([
+            Service('up', 'http', '127.0.0.1', self.port, '/'),
+            Service('struggling', 'http', '127.0.0.1', self.port, '/down'),
+            Service('tcp', 'tcp', '127.0.0.1', listener.getsockname()[1]),
+            Service('refused', 'tcp', '127.0.0.1', _closed_port()),
+        ])
+
+        results = {result.name: result for result in checker.check_all()}
+
+        self.assertTrue(results['up'].up)
+        self.assertFalse(results['struggling'].up)
+        self.assertEqual(results['struggling'].status, 503)
+        self.assertTrue(results['tcp'].up)
+        self.assertFalse(results['refused'].up)
+        self.assertIsNotNone(results['refused'].error)
+
+    def test_results_cached_for_ttl(self):
+        checker = self.checker([Service('local', 'http', '127.0.0.1', self.port, '/')], ttl=60)
+
+        first, cached_first = checker.results()
+        second, cached_second = checker.results()
+        _, cached_refresh = checker.results(max_age=0)
+
+        self.assertFalse(cached_first)
+        self.assertTrue(cached_second)
+        self.assertIs(first[0], second[0])
+        self.assertFalse(cached_refresh)
+
+    def test_breaker_skips_failing_service(self):
+        checker = self.checker([Service('refused', 'tcp', '127.0.0.1', _closed_port())], breaker_threshold=2, breaker_cooldown=60)
+
+        for _ in range(2):
+            checker.check_all()
+        with patch('backend.services._resolve') as mock_resolve:
+            result = checker.check_all()[0]
+
+        mock_resolve.assert_not_called()
+        self.assertEqual(result.breaker, 'open')
+        self.assertFalse(result.up)
+
+
+class CircuitBreakerTestCase(unittest.TestCase):
+    def test_open_half_open_closed(self):
+        now = [0.0]
+        breaker = CircuitBreaker(threshold=2, cooldown=10, clock=lambda: now[0])
+
+        breaker.record(False)
+        self.assertEqual(breaker.state, 'closed')
+        breaker.record(False)
+        self.assertEqual(breaker.state, 'open')
+        self.assertFalse(breaker.allow())
+
+        now[0] = 10
+        self.assertEqual(breaker.state, 'half_open')
+        breaker.record(False)
+        self.assertEqual(breaker.state, 'open')
+
+        now[0] = 20
+        breaker.record(True)
+        self.assertEqual(breaker.state, 'closed')
+
+
+class ParseServicesTestCase(unittest.TestCase):
+    def test_parse(self):
+        parsed = parse_services('a=https://example.com, b=http://example.org:8080/health?x=1,c=tcp://1.1.1.1:53')
+
+        self.assertEqual(parsed, [
+            Service('a', 'https', 'example.com', 443, '/'),
+            Service('b', 'http', 'example.org', 8080, '/health?x=1'),
+            Service('c', 'tcp', '1.1.1.1', 53, '/'),
+        ])
+
+    def test_invalid(self):
+        for spec in ('nourl', 'a=ftp://example.com', 'a=tcp://1.1.1.1'):
+            with self.assertRaises(ServiceConfigError):
+                parse_services(spec)
+
+
+class ServicesRouteTestCase(unittest.TestCase):
+    def setUp(self):
+        app = Flask(__name__)
+        app.register_blueprint(routes)
+        self.client = app.test_client()
+        self.listener = socket.create_server(('127.0.0.1', 0))
+        checker = ServiceChecker([Service('tcp', 'tcp', '127.0.0.1', self.listener.getsockname()[1])], timeout=1)
+        patcher = patch.object(services, 'service_checker', checker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(checker.close)
+        self.addCleanup(self.listener.close)
+
+    def test_status_and_cache(self):
+        first = self.client.get('/api/services')
+        second = self.client.get('/api/services')
+        refreshed = self.client.get('/api/services?refresh=1')
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json['up'], 1)
+        self.assertEqual(first.json['services'][0]['name'], 'tcp')
+        self.assertFalse(first.json['cached'])
+        self.assertTrue(second.json['cached'])
+        self.assertFalse(refreshed.json['cached'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from flask import Flask
+
+from backend import database, serialization, snapshot
+from backend.benchmarks import fixtures
+from backend.benchmarks.suite import TemporaryDatabase
+from backend.routes import routes
+from backend.transport import SimulatedNetwork, SimulatedTransport, set_transport
+from backend.utils import update_scan_results
+from backend.snapshot import SnapshotError, WarmStartState, decode_snapshot, encode_snapshot, read_snapshot, warm_start, write_snapshot
+
+
+class SnapshotFormatTestCase(unittest.TestCase):
+    def test_round_trip(self):
+        devices = fixtures.devices(50)
+
+        decoded = decode_snapshot(encode_snapshot(devices, saved_at=1234.5))
+
+        self.assertEqual(decoded.saved_at, 1234.5)
+        self.assertEqual(len(decoded.devices), 50)
+        for original, loaded in zip(devices, decoded.devices):
+            self.assertEqual(loaded['mac'], original['mac'].lower())
+            self.assertEqual(loaded['ip'], original['ip'])
+            self.assertEqual(loaded['last_seen'], original['last_seen'])
+            self.assertEqual(loaded['random_mac'], original['random_mac'])
+            self.assertEqual(loaded['hostname'], None if original['hostname'] == 'Unknown' else original['hostname'])
+
+    def test_strings_are_deduplicated(self):
+        devices = [{'mac': f'AA:BB:CC:00:00:{i:02X}', 'ip': f'10.0.0.{i}', 'vendor': 'Apple, Inc.'} for i in range(100)]
+
+        size = len(encode_snapshot(devices))
+
+        self.assertLess(size, snapshot.HEADER.size + 100 * snapshot.RECORD.size + 100 * 12 + 20)
+
+    def test_rejects_garbage_and_truncated_files(self):
+        data = encode_snapshot(fixtures.devices(5))
+
+        with self.assertRaises(SnapshotError):
+            decode_snapshot(b'not a snapshot at all')
+        with self.assertRaises(SnapshotError):
+            decode_snapshot(data[:-10])
+
+    def test_atomic_write_and_mmap_read(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'devices.bin')
+            self.assertIsNone(read_snapshot(path))
+
+            write_snapshot(fixtures.devices(3), path)
+            write_snapshot(fixtures.devices(7), path)
+
+            self.assertEqual(len(read_snapshot(path).devices), 7)
+            self.assertEqual(os.listdir(directory), ['devices.bin'])
+
+
+class WarmStartTestCase(unittest.TestCase):
+    def test_warm_start_seeds_caches_and_devices_until_first_sweep(self):
+        serialization.response_cache.clear()
+        app = Flask(__name__)
+        app.register_blueprint(routes)
+        client = app.test_client()
+        state = WarmStartState()
+        devices = [{'mac': 'AA:BB:CC:DD:EE:01', 'ip': '10.0.0.5', 'hostname': 'nas.lan', 'vendor': 'Synology',
+                    'last_seen': '2026-01-01T12:00:00.000000', 'random_mac': False}]
+        hostnames, vendors = {}, {}
+
+        with tempfile.TemporaryDirectory() as directory, TemporaryDatabase(), \
+                patch('backend.snapshot.warm_state', state), patch('backend.routes.warm_state', state), \
+                patch('backend.routes.get_hostname', return_value=None):
+            path = os.path.join(directory, 'devices.bin')
+            write_snapshot(devices, path)
+
+            warm_start(hostnames, vendors, path)
+            stale = client.get('/api/devices')
+            state.confirmed()
+            live = client.get('/api/devices')
+
+        self.assertEqual(hostnames, {'10.0.0.5': 'nas.lan'})
+        self.assertEqual(vendors, {'AA:BB:CC:DD:EE:01': 'Synology'})
+        self.assertTrue(stale.get_json()['stale'])
+        self.assertEqual(stale.headers['X-Data-Stale'], 'true')
+        self.assertEqual(stale.get_json()['devices'][0]['hostname'], 'nas.lan')
+        self.assertFalse(live.get_json()['stale'])
+
+    def test_first_sweep_updates_the_snapshot_devices(self):
+        network = SimulatedNetwork(density=0.2, loss=0.0, seed=4)
+        previous = set_transport(SimulatedTransport(network))
+        self.addCleanup(set_transport, previous)
+        devices = [{'mac': host.mac.upper(), 'ip': host.ip, 'last_seen': '2026-01-01T12:00:00.000000'} for host in network.hosts.values()]
+
+        with tempfile.TemporaryDirectory() as directory, TemporaryDatabase(), patch('backend.snapshot.warm_state', WarmStartState()), \
+                patch('backend.utils.queue_reverse_lookup'), patch('backend.utils.OS_FINGERPRINT', False), patch('backend.utils.IPV6_DISCOVERY', False):
+            path = os.path.join(directory, 'devices.bin')
+            write_snapshot(devices, path)
+
+            warm_start({}, {}, path)
+            update_scan_results()
+            rows = database.get_devices_with_label_db()
+
+        self.assertEqual(sorted((row['mac'], row['ip']) for row in rows), sorted((host.mac, host.ip) for host in network.hosts.values()))
+        self.assertTrue(all(row['last_seen'] != '2026-01-01T12:00:00.000000' for row in rows))
+
+    def test_status_survives_restarts(self):
+        devices = [
+            {'mac': '02:00:00:00:00:01', 'ip': '10.0.0.1', 'status': 'offline'},
+            {'mac': '02:00:00:00:00:02', 'ip': '10.0.0.2', 'status': 'unresponsive'},
+        ]
+
+        with tempfile.TemporaryDirectory() as directory, TemporaryDatabase(), patch('backend.snapshot.warm_state', WarmStartState()):
+            path = os.path.join(directory, 'devices.bin')
+            write_snapshot(devices, path)
+            # New database: the snapshot's status
+            warm_start({}, {}, path)
+            restored = {row['mac']: row['status'] for row in database.get_devices_with_label_db()}
+            # The table's rows are newer than the snapshot and stay as they are
+            write_snapshot([device | {'status': 'online'} for device in devices], path)
+            warm_start({}, {}, path)
+            kept = {row['mac']: row['status'] for row in database.get_devices_with_label_db()}
+
+        self.assertEqual(restored, {'02:00:00:00:00:01': 'offline', '02:00:00:00:00:02': 'unresponsive'})
+        self.assertEqual(kept, restored)
+
+    def test_upper_case_copies_are_dropped(self):
+        with TemporaryDatabase():
+            database.insert_or_replace_device_db([{'mac': 'AA:BB:CC:DD:EE:FF', 'ip': '10.0.0.5'}, {'mac': 'aa:bb:cc:dd:ee:ff', 'ip': '10.0.0.5'},
+                                                  {'mac': 'AA:BB:CC:DD:EE:01', 'ip': '10.0.0.6'}])
+            database.init_db()
+
+            self.assertEqual(sorted(row['mac'] for row in database.get_devices_with_label_db()), ['AA:BB:CC:DD:EE:01', 'aa:bb:cc:dd:ee:ff'])
+
+    def test_unreadable_snapshot_is_a_cold_start(self):
+        with tempfile.NamedTemporaryFile(suffix='.bin') as f:
+            f.write(b'garbage' * 10)
+            f.flush()
+
+            self.assertIsNone(warm_start({}, {}, f.name))
+
+
+if __name__ == '__main__':
+    unittest.main()
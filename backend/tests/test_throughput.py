@@ -0,0 +1,146 @@
+import socket
+import threading
+import unittest
+from unittest.mock import patch
+
+from flask import Flask
+
+from backend.admission import throughput_admission
+from backend.routes import routes
+from backend.throughput import DATAGRAM, ThroughputError, ThroughputServer, run_tcp_test, run_udp_test, tcp_info
+
+
+class ThroughputLoopbackTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = ThroughputServer('127.0.0.1', 0).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_tcp_upload_parallel_streams(self):
+        result = run_tcp_test('127.0.0.1', self.server.port, duration=0.3, streams=3, direction='upload')
+
+        self.assertEqual(result['streams'], 3)
+        self.assertEqual(len(result['per_stream']), 3)
+        # Goodput is what the server received, which is everything the streams sent
+        self.assertEqual(result['bytes'], sum(stream['bytes'] for stream in result['per_stream']))
+        self.assertGreater(result['goodput_mbps'], 0)
+        if hasattr(socket, 'TCP_INFO'):
+            self.assertIsNotNone(result['retransmits'])
+
+    def test_tcp_download(self):
+        result = run_tcp_test('127.0.0.1', self.server.port, duration=0.3, streams=2, direction='download')
+
+        self.assertGreater(result['bytes'], 0)
+        self.assertGreater(result['goodput_mbps'], 0)
+        self.assertGreaterEqual(result['seconds'], 0.2)
+
+    def test_udp_loss_and_jitter(self):
+        result = run_udp_test('127.0.0.1', self.server.port, duration=0.3, rate_mbps=10)
+
+        self.assertGreater(result['datagrams_sent'], 0)
+        self.assertEqual(result['datagrams_received'], result['datagrams_sent'])
+        self.assertEqual(result['loss'], 0)
+        self.assertGreaterEqual(result['jitter_ms'], 0)
+
+    def test_udp_streams_number_every_datagram_once(self):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as receiver, \
+                patch('backend.throughput._server_result', return_value={}):
+            receiver.bind(('127.0.0.1', 0))
+            receiver.settimeout(0.5)
+            sequences = []
+
+            def receive():
+                try:
+                    while True:
+                        sequences.append(DATAGRAM.unpack_from(receiver.recv(2048))[2])
+                except socket.timeout:
+                    pass
+
+            reader = threading.Thread(target=receive)
+            reader.start()
+            result = run_udp_test('127.0.0.1', receiver.getsockname()[1], duration=0.3, rate_mbps=4, streams=4)
+            reader.join()
+
+        self.assertEqual(sorted(sequences), list(range(result['datagrams_sent'])))
+
+    def test_results_are_consumed(self):
+        run_tcp_test('127.0.0.1', self.server.port, duration=0.1)
+
+        self.assertEqual(self.server._results, {})
+
+    def test_unreachable_server(self):
+        port = self.server.port
+        self.server.stop()
+        with self.assertRaises(ThroughputError):
+            run_tcp_test('127.0.0.1', port, duration=0.1)
+
+
+class TcpInfoTestCase(unittest.TestCase):
+    @unittest.skipUnless(hasattr(socket, 'TCP_INFO'), 'TCP_INFO is Linux only')
+    def test_connected_socket(self):
+        with socket.create_server(('127.0.0.1', 0)) as server, socket.create_connection(server.getsockname()) as client:
+            info = tcp_info(client)
+
+        self.assertEqual(info['retransmits'], 0)
+        self.assertGreaterEqual(info['rtt_ms'], 0)
+
+
+class ThroughputRouteTestCase(unittest.TestCase):
+    def setUp(self):
+        app = Flask(__name__)
+        app.register_blueprint(routes)
+        self.client = app.test_client()
+        self.server = ThroughputServer('127.0.0.1', 0).start()
+        throughput_admission.reset()
+        self.addCleanup(throughput_admission.reset)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_tcp_test(self):
+        response = self.client.post('/api/throughput', json={
+            'target': '127.0.0.1', 'port': self.server.port, 'duration': 0.2, 'streams': 2,
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['protocol'], 'tcp')
+        self.assertGreater(response.json['goodput_mbps'], 0)
+
+    def test_invalid_parameters(self):
+        for body in ({'target': 'nope'}, {'target': '127.0.0.1', 'streams': 100}, {'target': '127.0.0.1', 'protocol': 'udp', 'direction': 'download'},
+                     {'target': '127.0.0.1', 'protocol': 'udp', 'rate_mbps': 'inf'}, {'target': '127.0.0.1', 'protocol': 'udp', 'rate_mbps': 5000}):
+            response = self.client.post('/api/throughput', json=body)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json['error']['code'], 'invalid_parameters')
+
+    def test_one_test_at_a_time(self):
+        started, release = threading.Event(), threading.Event()
+
+        def hold():
+            with throughput_admission.slot():
+                started.set()
+                release.wait(5)
+
+        holder = threading.Thread(target=hold)
+        holder.start()
+        started.wait(5)
+        try:
+            response = self.client.post('/api/throughput', json={'target': '127.0.0.1', 'port': self.server.port, 'duration': 0.1})
+        finally:
+            release.set()
+            holder.join()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json['error']['code'], 'queue_full')
+
+    def test_unreachable(self):
+        port = self.server.port
+        self.server.stop()
+        response = self.client.post('/api/throughput', json={'target': '127.0.0.1', 'port': port, 'duration': 0.1})
+
+        self.assertEqual(response.status_code, 502)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+
+from backend.mac_utils import is_locally_administered_mac, mac_lookup_vendor
+from backend.transport import SimulatedNetwork, SimulatedTransport
+from backend.utils import guess_os_family, is_device_online, scan_network
+
+
+class SimulatedTransportTestCase(unittest.TestCase):
+    def test_network_is_deterministic_for_a_seed(self):
+        first = SimulatedNetwork(subnets=['10.1.0.0/24'], seed=7)
+        second = SimulatedNetwork(subnets=['10.1.0.0/24'], seed=7)
+
+        self.assertEqual(
+            [(host.ip, host.mac) for host in first.hosts.values()],
+            [(host.ip, host.mac) for host in second.hosts.values()],
+        )
+
+    def test_subnets_larger_than_a_slash_16_are_rejected(self):
+        with self.assertRaises(ValueError):
+            SimulatedNetwork(subnets=['10.0.0.0/15'])
+
+    def test_scan_network_finds_simulated_hosts(self):
+        network = SimulatedNetwork(subnets=['10.1.0.0/24'], density=0.5, loss=0.0, seed=1)
+        transport = SimulatedTransport(network)
+
+        devices = scan_network(subnet='10.1.0.0/24', transport=transport)
+
+        self.assertEqual(sorted(ip for ip, _ in devices), sorted(network.hosts))
+        self.assertEqual(transport.packets_sent, 254)
+        self.assertGreaterEqual(transport.simulated_seconds, 3)
+
+    def test_slash_16_sweep_with_loss(self):
+        network = SimulatedNetwork(subnets=['10.2.0.0/16'], density=0.2, loss=0.1, seed=2)
+        transport = SimulatedTransport(network)
+
+        devices = scan_network(subnet='10.2.0.0/16', transport=transport)
+
+        self.assertEqual(transport.packets_sent, 65534)
+        self.assertLess(len(devices), len(network.hosts))
+        self.assertGreater(len(devices), len(network.hosts) * 0.8)
+
+    def test_vendor_mix_and_random_macs(self):
+        network = SimulatedNetwork(subnets=['10.3.0.0/24'], density=1.0, random_mac_ratio=0.2, seed=3)
+        macs = [host.mac for host in network.hosts.values()]
+
+        random_macs = [mac for mac in macs if is_locally_administered_mac(mac)]
+        vendor_macs = [mac for mac in macs if not is_locally_administered_mac(mac)]
+
+        self.assertTrue(random_macs)
+        self.assertTrue(all(mac_lookup_vendor(mac) for mac in vendor_macs))
+
+    def test_probes_answer_for_present_hosts_only(self):
+        network = SimulatedNetwork(subnets=['10.4.0.0/24'], density=0.5, loss=0.0, os_mix={128: 1}, seed=4)
+        transport = SimulatedTransport(network)
+        present = next(iter(network.hosts))
+        absent = next(f'10.4.0.{i}' for i in range(1, 255) if f'10.4.0.{i}' not in network.hosts)
+
+        self.assertTrue(is_device_online(present, transport=transport))
+        self.assertFalse(is_device_online(absent, transport=transport))
+        self.assertEqual(guess_os_family(present, transport=transport), 'Windows')
+        self.assertIsNone(guess_os_family(absent, transport=transport))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import io
+import unittest
+
+from backend.benchmarks import fixtures
+from backend.benchmarks.harness import BenchmarkResult, find_regressions
+from backend.benchmarks.legacy import legacy_parse_netsh_wlan_networks
+from backend.traceroute import parse_traceroute_output
+from backend.wifi import iter_netsh_wlan_networks, parse_netsh_output, parse_netsh_wlan_networks
+
+
+class ParserTestCase(unittest.TestCase):
+    def test_parse_netsh_wlan_networks_reads_every_ssid_and_bssid(self):
+        dump = fixtures.netsh_wlan_networks_dump(networks=25)
+
+        networks = parse_netsh_wlan_networks(dump)
+
+        self.assertEqual(len(networks), 25)
+        self.assertEqual(networks[0]['ssid'], 'Network-1')
+        self.assertEqual(networks[22]['ssid'], '')  # hidden network
+        self.assertEqual(
+            sum(len(network['bssids']) for network in networks),
+            dump.count('    BSSID '),
+        )
+        bssid = networks[0]['bssids'][0]
+        self.assertIsInstance(bssid['channel'], int)
+        self.assertEqual(bssid['basic_rates_mbps'], [6, 12, 24])
+
+    def test_parse_netsh_wlan_networks_reads_bss_load(self):
+        networks = parse_netsh_wlan_networks(fixtures.netsh_wlan_networks_dump(networks=25))
+
+        loads = [bssid['bss_load'] for network in networks for bssid in network['bssids'] if bssid['bss_load']]
+
+        self.assertTrue(loads)
+        self.assertTrue(all(0 <= load['channel_utilization_percent'] <= 100 for load in loads))
+
+    def test_parse_netsh_wlan_networks_matches_the_legacy_parser(self):
+        dump = fixtures.netsh_wlan_networks_dump(networks=60)
+
+        self.assertEqual(parse_netsh_wlan_networks(dump), legacy_parse_netsh_wlan_networks(dump))
+
+    def test_iter_netsh_wlan_networks_yields_each_network_once_complete(self):
+        dump = fixtures.netsh_wlan_networks_dump(networks=3)
+        lines = iter(io.StringIO(dump))
+        consumed = []
+
+        def reading():
+            for line in lines:
+                consumed.append(line)
+                yield line
+
+        networks = iter_netsh_wlan_networks(reading())
+        first = next(networks)
+
+        self.assertEqual(first['ssid'], 'Network-1')
+        # Only read up to the header of the second SSID block
+        self.assertTrue(consumed[-1].startswith('SSID 2 '))
+        self.assertEqual([network['ssid'] for network in networks], ['Network-2', 'Network-3'])
+
+    def test_parse_netsh_output_accepts_lines(self):
+        output = 'Name                   : Wi-Fi\n    Signal                 : 80%\n    Channel                : 6\n'
+
+        self.assertEqual(parse_netsh_output(output), parse_netsh_output(io.StringIO(output)))
+        self.assertEqual(parse_netsh_output(output)['Signal'], '80%')
+
+    def test_parse_traceroute_output_marks_timeouts_and_destination(self):
+        stdout = (
+            'traceroute to 1.1.1.1 (1.1.1.1), 30 hops max, 60 byte packets\n'
+            ' 1  192.168.0.1  1.000 ms  2.000 ms  3.000 ms\n'
+            ' 2  * * *\n'
+            ' 3  1.1.1.1  10.000 ms  *  12.000 ms\n'
+        )
+
+        hops = parse_traceroute_output(stdout, '1.1.1.1')
+
+        self.assertEqual([hop['status'] for hop in hops], ['ok', 'timeout', 'reached'])
+        self.assertEqual(hops[0]['rtt_ms'], 2.0)
+        self.assertEqual(hops[2]['rtt_ms'], 11.0)
+        self.assertIsNone(hops[1]['ip'])
+
+    def test_parse_traceroute_output_handles_synthetic_fixture(self):
+        hops = parse_traceroute_output(fixtures.traceroute_stdout(hops=30), '142.250.72.14')
+
+        self.assertEqual(len(hops), 30)
+        self.assertEqual(hops[-1]['status'], 'reached')
+
+
+class BenchmarkHarnessTestCase(unittest.TestCase):
+    def test_find_regressions_flags_slowdowns_over_threshold(self):
+        baseline = {
+            'fast': {'median_s': 1.0},
+            'slow': {'median_s': 1.0},
+        }
+        results = [
+            BenchmarkResult('fast', 5, 1.0, 1.1, 1.1),
+            BenchmarkResult('slow', 5, 1.0, 1.5, 1.5),
+            BenchmarkResult('new', 5, 1.0, 9.0, 9.0),
+        ]
+
+        regressions = find_regressions(results, baseline, threshold=0.2)
+
+        self.assertEqual([regression.name for regression in regressions], ['slow'])
+        self.assertAlmostEqual(regressions[0].slowdown, 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,201 @@
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from flask import Flask
+
+from backend import wifi
+from backend.routes import routes
+from backend.wifi_channels import bonded_block, channel_occupancy, channel_recommendation
+
+
+def network(ssid, *bssids):
+    return {'ssid': ssid, 'bssids': [
+        {'bssid': bssid, 'channel': channel, 'band': '2.4 GHz' if channel <= 14 else '5 GHz',
+         'signal_percent': signal, 'radio_type': radio, 'bss_load': load}
+        for bssid, channel, signal, radio, load in bssids
+    ]}
+
+
+class NeighborScanCacheTestCase(unittest.TestCase):
+    def test_fresh_snapshot_is_reused(self):
+        scans = []
+        cache = wifi.NeighborScanCache(lambda: scans.append(1) or [{'ssid': 'a'}], max_age=60, stale_age=120)
+
+        first = cache.get()
+        second = cache.get()
+
+        self.assertIs(first, second)
+        self.assertEqual(len(scans), 1)
+
+    def test_stale_snapshot_is_served_while_revalidating(self):
+        release = threading.Event()
+        calls = []
+
+        def scan():
+            calls.append(1)
+            if len(calls) > 1:
+                release.wait(5)
+            return [{'ssid': f'scan-{len(calls)}'}]
+
+        cache = wifi.NeighborScanCache(scan, max_age=0, stale_age=60)
+        first = cache.get()
+
+        stale = cache.get()
+        self.assertIs(stale, first)
+        release.set()
+        for _ in range(100):
+            if cache.snapshot is not first:
+                break
+            time.sleep(0.01)
+        self.assertEqual(cache.snapshot.networks, [{'ssid': 'scan-2'}])
+        self.assertEqual(cache.snapshot.version, 2)
+
+    def test_concurrent_callers_share_one_scan(self):
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def scan():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return [{'ssid': 'a'}]
+
+        cache = wifi.NeighborScanCache(scan, max_age=60, stale_age=120)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get())) for _ in range(5)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(result is results[0] for result in results))
+
+    def test_scan_error_without_snapshot_raises(self):
+        def scan():
+            raise RuntimeError('netsh missing')
+
+        cache = wifi.NeighborScanCache(scan)
+
+        with self.assertRaises(RuntimeError):
+            cache.get()
+
+    @patch('backend.wifi.wifi_interface_restart')
+    def test_adapter_reset_is_rate_limited(self, mock_restart):
+        with patch('backend.wifi._last_adapter_reset', None):
+            wifi.reset_wifi_adapter()
+            with self.assertRaises(wifi.AdapterResetRateLimited) as raised:
+                wifi.reset_wifi_adapter()
+
+        mock_restart.assert_called_once()
+        self.assertGreater(raised.exception.retry_after, 0)
+
+
+class ChannelOccupancyTestCase(unittest.TestCase):
+    def test_adjacent_24ghz_channels_overlap(self):
+        networks = [network('a', ('aa:00:00:00:00:01', 3, 100, '802.11n', None))]
+
+        occupancy = channel_occupancy(networks)
+
+        self.assertAlmostEqual(occupancy['2.4 GHz'][1]['score'], 0.6)
+        self.assertAlmostEqual(occupancy['2.4 GHz'][6]['score'], 0.4)
+        self.assertEqual(occupancy['2.4 GHz'][11]['score'], 0)
+
+    def test_5ghz_bonded_block_occupies_every_channel(self):
+        networks = [network('a', ('aa:00:00:00:00:01', 44, 50, '802.11ac', {'channel_utilization_percent': 50}))]
+
+        occupancy = channel_occupancy(networks)
+
+        self.assertEqual(list(bonded_block(44, 80)), [36, 40, 44, 48])
+        self.assertEqual(list(bonded_block(157, 40)), [157, 161])
+        for channel in (36, 40, 44, 48):
+            self.assertAlmostEqual(occupancy['5 GHz'][channel]['score'], 0.5)
+        self.assertEqual(occupancy['5 GHz'][52]['score'], 0)
+
+    def test_bss_load_and_signal_weight_the_score(self):
+        busy = [network('a', ('aa:00:00:00:00:01', 6, 100, '802.11n', {'channel_utilization_percent': 100}))]
+        quiet = [network('a', ('aa:00:00:00:00:01', 6, 50, '802.11n', {'channel_utilization_percent': 0}))]
+
+        self.assertAlmostEqual(channel_occupancy(busy)['2.4 GHz'][6]['score'], 1.5)
+        self.assertAlmostEqual(channel_occupancy(quiet)['2.4 GHz'][6]['score'], 0.25)
+
+    def test_recommendation_excludes_own_ap_and_picks_least_occupied(self):
+        networks = [
+            network('home', ('aa:00:00:00:00:01', 6, 100, '802.11n', None)),
+            network('n1', ('bb:00:00:00:00:01', 1, 90, '802.11n', None)),
+            network('n2', ('cc:00:00:00:00:01', 6, 90, '802.11n', None), ('cc:00:00:00:00:02', 7, 60, '802.11n', None)),
+        ]
+
+        result = channel_recommendation(networks, current_channel=6, band='2.4 GHz', exclude_bssids=['AA:00:00:00:00:01'])
+
+        self.assertEqual(result['recommended_channel'], 11)
+        self.assertEqual(result['current']['channel'], 6)
+        self.assertEqual(result['current']['networks'], 1)
+        self.assertEqual({entry['channel'] for entry in result['channels']}, {1, 6, 11})
+
+    def test_count_networks_on_channel_counts_networks_not_lines(self):
+        dump = (
+            'SSID 1 : a\n'
+            '    BSSID 1                 : aa:00:00:00:00:01\n'
+            '         Signal             : 80%\n'
+            '         Channel            : 6\n'
+            '    BSSID 2                 : aa:00:00:00:00:02\n'
+            '         Channel            : 6\n'
+            'SSID 2 : b\n'
+            '    BSSID 1                 : bb:00:00:00:00:01\n'
+            '         Channel            : 11\n'
+        )
+
+        self.assertEqual(wifi.count_networks_on_channel(dump, '6'), 1)
+        self.assertEqual(wifi.count_networks_on_channel(dump, '11'), 1)
+        self.assertEqual(wifi.count_networks_on_channel(dump, '1'), 0)
+
+    @patch('backend.wifi.get_interface_data')
+    def test_signal_quality_uses_the_shared_snapshot(self, mock_interface):
+        mock_interface.return_value = {'channel': '6', 'band': '2.4 GHz', 'signal': '80%', 'bssid': 'aa:00:00:00:00:01'}
+        networks = [network('n', ('bb:00:00:00:00:01', 6, 100, '802.11n', None))]
+        cache = wifi.NeighborScanCache(lambda: networks)
+
+        with patch('backend.wifi.neighbor_scan_cache', cache), patch('backend.wifi.run_wifi_command') as mock_run:
+            quality = wifi.get_wifi_signal_quality()
+
+        mock_run.assert_not_called()
+        self.assertEqual(quality['interference_level'], 'low')
+        self.assertEqual(quality['channel_occupancy']['current']['networks'], 1)
+
+
+class WifiRoutesTestCase(unittest.TestCase):
+    def setUp(self):
+        app = Flask(__name__)
+        app.register_blueprint(routes)
+        self.client = app.test_client()
+
+    @patch('backend.routes.get_neighbor_snapshot')
+    def test_neighbor_route_reports_cache_age(self, mock_snapshot):
+        mock_snapshot.return_value = wifi.ScanSnapshot(networks=[{'ssid': 'a'}], scanned_at=None, version=1)
+
+        response = self.client.get('/api/wifi/scan/neighbor')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), [{'ssid': 'a'}])
+        self.assertEqual(response.headers['X-Scan-Stale'], 'false')
+        mock_snapshot.assert_called_once_with(reset_adapter=False)
+
+    @patch('backend.routes.get_neighbor_snapshot', side_effect=wifi.AdapterResetRateLimited(42))
+    def test_neighbor_route_rate_limited_reset_returns_429(self, mock_snapshot):
+        response = self.client.get('/api/wifi/scan/neighbor?reset_adapter=1')
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '43')
+        self.assertEqual(response.get_json()['error']['code'], 'adapter_reset_rate_limited')
+
+
+if __name__ == '__main__':
+    unittest.main()
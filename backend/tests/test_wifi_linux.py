@@ -0,0 +1,129 @@
+import os
+import unittest
+from unittest.mock import patch
+
+from backend import wifi, wifi_linux
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name)) as f:
+        return f.read()
+
+
+class IwScanParserTestCase(unittest.TestCase):
+    def setUp(self):
+        self.networks = wifi_linux.parse_iw_scan(fixture('iw_scan_dump.txt'))
+        self.by_ssid = {network['ssid']: network for network in self.networks}
+
+    def test_groups_bssids_by_ssid(self):
+        self.assertEqual([network['ssid'] for network in self.networks], ['HomeNet', 'CoffeeShop', ''])
+        self.assertEqual(len(self.by_ssid['HomeNet']['bssids']), 2)
+
+    def test_matches_the_netsh_structure(self):
+        netsh_keys = {'ssid', 'network_type', 'authentication', 'encryption', 'bssids'}
+        bssid_keys = {
+            'bssid', 'signal_percent', 'radio_type', 'band', 'channel', 'details', 'bss_load',
+            'qos_mscs_supported', 'qos_map_supported', 'basic_rates_mbps', 'other_rates_mbps',
+        }
+        for network in self.networks:
+            self.assertEqual(set(network), netsh_keys)
+            for bssid in network['bssids']:
+                self.assertEqual(set(bssid), bssid_keys)
+
+    def test_reads_security_radio_and_channel(self):
+        home = self.by_ssid['HomeNet']
+        first, second = home['bssids']
+
+        self.assertEqual(home['authentication'], 'WPA3-Personal')
+        self.assertEqual(home['encryption'], 'CCMP')
+        self.assertEqual(first['channel'], 36)
+        self.assertEqual(first['band'], '5 GHz')
+        self.assertEqual(first['radio_type'], '802.11ax')
+        self.assertEqual(first['signal_percent'], 69)
+        self.assertTrue(first['qos_map_supported'])
+        self.assertEqual(first['basic_rates_mbps'], [6, 12, 24])
+        self.assertEqual(second['channel'], 6)
+        self.assertEqual(second['radio_type'], '802.11n')
+        self.assertEqual(second['basic_rates_mbps'], [1, 2, 5.5, 11])
+        self.assertEqual(second['other_rates_mbps'], [6, 9, 12, 18, 24, 36, 48, 54])
+
+        self.assertEqual(self.by_ssid['CoffeeShop']['authentication'], 'Open')
+        self.assertEqual(self.by_ssid['CoffeeShop']['bssids'][0]['radio_type'], '802.11b')
+        self.assertEqual(self.by_ssid['']['authentication'], 'WPA2-Enterprise')
+        # No DS parameter set: channel comes from the frequency
+        self.assertEqual(self.by_ssid['']['bssids'][0]['channel'], 149)
+
+    def test_reads_bss_load(self):
+        load = self.by_ssid['HomeNet']['bssids'][0]['bss_load']
+
+        self.assertEqual(load['connected_stations'], 3)
+        self.assertEqual(load['channel_utilization_raw'], 102)
+        self.assertEqual(load['channel_utilization_percent'], 40)
+        self.assertEqual(load['medium_available_capacity'], 31250)
+        self.assertEqual(load['medium_available_capacity_unit'], '32us')
+        self.assertIsNone(self.by_ssid['HomeNet']['bssids'][1]['bss_load'])
+
+
+class IwLinkParserTestCase(unittest.TestCase):
+    def test_proc_net_wireless(self):
+        stats = wifi_linux.parse_proc_net_wireless(fixture('proc_net_wireless.txt'))
+
+        self.assertEqual(stats['wlan0']['link_quality'], 58.0)
+        self.assertEqual(stats['wlan0']['level_dbm'], -52.0)
+        self.assertIsNone(stats['wlan0']['noise_dbm'])
+        self.assertEqual(stats['wlan0']['discarded_retry'], 17)
+
+    def test_interface_data_has_the_netsh_keys(self):
+        stats = wifi_linux.parse_proc_net_wireless(fixture('proc_net_wireless.txt'))
+
+        data = wifi_linux.interface_data('wlan0', fixture('iw_link.txt'), stats)
+
+        self.assertEqual(data['SSDI'], 'HomeNet')
+        self.assertEqual(data['bssid'], '04:f0:21:1a:2b:3c')
+        self.assertEqual(data['channel'], '36')
+        self.assertEqual(data['band'], '5 GHz')
+        self.assertEqual(data['radio_type'], '802.11ac')
+        self.assertEqual(data['signal'], '69%')
+        self.assertEqual(data['recieve_rate_mbps'], 866.7)
+        self.assertEqual(data['state'], 'connected')
+
+    def test_station_dump(self):
+        station = wifi_linux.parse_iw_station_dump(fixture('iw_station_dump.txt'))
+
+        self.assertEqual(station['bssid'], '04:f0:21:1a:2b:3c')
+        self.assertEqual(station['signal_dbm'], -52.0)
+        self.assertEqual(station['tx_bitrate'], 650.0)
+        self.assertEqual(station['rx_bitrate'], 866.7)
+        self.assertEqual(station['tx_retries'], 1234)
+        self.assertEqual(station['tx_failed'], 12)
+
+    def test_not_connected(self):
+        data = wifi_linux.interface_data('wlan0', 'Not connected.\n', {})
+
+        self.assertEqual(data['state'], 'disconnected')
+        self.assertIsNone(data['signal'])
+
+
+class BackendSelectionTestCase(unittest.TestCase):
+    @patch('backend.wifi.WIFI_BACKEND', 'auto')
+    @patch('backend.wifi.system', return_value='Linux')
+    def test_auto_picks_iw_on_linux(self, mock_system):
+        self.assertEqual(wifi.wifi_backend(), 'iw')
+
+    @patch('backend.wifi.WIFI_BACKEND', 'iw')
+    @patch('backend.wifi.wifi_linux.default_interface', return_value='wlan0')
+    @patch('backend.wifi.stream_wifi_command')
+    def test_iw_backend_reads_the_scan_dump(self, mock_stream, mock_interface):
+        mock_stream.return_value.__enter__.return_value = iter(fixture('iw_scan_dump.txt').splitlines(keepends=True))
+
+        networks = wifi.scan_neighbor_nets()
+
+        mock_stream.assert_called_once()
+        self.assertEqual(mock_stream.call_args.args[1], ['iw', 'dev', 'wlan0', 'scan', 'dump'])
+        self.assertEqual(len(networks), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import math
+import os
+import unittest
+from unittest.mock import patch
+
+from flask import Flask
+
+from backend import wifi_sampler
+from backend.routes import routes
+from backend.ringbuffer import RingBuffer
+from backend.wifi_sampler import LinkSampleReader, Rollup, SignalSampler
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+class RingBufferTestCase(unittest.TestCase):
+    def test_overwrites_oldest_and_keeps_capacity(self):
+        ring = RingBuffer(4, ['value'])
+        for i in range(10):
+            ring.append((i, i * 10))
+
+        self.assertEqual(len(ring), 4)
+        self.assertEqual(list(ring.window()['timestamp']), [6, 7, 8, 9])
+        self.assertEqual(ring.latest(), (9.0, 90.0))
+
+    def test_window_across_the_wrap(self):
+        ring = RingBuffer(5, ['value'])
+        for i in range(8):
+            ring.append((i, -i))
+
+        window = ring.window(start=4, end=7)
+
+        self.assertEqual(list(window['timestamp']), [4, 5, 6])
+        self.assertEqual(list(window['value']), [-4, -5, -6])
+        self.assertEqual(list(ring.iter_rows(start=6)), [(6.0, -6.0), (7.0, -7.0)])
+        self.assertEqual(len(ring.window(start=100)['value']), 0)
+
+
+class RollupTestCase(unittest.TestCase):
+    def test_min_max_mean_per_bucket_skipping_nan(self):
+        rollup = Rollup(1, 10, metrics=['signal'])
+        for timestamp, value in [(10.0, -50), (10.5, -60), (10.9, math.nan), (11.2, -40)]:
+            rollup.add(timestamp, [value])
+        rollup.flush()
+
+        window = rollup.buffer.window()
+
+        self.assertEqual(list(window['timestamp']), [10, 11])
+        self.assertEqual(list(window['signal_min']), [-60, -40])
+        self.assertEqual(list(window['signal_max']), [-50, -40])
+        self.assertEqual(list(window['signal_mean']), [-55, -40])
+
+
+class SignalSamplerTestCase(unittest.TestCase):
+    def test_memory_is_bounded(self):
+        now = [0.0]
+
+        def clock():
+            now[0] += 1
+            return now[0]
+
+        sampler = SignalSampler(lambda: (-50, 100, 200, 0), hz=1, raw_seconds=5, clock=clock)
+        for _ in range(10000):
+            sampler.sample()
+
+        self.assertEqual(len(sampler.raw), 5)
+        self.assertEqual(len(sampler.rollups['1s'].buffer), 3600)
+        self.assertEqual(len(sampler.rollups['1m'].buffer), 166)
+        self.assertEqual(sampler.raw.latest()[0], 10000)
+
+    def test_failed_reads_are_counted(self):
+        def read():
+            raise OSError('no interface')
+
+        sampler = SignalSampler(read, hz=10)
+
+        self.assertIsNone(sampler.sample())
+        self.assertEqual(sampler.errors, 1)
+        self.assertEqual(len(sampler.raw), 0)
+
+    @patch('backend.wifi.wifi_backend', return_value='iw')
+    @patch('backend.wifi.wifi_interface_name', return_value='wlan0')
+    @patch('backend.wifi_linux.read_proc_net_wireless', return_value={'wlan0': {'level_dbm': -61.0}})
+    @patch('backend.wifi.run_wifi_command')
+    def test_linux_reader_rate_limits_station_dump(self, mock_run, mock_proc, mock_interface, mock_backend):
+        mock_run.return_value.stdout = 'Station 04:f0:21:1a:2b:3c (on wlan0)\n\ttx retries:\t100\n\ttx bitrate:\t650.0 MBit/s\n\trx bitrate:\t866.7 MBit/s\n'
+        reader = LinkSampleReader(station_interval=60)
+
+        first = reader()
+        mock_run.return_value.stdout = mock_run.return_value.stdout.replace('100', '130')
+        reader._station_at = None
+        second = reader()
+        third = reader()
+
+        self.assertEqual(first, (-61.0, 866.7, 650.0, 0.0))
+        self.assertEqual(second[3], 30.0)
+        self.assertEqual(third, (-61.0, 866.7, 650.0, 0.0))
+        self.assertEqual(mock_run.call_count, 2)
+
+    @patch('backend.wifi.wifi_backend', return_value='netsh')
+    @patch('backend.wifi.stream_wifi_command')
+    def test_windows_reader_parses_and_rate_limits_netsh(self, mock_stream, mock_backend):
+        with open(os.path.join(FIXTURES, 'netsh_show_interface.txt')) as f:
+            output = f.read()
+        mock_stream.return_value.__enter__.side_effect = lambda: iter(output.splitlines(keepends=True))
+        reader = LinkSampleReader(station_interval=60)
+
+        first = reader()
+        second = reader()
+
+        # 85% is -40.5 dBm, truncated
+        self.assertEqual(first[:3], (-40.0, 866.7, 650.0))
+        self.assertTrue(math.isnan(first[3]))
+        self.assertEqual(second[:3], first[:3])
+        self.assertEqual(mock_stream.call_count, 1)
+
+
+class WifiSamplesRouteTestCase(unittest.TestCase):
+    def setUp(self):
+        app = Flask(__name__)
+        app.register_blueprint(routes)
+        self.client = app.test_client()
+
+    def test_disabled_sampler_returns_503(self):
+        with patch('backend.wifi_sampler.wifi_sampler', None):
+            response = self.client.get('/api/wifi/samples')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.get_json()['error']['code'], 'sampler_disabled')
+
+    def test_returns_columns_with_nan_as_null(self):
+        sampler = SignalSampler(lambda: (-50, math.nan, 200, 0), hz=10)
+        sampler.sample()
+
+        with patch('backend.wifi_sampler.wifi_sampler', sampler):
+            response = self.client.get('/api/wifi/samples?seconds=10')
+            invalid = self.client.get('/api/wifi/samples?resolution=5s')
+
+        samples = response.get_json()['samples']
+        self.assertEqual(samples['signal_dbm'], [-50])
+        self.assertEqual(samples['rx_rate_mbps'], [None])
+        self.assertEqual(invalid.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,404 @@
+from dataclasses import asdict, dataclass, field
+import json
+import os
+import random
+import socket
+import struct
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from venv import logger
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# LAN throughput tests, iperf-style, between two instances of this backend: one runs the
+# test server (THROUGHPUT_SERVER_PORT, 0 = off), the other calls `/api/throughput`.
+#
+# Every TCP connection starts with a fixed header (magic, version, mode, duration, test id).
+# Streams of one test share the test id; once they're done the client asks the server for
+# its side of the measurement (bytes received, sender retransmits) with a MODE_RESULT
+# connection. UDP datagrams carry (test id, sequence, send time) so the server can count
+# loss, reordering and RFC 3550 jitter.
+THROUGHPUT_SERVER_PORT = int(os.getenv('THROUGHPUT_SERVER_PORT', '0'))
+THROUGHPUT_SERVER_HOST = os.getenv('THROUGHPUT_SERVER_HOST', '0.0.0.0')
+DEFAULT_PORT = 5201
+MAX_DURATION = 30
+MAX_STREAMS = 16
+# UDP tests are paced, never faster than this (a LAN test, not a flood)
+MAX_RATE_MBPS = 1000
+
+MAGIC = b'NDTP'
+VERSION = 1
+MODE_UPLOAD = 1    # client -> server
+MODE_DOWNLOAD = 2  # server -> client
+MODE_RESULT = 3
+HEADER = struct.Struct('!4sBBHdQ')
+DATAGRAM = struct.Struct('!4sQId')
+UDP_PAYLOAD_BYTES = 1200
+
+# Sent with sendfile() from one random file (random so compression on the path can't help)
+PAYLOAD_FILE_BYTES = 4 * 1024 * 1024
+# Per sendfile() call, small enough that a slow link doesn't overshoot the duration much
+SEND_CHUNK_BYTES = 256 * 1024
+RECV_BUFFER_BYTES = 256 * 1024
+# tcp_info (linux/tcp.h): rtt and total_retrans offsets, in the first 104 bytes
+TCP_INFO_LENGTH = 104
+TCP_INFO_RTT_OFFSET = 68
+TCP_INFO_TOTAL_RETRANS_OFFSET = 100
+
+class ThroughputError(Exception):
+    """Raised when the test server can't be reached or answers something unexpected"""
+    pass
+
+_payload_file = None
+_payload_lock = threading.Lock()
+
+def payload_file():
+    """A PAYLOAD_FILE_BYTES temp file of random bytes, created once per process."""
+    global _payload_file
+    with _payload_lock:
+        if _payload_file is None:
+            f = tempfile.TemporaryFile()
+            f.write(os.urandom(PAYLOAD_FILE_BYTES))
+            f.flush()
+            _payload_file = f
+        return _payload_file
+
+def tcp_info(sock: socket.socket) -> Dict[str, Optional[float]]:
+    """Sender-side retransmits and smoothed RTT from TCP_INFO (Linux only, None elsewhere)."""
+    option = getattr(socket, 'TCP_INFO', None)
+    if option is None:
+        return {'retransmits': None, 'rtt_ms': None}
+    try:
+        info = sock.getsockopt(socket.IPPROTO_TCP, option, TCP_INFO_LENGTH)
+    except OSError:
+        return {'retransmits': None, 'rtt_ms': None}
+    if len(info) < TCP_INFO_LENGTH:
+        return {'retransmits': None, 'rtt_ms': None}
+    (rtt_us,) = struct.unpack_from('I', info, TCP_INFO_RTT_OFFSET)
+    (retransmits,) = struct.unpack_from('I', info, TCP_INFO_TOTAL_RETRANS_OFFSET)
+    return {'retransmits': retransmits, 'rtt_ms': rtt_us / 1000}
+
+def send_for(sock: socket.socket, duration: float) -> int:
+    """Sends the payload file in a loop for `duration` seconds (zero-copy with sendfile)."""
+    f = payload_file()
+    sent = 0
+    offset = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        # socket.sendfile falls back to send() where os.sendfile isn't available
+        sent += sock.sendfile(f, offset, SEND_CHUNK_BYTES)
+        offset = (offset + SEND_CHUNK_BYTES) % PAYLOAD_FILE_BYTES
+    return sent
+
+def receive_all(sock: socket.socket) -> Tuple[int, float]:
+    """Reads until EOF into one reused buffer, returns (bytes, seconds from first byte)."""
+    buffer = memoryview(bytearray(RECV_BUFFER_BYTES))
+    received = 0
+    first = None
+    while True:
+        n = sock.recv_into(buffer)
+        if not n:
+            break
+        if first is None:
+            first = time.perf_counter()
+        received += n
+    return received, (time.perf_counter() - first) if first is not None else 0.0
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ThroughputError("Connection closed mid-header")
+        data += chunk
+    return data
+
+@dataclass
+class _ServerResult:
+    bytes: int = 0
+    seconds: float = 0.0
+    streams: int = 0
+    retransmits: Optional[int] = None
+    udp_received: int = 0
+    udp_max_seq: int = -1
+    udp_out_of_order: int = 0
+    udp_jitter_ms: float = 0.0
+    udp_first: Optional[float] = None
+    udp_last: Optional[float] = None
+    _udp_transit: Optional[float] = field(default=None, repr=False)
+
+class ThroughputServer:
+    """TCP and UDP test server on the same port. `port=0` picks a free one (tests)."""
+
+    def __init__(self, host: str = THROUGHPUT_SERVER_HOST, port: int = DEFAULT_PORT, result_ttl: float = 300):
+        self.result_ttl = result_ttl
+        self.tcp = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.tcp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.tcp.bind((host, port))
+        self.port = self.tcp.getsockname()[1]
+        self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp.bind((host, self.port))
+        self.udp.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 << 20)
+        self._results: Dict[int, Tuple[float, _ServerResult]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def _result(self, test_id: int) -> _ServerResult:
+        now = time.monotonic()
+        with self._lock:
+            for expired in [key for key, (created, _) in self._results.items() if now - created > self.result_ttl]:
+                del self._results[expired]
+            if test_id not in self._results:
+                self._results[test_id] = (now, _ServerResult())
+            return self._results[test_id][1]
+
+    def start(self):
+        self.tcp.listen(64)
+        for target, name in ((self._accept_loop, 'throughput-tcp'), (self._udp_loop, 'throughput-udp')):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for sock in (self.tcp, self.udp):
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+    def _accept_loop(self):
+        while not self._stop.is_set():
+            try:
+                conn, _ = self.tcp.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn: socket.socket):
+        with conn:
+            try:
+                conn.settimeout(MAX_DURATION + 10)
+                magic, version, mode, _, duration, test_id = HEADER.unpack(_recv_exactly(conn, HEADER.size))
+                if magic != MAGIC or version != VERSION:
+                    return
+                duration = min(max(duration, 0.1), MAX_DURATION)
+                if mode == MODE_UPLOAD:
+                    received, seconds = receive_all(conn)
+                    result = self._result(test_id)
+                    with self._lock:
+                        result.bytes += received
+                        result.seconds = max(result.seconds, seconds)
+                        result.streams += 1
+                elif mode == MODE_DOWNLOAD:
+                    sent = send_for(conn, duration)
+                    retransmits = tcp_info(conn)['retransmits']
+                    result = self._result(test_id)
+                    with self._lock:
+                        result.bytes += sent
+                        result.streams += 1
+                        if retransmits is not None:
+                            result.retransmits = (result.retransmits or 0) + retransmits
+                    conn.shutdown(socket.SHUT_WR)
+                elif mode == MODE_RESULT:
+                    with self._lock:
+                        entry = self._results.pop(test_id, None)
+                    payload = asdict(entry[1]) if entry else {}
+                    payload.pop('_udp_transit', None)
+                    conn.sendall(json.dumps(payload).encode())
+            except (OSError, struct.error, ThroughputError) as e:
+                logger.warning(f"Throughput test connection failed: {e}")
+
+    def _udp_loop(self):
+        buffer = memoryview(bytearray(65536))
+        while not self._stop.is_set():
+            try:
+                n, _ = self.udp.recvfrom_into(buffer)
+            except OSError:
+                return
+            arrival = time.time()
+            if n < DATAGRAM.size:
+                continue
+            magic, test_id, seq, sent_at = DATAGRAM.unpack_from(buffer)
+            if magic != MAGIC:
+                continue
+            result = self._result(test_id)
+            with self._lock:
+                result.udp_received += 1
+                result.bytes += n
+                if seq < result.udp_max_seq:
+                    result.udp_out_of_order += 1
+                result.udp_max_seq = max(result.udp_max_seq, seq)
+                if result.udp_first is None:
+                    result.udp_first = arrival
+                result.udp_last = arrival
+                # RFC 3550: J += (|D(i-1, i)| - J) / 16, clock offset cancels out in D
+                transit = (arrival - sent_at) * 1000
+                if result._udp_transit is not None:
+                    result.udp_jitter_ms += (abs(transit - result._udp_transit) - result.udp_jitter_ms) / 16
+                result._udp_transit = transit
+
+def _connect(host: str, port: int, mode: int, duration: float, test_id: int) -> socket.socket:
+    try:
+        sock = socket.create_connection((host, port), timeout=5)
+    except OSError as e:
+        raise ThroughputError(f"Can't reach the throughput server at {host}:{port} ({e})") from e
+    sock.settimeout(duration + 10)
+    sock.sendall(HEADER.pack(MAGIC, VERSION, mode, 0, duration, test_id))
+    return sock
+
+def _server_result(host: str, port: int, test_id: int) -> Dict[str, Any]:
+    with _connect(host, port, MODE_RESULT, 0, test_id) as sock:
+        data = b''
+        while chunk := sock.recv(65536):
+            data += chunk
+    try:
+        return json.loads(data or b'{}')
+    except ValueError as e:
+        raise ThroughputError("Unexpected reply from the throughput server") from e
+
+def _mbps(size: int, seconds: float) -> Optional[float]:
+    return round(size * 8 / seconds / 1e6, 2) if seconds > 0 else None
+
+def run_tcp_test(host: str, port: int = DEFAULT_PORT, duration: float = 5, streams: int = 1, direction: str = 'upload') -> Dict[str, Any]:
+    """
+    `streams` parallel TCP streams for `duration` seconds. Goodput is measured
+    at the receiver, retransmits at the sender (our TCP_INFO for uploads, the
+    server's for downloads).
+    """
+    test_id = random.getrandbits(64)
+    mode = MODE_UPLOAD if direction == 'upload' else MODE_DOWNLOAD
+    per_stream: List[Dict[str, Any]] = [{} for _ in range(streams)]
+    errors: List[Exception] = []
+
+    def run_stream(index: int):
+        try:
+            with _connect(host, port, mode, duration, test_id) as sock:
+                if mode == MODE_UPLOAD:
+                    sent = send_for(sock, duration)
+                    info = tcp_info(sock)
+                    sock.shutdown(socket.SHUT_WR)
+                    # Wait for the server to have counted everything
+                    sock.recv(1)
+                    per_stream[index] = {'bytes': sent} | info
+                else:
+                    received, seconds = receive_all(sock)
+                    per_stream[index] = {'bytes': received, 'seconds': round(seconds, 3), 'mbps': _mbps(received, seconds)} | tcp_info(sock)
+        except (OSError, ThroughputError) as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run_stream, args=(i,)) for i in range(streams)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise ThroughputError(str(errors[0]))
+    server = _server_result(host, port, test_id)
+
+    if mode == MODE_UPLOAD:
+        received, seconds = server.get('bytes', 0), server.get('seconds', 0)
+        retransmits = [stream['retransmits'] for stream in per_stream if stream.get('retransmits') is not None]
+        retransmits = sum(retransmits) if retransmits else None
+    else:
+        received = sum(stream['bytes'] for stream in per_stream)
+        seconds = max(stream['seconds'] for stream in per_stream)
+        retransmits = server.get('retransmits')
+    return {
+        'protocol': 'tcp',
+        'direction': direction,
+        'streams': streams,
+        'duration': duration,
+        'bytes': received,
+        'seconds': round(seconds, 3),
+        'goodput_mbps': _mbps(received, seconds),
+        'retransmits': retransmits,
+        'per_stream': per_stream,
+    }
+
+def run_udp_test(host: str, port: int = DEFAULT_PORT, duration: float = 5, rate_mbps: float = 100, streams: int = 1) -> Dict[str, Any]:
+    """
+    Paced UDP at `rate_mbps` (split over `streams` sockets) for `duration`
+    seconds, upload only. Loss, reordering and jitter come from the server.
+    """
+    test_id = random.getrandbits(64)
+    payload = os.urandom(UDP_PAYLOAD_BYTES - DATAGRAM.size)
+    interval = UDP_PAYLOAD_BYTES * 8 / (rate_mbps * 1e6 / streams)
+    sequence = iter(range(1 << 32))
+    sequence_lock = threading.Lock()
+    sent_counts = [0] * streams
+
+    def run_stream(index: int):
+        # A buffer per stream: with a shared one, another stream could rewrite the header before the send
+        datagram = bytearray(DATAGRAM.size) + payload
+        view = memoryview(datagram)
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.connect((host, port))
+            start = time.perf_counter()
+            next_send = start
+            while True:
+                now = time.perf_counter()
+                if now - start >= duration:
+                    break
+                if now < next_send:
+                    time.sleep(min(next_send - now, 0.001))
+                    continue
+                with sequence_lock:
+                    seq = next(sequence)
+                # Only the header changes, the datagram buffer is reused for every send
+                DATAGRAM.pack_into(view, 0, MAGIC, test_id, seq, time.time())
+                try:
+                    sock.send(view)
+                    sent_counts[index] += 1
+                except OSError:
+                    pass
+                next_send += interval
+
+    threads = [threading.Thread(target=run_stream, args=(i,)) for i in range(streams)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Give in-flight datagrams a moment before asking for the count
+    time.sleep(0.2)
+    server = _server_result(host, port, test_id)
+
+    sent = sum(sent_counts)
+    received = server.get('udp_received', 0)
+    first, last = server.get('udp_first'), server.get('udp_last')
+    seconds = (last - first) if first is not None and last is not None else 0
+    return {
+        'protocol': 'udp',
+        'direction': 'upload',
+        'streams': streams,
+        'duration': duration,
+        'rate_mbps': rate_mbps,
+        'datagrams_sent': sent,
+        'datagrams_received': received,
+        'loss': round(1 - received / sent, 4) if sent else None,
+        'out_of_order': server.get('udp_out_of_order', 0),
+        'jitter_ms': round(server.get('udp_jitter_ms', 0.0), 3),
+        'bytes': server.get('bytes', 0),
+        'seconds': round(seconds, 3),
+        'goodput_mbps': _mbps(server.get('bytes', 0), seconds),
+    }
+
+throughput_server: Optional[ThroughputServer] = None
+
+def start_throughput_server(port: int = THROUGHPUT_SERVER_PORT, host: str = THROUGHPUT_SERVER_HOST) -> ThroughputServer:
+    global throughput_server
+    throughput_server = ThroughputServer(host, port).start()
+    return throughput_server
+
+if __name__ == '__main__':
+    # Standalone server on another machine: python -m backend.throughput [port]
+    import sys
+    server = start_throughput_server(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT)
+    print(f"Throughput server listening on {THROUGHPUT_SERVER_HOST}:{server.port} (tcp and udp)")
+    threading.Event().wait()
@@ -1,15 +1,82 @@
 import re
 import socket
 import subprocess
+import threading
 import time
 from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
+from backend.metrics import TRACEROUTE_PHASE_SECONDS
+from backend.profiling import track
 from backend.utils import reverse_lookup
-def traceroute_host(target, max_hops=30, timeout=2):
+
+# Bounds of the `max_hops`/`timeout` the endpoint accepts
+MAX_HOPS = 64
+MAX_TIMEOUT = 10
+
+hop_line_re = re.compile(r'^\s*(\d+)\s+(.*)$')
+ip_re = re.compile(r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}')
+ms_re = re.compile(r'([\d.]+)\s*ms')
+
+def parse_traceroute_output(stdout, target_ip):
+    """
+    Parses `traceroute -n` stdout into one dict per hop. Hostnames are left
+    as None, resolving them is up to the caller.
+    """
+    hops = []
+    for line in stdout.strip().splitlines():
+        match = hop_line_re.match(line)
+        if not match:
+            continue
+
+        hop_num = int(match.group(1))
+        rest = match.group(2)
+
+        ips = ip_re.findall(rest)
+        rtts = [float(x) for x in ms_re.findall(rest)]
+        hop_ip = ips[0] if ips else None
+        avg_rtt = round(sum(rtts) / len(rtts), 1) if rtts else None
+        is_timeout = not ips and '*' in rest
+        is_destination = hop_ip == target_ip
+        status = "reached" if is_destination else 'timeout' if is_timeout else "ok"
+      
+        hops.append({
+            "hop": hop_num,
+            "ip": hop_ip,
+            "hostname": None,
+            "rtt_ms": avg_rtt,
+            "status": status,
+        })
+    return hops
+
+def _stream_traceroute(args, deadline_seconds, target_ip, on_hop):
+    """Runs traceroute reading its output line by line, calling `on_hop` for each hop as it's printed."""
+    proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    killer = threading.Timer(deadline_seconds, proc.kill)
+    killer.start()
+    try:
+        lines = []
+        for line in proc.stdout:
+            lines.append(line)
+            for hop in parse_traceroute_output(line, target_ip):
+                on_hop(hop)
+        stderr = proc.stderr.read()
+        returncode = proc.wait()
+    finally:
+        killer.cancel()
+        if proc.poll() is None:  # on_hop raised (the job was cancelled), don't leave it running
+            proc.kill()
+            proc.wait()
+    if returncode < 0:
+        raise subprocess.TimeoutExpired(args, deadline_seconds)
+    return subprocess.CompletedProcess(args, returncode, ''.join(lines), stderr)
+
+def traceroute_host(target, max_hops=30, timeout=2, on_hop=None):
     """
     Traces the route to a host using the system `traceroute` command (UDP
     probes), then parses its output into structured JSON, including reverse
     DNS hostnames for each responding hop and timing broken down by phase.
+    `on_hop(hop)`, if given, gets each hop as soon as traceroute prints it,
+    before its hostname is resolved.
     """
     total_start = time.time()
     parsed = urlparse(target if "://" in target else f"//{target}")
@@ -22,12 +89,17 @@ def traceroute_host(target, max_hops=30, timeout=2):
 
     traceroute_start = time.time()
     try:
-        proc = subprocess.run(
-            ["traceroute", "-n", "-w", str(timeout), "-m", str(max_hops), hostname],
-            capture_output=True,
-            text=True,
-            timeout=(max_hops * timeout) + 10,
-        )
+        args = ["traceroute", "-n", "-w", str(timeout), "-m", str(max_hops), hostname]
+        with track('subprocess'):
+            if on_hop is not None:
+                proc = _stream_traceroute(args, (max_hops * timeout) + 10, target_ip, on_hop)
+            else:
+                proc = subprocess.run(
+                    args,
+                    capture_output=True,
+                    text=True,
+                    timeout=(max_hops * timeout) + 10,
+                )
     except FileNotFoundError as exc:
         raise RuntimeError(
             "The traceroute command isn't installed. Install it with: sudo apt install traceroute"
@@ -40,34 +112,7 @@ def traceroute_host(target, max_hops=30, timeout=2):
     if proc.returncode != 0 and not proc.stdout:
         raise RuntimeError(f"Traceroute failed: {proc.stderr.strip()}")
 
-    hop_line_re = re.compile(r'^\s*(\d+)\s+(.*)$')
-    ip_re = re.compile(r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}')
-    ms_re = re.compile(r'([\d.]+)\s*ms')
-
-    hops = []
-    for line in proc.stdout.strip().splitlines():
-        match = hop_line_re.match(line)
-        if not match:
-            continue
-
-        hop_num = int(match.group(1))
-        rest = match.group(2)
-
-        ips = ip_re.findall(rest)
-        rtts = [float(x) for x in ms_re.findall(rest)]
-        hop_ip = ips[0] if ips else None
-        avg_rtt = round(sum(rtts) / len(rtts), 1) if rtts else None
-        is_timeout = not ips and '*' in rest
-        is_destination = hop_ip == target_ip
-        status = "reached" if is_destination else 'timeout' if is_timeout else "ok"
-      
-        hops.append({
-            "hop": hop_num,
-            "ip": hop_ip,
-            "hostname": None,
-            "rtt_ms": avg_rtt,
-            "status": status,
-        })
+    hops = parse_traceroute_output(proc.stdout, target_ip)
 
     dns_start = time.time()
 
@@ -98,6 +143,10 @@ def traceroute_host(target, max_hops=30, timeout=2):
     destination_rtt_ms = hops[-1]["rtt_ms"] if reached else None
     estimated_one_way_ms = round(destination_rtt_ms / 2, 1) if destination_rtt_ms else None
 
+    TRACEROUTE_PHASE_SECONDS.observe(traceroute_ms / 1000, phase='traceroute')
+    TRACEROUTE_PHASE_SECONDS.observe(dns_ms / 1000, phase='dns_lookup')
+    TRACEROUTE_PHASE_SECONDS.observe(total_ms / 1000, phase='total')
+
     return {
         "target": hostname,
         "target_ip": target_ip,
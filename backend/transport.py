@@ -0,0 +1,774 @@
+import ipaddress
+import os
+import random
+import re
+import select
+import socket
+import struct
+import subprocess
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+import scapy.all as scapy
+from scapy.layers.inet import ICMP, IP, TCP
+from scapy.layers.inet6 import ICMPv6EchoReply, ICMPv6EchoRequest, ICMPv6ND_NA, ICMPv6ND_NS, ICMPv6NDOptDstLLAddr, ICMPv6NDOptSrcLLAddr, IPv6
+from scapy.layers.l2 import ARP, Ether
+from scapy.utils6 import in6_getnsma, in6_getnsmac
+
+from backend.mac_utils import eui64_address
+
+# The packet exchanges the scanner needs, behind one small interface so the scan paths
+# can run against either the real network (`ScapyTransport`) or a deterministic
+# in-memory one (`SimulatedTransport`) for load tests and benchmarks on any box.
+# Select the simulator with NETWORK_TRANSPORT=simulated (see `transport_from_env`).
+
+class ScapyTransport:
+    """Raw packets through scapy, needs CAP_NET_RAW (or root)."""
+
+    def default_subnet(self) -> str:
+        # Assumes a /24, same as scan_network always has
+        from backend.utils import net_config
+        network_prefix = net_config.local_ip.rsplit('.', 1)[0]
+        return f"{network_prefix}.0/24"
+
+    def arp_sweep(self, subnet: str, timeout: float = 3, iface: Optional[str] = None) -> list[tuple[str, str]]:
+        """Broadcast ARP who-has for every address in `subnet`, returns (ip, mac) of the hosts that answered."""
+        packet = Ether(dst="ff:ff:ff:ff:ff:ff") / ARP(pdst=subnet)
+        answered, _ = scapy.srp(packet, timeout=timeout, iface=iface, verbose=0)
+        return [(receive.psrc, receive.src) for _, receive in answered]
+
+    def arp_probe(self, ip: str, timeout: float = 2, iface: Optional[str] = None) -> Optional[str]:
+        """Broadcast ARP who-has for a single IP, returns the MAC that answered, if any."""
+        packet = Ether(dst="ff:ff:ff:ff:ff:ff") / ARP(pdst=ip)
+        answered, _ = scapy.srp(packet, timeout=timeout, iface=iface, verbose=0)
+        return answered[0][1].hwsrc if answered else None
+
+    def arp_probe_many(self, targets: dict[str, str], timeout: float = 2, iface: Optional[str] = None) -> dict[str, str]:
+        """
+        Unicast ARP who-has to each known {ip: mac}, all sent at once, waiting for
+        replies until every target answered or `timeout`. Returns {ip: mac} of the
+        replies; a target whose IP moved to another device doesn't answer, its
+        NIC only gets the frame addressed to it.
+
+        On Linux the 42-byte frames are packed and sent on an AF_PACKET socket
+        bound to ARP, like `ping_many` no scapy packet is built per target.
+        """
+        if not targets:
+            return {}
+        iface = iface or str(scapy.conf.iface)
+        source_mac, source_ip = scapy.get_if_hwaddr(iface), scapy.get_if_addr(iface)
+        if not hasattr(socket, 'AF_PACKET'):
+            packets = [Ether(dst=mac) / ARP(pdst=ip, psrc=source_ip) for ip, mac in targets.items()]
+            answered, _ = scapy.srp(packets, timeout=timeout, iface=iface, verbose=0)
+            return {receive.psrc: receive.hwsrc.lower() for _, receive in answered}
+        replies: dict[str, str] = {}
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ARP))
+        try:
+            sock.bind((iface, ETH_P_ARP))
+            sender = _mac_bytes(source_mac), socket.inet_aton(source_ip)
+            pending = set()
+            for ip, mac in targets.items():
+                try:
+                    sock.send(_arp_request(_mac_bytes(mac), socket.inet_aton(ip), *sender))
+                    pending.add(ip)
+                except (OSError, ValueError):
+                    pass  # malformed address or unroutable, the target stays unanswered
+            sock.setblocking(False)
+            deadline = time.perf_counter() + timeout
+            while pending and (remaining := deadline - time.perf_counter()) > 0:
+                if not select.select([sock], [], [], remaining)[0]:
+                    break
+                while True:
+                    try:
+                        frame = sock.recv(64)
+                    except BlockingIOError:
+                        break
+                    reply = _parse_arp_reply(frame)
+                    if reply is not None and reply[0] in pending:
+                        pending.discard(reply[0])
+                        replies[reply[0]] = reply[1]
+        finally:
+            sock.close()
+        return replies
+
+    def icmp_ttl(self, ip: str, timeout: float = 1) -> Optional[int]:
+        """TTL of the ICMP echo reply from `ip`, None if it didn't answer."""
+        reply = scapy.sr1(IP(dst=ip)/ICMP(), timeout=timeout, verbose=0)
+        return reply.ttl if reply is not None else None
+
+    def syn_scan(self, ip: str, ports: list[int], timeout: float = 1) -> list[int]:
+        """
+        Half-open scan: one SYN per port, returns the ports that answered SYN-ACK.
+        The kernel resets those connections itself since no socket owns them.
+        """
+        packets = IP(dst=ip) / TCP(sport=scapy.RandShort(), dport=ports, flags='S')
+        answered, _ = scapy.sr(packets, timeout=timeout, verbose=0)
+        return sorted({reply[TCP].sport for _, reply in answered if TCP in reply and reply[TCP].flags & 0x12 == 0x12})
+
+    def fingerprint_many(self, targets: dict[str, Optional[int]], timeout: float = 2) -> dict[str, dict]:
+        """
+        OS fingerprint probes for every target in a single `sr()`: an ICMP echo
+        with a non-zero code (some stacks echo it back, others zero it) and, for
+        targets with a known open port, a SYN carrying the usual options, whose
+        SYN-ACK window and option layout differ per stack. Returns the features
+        observed per target that answered anything (see `fingerprint.py`).
+        """
+        probes = []
+        for ip, port in targets.items():
+            probes.append(IP(dst=ip) / ICMP(type=8, code=FINGERPRINT_ICMP_CODE, id=os.getpid() & 0xFFFF, seq=len(probes)))
+            if port:
+                probes.append(IP(dst=ip) / TCP(sport=scapy.RandShort(), dport=port, flags='S', window=1024, options=FINGERPRINT_TCP_OPTIONS))
+        if not probes:
+            return {}
+        answered, _ = scapy.sr(probes, timeout=timeout, verbose=0)
+        features: dict[str, dict] = {}
+        for sent, reply in answered:
+            observed = features.setdefault(sent[IP].dst, {})
+            if ICMP in reply and reply[ICMP].type == 0:
+                observed['icmp_ttl'] = reply[IP].ttl
+                observed['icmp_code_echoed'] = reply[ICMP].code == FINGERPRINT_ICMP_CODE
+            elif TCP in reply and reply[TCP].flags & 0x12 == 0x12:
+                observed['tcp_ttl'] = reply[IP].ttl
+                observed['tcp_window'] = reply[TCP].window
+                observed['tcp_options'] = tcp_option_layout(reply[TCP].options)
+        return features
+
+    def ping_many(self, targets: list[str], count: int = 1, spacing: float = 0.02, timeout: float = 1) -> dict[str, list[Optional[float]]]:
+        """
+        `count` ICMP echo requests to every target, one probe to each target every
+        `spacing` seconds, all through a single socket. Returns the RTT in ms of
+        each probe per target, None for the ones not answered within `timeout`.
+
+        Doesn't go through scapy: building packets in Python per probe is what makes
+        monitoring hundreds of targets expensive, here each probe is a fixed 16-byte
+        echo request and replies are matched by sequence number.
+        """
+        if len(targets) * count > 0xFFFF:
+            raise ValueError("At most 65535 probes per round")
+        results: dict[str, list[Optional[float]]] = {target: [None] * count for target in targets}
+        sock, raw = _open_icmp_socket()
+        try:
+            ident = os.getpid() & 0xFFFF
+            pending: dict[int, tuple[str, int, float]] = {}
+            seq = random.randrange(0x10000)
+            deadline = time.perf_counter()
+            for probe in range(count):
+                for target in targets:
+                    seq = (seq + 1) & 0xFFFF
+                    pending[seq] = (target, probe, time.perf_counter())
+                    try:
+                        sock.sendto(_echo_request(ident, seq), (target, 0))
+                    except OSError:
+                        pending.pop(seq)  # unroutable target, the probe stays lost
+                deadline = time.perf_counter() + (spacing if probe < count - 1 else timeout)
+                _collect_echo_replies(sock, raw, ident, pending, results, deadline, timeout)
+        finally:
+            sock.close()
+        return results
+
+    def ipv6_prefixes(self, iface: Optional[str] = None) -> list[str]:
+        """The /64 of each IPv6 address on `iface`, link-local first (SLAAC addresses are always in a /64)."""
+        iface = iface or scapy.conf.iface.name
+        prefixes = []
+        for address, _, name in scapy.in6_getifaddr():
+            if name != iface:
+                continue
+            prefix = str(ipaddress.ip_network(f'{address}/64', strict=False))
+            if prefix not in prefixes:
+                prefixes.append(prefix)
+        return sorted(prefixes, key=lambda prefix: not prefix.startswith('fe80:'))
+
+    def ndp_sweep(self, targets: list[str], timeout: float = 2, iface: Optional[str] = None) -> list[tuple[str, str]]:
+        """
+        One ICMPv6 echo request to all-nodes (ff02::1), which every IPv6 host on the
+        link answers from its link-local address, plus a neighbor solicitation for
+        each of `targets`, all in one exchange. Returns (address, mac) of every
+        echo reply and neighbor advertisement.
+        """
+        iface = iface or scapy.conf.iface.name
+        source_mac = scapy.get_if_hwaddr(iface)
+        link_local = next((address for address, _, name in scapy.in6_getifaddr() if name == iface and address.startswith('fe80:')), None)
+        if link_local is None:
+            return []
+        ident = os.getpid() & 0xFFFF
+        packets = [Ether(src=source_mac, dst='33:33:00:00:00:01') / IPv6(src=link_local, dst='ff02::1') / ICMPv6EchoRequest(id=ident)]
+        for target in targets:
+            solicited = in6_getnsma(socket.inet_pton(socket.AF_INET6, target))
+            packets.append(
+                Ether(src=source_mac, dst=in6_getnsmac(solicited))
+                / IPv6(src=link_local, dst=socket.inet_ntop(socket.AF_INET6, solicited), hlim=255)
+                / ICMPv6ND_NS(tgt=target) / ICMPv6NDOptSrcLLAddr(lladdr=source_mac)
+            )
+        found = {}
+
+        def collect(receive):
+            if ICMPv6ND_NA in receive:
+                found[receive[ICMPv6ND_NA].tgt] = receive[ICMPv6NDOptDstLLAddr].lladdr if ICMPv6NDOptDstLLAddr in receive else receive.src
+            elif ICMPv6EchoReply in receive and receive[ICMPv6EchoReply].id == ident:
+                found[receive[IPv6].src] = receive.src
+
+        # Not srp: it can't pair the replies of unicast addresses with a request sent to
+        # a multicast one (unless conf.checkIPsrc is turned off for the whole process)
+        scapy.sniff(
+            iface=iface, timeout=timeout, store=False, prn=collect,
+            lfilter=lambda packet: Ether in packet and packet.src != source_mac and IPv6 in packet,
+            started_callback=lambda: scapy.sendp(packets, iface=iface, verbose=0),
+        )
+        return list(found.items())
+
+    def ipv6_neighbors(self) -> list[tuple[str, str, str]]:
+        """(address, mac, state) of the kernel's IPv6 neighbor cache, `ip -6 neigh` (Linux only, empty elsewhere)."""
+        try:
+            output = subprocess.run(['ip', '-6', 'neigh', 'show'], capture_output=True, text=True, timeout=5).stdout
+        except (OSError, subprocess.TimeoutExpired):
+            return []
+        return parse_ip_neigh(output)
+
+    def ttl_probe_many(self, targets: dict[str, int], timeout: float = 1, spacing: float = 0.0) -> dict[str, list[Optional[tuple[str, float]]]]:
+        """
+        One ICMP echo request per TTL from 1 to `max_hops` to every target
+        ({ip: max_hops}), all through a single raw socket, the targets' probes of
+        one TTL back to back and `spacing` seconds between TTLs. Returns, per
+        target and TTL, (address that answered, RTT in ms): a router's time
+        exceeded, an unreachable or the target's own echo reply; None if nothing
+        came back within `timeout`.
+
+        Needs a raw socket (CAP_NET_RAW): ICMP datagram sockets don't get the
+        time exceeded messages of other hosts.
+        """
+        if sum(targets.values()) > 0xFFFF:
+            raise ValueError("At most 65535 probes per round")
+        results: dict[str, list[Optional[tuple[str, float]]]] = {target: [None] * max_hops for target, max_hops in targets.items()}
+        sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+        sock.setblocking(False)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        try:
+            # Own identifier, not ping_many's: a raw socket sees every ICMP message of the host
+            ident = random.randrange(0x10000)
+            pending: dict[int, tuple[str, int, float]] = {}
+            seq = random.randrange(0x10000)
+            deadline = time.perf_counter()
+            for ttl in range(1, max(targets.values(), default=0) + 1):
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_TTL, ttl)
+                for target, max_hops in targets.items():
+                    if ttl > max_hops:
+                        continue
+                    seq = (seq + 1) & 0xFFFF
+                    pending[seq] = (target, ttl - 1, time.perf_counter())
+                    try:
+                        sock.sendto(_echo_request(ident, seq), (target, 0))
+                    except OSError:
+                        pending.pop(seq)
+                deadline = time.perf_counter() + spacing
+                _collect_ttl_replies(sock, ident, pending, results, deadline, timeout)
+            _collect_ttl_replies(sock, ident, pending, results, time.perf_counter() + timeout, timeout)
+        finally:
+            sock.close()
+        return results
+
+ETH_P_ARP = 0x0806
+_ARP_FRAME = struct.Struct('!6s6sHHHBBH6s4s6s4s')
+
+def _mac_bytes(mac: str) -> bytes:
+    raw = bytes.fromhex(mac.replace(':', '').replace('-', ''))
+    if len(raw) != 6:
+        raise ValueError(f"Invalid MAC address {mac!r}")
+    return raw
+
+def _arp_request(target_mac: bytes, target_ip: bytes, source_mac: bytes, source_ip: bytes) -> bytes:
+    return _ARP_FRAME.pack(target_mac, source_mac, ETH_P_ARP, 1, 0x0800, 6, 4, 1, source_mac, source_ip, b'\0' * 6, target_ip)
+
+def _parse_arp_reply(frame: bytes) -> Optional[tuple[str, str]]:
+    """(ip, mac) of the sender of an ARP reply, None for anything else."""
+    if len(frame) < _ARP_FRAME.size:
+        return None
+    _, _, ethertype, _, _, _, _, op, sender_mac, sender_ip, _, _ = _ARP_FRAME.unpack_from(frame)
+    if ethertype != ETH_P_ARP or op != 2:
+        return None
+    return socket.inet_ntoa(sender_ip), sender_mac.hex(':')
+
+FINGERPRINT_ICMP_CODE = 9
+FINGERPRINT_TCP_OPTIONS = [('WScale', 10), ('NOP', None), ('MSS', 1460), ('Timestamp', (0xFFFFFFFF, 0)), ('SAckOK', b'')]
+_TCP_OPTION_LETTERS = {'MSS': 'M', 'NOP': 'N', 'WScale': 'W', 'SAckOK': 'S', 'Timestamp': 'T', 'EOL': 'E'}
+
+def tcp_option_layout(options) -> str:
+    """Order of the TCP options as letters, e.g. "MSTNW" for MSS, SACK, timestamps, NOP, window scale."""
+    return ''.join(_TCP_OPTION_LETTERS.get(name, '?') for name, _ in options)
+
+_ECHO_REQUEST = struct.Struct('!BBHHHQ')
+_ECHO_HEADER = struct.Struct('!BBHHH')
+
+def _icmp_checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b'\0'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+def _echo_request(ident: int, seq: int) -> bytes:
+    payload = time.monotonic_ns() & 0xFFFFFFFFFFFFFFFF
+    checksum = _icmp_checksum(_ECHO_REQUEST.pack(8, 0, 0, ident, seq, payload))
+    return _ECHO_REQUEST.pack(8, 0, checksum, ident, seq, payload)
+
+def _open_icmp_socket() -> tuple[socket.socket, bool]:
+    """
+    An unprivileged ICMP datagram socket when net.ipv4.ping_group_range allows it,
+    a raw socket (CAP_NET_RAW) otherwise. Returns (socket, is_raw).
+    """
+    try:
+        sock, raw = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP), False
+    except PermissionError:
+        sock, raw = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP), True
+    sock.setblocking(False)
+    # A round's replies arrive in bursts (one per target per probe), don't drop them
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+    return sock, raw
+
+def _collect_echo_replies(sock, raw, ident, pending, results, deadline, timeout):
+    while pending:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return
+        readable, _, _ = select.select([sock], [], [], remaining)
+        if not readable:
+            return
+        while True:
+            try:
+                packet, (source, _) = sock.recvfrom(1500)
+            except BlockingIOError:
+                break
+            received = time.perf_counter()
+            # Raw sockets get the IP header too; datagram ones have the id rewritten by the kernel
+            offset = (packet[0] & 0x0F) * 4 if raw else 0
+            if len(packet) < offset + _ECHO_HEADER.size:
+                continue
+            icmp_type, _, _, reply_ident, seq = _ECHO_HEADER.unpack_from(packet, offset)
+            if icmp_type != 0 or (raw and reply_ident != ident):
+                continue
+            probe = pending.get(seq)
+            if probe is None or probe[0] != source:
+                continue
+            del pending[seq]
+            target, index, sent = probe
+            if received - sent <= timeout:
+                results[target][index] = (received - sent) * 1000
+
+_NEIGH_LINE_RE = re.compile(r'^(\S+) dev \S+ lladdr ([0-9a-fA-F:]{17})(?: router)? (\S+)')
+
+def parse_ip_neigh(output: str) -> list[tuple[str, str, str]]:
+    """
+    (address, mac, state) of the entries of `ip -6 neigh show` output that
+    have a MAC (not FAILED/INCOMPLETE). Only REACHABLE ones say the neighbor
+    answered lately: STALE, DELAY and PROBE entries can outlive the device.
+    """
+    neighbors = []
+    for line in output.splitlines():
+        match = _NEIGH_LINE_RE.match(line.strip())
+        if match and match.group(3) not in ('FAILED', 'INCOMPLETE'):
+            neighbors.append((match.group(1), match.group(2).lower(), match.group(3)))
+    return neighbors
+
+# ICMP messages that quote the probe that caused them
+_ICMP_TIME_EXCEEDED = 11
+_ICMP_UNREACHABLE = 3
+
+def _collect_ttl_replies(sock, ident, pending, results, deadline, timeout):
+    while pending:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return
+        readable, _, _ = select.select([sock], [], [], remaining)
+        if not readable:
+            return
+        while True:
+            try:
+                packet, (source, _) = sock.recvfrom(1500)
+            except BlockingIOError:
+                break
+            received = time.perf_counter()
+            offset = (packet[0] & 0x0F) * 4
+            if len(packet) < offset + _ECHO_HEADER.size:
+                continue
+            icmp_type = packet[offset]
+            if icmp_type in (_ICMP_TIME_EXCEEDED, _ICMP_UNREACHABLE):
+                # 8 bytes of ICMP header, then the probe's IP header and its first 8 bytes
+                quoted = offset + 8
+                if len(packet) < quoted + 20:
+                    continue
+                offset = quoted + (packet[quoted] & 0x0F) * 4
+                if len(packet) < offset + _ECHO_HEADER.size or packet[offset] != 8:
+                    continue
+            elif icmp_type != 0:
+                continue
+            _, _, _, reply_ident, seq = _ECHO_HEADER.unpack_from(packet, offset)
+            probe = pending.get(seq)
+            if reply_ident != ident or probe is None:
+                continue
+            del pending[seq]
+            target, index, sent = probe
+            if received - sent <= timeout:
+                results[target][index] = (source, (received - sent) * 1000)
+
+# Common consumer OUIs (all present in scapy's manuf database) and how often they show up
+DEFAULT_VENDOR_MIX = {
+    'F0:18:98': 30,  # Apple
+    '8C:79:F5': 15,  # Samsung
+    '44:65:0D': 10,  # Amazon
+    '00:1A:11': 10,  # Google
+    '50:C7:BF': 10,  # TP-Link
+    'B8:27:EB': 5,   # Raspberry Pi
+    '00:17:88': 5,   # Philips Hue
+    'FC:EC:DA': 5,   # Ubiquiti
+}
+
+# Services simulated hosts may listen on, each with this probability
+SIMULATED_PORTS = {22: 0.2, 53: 0.05, 80: 0.25, 443: 0.2, 445: 0.1, 631: 0.05, 3389: 0.05, 8080: 0.1, 9100: 0.05, 62078: 0.1}
+
+# What each simulated stack answers the fingerprint probes with: SYN-ACK window, option
+# layout and whether the ICMP echo code comes back
+SIMULATED_STACKS = {
+    64: (65160, 'MSTNW', True),     # Linux
+    128: (64240, 'MNWNNS', False),  # Windows
+    255: (4128, 'M', False),        # Network gear
+}
+
+# Initial TTL of each OS family's ICMP echo replies
+DEFAULT_OS_MIX = {
+    64: 60,   # Linux / Android / macOS / iOS
+    128: 30,  # Windows
+    255: 10,  # Network gear
+}
+
+@dataclass
+class SimulatedHost:
+    ip: str
+    mac: str
+    latency_ms: float
+    loss: float
+    ttl: int
+    open_ports: tuple[int, ...] = ()
+    # Link-local first, then the global ones
+    ipv6: tuple[str, ...] = ()
+
+@dataclass
+class SimulatedHop:
+    ip: str
+    latency_ms: float
+    # Share of the time exceeded messages the router doesn't send (ICMP rate limiting)
+    rate_limit: float = 0.0
+
+@dataclass
+class SimulatedNetwork:
+    """
+    A seeded, in-memory LAN. Every address of `subnets` (up to a /16 each) is
+    populated with probability `density`; each host gets a MAC from
+    `vendor_mix` (or a locally administered one, `random_mac_ratio` of the
+    time), a response latency drawn from `latency_ms` and the packet loss
+    probability `loss`. `ipv6_ratio` of them are dual-stack and `ipv6_only`
+    more hosts only have IPv6 addresses, in `ipv6_prefix`.
+    """
+    subnets: list[str] = field(default_factory=lambda: ['10.42.0.0/24'])
+    density: float = 0.3
+    latency_ms: tuple[float, float] = (0.5, 25.0)
+    loss: float = 0.02
+    vendor_mix: dict[str, int] = field(default_factory=lambda: dict(DEFAULT_VENDOR_MIX))
+    os_mix: dict[int, int] = field(default_factory=lambda: dict(DEFAULT_OS_MIX))
+    random_mac_ratio: float = 0.1
+    seed: int = 0
+    ipv6_ratio: float = 0.0
+    ipv6_only: int = 0
+    ipv6_prefix: str = 'fd42::/64'
+    hosts: dict[str, SimulatedHost] = field(init=False, repr=False)
+    # Every IPv6 address -> its host, IPv6-only hosts included
+    ipv6_hosts: dict[str, SimulatedHost] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        rng = random.Random(self.seed)
+        ouis, oui_weights = list(self.vendor_mix), list(self.vendor_mix.values())
+        ttls, ttl_weights = list(self.os_mix), list(self.os_mix.values())
+        self.hosts = {}
+        for subnet in self.subnets:
+            network = ipaddress.ip_network(subnet, strict=False)
+            if network.prefixlen < 16:
+                raise ValueError(f"Simulated subnets are limited to a /16, got {subnet}")
+            for address in network.hosts():
+                if rng.random() >= self.density:
+                    continue
+                if rng.random() < self.random_mac_ratio:
+                    # Set the U/L bit and clear the multicast bit, like phone privacy MACs
+                    first_octet = (rng.randrange(256) | 0b10) & 0b11111110
+                    mac = ':'.join(f'{b:02x}' for b in [first_octet, *(rng.randrange(256) for _ in range(5))])
+                else:
+                    oui = rng.choices(ouis, oui_weights)[0].lower()
+                    mac = oui + ':' + ':'.join(f'{rng.randrange(256):02x}' for _ in range(3))
+                ip = str(address)
+                self.hosts[ip] = SimulatedHost(
+                    ip=ip,
+                    mac=mac,
+                    latency_ms=rng.uniform(*self.latency_ms),
+                    loss=self.loss,
+                    ttl=rng.choices(ttls, ttl_weights)[0],
+                    # Own RNG per host: adding ports didn't change the draws above
+                    open_ports=self._open_ports(ip),
+                )
+
+        self._add_ipv6_hosts()
+
+    def _add_ipv6_hosts(self):
+        # Own RNGs again, the IPv4 hosts above stay the same whatever the IPv6 settings
+        self.ipv6_hosts = {}
+        for host in self.hosts.values():
+            if random.Random(f"{self.seed}:dual-stack:{host.ip}").random() < self.ipv6_ratio:
+                host.ipv6 = self._ipv6_addresses(host.mac)
+        rng = random.Random(f"{self.seed}:ipv6-only")
+        for _ in range(self.ipv6_only):
+            mac = '02:' + ':'.join(f'{rng.randrange(256):02x}' for _ in range(5))
+            addresses = self._ipv6_addresses(mac)
+            host = SimulatedHost(ip=addresses[-1], mac=mac, latency_ms=rng.uniform(*self.latency_ms), loss=self.loss, ttl=64, ipv6=addresses)
+            for address in addresses:
+                self.ipv6_hosts[address] = host
+        for host in self.hosts.values():
+            for address in host.ipv6:
+                self.ipv6_hosts[address] = host
+
+    def _ipv6_addresses(self, mac: str) -> tuple[str, ...]:
+        """Link-local and global EUI-64 addresses, or a random global (privacy) one half the time."""
+        rng = random.Random(f"{self.seed}:ipv6:{mac}")
+        prefix = ipaddress.ip_network(self.ipv6_prefix)
+        global_address = eui64_address(self.ipv6_prefix, mac) if rng.random() < 0.5 else str(prefix.network_address + rng.getrandbits(64))
+        return (eui64_address('fe80::/64', mac), global_address)
+
+    def _open_ports(self, ip: str) -> tuple[int, ...]:
+        rng = random.Random(f"{self.seed}:ports:{ip}")
+        return tuple(port for port, probability in SIMULATED_PORTS.items() if rng.random() < probability)
+
+class SimulatedTransport:
+    """
+    Answers ARP/ICMP from a `SimulatedNetwork` instead of the wire. Each
+    exchange is a new "round" with its own seeded RNG, so loss is random
+    across rounds but identical between runs.
+
+    Wall time is modelled, not spent: every call accounts the time a real
+    exchange would take (`send_rate_pps` to put the probes on the wire plus
+    waiting for replies up to `timeout`) in `simulated_seconds`, and sleeps
+    that multiplied by `time_scale` (0 by default, i.e. no sleeping).
+    """
+
+    def __init__(self, network: Optional[SimulatedNetwork] = None, send_rate_pps: float = 20_000, time_scale: float = 0.0):
+        self.network = network or SimulatedNetwork()
+        self.send_rate_pps = send_rate_pps
+        self.time_scale = time_scale
+        self.simulated_seconds = 0.0
+        self.packets_sent = 0
+        self._round = 0
+        # Route to each target traced so far, replace one to simulate a path change
+        self.paths: dict[str, list[SimulatedHop]] = {}
+        # {IPv6 address: mac} returned by `ipv6_neighbors`, REACHABLE unless neighbor_states says otherwise
+        self.neighbor_cache: dict[str, str] = {}
+        self.neighbor_states: dict[str, str] = {}
+
+    def default_subnet(self) -> str:
+        return self.network.subnets[0]
+
+    def _next_rng(self) -> random.Random:
+        self._round += 1
+        return random.Random(f"{self.network.seed}:{self._round}")
+
+    def _answers(self, host: Optional[SimulatedHost], rng: random.Random, timeout: float) -> bool:
+        return host is not None and rng.random() >= host.loss and host.latency_ms / 1000 <= timeout
+
+    def _spend(self, probes: int, wait: float):
+        elapsed = probes / self.send_rate_pps + wait
+        self.packets_sent += probes
+        self.simulated_seconds += elapsed
+        if self.time_scale > 0:
+            time.sleep(elapsed * self.time_scale)
+
+    def arp_sweep(self, subnet: str, timeout: float = 3, iface: Optional[str] = None) -> list[tuple[str, str]]:
+        rng = self._next_rng()
+        network = ipaddress.ip_network(subnet, strict=False)
+        hosts = self.network.hosts
+        answered = []
+        probes = 0
+        for address in network.hosts():
+            probes += 1
+            host = hosts.get(str(address))
+            if self._answers(host, rng, timeout):
+                answered.append((host.ip, host.mac))
+        # Like srp, a sweep always waits out the full timeout for late replies
+        self._spend(probes, timeout)
+        return answered
+
+    def arp_probe(self, ip: str, timeout: float = 2, iface: Optional[str] = None) -> Optional[str]:
+        rng = self._next_rng()
+        host = self.network.hosts.get(ip)
+        if self._answers(host, rng, timeout):
+            self._spend(1, host.latency_ms / 1000)
+            return host.mac
+        self._spend(1, timeout)
+        return None
+
+    def icmp_ttl(self, ip: str, timeout: float = 1) -> Optional[int]:
+        rng = self._next_rng()
+        host = self.network.hosts.get(ip)
+        if self._answers(host, rng, timeout):
+            self._spend(1, host.latency_ms / 1000)
+            return host.ttl
+        self._spend(1, timeout)
+        return None
+
+    def arp_probe_many(self, targets: dict[str, str], timeout: float = 2, iface: Optional[str] = None) -> dict[str, str]:
+        rng = self._next_rng()
+        replies = {}
+        slowest = 0.0
+        for ip, mac in targets.items():
+            host = self.network.hosts.get(ip)
+            if host is not None and host.mac == mac.lower() and self._answers(host, rng, timeout):
+                replies[ip] = host.mac
+                slowest = max(slowest, host.latency_ms / 1000)
+        # Returns as soon as every target answered, otherwise waits out the timeout
+        self._spend(len(targets), slowest if len(replies) == len(targets) else timeout)
+        return replies
+
+    def syn_scan(self, ip: str, ports: list[int], timeout: float = 1) -> list[int]:
+        rng = self._next_rng()
+        host = self.network.hosts.get(ip)
+        # Like sr, waits out the timeout for the ports that don't answer
+        self._spend(len(ports), timeout)
+        if host is None:
+            return []
+        return sorted(port for port in set(ports) if port in host.open_ports and rng.random() >= host.loss)
+
+    def fingerprint_many(self, targets: dict[str, Optional[int]], timeout: float = 2) -> dict[str, dict]:
+        rng = self._next_rng()
+        features: dict[str, dict] = {}
+        probes = 0
+        for ip, port in targets.items():
+            host = self.network.hosts.get(ip)
+            probes += 1 + bool(port)
+            if host is None:
+                continue
+            window, options, code_echoed = SIMULATED_STACKS.get(host.ttl, SIMULATED_STACKS[64])
+            observed = {}
+            if self._answers(host, rng, timeout):
+                observed |= {'icmp_ttl': host.ttl, 'icmp_code_echoed': code_echoed}
+            if port in host.open_ports and self._answers(host, rng, timeout):
+                observed |= {'tcp_ttl': host.ttl, 'tcp_window': window, 'tcp_options': options}
+            if observed:
+                features[ip] = observed
+        self._spend(probes, timeout)
+        return features
+
+    def ping_many(self, targets: list[str], count: int = 1, spacing: float = 0.02, timeout: float = 1) -> dict[str, list[Optional[float]]]:
+        rng = self._next_rng()
+        results: dict[str, list[Optional[float]]] = {}
+        for target in targets:
+            host = self.network.hosts.get(target)
+            rtts = []
+            for _ in range(count):
+                if host is None or rng.random() < host.loss:
+                    rtts.append(None)
+                    continue
+                # +-20% jitter around the host's latency, with the odd 3x queueing spike
+                rtt = host.latency_ms * rng.uniform(0.8, 1.2) * (3 if rng.random() < 0.02 else 1)
+                rtts.append(rtt if rtt <= timeout * 1000 else None)
+            results[target] = rtts
+        self._spend(len(targets) * count, (count - 1) * spacing + timeout)
+        return results
+
+    def ipv6_prefixes(self, iface: Optional[str] = None) -> list[str]:
+        return ['fe80::/64', self.network.ipv6_prefix]
+
+    def ndp_sweep(self, targets: list[str], timeout: float = 2, iface: Optional[str] = None) -> list[tuple[str, str]]:
+        rng = self._next_rng()
+        found: dict[str, str] = {}
+        for host in {id(host): host for host in self.network.ipv6_hosts.values()}.values():
+            if self._answers(host, rng, timeout):
+                found[host.ipv6[0]] = host.mac
+        for target in targets:
+            host = self.network.ipv6_hosts.get(target)
+            if self._answers(host, rng, timeout):
+                found[target] = host.mac
+        # Like the real sweep, waits out the whole timeout
+        self._spend(1 + len(targets), timeout)
+        return list(found.items())
+
+    def ipv6_neighbors(self) -> list[tuple[str, str, str]]:
+        """The simulated kernel cache: the global addresses the host has talked to, set by tests."""
+        return [(ip, mac, self.neighbor_states.get(ip, 'REACHABLE')) for ip, mac in self.neighbor_cache.items()]
+
+    def path(self, target: str) -> list[SimulatedHop]:
+        """
+        The hops to `target`, the target itself last: a single hop for the LAN's
+        own hosts, 4-12 seeded routers (a quarter of them rate limiting their
+        ICMP) in front of anything else.
+        """
+        path = self.paths.get(target)
+        if path is None:
+            host = self.network.hosts.get(target)
+            if host is not None:
+                path = [SimulatedHop(target, host.latency_ms)]
+            else:
+                rng = random.Random(f"{self.network.seed}:path:{target}")
+                path, latency = [], 0.0
+                for _ in range(rng.randint(4, 12)):
+                    latency += rng.uniform(0.5, 8)
+                    router = f"100.{rng.randrange(64, 128)}.{rng.randrange(256)}.{rng.randrange(1, 255)}"
+                    path.append(SimulatedHop(router, latency, rng.choice((0.0, 0.0, 0.0, 0.5))))
+                path.append(SimulatedHop(target, latency + rng.uniform(0.5, 8)))
+            self.paths[target] = path
+        return path
+
+    def ttl_probe_many(self, targets: dict[str, int], timeout: float = 1, spacing: float = 0.0) -> dict[str, list[Optional[tuple[str, float]]]]:
+        rng = self._next_rng()
+        results: dict[str, list[Optional[tuple[str, float]]]] = {}
+        probes = 0
+        for target, max_hops in targets.items():
+            path = self.path(target)
+            answers: list[Optional[tuple[str, float]]] = []
+            for ttl in range(1, max_hops + 1):
+                # Past the target's distance, the target itself answers
+                hop = path[min(ttl, len(path)) - 1]
+                probes += 1
+                if rng.random() < self.network.loss or (ttl < len(path) and rng.random() < hop.rate_limit):
+                    answers.append(None)
+                    continue
+                rtt = hop.latency_ms * rng.uniform(0.9, 1.2)
+                answers.append((hop.ip, rtt) if rtt <= timeout * 1000 else None)
+            results[target] = answers
+        self._spend(probes, (max(targets.values(), default=1) - 1) * spacing + timeout)
+        return results
+
+def transport_from_env():
+    """
+    NETWORK_TRANSPORT=simulated selects the simulator, configured through
+    SIMULATED_SUBNETS (comma separated), SIMULATED_DENSITY, SIMULATED_LOSS,
+    SIMULATED_IPV6_RATIO and SIMULATED_SEED. Anything else talks to the real
+    network through scapy.
+    """
+    if os.getenv('NETWORK_TRANSPORT', 'scapy').lower() != 'simulated':
+        return ScapyTransport()
+    network = SimulatedNetwork(
+        subnets=[subnet.strip() for subnet in os.getenv('SIMULATED_SUBNETS', '10.42.0.0/24').split(',') if subnet.strip()],
+        density=float(os.getenv('SIMULATED_DENSITY', '0.3')),
+        loss=float(os.getenv('SIMULATED_LOSS', '0.02')),
+        ipv6_ratio=float(os.getenv('SIMULATED_IPV6_RATIO', '0')),
+        seed=int(os.getenv('SIMULATED_SEED', '0')),
+    )
+    return SimulatedTransport(network)
+
+_transport = None
+
+def get_transport():
+    global _transport
+    if _transport is None:
+        _transport = transport_from_env()
+    return _transport
+
+def set_transport(transport):
+    """Swap the process-wide transport (tests, benchmarks); returns the previous one."""
+    global _transport
+    previous, _transport = _transport, transport
+    return previous
@@ -3,8 +3,6 @@ from typing import List
 from venv import logger
 # from dotenv import load_dotenv
 import scapy.all as scapy
-from scapy.layers.inet import ICMP, IP
-from scapy.layers.l2 import ARP, Ether
 import re
 import time
 import socket
@@ -12,13 +10,22 @@ from platform import system
 from subprocess import run
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor
-from scapy.sendrecv import srp
-from backend.database import Device, insert_or_replace_device_db, update_device_hostname
+from backend.database import Device, get_known_macs_db, insert_or_replace_device_db, save_ipv6_neighbors_db, update_device_hostname
+from backend.fingerprint import OS_FINGERPRINT, Fingerprint, fingerprint_hosts, fingerprint_stale_devices
+from backend.ipv6 import IPV6_DISCOVERY, IPV6_FORGET_AFTER, LIVE_SOURCES, preferred_address, start_ipv6_discovery
 from backend.mac_utils import is_locally_administered_mac, mac_lookup_vendor
+from backend.profiling import track
+from backend.snapshot import warm_state
+from backend.transport import get_transport
+from backend.metrics import REVERSE_LOOKUP_QUEUE_DEPTH, REVERSE_LOOKUP_SECONDS, SCAN_DURATION_SECONDS, SCAN_HOSTS_FOUND, SCANS
 from dataclasses import dataclass, field
 
 executor = ThreadPoolExecutor(max_workers=3)
 lookup_futures = {}
+# ip -> resolved hostname and mac -> vendor, kept across sweeps and seeded from the
+# warm-start snapshot (see snapshot.py)
+hostname_cache: dict[str, str] = {}
+vendor_cache: dict[str, str] = {}
 
 class LookupError(Exception):
     """Raised when there was an error looking up an ip"""
@@ -51,7 +58,8 @@ def ping_host(ip):
     param = '-n' if system().lower() == 'windows' else '-c'
     command = ['ping', param, '1', '-W', '1', ip]
     try:
-        result = run(command, capture_output=True, timeout=2)
+        with track('subprocess'):
+            result = run(command, capture_output=True, timeout=2)
         return result.returncode == 0
     except:
         return False
@@ -61,7 +69,8 @@ def get_arp_table():
     devices = []
     host_re = r'([\d.]+)\s+([\da-fA-F:-]+)\s+(\w+)'
     try:
-        arp_command = run(['arp', '-a' if system() == "Windows" else '-n'], capture_output=True, text=True)
+        with track('subprocess'):
+            arp_command = run(['arp', '-a' if system() == "Windows" else '-n'], capture_output=True, text=True)
         lines = arp_command.stdout.split('\n')
         
         if system() == "Windows":
@@ -88,7 +97,7 @@ def get_arp_table():
     
     return devices
 
-def scan_network():
+def scan_network(subnet: str | None = None, transport=None):
     """
     Scan local network for devices using a broadcast ARP request (scapy).
 
@@ -97,44 +106,50 @@ def scan_network():
     each host, since some devices block ICMP but must still answer ARP to
     participate on the network at all.
 
-    Note: assumes a /24 (255.255.255.0) subnet. If your network uses a
-    different mask, adjust the `subnet` line below accordingly.
-    Requires elevated privileges (sudo) since it sends raw Ethernet frames.
+    Note: unless `subnet` is given, assumes a /24 (255.255.255.0) subnet
+    around the local IP (see `ScapyTransport.default_subnet`).
+    Requires elevated privileges (sudo) since it sends raw Ethernet frames,
+    unless running on the simulated transport (NETWORK_TRANSPORT=simulated).
     """
- 
-    network_prefix = net_config.local_ip.rsplit('.', 1)[0]
-    subnet = f"{network_prefix}.0/24"
-    packet = Ether(dst="ff:ff:ff:ff:ff:ff") / ARP(pdst=subnet)
-    answered, _ = scapy.srp(
-        packet,
-        timeout=3,
-        iface=net_config.local_iface,
-        verbose=0,
-    )
-    # print(answered.summary(lambda s,r: r.sprintf("%Ether.src% %ARP.psrc%") ))
-    devices = [[ receive.psrc, receive.src ] for  _, receive in answered]
+    transport = transport or get_transport()
+    subnet = subnet or transport.default_subnet()
+    with SCAN_DURATION_SECONDS.time():
+        answered = transport.arp_sweep(subnet, timeout=3, iface=net_config.local_iface)
+    devices = [[ ip, mac ] for ip, mac in answered]
+    SCANS.inc()
+    SCAN_HOSTS_FOUND.set(len(devices))
     return devices
 
 def get_hostname(ip) -> str | None:
-    """Get hostname if ready, None if still processing"""
+    """Get hostname if ready (or known from before), None if still processing"""
     if ip in lookup_futures:
         future = lookup_futures[ip]
         if future.done():
             try:
-                hostname_result = future.result(timeout=0)
-                update_device_hostname(ip, hostname_result)
-                return hostname_result
+                # `on_lookup_complete` already stored it, don't write on every read
+                hostname = future.result(timeout=0)
+                if hostname:
+                    return hostname
             except Exception as e:
                 logger.error(f"Reverse lookup failed for {ip}: {e}")
-                return None
-    return None
+    return hostname_cache.get(ip)
+
+def lookup_vendor(mac) -> str | None:
+    """`mac_lookup_vendor`, cached per MAC"""
+    vendor = vendor_cache.get(mac.upper())
+    if vendor is None:
+        vendor = mac_lookup_vendor(mac)
+        if vendor:
+            vendor_cache[mac.upper()] = vendor
+    return vendor
 
 def queue_reverse_lookup(ip):
     """Submit reverse lookup to thread pool"""
     try:
         if ip not in lookup_futures:
-            future = executor.submit(reverse_lookup, ip)
+            future = executor.submit(timed_reverse_lookup, ip)
             lookup_futures[ip] = future
+            REVERSE_LOOKUP_QUEUE_DEPTH.inc()
             
             # Add a callback to update DB when done
             future.add_done_callback(lambda f: on_lookup_complete(ip, f))
@@ -143,14 +158,27 @@ def queue_reverse_lookup(ip):
         
 def on_lookup_complete(ip, future):
     """Called when reverse lookup finishes"""
+    REVERSE_LOOKUP_QUEUE_DEPTH.dec()
     try:
         hostname = future.result()
         if hostname:
+            hostname_cache[ip] = hostname
             update_device_hostname(ip, hostname)
             logger.info(f"Updated {ip} with hostname: {hostname}")
     except Exception as e:
         logger.error(f"Reverse lookup failed for {ip}: {e}")
         
+def timed_reverse_lookup(ip):
+    """`reverse_lookup`, recording its latency and whether a hostname came back"""
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        hostname = reverse_lookup(ip)
+        outcome = 'resolved' if hostname else 'unresolved'
+        return hostname
+    finally:
+        REVERSE_LOOKUP_SECONDS.observe(time.perf_counter() - start, outcome=outcome)
+
 def reverse_lookup(ip):
     """Try multiple methods to get hostname
     Note: this function is runned in a different threat to improve performance, this lookups can take time and otherwise the main thread might get block for the duration of it.
@@ -178,28 +206,53 @@ def reverse_lookup(ip):
     logger.warning(f"reverse_lookup: No hostname found for {ip}")
     return hostname if hostname != ip else None
     
-def is_device_online(ip_address):
+def is_device_online(ip_address, transport=None):
     # This function is not yet implemented, nor called anywhere, but should check if a device that has an assigned IP is answering or not answering (not necessarly offline).
-    # Create an ARP packet asking "who has the IP?"
-    arp_request = ARP(pdst=ip_address)
-    # Broadcast the request over Layer 2 (Ethernet)
-    broadcast = Ether(dst="ff:ff:ff:ff:ff:ff")
-    packet = broadcast / arp_request
+    # Broadcast an ARP "who has the IP?" over Layer 2 (Ethernet) and wait for a response
+    transport = transport or get_transport()
+    mac = transport.arp_probe(ip_address, timeout=2)
     
-    # Send the packet and wait for a response
-    answered, _ = srp(packet, timeout=2, verbose=False)
-    
-    # If the answered list has items, the device is online and returned its MAC address
-    if answered:
-        print(f"Device {ip_address} is answering. MAC: {answered[0][1].hwsrc}")
+    # If someone answered, the device is online and returned its MAC address
+    if mac:
+        print(f"Device {ip_address} is answering. MAC: {mac}")
         return True
     else:
         print(f"Device {ip_address} is not answering.")
         return False
     
+def save_ipv6_neighbors(neighbors, ipv4_macs):
+    """
+    Stores the (mac, ip, source) found by `discover_ipv6` and adds the devices
+    that didn't answer ARP (IPv6-only, or missed this sweep) but did answer
+    over IPv6 as online. Stale neighbor cache entries only update addresses.
+    """
+    addresses_by_mac: dict[str, list[str]] = {}
+    for mac, ip, source in neighbors:
+        if source in LIVE_SOURCES:
+            addresses_by_mac.setdefault(mac, []).append(ip)
+    now = datetime.now().strftime('%Y-%m-%dT%H:%M:%S.%f')
+    devices: List[Device] = []
+    for mac, addresses in addresses_by_mac.items():
+        if mac in ipv4_macs:
+            continue
+        ip = preferred_address(addresses)
+        devices.append({
+            "hostname": hostname_cache.get(ip) or 'Unknown',
+            "mac": mac,
+            "ip": ip,
+            "vendor": lookup_vendor(mac) or 'Unknown',
+            "last_seen": now,
+            "status": "online",
+            "random_mac": is_locally_administered_mac(mac) or None,
+        })
+    forget_before = datetime.fromtimestamp(time.time() - IPV6_FORGET_AFTER).strftime('%Y-%m-%dT%H:%M:%S.%f')
+    return save_ipv6_neighbors_db(neighbors, devices, forget_before)
+
 def update_scan_results(): 
     try:
         scapy.conf.route.resync()  # <-- re-read the OS routing table fresh, don't trust scapy's cached copy
+        # Runs while the ARP sweep below does
+        ipv6_discovery = start_ipv6_discovery(get_known_macs_db(), iface=net_config.local_iface) if IPV6_DISCOVERY else None
         answered_devices = scan_network()
         # Resolve hostnames in parallel (reverse DNS via the router's
         # local resolver, works for devices whose DHCP lease got a
@@ -212,8 +265,9 @@ def update_scan_results():
                 if ip is not None and mac is not None:
                     # TODO: We should decouple the reverse lookup for the hostname and do it separetly from the main scan, otherwise it holdsup the whole scan (takes forever). 
                     queue_reverse_lookup(ip)
-                    hostname = None
-                    vendor = mac_lookup_vendor(mac)
+                    # Keep the last known hostname while the lookup runs instead of resetting it
+                    hostname = hostname_cache.get(ip)
+                    vendor = lookup_vendor(mac)
                     random_mac = is_locally_administered_mac(mac)
                     now = datetime.now().strftime('%Y-%m-%dT%H:%M:%S.%f')
             
@@ -229,6 +283,18 @@ def update_scan_results():
                 else:
                     continue
             insert_or_replace_device_db(devices)
+        if ipv6_discovery is not None:
+            try:
+                save_ipv6_neighbors(ipv6_discovery.result(), {mac for _, mac in answered_devices})
+            except Exception as e:
+                logger.error(f"IPv6 discovery failed: {e}")
+        if answered_devices:
+            if OS_FINGERPRINT:
+                try:
+                    fingerprint_stale_devices()
+                except Exception as e:
+                    logger.error(f"OS fingerprinting failed: {e}")
+        warm_state.confirmed()
     except Exception as e:
         logger.error(f"Background scan error: {e}")
         
@@ -286,20 +352,6 @@ def background_scan() -> List[Device]:
 #         "stderr": error,
 #     }
 
-def guess_os_family(ip):
-    reply = scapy.sr1(
-        IP(dst=ip)/ICMP(), 
-        timeout=1, 
-        verbose=0
-    )
-    
-    if reply is None:
-        return None
-    ttl = reply.ttl
-    if ttl <= 64:
-        return "Linux/Android/Unix-like"
-    elif ttl <= 128:
-        return "Windows"
-    else:
-        return "Network device (router/switch)"
-    
\ No newline at end of file
+def guess_os_family(ip, transport=None):
+    """One-off guess for a single address; the sweep fingerprints all new devices at once (fingerprint.py)."""
+    return fingerprint_hosts({ip: None}, transport).get(ip, Fingerprint(None)).family
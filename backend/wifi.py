@@ -1,9 +1,37 @@
-from dataclasses import dataclass
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+import os
+from platform import system
 import re
 import subprocess
+import threading
+import time
 from venv import logger
 import subprocess
-from typing import List, Optional, Dict, Any
+from typing import Callable, Iterable, Iterator, List, Optional, Dict, Any, Union
+from dotenv import load_dotenv
+from backend.metrics import WIFI_SUBPROCESS_SECONDS
+from backend.profiling import track
+from backend import wifi_linux
+from backend.wifi_channels import channel_recommendation
+
+load_dotenv()
+
+# Neighbor scans: served from cache while younger than WIFI_SCAN_MAX_AGE seconds; up to
+# WIFI_SCAN_STALE_AGE the cached scan is still served while a refresh runs in the background.
+WIFI_SCAN_MAX_AGE = float(os.getenv('WIFI_SCAN_MAX_AGE', '30'))
+WIFI_SCAN_STALE_AGE = float(os.getenv('WIFI_SCAN_STALE_AGE', '300'))
+# Seconds between background refreshes, 0 disables the refresher thread
+WIFI_SCAN_REFRESH_INTERVAL = float(os.getenv('WIFI_SCAN_REFRESH_INTERVAL', '0'))
+WIFI_RESET_MIN_INTERVAL = float(os.getenv('WIFI_RESET_MIN_INTERVAL', '300'))
+# "netsh" (Windows), "iw" (Linux, see wifi_linux.py) or "auto" to pick by platform
+WIFI_BACKEND = os.getenv('WIFI_BACKEND', 'auto').lower()
+
+netsh_ssid_re = re.compile(r'^SSID \d+\s*:\s?(.*)$')
+netsh_bssid_re = re.compile(r'^BSSID \d+\s*:\s*(.*)$')
+netsh_utilization_re = re.compile(r'(\d+)\s*\((\d+)\s*%\)')
+netsh_capacity_re = re.compile(r'(\d+)\s*\(([^)]+)\)')
 
 # import jc
 @dataclass
@@ -14,36 +42,210 @@ class WiFiNetwork:
     channel: str
     bssid: str
 
+def run_wifi_command(command_name: str, args: List[str], **kwargs) -> subprocess.CompletedProcess:
+    """`subprocess.run` for the WiFi tooling, timed under `command_name` in the metrics."""
+    with WIFI_SUBPROCESS_SECONDS.time(command=command_name), track('subprocess'):
+        return subprocess.run(args, **kwargs)
+
+@contextmanager
+def stream_wifi_command(command_name: str, args: List[str]) -> Iterator[Iterable[str]]:
+    """
+    Runs a WiFi command and yields its stdout lines as the pipe produces them,
+    so parsers never hold the whole output. Raises CalledProcessError on a
+    non-zero exit, like `check=True`.
+    """
+    with WIFI_SUBPROCESS_SECONDS.time(command=command_name), track('subprocess'):
+        with subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True) as process:
+            try:
+                yield process.stdout
+            finally:
+                # Drain whatever the parser didn't read so the child can exit
+                for _ in process.stdout:
+                    pass
+            returncode = process.wait()
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, args)
+
+class AdapterResetRateLimited(Exception):
+    """Raised when an adapter reset is requested again before WIFI_RESET_MIN_INTERVAL elapsed"""
+    def __init__(self, retry_after: float):
+        super().__init__(f"The WiFi adapter was reset recently, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+_last_adapter_reset: Optional[float] = None
+_adapter_reset_lock = threading.Lock()
+
+def wifi_backend() -> str:
+    if WIFI_BACKEND != 'auto':
+        return WIFI_BACKEND
+    return 'netsh' if system() == 'Windows' else 'iw'
+
+def wifi_interface_name() -> str:
+    """Interface to pass to `iw dev <if> ...`"""
+    interface = wifi_linux.default_interface()
+    if not interface:
+        raise RuntimeError("No wireless interface found (set WIFI_INTERFACE)")
+    return interface
+
 def wifi_interface_restart():
+    if wifi_backend() == 'iw':
+        # Linux doesn't need the adapter bounced: ask the kernel for a fresh scan, the next
+        # `scan dump` reads its results (needs CAP_NET_ADMIN, the link stays up).
+        run_wifi_command('iw_scan_trigger', ['iw', 'dev', wifi_interface_name(), 'scan', 'trigger'], capture_output=True, text=True, check=True)
+        return
     # With the `netsh wlan show networks mode=bssid` we are reading cached results, in order to read "fresh results" we need to turn off the windows service and turn it back on to refresh the cached results, this is what we are doing here.
-    subprocess.run(['netsh', 'interface', 'set', 'interface', "Wi-Fi", 'admin=disabled']);
-    subprocess.run(['netsh', 'interface', 'set', 'interface', "Wi-Fi", 'admin=enabled']);
-    
-def get_neighbor_nets():
-    # This function returns the neightboring networks and it's signal's channel and quality. Should help asses if we need to change our network's channel or band.
-    wifi_interface_restart()
-    result = subprocess.run(
-            ['netsh', 'wlan', 'show', 'networks', 'mode=bssid'],
-            capture_output=True,
-            text=True,
-            check=True
-        )
+    # This drops the connection for a few seconds, only do it through `reset_wifi_adapter`.
+    run_wifi_command('interface_disable', ['netsh', 'interface', 'set', 'interface', "Wi-Fi", 'admin=disabled']);
+    run_wifi_command('interface_enable', ['netsh', 'interface', 'set', 'interface', "Wi-Fi", 'admin=enabled']);
+
+def reset_wifi_adapter():
+    """Rate-limited `wifi_interface_restart`, at most once every WIFI_RESET_MIN_INTERVAL seconds."""
+    global _last_adapter_reset
+    with _adapter_reset_lock:
+        now = time.monotonic()
+        if _last_adapter_reset is not None and now - _last_adapter_reset < WIFI_RESET_MIN_INTERVAL:
+            raise AdapterResetRateLimited(WIFI_RESET_MIN_INTERVAL - (now - _last_adapter_reset))
+        _last_adapter_reset = now
+        wifi_interface_restart()
+
+def scan_neighbor_nets() -> List[Dict[str, Any]]:
+    """Reads the OS's current view of the neighboring networks (no adapter reset)."""
+    if wifi_backend() == 'iw':
+        with stream_wifi_command('iw_scan_dump', ['iw', 'dev', wifi_interface_name(), 'scan', 'dump']) as lines:
+            return wifi_linux.networks_from_iw_records(wifi_linux.iter_iw_scan_records(lines))
+    with stream_wifi_command('show_networks', ['netsh', 'wlan', 'show', 'networks', 'mode=bssid']) as lines:
+        return list(iter_netsh_wlan_networks(lines))
+
+@dataclass
+class ScanSnapshot:
+    networks: List[Dict[str, Any]]
+    scanned_at: datetime
+    version: int
+    taken_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.taken_at
+
+class NeighborScanCache:
+    """
+    Neighbor scan results with a freshness window and stale-while-revalidate.
+
+    - younger than `max_age`: served as is
+    - younger than `stale_age`: served immediately, a refresh starts in the background
+    - older, or nothing cached yet: the caller waits for a refresh
+
+    Refreshes are single-flight: concurrent callers share the one scan in progress
+    instead of each launching netsh against the same adapter.
+    """
+
+    def __init__(self, scan: Callable[[], List[Dict[str, Any]]], max_age: float = WIFI_SCAN_MAX_AGE, stale_age: float = WIFI_SCAN_STALE_AGE):
+        self._scan = scan
+        self.max_age = max_age
+        self.stale_age = stale_age
+        self._lock = threading.Lock()
+        self._snapshot: Optional[ScanSnapshot] = None
+        self._inflight: Optional[threading.Event] = None
+        self._error: Optional[BaseException] = None
+        self._version = 0
+
+    @property
+    def snapshot(self) -> Optional[ScanSnapshot]:
+        return self._snapshot
+
+    def get(self) -> ScanSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.age < self.max_age:
+            return snapshot
+        if snapshot is not None and snapshot.age < self.stale_age:
+            self.refresh(wait=False)
+            return snapshot
+        return self.refresh(wait=True)
+
+    def refresh(self, wait: bool = True) -> Optional[ScanSnapshot]:
+        """Starts a scan unless one is already running; with `wait`, blocks until it finishes."""
+        with self._lock:
+            event = self._inflight
+            leader = event is None
+            if leader:
+                event = self._inflight = threading.Event()
+        if leader:
+            if wait:
+                self._run_scan(event)
+            else:
+                threading.Thread(target=self._run_scan, args=(event,), daemon=True).start()
+                return self._snapshot
+        elif not wait:
+            return self._snapshot
+        event.wait()
+        with self._lock:
+            if self._error is not None and (self._snapshot is None or self._snapshot.age >= self.stale_age):
+                raise self._error
+            return self._snapshot
+
+    def _run_scan(self, event: threading.Event):
+        try:
+            networks = self._scan()
+            with self._lock:
+                self._version += 1
+                self._snapshot = ScanSnapshot(networks=networks, scanned_at=datetime.now(), version=self._version)
+                self._error = None
+        except Exception as e:
+            logger.error(f"WiFi neighbor scan failed: {e}")
+            with self._lock:
+                self._error = e
+        finally:
+            with self._lock:
+                self._inflight = None
+            event.set()
+
+    def start_background_refresh(self, interval: float) -> threading.Thread:
+        def refresh_forever():
+            while True:
+                try:
+                    self.refresh(wait=True)
+                except Exception:
+                    pass  # already logged by _run_scan, keep serving the last good scan
+                time.sleep(interval)
+        thread = threading.Thread(target=refresh_forever, daemon=True)
+        thread.start()
+        return thread
+
+neighbor_scan_cache = NeighborScanCache(scan_neighbor_nets)
+
+def get_neighbor_snapshot(reset_adapter: bool = False) -> ScanSnapshot:
+    """
+    Cached neighbor scan. `reset_adapter` power-cycles the WiFi adapter first to
+    force the OS to rescan (rate-limited, raises AdapterResetRateLimited) and
+    then waits for a fresh scan.
+    """
+    if reset_adapter:
+        reset_wifi_adapter()
+        return neighbor_scan_cache.refresh(wait=True)
+    return neighbor_scan_cache.get()
 
-    wifi_networks_data = parse_netsh_wlan_networks(result.stdout) 
+def get_neighbor_nets(reset_adapter: bool = False):
+    # This function returns the neightboring networks and it's signal's channel and quality. Should help asses if we need to change our network's channel or band.
+    wifi_networks_data = get_neighbor_snapshot(reset_adapter).networks
     if not wifi_networks_data:
         return None
 
     return wifi_networks_data
     
 def get_interface_data():
-    result = subprocess.run(
-        ['netsh', 'wlan', 'show', 'interface'],
-        capture_output=True,
-        text=True,
-        check=True
-    )
-    
-    interface_data = parse_netsh_output(result.stdout)
+    if wifi_backend() == 'iw':
+        interface = wifi_interface_name()
+        result = run_wifi_command(
+            'iw_link',
+            ['iw', 'dev', interface, 'link'],
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        return wifi_linux.interface_data(interface, result.stdout, wifi_linux.read_proc_net_wireless())
+
+    with stream_wifi_command('show_interface', ['netsh', 'wlan', 'show', 'interface']) as lines:
+        interface_data = parse_netsh_output(lines)
     if not interface_data:
         return None
     
@@ -53,6 +255,8 @@ def get_interface_data():
         'physical_address': interface_data['Physical address'],
         'state': interface_data.get('State') or None,
         'SSDI': interface_data.get('SSID') or None,
+        # Newer Windows builds label it "AP BSSID"
+        'bssid': interface_data.get('AP BSSID') or interface_data.get('BSSID') or None,
         'band': interface_data.get('Band') or None,
         'channel': interface_data.get('Channel') or None,
         'radio_type': interface_data.get('Radio type') or None,
@@ -67,6 +271,8 @@ def get_wifi_signal_quality() -> Optional[Dict[str, Any]]:
     """
     Get detailed WiFi signal quality info on Windows.
     Returns signal strength, SNR, channel, interference, etc.
+    Interference and the channel recommendation come from the shared (cached)
+    neighbor scan snapshot, no extra scan is triggered here.
     """
     try:
         # Get current connected network info
@@ -74,15 +280,13 @@ def get_wifi_signal_quality() -> Optional[Dict[str, Any]]:
         channel = None
         signal_quality_percent = None
         interference_level = "unknown"
+        occupancy = None
         if interface:
             channel = interface.get('channel')
-            signal_str = interface.get('signal')
-            if signal_str and isinstance(signal_str, str) and signal_str.endswith('%'):
-                try:
-                    signal_quality_percent = int(signal_str.rstrip('%'))
-                except ValueError:
-                    signal_quality_percent = None
-            interference_level = detect_interference(channel)
+            signal_quality_percent = parse_signal_percent(interface.get('signal'))
+            occupancy = get_channel_occupancy(interface)
+            if occupancy and occupancy['current']:
+                interference_level = occupancy['current']['interference_level']
         # Get more detailed info
         signal_strength_dbm = get_signal_strength_dbm(signal_quality_percent)
         snr = estimate_snr(signal_strength_dbm)
@@ -93,6 +297,7 @@ def get_wifi_signal_quality() -> Optional[Dict[str, Any]]:
             'channel': int(channel) if channel else None,
             'frequency_ghz': get_frequency_from_channel(channel),
             'interference_level': interference_level,
+            'channel_occupancy': occupancy,
             'recommendation': get_signal_recommendation(signal_quality_percent, snr) if signal_quality_percent is not None else None,
             'status': 'connected',
             'interface': interface
@@ -105,17 +310,43 @@ def get_wifi_signal_quality() -> Optional[Dict[str, Any]]:
         logger.error(f"Unexpected error getting WiFi quality: {e}")
         return None
 
-def parse_netsh_output(output: str) -> Dict[str, str]:
-    """Parse netsh wlan show interface output"""
+def get_channel_occupancy(interface: Dict[str, Any], networks: Optional[List[Dict[str, Any]]] = None) -> Optional[Dict[str, Any]]:
+    """Channel occupancy/recommendation for the connected interface, None when there's no scan to base it on."""
+    if networks is None:
+        try:
+            networks = neighbor_scan_cache.get().networks
+        except Exception as e:
+            logger.debug(f"Could not read the neighbor scan: {e}")
+            return None
+    try:
+        channel = int(interface.get('channel')) if interface.get('channel') else None
+    except ValueError:
+        channel = None
+    return channel_recommendation(
+        networks,
+        current_channel=channel,
+        band=interface.get('band'),
+        exclude_bssids=[interface.get('bssid')],
+    )
+
+def parse_netsh_output(output: Union[str, Iterable[str]]) -> Dict[str, str]:
+    """Parse netsh wlan show interface output (a string, or its lines as they're read)"""
     data = {}
-    for line in output.split('\n'):
-        if ':' in line:
-            key, value = line.split(':', 1)
-            key = key.strip()
-            value = value.strip()
-            data[key] = value
+    for line in output.splitlines() if isinstance(output, str) else output:
+        key, sep, value = line.partition(':')
+        if sep:
+            data[key.strip()] = value.strip()
     return data
 
+def parse_signal_percent(signal) -> Optional[int]:
+    """netsh's `Signal` field ("85%") as an int, None if it isn't one"""
+    if not isinstance(signal, str) or not signal.endswith('%'):
+        return None
+    try:
+        return int(signal.rstrip('%'))
+    except ValueError:
+        return None
+
 def get_signal_strength_dbm(signal_quality) -> Optional[int]:
     """
     Get signal strength in dBm (more accurate than percentage).
@@ -166,53 +397,29 @@ def get_frequency_from_channel(channel: Optional[str]) -> Optional[float]:
     
     return None
 
-def detect_interference(channel: Optional[str]) -> str:
+def detect_interference(channel: Optional[str], networks: Optional[List[Dict[str, Any]]] = None) -> str:
     """
-    Detect potential interference on the channel.
-    This is simplified - in reality you'd scan for other networks.
+    Detect potential interference on the channel, from the overlap-aware
+    occupancy model over the neighbor scan (the cached snapshot unless
+    `networks` is given).
     """
     if not channel:
         return "unknown"
     
-    try:
-        result = subprocess.run(
-            ['netsh', 'wlan', 'show', 'networks', 'mode=Bssid'],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        
-        # Count networks on same channel
-        networks_on_channel = count_networks_on_channel(result.stdout, channel)
-        
-        if networks_on_channel > 3:
-            return "high"
-        elif networks_on_channel > 1:
-            return "medium"
-        else:
-            return "low"
-    
-    except Exception as e:
-        logger.debug(f"Could not detect interference: {e}")
+    occupancy = get_channel_occupancy({'channel': channel}, networks)
+    if not occupancy or not occupancy['current']:
         return "unknown"
+    return occupancy['current']['interference_level']
 
 def count_networks_on_channel(netsh_output: str, target_channel: str) -> int:
-    """Parse netsh output to count networks on the same channel"""
-    count = 0
-    current_channel = None
-    
-    for line in netsh_output.split('\n'):
-        if 'Channel' in line and ':' in line:
-            try:
-                _, ch = line.split(':')
-                current_channel = ch.strip()
-            except ValueError:
-                pass
-        
-        if current_channel == target_channel:
-            count += 1
-    
-    return count
+    """Parse netsh output to count networks (SSIDs) with at least one BSSID on the channel"""
+    return networks_on_channel(parse_netsh_wlan_networks(netsh_output), int(target_channel))
+
+def networks_on_channel(networks: List[Dict[str, Any]], channel: int) -> int:
+    return sum(
+        1 for network in networks
+        if any(bssid.get('channel') == channel for bssid in network.get('bssids', []))
+    )
 
 def get_signal_recommendation(signal_quality: Optional[int], snr: Optional[int]) -> str:
     """Get actionable recommendation based on signal metrics"""
@@ -237,25 +444,46 @@ def sort_list_of_dict_by(data, field:str):
     return sorted_data
 
 def parse_netsh_wlan_networks(raw_output: str) -> List[Dict[str, Any]]:
-    networks: List[Dict[str, Any]] = []
+    return list(iter_netsh_wlan_networks(raw_output.splitlines()))
+
+def _new_bssid(bssid: str) -> Dict[str, Any]:
+    return {
+        "bssid": bssid,
+        "signal_percent": None,
+        "radio_type": None,
+        "band": None,
+        "channel": None,
+        "details": None,
+        "bss_load": None,
+        "qos_mscs_supported": None,
+        "qos_map_supported": None,
+        "basic_rates_mbps": [],
+        "other_rates_mbps": [],
+    }
+
+def iter_netsh_wlan_networks(lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Yields each SSID block of `netsh wlan show networks mode=bssid` output,
+    with its BSSIDs, as soon as the next block starts. `lines` can be the
+    subprocess pipe, only the network being parsed is held in memory.
+    """
     current_network: Optional[Dict[str, Any]] = None
     current_bssid: Optional[Dict[str, Any]] = None
     in_bss_load = False
  
-    ssid_re = re.compile(r'^SSID \d+\s*:\s?(.*)$')
-    bssid_re = re.compile(r'^BSSID \d+\s*:\s*(.*)$')
- 
-    for raw_line in raw_output.splitlines():
-        if not raw_line.strip():
+    for raw_line in lines:
+        line = raw_line.strip()
+        if not line:
             continue
  
         indent = len(raw_line) - len(raw_line.lstrip(' '))
-        line = raw_line.strip()
  
         # Top-level: new SSID block
         if indent == 0:
-            ssid_match = ssid_re.match(line)
+            ssid_match = netsh_ssid_re.match(line)
             if ssid_match:
+                if current_network is not None:
+                    yield current_network
                 current_network = {
                     "ssid": ssid_match.group(1).strip(),  # can be "" for hidden networks
                     "network_type": None,
@@ -263,7 +491,6 @@ def parse_netsh_wlan_networks(raw_output: str) -> List[Dict[str, Any]]:
                     "encryption": None,
                     "bssids": [],
                 }
-                networks.append(current_network)
                 current_bssid = None
                 in_bss_load = False
             continue  # ignores "Interface name" / "There are N networks..." header lines
@@ -273,21 +500,9 @@ def parse_netsh_wlan_networks(raw_output: str) -> List[Dict[str, Any]]:
  
         # SSID-level: new BSSID block, or SSID metadata (Network type / Authentication / Encryption)
         if indent == 4:
-            bssid_match = bssid_re.match(line)
+            bssid_match = netsh_bssid_re.match(line)
             if bssid_match:
-                current_bssid = {
-                    "bssid": bssid_match.group(1).strip(),
-                    "signal_percent": None,
-                    "radio_type": None,
-                    "band": None,
-                    "channel": None,
-                    "details": None,
-                    "bss_load": None,
-                    "qos_mscs_supported": None,
-                    "qos_map_supported": None,
-                    "basic_rates_mbps": [],
-                    "other_rates_mbps": [],
-                }
+                current_bssid = _new_bssid(bssid_match.group(1).strip())
                 current_network["bssids"].append(current_bssid)
                 in_bss_load = False
                 continue
@@ -313,12 +528,12 @@ def parse_netsh_wlan_networks(raw_output: str) -> List[Dict[str, Any]]:
             if key == "connected stations":
                 bss_load["connected_stations"] = int(value) or None
             elif key == "channel utilization":
-                m = re.match(r'(\d+)\s*\((\d+)\s*%\)', value)
+                m = netsh_utilization_re.match(value)
                 if m:
                     bss_load["channel_utilization_raw"] = int(m.group(1))
                     bss_load["channel_utilization_percent"] = int(m.group(2))
             elif key == "medium available capacity":
-                m = re.match(r'(\d+)\s*\(([^)]+)\)', value)
+                m = netsh_capacity_re.match(value)
                 if m:
                     bss_load["medium_available_capacity"] = int(m.group(1))
                     bss_load["medium_available_capacity_unit"] = m.group(2).strip()
@@ -358,7 +573,8 @@ def parse_netsh_wlan_networks(raw_output: str) -> List[Dict[str, Any]]:
             elif key.startswith("other rates"):
                 current_bssid["other_rates_mbps"] = _parse_rates(value)
  
-    return networks
+    if current_network is not None:
+        yield current_network
  
  
 def _parse_rates(value: str) -> List[float]:
@@ -0,0 +1,151 @@
+from typing import Any, Dict, Iterable, List, Optional
+
+# Channel occupancy model for the neighbor scan (`parse_netsh_wlan_networks` output).
+#
+# Every neighbor BSSID adds pressure to each candidate channel it overlaps with:
+#
+#     overlap(candidate, bssid) * signal_percent / 100 * (0.5 + utilization)
+#
+# - 2.4 GHz channels are 5 MHz apart but 20 MHz wide, so a BSSID on channel c bleeds into
+#   c±4 with linearly decreasing weight (1, 0.8, 0.6, 0.4, 0.2).
+# - 5 GHz channels don't overlap at 20 MHz, but 802.11n/ac/ax/be bond 40/80 MHz: a BSSID
+#   fully occupies every 20 MHz channel of its aligned bonded block.
+# - utilization is the BSS-load channel utilization (0-1) when the AP advertises it,
+#   otherwise DEFAULT_UTILIZATION, so a full-strength co-channel AP weighs about 1.0.
+#
+# The score therefore reads roughly as "equivalent strong networks sharing this channel".
+
+BAND_24 = '2.4 GHz'
+BAND_5 = '5 GHz'
+BAND_6 = '6 GHz'  # reported by netsh but not modelled (no legacy neighbors to share it with yet)
+
+CANDIDATES_24 = (1, 6, 11)
+CANDIDATES_5 = (36, 40, 44, 48, 52, 56, 60, 64, 100, 104, 108, 112, 116, 120, 124, 128, 132, 136, 140, 144, 149, 153, 157, 161, 165)
+
+DEFAULT_UTILIZATION = 0.5
+OVERLAP_24 = {0: 1.0, 1: 0.8, 2: 0.6, 3: 0.4, 4: 0.2}
+
+# Bonded width we assume per PHY, netsh doesn't report the channel width
+RADIO_WIDTH_MHZ = {
+    '802.11a': 20,
+    '802.11g': 20,
+    '802.11n': 40,
+    '802.11ac': 80,
+    '802.11ax': 80,
+    '802.11be': 80,
+}
+
+INTERFERENCE_HIGH = 3
+INTERFERENCE_MEDIUM = 1
+
+def band_of(channel: int, band: Optional[str] = None) -> str:
+    if band:
+        if band.startswith('6'):
+            return BAND_6
+        return BAND_24 if band.startswith('2.4') else BAND_5
+    return BAND_24 if channel <= 14 else BAND_5
+
+def bonded_block(channel: int, width_mhz: int) -> range:
+    """The 20 MHz channel numbers of the aligned `width_mhz` block that contains `channel` (5 GHz)."""
+    span = max(width_mhz // 20, 1)
+    base = 149 if channel >= 149 else 36
+    start = base + ((channel - base) // (4 * span)) * 4 * span
+    return range(start, start + 4 * span, 4)
+
+def overlapping_candidates(channel: int, band: str, width_mhz: int, candidates: Iterable[int]) -> Iterable[tuple[int, float]]:
+    """(candidate channel, overlap weight) pairs a BSSID on `channel` interferes with."""
+    if band == BAND_24:
+        for candidate in candidates:
+            weight = OVERLAP_24.get(abs(candidate - channel))
+            if weight:
+                yield candidate, weight
+    else:
+        for candidate in bonded_block(channel, width_mhz):
+            yield candidate, 1.0
+
+def channel_occupancy(networks: List[Dict[str, Any]], exclude_bssids: Iterable[str] = (), extra_channels: Iterable[tuple[int, str]] = ()) -> Dict[str, Dict[int, Dict[str, Any]]]:
+    """
+    Occupancy score per candidate channel, per band, in a single pass over the
+    scan. `exclude_bssids` leaves our own AP(s) out of the count, `extra_channels`
+    ((channel, band) pairs) scores channels outside the usual candidates too
+    (e.g. our own 2.4 GHz channel 3).
+    """
+    excluded = {bssid.lower() for bssid in exclude_bssids if bssid}
+    candidates = {BAND_24: set(CANDIDATES_24), BAND_5: set(CANDIDATES_5)}
+    for channel, band in extra_channels:
+        if band in candidates:
+            candidates[band].add(channel)
+    occupancy: Dict[str, Dict[int, Dict[str, Any]]] = {
+        band: {channel: {'score': 0.0, 'networks': set()} for channel in sorted(channels)}
+        for band, channels in candidates.items()
+    }
+    for network in networks:
+        for bssid in network.get('bssids', []):
+            channel = bssid.get('channel')
+            if not channel or (bssid.get('bssid') or '').lower() in excluded:
+                continue
+            band = band_of(channel, bssid.get('band'))
+            if band not in candidates:
+                continue
+            signal = (bssid.get('signal_percent') or 0) / 100
+            load = bssid.get('bss_load') or {}
+            utilization = load.get('channel_utilization_percent')
+            utilization = utilization / 100 if utilization is not None else DEFAULT_UTILIZATION
+            width = RADIO_WIDTH_MHZ.get(bssid.get('radio_type') or '', 20) if band == BAND_5 else 20
+            pressure = signal * (0.5 + utilization)
+            for candidate, weight in overlapping_candidates(channel, band, width, candidates[band]):
+                slot = occupancy[band].get(candidate)
+                if slot is None:
+                    continue
+                slot['score'] += weight * pressure
+                slot['networks'].add(network.get('ssid'))
+    return occupancy
+
+def interference_level(score: Optional[float]) -> str:
+    if score is None:
+        return "unknown"
+    if score > INTERFERENCE_HIGH:
+        return "high"
+    elif score > INTERFERENCE_MEDIUM:
+        return "medium"
+    return "low"
+
+def channel_recommendation(networks: List[Dict[str, Any]], current_channel: Optional[int] = None, band: Optional[str] = None, exclude_bssids: Iterable[str] = ()) -> Dict[str, Any]:
+    """
+    Ranks the candidate channels of our band (both bands when it's unknown) by
+    occupancy and recommends the least occupied one.
+    """
+    current_band = band_of(current_channel, band) if current_channel else None
+    extra = [(current_channel, current_band)] if current_channel else []
+    occupancy = channel_occupancy(networks, exclude_bssids, extra_channels=extra)
+    bands = [current_band] if current_band in occupancy else [BAND_24, BAND_5]
+
+    def describe(channel, channel_band, slot):
+        return {
+            'channel': channel,
+            'band': channel_band,
+            'score': round(slot['score'], 2),
+            'networks': len(slot['networks']),
+            'interference_level': interference_level(slot['score']),
+        }
+
+    usual = set(CANDIDATES_24) | set(CANDIDATES_5)
+    channels = [
+        describe(channel, channel_band, slot)
+        for channel_band in bands
+        for channel, slot in occupancy[channel_band].items()
+        if channel in usual
+    ]
+    channels.sort(key=lambda entry: (entry['score'], entry['channel']))
+
+    current = None
+    if current_channel and current_band in occupancy:
+        current = describe(current_channel, current_band, occupancy[current_band][current_channel])
+
+    best = channels[0] if channels else None
+    return {
+        'current': current,
+        'recommended_channel': best['channel'] if best else None,
+        'recommended_band': best['band'] if best else None,
+        'channels': channels,
+    }
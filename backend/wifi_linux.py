@@ -0,0 +1,364 @@
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+# Linux WiFi backend: link quality from /proc/net/wireless, the connection from
+# `iw dev <if> link` and neighbors from `iw dev <if> scan dump`. The dump reads the
+# kernel's cached scan results, so unlike `iw scan` it neither needs CAP_NET_ADMIN nor
+# knocks the radio off-channel. Everything is parsed into the same shapes the netsh
+# backend produces (`get_interface_data` / `parse_netsh_wlan_networks`).
+
+PROC_NET_WIRELESS = '/proc/net/wireless'
+SYS_CLASS_NET = '/sys/class/net'
+
+bss_re = re.compile(r'^BSS ([0-9a-fA-F:]{17})')
+dbm_re = re.compile(r'(-?\d+(?:\.\d+)?)\s*dBm')
+station_signal_re = re.compile(r'^(-?\d+(?:\.\d+)?)')
+bitrate_re = re.compile(r'([\d.]+)\s*MBit/s')
+utilisation_re = re.compile(r'(\d+)\s*/\s*255')
+capacity_re = re.compile(r'(\d+)\s*\[\*?([^\]]+)\]')
+
+def default_interface() -> Optional[str]:
+    """WIFI_INTERFACE, else the first wireless interface the kernel knows about."""
+    configured = os.getenv('WIFI_INTERFACE')
+    if configured:
+        return configured
+    stats = read_proc_net_wireless()
+    return next(iter(stats), None)
+
+def read_proc_net_wireless(path: str = PROC_NET_WIRELESS) -> Dict[str, Dict[str, Any]]:
+    try:
+        with open(path) as f:
+            return parse_proc_net_wireless(f.read())
+    except OSError:
+        return {}
+
+def parse_proc_net_wireless(content: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Parses /proc/net/wireless. Noise of -256 (or 0) means the driver doesn't
+    report it, it comes back as None.
+    """
+    interfaces = {}
+    for line in content.splitlines()[2:]:  # two header lines
+        name, _, rest = line.partition(':')
+        fields = rest.split()
+        if not name.strip() or len(fields) < 10:
+            continue
+        link, level, noise = (float(value.rstrip('.')) for value in fields[1:4])
+        interfaces[name.strip()] = {
+            'status': fields[0],
+            'link_quality': link,
+            'level_dbm': level,
+            'noise_dbm': noise if -256 < noise < 0 else None,
+            'discarded_nwid': int(fields[4]),
+            'discarded_crypt': int(fields[5]),
+            'discarded_frag': int(fields[6]),
+            'discarded_retry': int(fields[7]),
+            'discarded_misc': int(fields[8]),
+            'missed_beacon': int(fields[9]),
+        }
+    return interfaces
+
+def signal_percent_from_dbm(dbm: Optional[float]) -> Optional[int]:
+    """Inverse of `get_signal_strength_dbm` (100% = -30 dBm, 0% = -100 dBm)"""
+    if dbm is None:
+        return None
+    return max(0, min(100, round((dbm + 100) / 0.7)))
+
+def channel_from_freq(freq_mhz: float) -> Optional[int]:
+    freq = int(freq_mhz)
+    if freq == 2484:
+        return 14
+    if 2412 <= freq <= 2472:
+        return (freq - 2407) // 5
+    if 5150 <= freq <= 5895:
+        return (freq - 5000) // 5
+    if 5955 <= freq <= 7115:
+        return (freq - 5950) // 5
+    return None
+
+def band_from_freq(freq_mhz: float) -> Optional[str]:
+    if 2400 <= freq_mhz < 2500:
+        return '2.4 GHz'
+    if 5150 <= freq_mhz < 5925:
+        return '5 GHz'
+    if 5925 <= freq_mhz <= 7125:
+        return '6 GHz'
+    return None
+
+def _rate(token: str):
+    value = float(token.rstrip('*'))
+    return int(value) if value.is_integer() else value
+
+def _authentication(rsn: Dict[str, str], wpa: Dict[str, str], privacy: bool) -> str:
+    if rsn:
+        suites = rsn.get('authentication suites', '')
+        if 'SAE' in suites:
+            return 'WPA3-Personal'
+        if '802.1X' in suites:
+            return 'WPA2-Enterprise'
+        return 'WPA2-Personal'
+    if wpa:
+        return 'WPA-Enterprise' if '802.1X' in wpa.get('authentication suites', '') else 'WPA-Personal'
+    return 'WEP' if privacy else 'Open'
+
+def _encryption(rsn: Dict[str, str], wpa: Dict[str, str], privacy: bool) -> str:
+    ciphers = (rsn or wpa).get('pairwise ciphers')
+    if ciphers:
+        return ciphers.split()[0]
+    return 'WEP' if privacy else 'None'
+
+def _radio_type(sections: set, band: Optional[str], rates: List[float]) -> Optional[str]:
+    if 'eht capabilities' in sections:
+        return '802.11be'
+    if 'he capabilities' in sections:
+        return '802.11ax'
+    if 'vht capabilities' in sections:
+        return '802.11ac'
+    if 'ht capabilities' in sections:
+        return '802.11n'
+    if band == '5 GHz':
+        return '802.11a'
+    if band == '2.4 GHz':
+        return '802.11g' if rates and max(rates) > 11 else '802.11b'
+    return None
+
+class _BssRecord:
+    """Accumulates one `BSS ...` block of `iw scan dump` before it's turned into a netsh-shaped dict."""
+    __slots__ = ('bssid', 'ssid', 'freq', 'signal_dbm', 'channel', 'capability', 'sections', 'section', 'rsn', 'wpa', 'bss_load', 'basic_rates', 'other_rates', 'extended_capabilities')
+
+    def __init__(self, bssid: str):
+        self.bssid = bssid.lower()
+        self.ssid = ''
+        self.freq = None
+        self.signal_dbm = None
+        self.channel = None
+        self.capability = ''
+        self.sections = set()
+        self.section = None
+        self.rsn = {}
+        self.wpa = {}
+        self.bss_load = None
+        self.basic_rates = []
+        self.other_rates = []
+        self.extended_capabilities = []
+
+    def field(self, key: str, value: str):
+        if key == 'ssid':
+            self.ssid = value
+        elif key == 'freq':
+            self.freq = float(value)
+        elif key == 'signal':
+            match = dbm_re.search(value)
+            self.signal_dbm = float(match.group(1)) if match else None
+        elif key == 'capability':
+            self.capability = value
+        elif key == 'ds parameter set':
+            self.channel = int(value.split()[-1])
+        elif key in ('supported rates', 'extended supported rates'):
+            for token in value.split():
+                try:
+                    (self.basic_rates if token.endswith('*') else self.other_rates).append(_rate(token))
+                except ValueError:
+                    pass
+
+    def sub_field(self, key: str, value: str):
+        if self.section == 'rsn':
+            self.rsn[key] = value
+        elif self.section == 'wpa':
+            self.wpa[key] = value
+        elif self.section == 'bss load':
+            if key == 'station count':
+                self.bss_load['connected_stations'] = int(value) or None
+            elif key == 'channel utilisation':
+                match = utilisation_re.match(value)
+                if match:
+                    raw = int(match.group(1))
+                    self.bss_load['channel_utilization_raw'] = raw
+                    self.bss_load['channel_utilization_percent'] = raw * 100 // 255
+            elif key == 'available admission capacity':
+                match = capacity_re.match(value)
+                if match:
+                    self.bss_load['medium_available_capacity'] = int(match.group(1))
+                    self.bss_load['medium_available_capacity_unit'] = match.group(2).strip()
+        elif self.section == 'ht operation' and key == 'primary channel' and self.channel is None:
+            self.channel = int(value)
+        elif self.section == 'extended capabilities':
+            self.extended_capabilities.append(key)
+
+    def as_bssid(self) -> Dict[str, Any]:
+        band = band_from_freq(self.freq) if self.freq else None
+        channel = self.channel or (channel_from_freq(self.freq) if self.freq else None)
+        return {
+            "bssid": self.bssid,
+            "signal_percent": signal_percent_from_dbm(self.signal_dbm),
+            "radio_type": _radio_type(self.sections, band, self.basic_rates + self.other_rates),
+            "band": band,
+            "channel": channel,
+            "details": None,
+            "bss_load": self.bss_load,
+            "qos_mscs_supported": 'mscs' in self.extended_capabilities,
+            "qos_map_supported": 'qos map' in self.extended_capabilities,
+            "basic_rates_mbps": self.basic_rates,
+            "other_rates_mbps": self.other_rates,
+        }
+
+def iter_iw_scan_records(lines: Iterable[str]) -> Iterable[_BssRecord]:
+    """Yields each BSS of `iw dev <if> scan dump` output as soon as its block is complete."""
+    record: Optional[_BssRecord] = None
+    for raw_line in lines:
+        line = raw_line.rstrip('\n')
+        if not line.strip():
+            continue
+
+        match = bss_re.match(line)
+        if match:
+            if record is not None:
+                yield record
+            record = _BssRecord(match.group(1))
+            continue
+        if record is None:
+            continue
+
+        depth = len(line) - len(line.lstrip('\t'))
+        stripped = line.strip()
+        if depth >= 2 or stripped.startswith('*'):
+            # "\t\t * key: value" lines belong to the current section
+            key, _, value = stripped.lstrip('* ').partition(':')
+            record.sub_field(key.strip().lower(), value.strip())
+            continue
+
+        key, _, value = stripped.partition(':')
+        key, value = key.strip().lower(), value.strip()
+        record.field(key, value)
+        record.section = key
+        record.sections.add(key)
+        if key == 'bss load':
+            record.bss_load = {
+                "connected_stations": None,
+                "channel_utilization_raw": None,
+                "channel_utilization_percent": None,
+                "medium_available_capacity": None,
+                "medium_available_capacity_unit": None,
+            }
+        if value.startswith('*'):
+            # iw prints the first sub-field on the header line: "RSN:\t * Version: 1"
+            sub_key, _, sub_value = value.lstrip('* ').partition(':')
+            record.sub_field(sub_key.strip().lower(), sub_value.strip())
+    if record is not None:
+        yield record
+
+def parse_iw_scan(raw_output: str) -> List[Dict[str, Any]]:
+    """
+    Parses `iw dev <if> scan dump` into the `parse_netsh_wlan_networks`
+    structure: one entry per SSID, with its BSSIDs.
+    """
+    return networks_from_iw_records(iter_iw_scan_records(raw_output.splitlines()))
+
+def networks_from_iw_records(records: Iterable[_BssRecord]) -> List[Dict[str, Any]]:
+    """Groups BSS records (from `iter_iw_scan_records`) by SSID."""
+    networks: Dict[str, Dict[str, Any]] = {}
+    for record in records:
+        privacy = 'Privacy' in record.capability
+        network = networks.get(record.ssid)
+        if network is None:
+            network = networks[record.ssid] = {
+                "ssid": record.ssid,
+                "network_type": 'Adhoc' if 'IBSS' in record.capability else 'Infrastructure',
+                "authentication": _authentication(record.rsn, record.wpa, privacy),
+                "encryption": _encryption(record.rsn, record.wpa, privacy),
+                "bssids": [],
+            }
+        network["bssids"].append(record.as_bssid())
+    return list(networks.values())
+
+def parse_iw_link(raw_output: str) -> Dict[str, Any]:
+    """Parses `iw dev <if> link`. Returns {} when not connected."""
+    lines = raw_output.splitlines()
+    if not lines or not lines[0].startswith('Connected to'):
+        return {}
+    link: Dict[str, Any] = {'bssid': lines[0].split()[2].lower()}
+    for line in lines[1:]:
+        key, _, value = line.strip().partition(':')
+        key, value = key.strip().lower(), value.strip()
+        if key == 'ssid':
+            link['ssid'] = value
+        elif key == 'freq':
+            link['freq'] = float(value)
+        elif key == 'signal':
+            match = dbm_re.search(value)
+            link['signal_dbm'] = float(match.group(1)) if match else None
+        elif key in ('rx bitrate', 'tx bitrate'):
+            match = bitrate_re.search(value)
+            link[key.replace(' ', '_')] = float(match.group(1)) if match else None
+            link[key.replace(' ', '_') + '_info'] = value
+    return link
+
+def _link_radio_type(link: Dict[str, Any]) -> Optional[str]:
+    info = link.get('rx_bitrate_info') or link.get('tx_bitrate_info') or ''
+    for marker, radio_type in (('EHT-', '802.11be'), ('HE-', '802.11ax'), ('VHT-', '802.11ac'), ('MCS', '802.11n')):
+        if marker in info:
+            return radio_type
+    return None
+
+def _read_sys(interface: str, attribute: str) -> Optional[str]:
+    try:
+        with open(os.path.join(SYS_CLASS_NET, interface, attribute)) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def interface_data(interface: str, link_output: str, proc_stats: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Same keys as the netsh `get_interface_data`, from `iw link` + /proc/net/wireless."""
+    link = parse_iw_link(link_output)
+    stats = proc_stats.get(interface, {})
+    freq = link.get('freq')
+    signal_dbm = link.get('signal_dbm', stats.get('level_dbm'))
+    signal_percent = signal_percent_from_dbm(signal_dbm)
+    return {
+        'name': interface,
+        'description': None,
+        'physical_address': _read_sys(interface, 'address'),
+        'state': 'connected' if link else 'disconnected',
+        'SSDI': link.get('ssid') or None,
+        'bssid': link.get('bssid'),
+        'band': band_from_freq(freq) if freq else None,
+        'channel': str(channel_from_freq(freq)) if freq and channel_from_freq(freq) else None,
+        'radio_type': _link_radio_type(link),
+        'authentication': None,
+        'cipher': None,
+        'recieve_rate_mbps': link.get('rx_bitrate'),
+        'transmit_rate_mbps': link.get('tx_bitrate'),
+        'signal': f"{signal_percent}%" if signal_percent is not None else None,
+        'signal_dbm': signal_dbm,
+        'noise_dbm': stats.get('noise_dbm'),
+        'link_quality': stats.get('link_quality'),
+    }
+
+def parse_iw_station_dump(raw_output: str) -> Dict[str, Any]:
+    """
+    Parses `iw dev <if> station dump` for the first station (the AP we're
+    associated with, in managed mode): signal, bitrates and retry counters.
+    """
+    station: Dict[str, Any] = {}
+    for line in raw_output.splitlines():
+        if line.startswith('Station '):
+            if station:
+                break
+            station['bssid'] = line.split()[1].lower()
+            continue
+        key, _, value = line.strip().partition(':')
+        key, value = key.strip().lower(), value.strip()
+        if key == 'signal':
+            # "-52 [-54, -55] dBm": the combined signal, then per chain
+            match = station_signal_re.match(value)
+            station['signal_dbm'] = float(match.group(1)) if match else None
+        elif key in ('rx bitrate', 'tx bitrate'):
+            match = bitrate_re.search(value)
+            station[key.replace(' ', '_')] = float(match.group(1)) if match else None
+        elif key in ('tx retries', 'tx failed', 'rx packets', 'tx packets'):
+            try:
+                station[key.replace(' ', '_')] = int(value)
+            except ValueError:
+                pass
+    return station
@@ -0,0 +1,219 @@
+from array import array
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+from backend import wifi, wifi_linux
+from backend.ringbuffer import RingBuffer
+
+load_dotenv()
+
+# High-frequency link sampler: polls signal, bitrates and retries WIFI_SAMPLER_HZ times a
+# second (0 disables it) into fixed-size ring buffers, and rolls the samples up into
+# min/max/mean series at 1 s, 1 min and 1 h. Every buffer is preallocated, memory never
+# grows no matter how long the sampler runs.
+WIFI_SAMPLER_HZ = float(os.getenv('WIFI_SAMPLER_HZ', '0'))
+# Seconds of raw samples kept (at 10 Hz, 600 s is 6000 samples, ~240 KB)
+WIFI_SAMPLER_RAW_SECONDS = float(os.getenv('WIFI_SAMPLER_RAW_SECONDS', '600'))
+# `iw station dump` (Linux) and `netsh wlan show interface` (Windows) fork a process, so what
+# they report is refreshed at most this often: rates/retries on Linux, the whole sample on Windows
+WIFI_SAMPLER_STATION_INTERVAL = float(os.getenv('WIFI_SAMPLER_STATION_INTERVAL', '1'))
+
+METRICS = ('signal_dbm', 'rx_rate_mbps', 'tx_rate_mbps', 'tx_retries')
+
+# (name, bucket seconds, buckets kept)
+ROLLUPS = (
+    ('1s', 1, 3600),
+    ('1m', 60, 1440),
+    ('1h', 3600, 720),
+)
+
+NAN = math.nan
+
+class Rollup:
+    """
+    Downsamples samples into `resolution`-second buckets of min/max/mean per
+    metric, kept in a ring of `capacity` buckets. NaNs (missing readings) are
+    left out of the aggregates.
+    """
+    def __init__(self, resolution: float, capacity: int, metrics: Iterable[str] = METRICS):
+        self.resolution = resolution
+        self.metrics = tuple(metrics)
+        fields = [f'{metric}_{aggregate}' for metric in self.metrics for aggregate in ('min', 'max', 'mean')]
+        self.buffer = RingBuffer(capacity, fields)
+        self._bucket: Optional[float] = None
+        self._reset()
+
+    def _reset(self):
+        count = len(self.metrics)
+        self._min = [math.inf] * count
+        self._max = [-math.inf] * count
+        self._sum = [0.0] * count
+        self._n = [0] * count
+
+    def add(self, timestamp: float, values: Iterable[float]):
+        bucket = timestamp - timestamp % self.resolution
+        if self._bucket is not None and bucket != self._bucket:
+            self.flush()
+        self._bucket = bucket
+        for i, value in enumerate(values):
+            if value != value:  # NaN
+                continue
+            if value < self._min[i]:
+                self._min[i] = value
+            if value > self._max[i]:
+                self._max[i] = value
+            self._sum[i] += value
+            self._n[i] += 1
+
+    def flush(self):
+        """Closes the current bucket into the ring."""
+        if self._bucket is None:
+            return
+        row = [self._bucket]
+        for i in range(len(self.metrics)):
+            if self._n[i]:
+                row += [self._min[i], self._max[i], self._sum[i] / self._n[i]]
+            else:
+                row += [NAN, NAN, NAN]
+        self.buffer.append(row)
+        self._bucket = None
+        self._reset()
+
+class LinkSampleReader:
+    """
+    Reads one (signal_dbm, rx_rate_mbps, tx_rate_mbps, tx_retries) sample. On
+    Linux the signal comes from /proc/net/wireless on every call (no fork) and
+    the rates/retry counter from `iw station dump` every `station_interval`
+    seconds; `tx_retries` is the number of retries since the previous reading.
+    Elsewhere it reads `netsh wlan show interface` every `station_interval`
+    seconds, which has no retry counter.
+    """
+    def __init__(self, station_interval: float = WIFI_SAMPLER_STATION_INTERVAL):
+        self.station_interval = station_interval
+        self._station_at: Optional[float] = None
+        self._rates = (NAN, NAN)
+        self._retries_total: Optional[int] = None
+        self._netsh_sample = (NAN, NAN, NAN, NAN)
+
+    def __call__(self) -> Tuple[float, float, float, float]:
+        if wifi.wifi_backend() == 'iw':
+            return self._read_iw()
+        return self._read_netsh()
+
+    def _read_iw(self) -> Tuple[float, float, float, float]:
+        interface = wifi.wifi_interface_name()
+        level = wifi_linux.read_proc_net_wireless().get(interface, {}).get('level_dbm')
+        retries = 0.0
+        now = time.monotonic()
+        if self._station_at is None or now - self._station_at >= self.station_interval:
+            self._station_at = now
+            result = wifi.run_wifi_command('iw_station_dump', ['iw', 'dev', interface, 'station', 'dump'], capture_output=True, text=True)
+            station = wifi_linux.parse_iw_station_dump(result.stdout)
+            retries = self._retries_delta(station.get('tx_retries'))
+            self._rates = (_or_nan(station.get('rx_bitrate')), _or_nan(station.get('tx_bitrate')))
+            if level is None:
+                level = station.get('signal_dbm')
+        return (_or_nan(level), *self._rates, retries)
+
+    def _retries_delta(self, total: Optional[int]) -> float:
+        if total is None:
+            return NAN
+        previous, self._retries_total = self._retries_total, total
+        # First reading, or the counter restarted after a reassociation
+        if previous is None or total < previous:
+            return 0.0
+        return float(total - previous)
+
+    def _read_netsh(self) -> Tuple[float, float, float, float]:
+        now = time.monotonic()
+        if self._station_at is None or now - self._station_at >= self.station_interval:
+            self._station_at = now
+            data = wifi.get_interface_data() or {}
+            self._netsh_sample = (
+                _or_nan(wifi.get_signal_strength_dbm(wifi.parse_signal_percent(data.get('signal')))),
+                _or_nan(data.get('recieve_rate_mbps')),
+                _or_nan(data.get('transmit_rate_mbps')),
+                NAN,
+            )
+        return self._netsh_sample
+
+def _or_nan(value) -> float:
+    try:
+        return float(value) if value is not None else NAN
+    except (TypeError, ValueError):
+        return NAN
+
+class SignalSampler:
+    """
+    Polls `read_sample` `hz` times a second on a background thread, keeping
+    `raw_seconds` of raw samples plus the ROLLUPS series.
+    """
+    def __init__(self, read_sample: Callable[[], Iterable[float]], hz: float = 10, raw_seconds: float = WIFI_SAMPLER_RAW_SECONDS, clock: Callable[[], float] = time.time):
+        if hz <= 0:
+            raise ValueError("hz must be positive")
+        self.read_sample = read_sample
+        self.hz = hz
+        self.clock = clock
+        self.raw = RingBuffer(max(int(hz * raw_seconds), 1), METRICS)
+        self.rollups = {name: Rollup(resolution, capacity) for name, resolution, capacity in ROLLUPS}
+        self.errors = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def sample(self) -> Optional[Tuple[float, ...]]:
+        """Takes one sample now. Failed reads are counted, not recorded."""
+        try:
+            values = tuple(self.read_sample())
+        except Exception:
+            self.errors += 1
+            return None
+        timestamp = self.clock()
+        self.raw.append((timestamp, *values))
+        for rollup in self.rollups.values():
+            rollup.add(timestamp, values)
+        return (timestamp, *values)
+
+    def start(self) -> threading.Thread:
+        def sample_forever():
+            period = 1 / self.hz
+            next_tick = time.monotonic()
+            while not self._stop.is_set():
+                self.sample()
+                # Fixed schedule, a slow read skips ticks instead of drifting
+                next_tick += period
+                now = time.monotonic()
+                if next_tick < now:
+                    next_tick = now + period - (now - next_tick) % period
+                self._stop.wait(next_tick - now)
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=sample_forever, name='wifi-sampler', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def window(self, resolution: str = 'raw', start: Optional[float] = None, end: Optional[float] = None) -> Dict[str, array]:
+        if resolution == 'raw':
+            return self.raw.window(start, end)
+        if resolution not in self.rollups:
+            raise KeyError(resolution)
+        return self.rollups[resolution].buffer.window(start, end)
+
+wifi_sampler: Optional[SignalSampler] = None
+
+def start_wifi_sampler(hz: float = WIFI_SAMPLER_HZ) -> SignalSampler:
+    global wifi_sampler
+    wifi_sampler = SignalSampler(LinkSampleReader(), hz=hz)
+    wifi_sampler.start()
+    return wifi_sampler